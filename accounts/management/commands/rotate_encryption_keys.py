@@ -0,0 +1,134 @@
+"""
+Management command to re-encrypt EncryptedTextField columns with the current FERNET_KEY.
+
+Rotation procedure:
+    1. Set BLIND_INDEX_KEY explicitly (if not already set) so blind indexes stay valid
+    2. Move the old key into FERNET_OLD_KEYS and set a new FERNET_KEY, then deploy
+    3. python manage.py rotate_encryption_keys
+    4. Remove the old key from FERNET_OLD_KEYS
+
+Usage:
+    python manage.py rotate_encryption_keys
+    python manage.py rotate_encryption_keys --schema=acme --dry-run
+"""
+from cryptography.fernet import Fernet, InvalidToken
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from django_tenants.utils import schema_context, get_public_schema_name
+from accounts.models import Tenant
+from utils.encryption import EncryptedTextField, get_cipher, get_encryption_keys, raw_encrypted_values
+
+
+class Command(BaseCommand):
+    help = 'Re-encrypt encrypted fields with the primary FERNET_KEY'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schema',
+            type=str,
+            help='Only rotate this schema (default: public and every tenant schema)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows re-encrypted per UPDATE (default: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count rows that need re-encryption without writing them'
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BLIND_INDEX_KEY', ''):
+            self.stdout.write(self.style.WARNING(
+                'BLIND_INDEX_KEY is not set: blind indexes are derived from FERNET_KEY and '
+                'must be rebuilt after changing it.'
+            ))
+
+        public_schema = get_public_schema_name()
+        if options['schema']:
+            schemas = [options['schema']]
+        else:
+            schemas = [public_schema] + list(
+                Tenant.objects.exclude(schema_name=public_schema).values_list('schema_name', flat=True)
+            )
+
+        total = 0
+        for schema_name in schemas:
+            app_labels = self.get_app_labels(settings.SHARED_APPS if schema_name == public_schema else settings.TENANT_APPS)
+            with schema_context(schema_name):
+                for model in apps.get_models():
+                    if model._meta.app_label not in app_labels or model._meta.proxy:
+                        continue
+                    fields = [f for f in model._meta.concrete_fields if isinstance(f, EncryptedTextField)]
+                    if not fields:
+                        continue
+                    count = self.rotate_model(model, fields, options['batch_size'], options['dry_run'])
+                    if count:
+                        self.stdout.write(f'  [{schema_name}] {model._meta.label}: {count} values')
+                    total += count
+
+        verb = 'need re-encryption' if options['dry_run'] else 're-encrypted'
+        self.stdout.write(self.style.SUCCESS(f'Done. {total} values {verb}.'))
+
+    def get_app_labels(self, app_names):
+        labels = set()
+        for config in apps.get_app_configs():
+            if config.name in app_names:
+                labels.add(config.label)
+        return labels
+
+    def rotate_model(self, model, fields, batch_size, dry_run):
+        """Rotate tokens not already under the primary key. Undecryptable values are left untouched."""
+        primary = Fernet(get_encryption_keys()[0])
+        cipher = get_cipher()
+        names = [f.attname for f in fields]
+        count = 0
+
+        # Work on ciphertext directly so values are never decrypted into model instances
+        with raw_encrypted_values():
+            rows = model._default_manager.values_list('pk', *names).iterator(chunk_size=batch_size)
+            batch = {name: {} for name in names}
+
+            for row in rows:
+                pk = row[0]
+                for name, token in zip(names, row[1:]):
+                    if not token:
+                        continue
+                    try:
+                        primary.decrypt(token.encode('utf-8'))
+                        continue
+                    except InvalidToken:
+                        pass
+                    try:
+                        batch[name][pk] = cipher.rotate(token.encode('utf-8')).decode('utf-8')
+                    except InvalidToken:
+                        continue
+                    count += 1
+
+                if sum(len(v) for v in batch.values()) >= batch_size:
+                    if not dry_run:
+                        self.write_batch(model, batch)
+                    batch = {name: {} for name in names}
+
+            if not dry_run:
+                self.write_batch(model, batch)
+        return count
+
+    def write_batch(self, model, batch):
+        with transaction.atomic():
+            for name, tokens in batch.items():
+                if not tokens:
+                    continue
+                # Value with a plain TextField output skips EncryptedTextField.get_prep_value
+                model._default_manager.filter(pk__in=list(tokens)).update(**{
+                    name: Case(
+                        *[When(pk=pk, then=Value(token, output_field=models.TextField())) for pk, token in tokens.items()],
+                        output_field=models.TextField(),
+                    )
+                })
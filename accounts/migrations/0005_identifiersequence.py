@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 19:51
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_seosettings_contact_address_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(help_text="Sequence name (e.g., 'order', 'item', 'branch')", max_length=20)),
+                ('last_value', models.BigIntegerField(default=0, help_text='Highest number handed out so far')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identifier_sequences', to='accounts.tenant')),
+            ],
+            options={
+                'unique_together': {('tenant', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.9 on 2026-10-18 01:10
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def settle_logged_events(apps, schema_editor):
+    # Rows logged before the delivery queue are past attempts, never to be resent
+    WebhookEvent = apps.get_model('accounts', 'WebhookEvent')
+    WebhookEvent.objects.filter(
+        Q(status_code__isnull=True) | Q(status_code__gte=300) | Q(status_code__lt=200)
+    ).update(status='dead', attempts=1)
+    WebhookEvent.objects.filter(status='delivered').update(attempts=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_identifiersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookendpoint',
+            name='consecutive_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='webhookendpoint',
+            name='disabled_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('dead', 'Dead')], default='delivered', max_length=20),
+        ),
+        migrations.RunPython(settle_logged_events, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('dead', 'Dead')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='error_message',
+            field=models.TextField(blank=True, help_text='Error of the last attempt', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='accounts_we_status_34be7b_idx'),
+        ),
+    ]
@@ -104,6 +104,23 @@ class Branch(models.Model):
             return f"{self.unique_id} - {self.name}"
         return f"{self.name} - {self.tenant.name}"
 
+class IdentifierSequence(models.Model):
+    """
+    Per-tenant counter backing human-readable identifiers (ORD-, ITM-, BR-).
+    Lives in the shared schema so branch IDs and tenant-schema orders share one allocator.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='identifier_sequences')
+    name = models.CharField(max_length=20, help_text="Sequence name (e.g., 'order', 'item', 'branch')")
+    last_value = models.BigIntegerField(default=0, help_text="Highest number handed out so far")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('tenant', 'name')
+
+    def __str__(self):
+        return f"{self.tenant.name} - {self.name}: {self.last_value}"
+
 class UserProfile(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='profiles')
@@ -336,6 +353,11 @@ class WebhookEndpoint(models.Model):
     is_active = models.BooleanField(default=True)
     events = models.JSONField(default=list, help_text="List of subscribed events (e.g., ['order.created', 'inventory.low'])")
     
+    # Circuit breaker (utils/webhooks.py): after WEBHOOK_CIRCUIT_THRESHOLD failures
+    # in a row, nothing is sent to the endpoint until disabled_until
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    disabled_until = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -343,7 +365,16 @@ class WebhookEndpoint(models.Model):
         return f"{self.url} ({self.tenant.name})"
 
 class WebhookEvent(models.Model):
-    """Log of webhook delivery attempts"""
+    """Webhook delivery to one endpoint: queued, retried and logged (utils/webhooks.py)"""
+    STATUS_PENDING = 'pending'
+    STATUS_DELIVERED = 'delivered'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DELIVERED, 'Delivered'),
+        (STATUS_DEAD, 'Dead'),
+    )
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='delivery_logs')
     event_type = models.CharField(max_length=50) # e.g., 'order.created'
@@ -352,12 +383,20 @@ class WebhookEvent(models.Model):
     signature = models.CharField(max_length=128, blank=True, null=True, help_text="HMAC-SHA256 signature of payload")
     status_code = models.PositiveIntegerField(null=True, blank=True)
     response_body = models.TextField(blank=True, null=True)
-    error_message = models.TextField(blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True, help_text="Error of the last attempt")
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
     
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
 
     def __str__(self):
         return f"{self.event_type} to {self.endpoint.url} - {self.status_code}"
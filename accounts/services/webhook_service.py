@@ -1,13 +1,12 @@
 """
 Webhook Service
 
-Handles webhook delivery with HMAC signature generation and validation.
+Delivers webhooks to registered endpoints through the delivery queue in
+utils/webhooks.py (signing, retries, circuit breaking).
 """
-import json
-import requests
-from django.conf import settings
+import datetime
 from accounts.models import WebhookEndpoint, WebhookEvent
-from api.security import generate_webhook_signature
+from utils import webhooks
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,7 +26,8 @@ class WebhookService:
             tenant: Tenant object (optional, for tenant-specific webhooks)
         
         Returns:
-            List of WebhookEvent objects representing delivery attempts
+            List of WebhookEvent objects representing delivery attempts;
+            failed ones are retried in the background
         """
         # Find all active endpoints subscribed to this event
         endpoints = WebhookEndpoint.objects.filter(
@@ -38,17 +38,9 @@ class WebhookService:
         if tenant:
             endpoints = endpoints.filter(tenant=tenant)
         
-        delivery_results = []
-        
-        for endpoint in endpoints:
-            result = WebhookService._deliver_to_endpoint(
-                endpoint=endpoint,
-                event_type=event_type,
-                payload=payload
-            )
-            delivery_results.append(result)
-        
-        return delivery_results
+        return WebhookService._deliver(
+            [webhooks.pending_event(endpoint, event_type, payload) for endpoint in endpoints]
+        )
     
     @staticmethod
     def _deliver_to_endpoint(endpoint: WebhookEndpoint, event_type: str, payload: dict):
@@ -63,62 +55,18 @@ class WebhookService:
         Returns:
             WebhookEvent object representing the delivery attempt
         """
-        # Serialize payload
-        payload_json = json.dumps(payload)
-        payload_bytes = payload_json.encode('utf-8')
-        
-        # Generate signature
-        signature = generate_webhook_signature(payload_bytes, endpoint.secret)
-        
-        # Prepare headers
-        headers = {
-            'Content-Type': 'application/json',
-            'X-Webhook-Signature': signature,
-            'X-Event-Type': event_type,
-            'User-Agent': 'POS-Webhook/1.0'
-        }
-        
-        # Attempt delivery
-        webhook_event = WebhookEvent(
-            endpoint=endpoint,
-            event_type=event_type,
-            payload=payload,
-            signature=signature
-        )
-        
-        try:
-            response = requests.post(
-                endpoint.url,
-                data=payload_json,
-                headers=headers,
-                timeout=10  # 10 second timeout
-            )
-            
-            webhook_event.status_code = response.status_code
-            webhook_event.response_body = response.text[:1000]  # Limit to 1000 chars
-            
-            if response.status_code >= 400:
-                webhook_event.error_message = f"HTTP {response.status_code}: {response.text[:500]}"
-                logger.warning(f"Webhook delivery failed: {endpoint.url} - {response.status_code}")
-            else:
-                logger.info(f"Webhook delivered successfully: {endpoint.url} - {event_type}")
-        
-        except requests.exceptions.Timeout:
-            webhook_event.error_message = "Request timeout after 10 seconds"
-            logger.error(f"Webhook timeout: {endpoint.url}")
-        
-        except requests.exceptions.RequestException as e:
-            webhook_event.error_message = f"Request failed: {str(e)}"
-            logger.error(f"Webhook delivery error: {endpoint.url} - {str(e)}")
-        
-        except Exception as e:
-            webhook_event.error_message = f"Unexpected error: {str(e)}"
-            logger.error(f"Webhook unexpected error: {endpoint.url} - {str(e)}")
-        
-        finally:
-            webhook_event.save()
-        
-        return webhook_event
+        event = webhooks.pending_event(endpoint, event_type, payload)
+        sent = WebhookService._deliver([event])
+        # An endpoint paused by its circuit breaker is not attempted
+        return sent[0] if sent else event
+    
+    @staticmethod
+    def _deliver(events):
+        """Queue unsaved WebhookEvent rows and send them now"""
+        if not events:
+            return []
+        WebhookEvent.objects.bulk_create(events)
+        return webhooks.WebhookDispatcher().dispatch([event.id for event in events])
     
     @staticmethod
     def test_webhook(endpoint_id: str):
@@ -26,3 +26,58 @@ def auto_generate_branch_id(sender, instance, **kwargs):
     if not instance.unique_id and instance.tenant:
         from utils.identifier_generator import generate_branch_id
         instance.unique_id = generate_branch_id(instance.tenant)
+
+
+# Cached API key principals (api/key_cache.py). Invalidated after commit so a
+# concurrent request cannot re-cache the old rows in between.
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from billing.models import Plan, Subscription
+from .models import APIKey, Tenant
+
+
+def _invalidate_api_keys_on_commit(**filters):
+    from api.key_cache import invalidate_tenant_api_keys
+    transaction.on_commit(lambda: invalidate_tenant_api_keys(**filters))
+
+
+@receiver([post_save, post_delete], sender=APIKey)
+def invalidate_cached_api_key(sender, instance, **kwargs):
+    from api.key_cache import invalidate_api_keys
+    key_hash = instance.key_hash
+    transaction.on_commit(lambda: invalidate_api_keys([key_hash]))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_tenant_api_keys(sender, instance, **kwargs):
+    _invalidate_api_keys_on_commit(tenant_id=instance.tenant_id)
+
+
+@receiver(post_save, sender=Tenant)
+def invalidate_api_keys_for_tenant(sender, instance, created, **kwargs):
+    if not created:
+        _invalidate_api_keys_on_commit(tenant_id=instance.pk)
+
+
+@receiver(post_save, sender=Plan)
+def invalidate_api_keys_for_plan(sender, instance, **kwargs):
+    _invalidate_api_keys_on_commit(tenant__subscription__plan_id=instance.pk)
+
+
+@receiver(post_save, sender=Branch)
+def invalidate_api_keys_for_branch(sender, instance, created, **kwargs):
+    if not created:
+        _invalidate_api_keys_on_commit(branch_id=instance.pk)
+
+
+# Webhook subscription index (utils/webhook_index.py), rebuilt after commit so
+# the rebuild reads the committed endpoints
+from .models import WebhookEndpoint
+
+
+@receiver([post_save, post_delete], sender=WebhookEndpoint)
+def rebuild_webhook_subscriptions(sender, instance, **kwargs):
+    from utils.webhook_index import rebuild
+    tenant_id = instance.tenant_id
+    transaction.on_commit(lambda: rebuild(tenant_id))
@@ -0,0 +1,176 @@
+"""
+Tests for the webhook delivery queue, against a local HTTP stand-in.
+"""
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import WebhookEndpoint, WebhookEvent
+from utils import webhook_index
+from utils.webhooks import WebhookDispatcher, WebhookService, _Circuit, backoff, pending_event, sign
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'webhook-delivery-tests'}}
+DELIVERY_SETTINGS = dict(
+    WEBHOOK_TIMEOUT=2, WEBHOOK_MAX_ATTEMPTS=3, WEBHOOK_BACKOFF_BASE=30, WEBHOOK_BACKOFF_MAX=3600,
+    WEBHOOK_WORKERS=8, WEBHOOK_ENDPOINT_CONCURRENCY=2, WEBHOOK_CIRCUIT_THRESHOLD=3,
+    WEBHOOK_CIRCUIT_COOLDOWN=300, WEBHOOK_DISPATCH_LIMIT=1000,
+)
+
+
+class StandIn:
+    """A local webhook receiver answering `status`, recording what it gets."""
+
+    def __init__(self, status=200, delay=0):
+        self.status = status
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.in_flight = self.max_in_flight = 0
+        lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                with lock:
+                    stand_in.in_flight += 1
+                    stand_in.max_in_flight = max(stand_in.max_in_flight, stand_in.in_flight)
+                    stand_in.connections.add(self.client_address)
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                time.sleep(stand_in.delay)
+                with lock:
+                    stand_in.requests.append((dict(self.headers), body))
+                    stand_in.in_flight -= 1
+                self.send_response(stand_in.status)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(**DELIVERY_SETTINGS)
+class WebhookSendTests(SimpleTestCase):
+    def setUp(self):
+        self.stand_in = StandIn()
+        self.addCleanup(self.stand_in.close)
+        self.endpoint = WebhookEndpoint(url=self.stand_in.url, secret='s3cret', events=['order.created'])
+
+    def events(self, count):
+        return [pending_event(self.endpoint, 'order.created', {'n': n}) for n in range(count)]
+
+    def test_events_are_signed_and_share_a_connection(self):
+        events = self.events(5)
+        WebhookDispatcher().send_all(_Circuit(self.endpoint), events)
+
+        self.assertEqual(len(self.stand_in.requests), 5)
+        self.assertEqual(len(self.stand_in.connections), 1)
+        headers, body = self.stand_in.requests[0]
+        self.assertEqual(headers['X-Puxbay-Signature'], sign(body.decode(), 's3cret'))
+        self.assertEqual(headers['X-Puxbay-Event'], 'order.created')
+        self.assertEqual(json.loads(body)['data'], {'n': 0})
+        for event in events:
+            self.assertEqual((event.status, event.attempts, event.status_code), (WebhookEvent.STATUS_DELIVERED, 1, 200))
+            self.assertIsNone(event.next_attempt_at)
+
+    def test_failures_back_off_then_die(self):
+        self.stand_in.status = 500
+        event = self.events(1)[0]
+        dispatcher = WebhookDispatcher()
+
+        self.assertFalse(dispatcher.send(self.endpoint, event))
+        self.assertEqual((event.status, event.attempts, event.error_message), (WebhookEvent.STATUS_PENDING, 1, "HTTP 500"))
+        self.assertGreaterEqual(event.next_attempt_at, timezone.now() + timedelta(seconds=14))
+
+        dispatcher.send(self.endpoint, event)
+        dispatcher.send(self.endpoint, event)
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.STATUS_DEAD, 3))
+        self.assertIsNone(event.next_attempt_at)
+
+    def test_backoff_doubles_with_jitter_up_to_the_cap(self):
+        for attempts, delay in ((1, 30), (2, 60), (3, 120), (20, 3600)):
+            for _ in range(20):
+                self.assertTrue(delay / 2 <= backoff(attempts) <= delay)
+
+    def test_open_circuit_stops_sending(self):
+        self.stand_in.status = 503
+        events = self.events(10)
+        circuit = _Circuit(self.endpoint)
+        WebhookDispatcher().send_all(circuit, events)
+
+        self.assertEqual(len(self.stand_in.requests), 3)
+        self.assertTrue(circuit.is_open)
+        # The rest wait for the cooldown without using up attempts
+        for event in events[3:]:
+            self.assertEqual((event.attempts, event.next_attempt_at), (0, circuit.open_until))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, **DELIVERY_SETTINGS)
+class WebhookQueueTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stand_in = StandIn(delay=0.02)
+        self.addCleanup(self.stand_in.close)
+        self.endpoint = WebhookEndpoint.objects.create(
+            tenant=self.tenant, url=self.stand_in.url, secret='s3cret', events=['order.created']
+        )
+        # The test transaction never commits, so rebuild the index by hand
+        webhook_index.rebuild(self.tenant.pk)
+
+    def test_deliver_persists_and_sends_with_bounded_concurrency(self):
+        events = [(str(self.tenant.pk), 'order.created', {'n': n}) for n in range(12)]
+        events.append((str(self.tenant.pk), 'customer.created', {}))
+
+        sent = WebhookService.deliver(events)
+
+        self.assertEqual(len(sent), 12)
+        self.assertEqual(len(self.stand_in.requests), 12)
+        self.assertLessEqual(self.stand_in.max_in_flight, 2)
+        self.assertEqual(
+            WebhookEvent.objects.filter(endpoint=self.endpoint, status=WebhookEvent.STATUS_DELIVERED).count(), 12
+        )
+
+    def test_claimed_rows_are_not_sent_twice(self):
+        WebhookService.enqueue([(self.tenant.pk, 'order.created', {})])
+        dispatcher = WebhookDispatcher()
+        event = dispatcher._claim(None, 10)[0]
+
+        # Leased to the first claim
+        self.assertEqual(dispatcher._claim(None, 10), [])
+        self.assertEqual(len(dispatcher.dispatch()), 0)
+        self.assertEqual(WebhookEvent.objects.get(pk=event.pk).status, WebhookEvent.STATUS_PENDING)
+
+    def test_dead_endpoint_is_paused(self):
+        self.stand_in.status = 500
+        WebhookService.deliver([(self.tenant.pk, 'order.created', {'n': n}) for n in range(10)])
+
+        self.endpoint.refresh_from_db()
+        self.assertGreaterEqual(self.endpoint.consecutive_failures, 3)
+        self.assertGreater(self.endpoint.disabled_until, timezone.now())
+        self.assertLess(len(self.stand_in.requests), 10)
+
+        # Nothing goes out until the cooldown is over, even once the retries are due
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(WebhookDispatcher().dispatch(), [])
+
+        # Then one successful probe closes the circuit
+        self.stand_in.status = 200
+        WebhookEndpoint.objects.filter(pk=self.endpoint.pk).update(disabled_until=timezone.now())
+        WebhookDispatcher().dispatch()
+        self.endpoint.refresh_from_db()
+        self.assertEqual((self.endpoint.consecutive_failures, self.endpoint.disabled_until), (0, None))
+        self.assertFalse(WebhookEvent.objects.filter(status=WebhookEvent.STATUS_PENDING).exists())
@@ -0,0 +1,62 @@
+"""
+Tests for the cached webhook subscription index.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import WebhookEndpoint
+from utils import webhook_index
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'webhook-index-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, WEBHOOK_INDEX_TTL=3600, WEBHOOK_INDEX_LOCAL_TTL=5, WEBHOOK_INDEX_LOCAL_SIZE=1000)
+class WebhookIndexTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        webhook_index._local.clear()
+
+    def test_tenant_without_webhooks_costs_one_query_then_none(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(webhook_index.is_subscribed(self.tenant.pk, 'order.created'))
+        self.assertEqual(len(queries.captured_queries), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(webhook_index.is_subscribed(self.tenant.pk, 'order.created'))
+            self.assertFalse(webhook_index.is_subscribed(str(self.tenant.pk), 'inventory.low'))
+        self.assertEqual(len(queries.captured_queries), 0)
+
+        # Other processes find it in the cache
+        webhook_index._local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(webhook_index.is_subscribed(self.tenant.pk, 'order.created'))
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_endpoint_changes_rebuild_the_index_after_commit(self):
+        self.assertFalse(webhook_index.is_subscribed(self.tenant.pk, 'order.created'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            endpoint = WebhookEndpoint.objects.create(
+                tenant=self.tenant, url="https://example.com/hook", secret="s", events=['order.created', 'inventory.low']
+            )
+        self.assertEqual(webhook_index.endpoint_ids(self.tenant.pk, 'order.created'), [str(endpoint.pk)])
+        self.assertFalse(webhook_index.is_subscribed(self.tenant.pk, 'customer.registered'))
+        # Rebuilt in the shared cache too, not just dropped
+        webhook_index._local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(webhook_index.is_subscribed(self.tenant.pk, 'inventory.low'))
+        self.assertEqual(len(queries.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            endpoint.is_active = False
+            endpoint.save()
+        self.assertFalse(webhook_index.is_subscribed(self.tenant.pk, 'order.created'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            endpoint.is_active = True
+            endpoint.save()
+            endpoint.delete()
+        self.assertEqual(webhook_index.subscriptions(self.tenant.pk), {})
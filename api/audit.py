@@ -0,0 +1,225 @@
+"""
+Asynchronous API audit log writer.
+
+APIAuditMiddleware hands each request to `record_api_request`, which only
+appends a dict of column values to an in-process ring buffer. A background thread drains
+the buffer with one bulk_create every API_AUDIT_BATCH_SIZE rows or
+API_AUDIT_FLUSH_INTERVAL_MS milliseconds, whichever comes first, so the
+response path never waits on an INSERT.
+
+Body decoding and redaction also run on the flusher thread. When the buffer is
+full the oldest entries are dropped (and counted) rather than blocking requests;
+`stats()` exposes the counters so backpressure shows up in /health/metrics/.
+
+Each worker process has its own buffer and thread. Entries still buffered when
+the process exits are flushed by an atexit hook.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+REDACTED = '[REDACTED]'
+
+
+def should_sample(method, status_code):
+    """
+    Writes and errors are always logged; successful reads are logged with
+    probability API_AUDIT_SAMPLE_RATE.
+    """
+    if method not in ('GET', 'HEAD', 'OPTIONS') or status_code >= 400:
+        return True
+    rate = getattr(settings, 'API_AUDIT_SAMPLE_RATE', 1.0)
+    return rate >= 1 or random.random() < rate
+
+
+def is_sensitive(key, fields):
+    """
+    True when `key` is one of `fields` or starts/ends with one as a whole
+    word: 'password' matches 'new_password', 'pin' does not match 'shipping'.
+    """
+    key = str(key).lower().replace('-', '_')
+    return any(
+        key == field or key.endswith(f'_{field}') or key.startswith(f'{field}_')
+        for field in fields
+    )
+
+
+def redact(value, fields):
+    """Replace the values of sensitive keys with REDACTED, recursively."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if is_sensitive(key, fields) else redact(item, fields)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item, fields) for item in value]
+    return value
+
+
+def prepare_body(body):
+    """
+    Turn captured body bytes into what is stored: parsed and redacted JSON
+    where possible, otherwise the decoded text. `body` is None when nothing was
+    captured, an int (its size) when it was too large to keep and a str when it is
+    already the text to store.
+    """
+    if body is None:
+        return {}
+    if isinstance(body, str):
+        return body
+    if isinstance(body, int):
+        return f"[Body too large: {body} bytes]"
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        return "[Unable to decode body]"
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return text
+    fields = [field.lower() for field in getattr(settings, 'API_AUDIT_REDACT_FIELDS', [])]
+    return redact(parsed, fields) if fields else parsed
+
+
+class AuditLogWriter:
+    """Bounded buffer of pending APIRequestLog rows plus the thread that writes them."""
+
+    def __init__(self, capacity=None, batch_size=None, flush_interval_ms=None):
+        self.capacity = capacity or getattr(settings, 'API_AUDIT_BUFFER_SIZE', 10000)
+        self.batch_size = batch_size or getattr(settings, 'API_AUDIT_BATCH_SIZE', 200)
+        self.flush_interval = (flush_interval_ms or getattr(settings, 'API_AUDIT_FLUSH_INTERVAL_MS', 1000)) / 1000
+        self._buffer = deque(maxlen=self.capacity)
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._counters = {
+            'enqueued': 0,
+            'dropped': 0,
+            'sampled_out': 0,
+            'written': 0,
+            'failed': 0,
+            'flushes': 0,
+        }
+        self._high_water = 0
+        self._last_flush_ms = 0
+
+    def enqueue(self, entry):
+        with self._condition:
+            if len(self._buffer) == self.capacity:
+                # deque(maxlen) evicts the oldest entry on append
+                self._counters['dropped'] += 1
+            self._buffer.append(entry)
+            self._counters['enqueued'] += 1
+            depth = len(self._buffer)
+            self._high_water = max(self._high_water, depth)
+            if depth >= self.batch_size:
+                self._condition.notify()
+        self._ensure_thread()
+
+    def skip(self):
+        with self._condition:
+            self._counters['sampled_out'] += 1
+
+    def flush(self):
+        """Write everything currently buffered. Safe to call from any thread."""
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    return
+                self._write(batch)
+
+    def stats(self):
+        with self._condition:
+            return dict(
+                self._counters,
+                depth=len(self._buffer),
+                capacity=self.capacity,
+                high_water=self._high_water,
+                last_flush_ms=self._last_flush_ms,
+            )
+
+    def _write(self, batch):
+        from accounts.models import APIRequestLog
+
+        started = time.monotonic()
+        try:
+            logs = []
+            for entry in batch:
+                entry = dict(entry)
+                entry['request_body'] = prepare_body(entry['request_body'])
+                entry['response_body'] = prepare_body(entry['response_body'])
+                logs.append(APIRequestLog(**entry))
+            APIRequestLog.objects.bulk_create(logs)
+            written, failed = len(batch), 0
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} API log entries: {str(e)}")
+            written, failed = 0, len(batch)
+        with self._condition:
+            self._counters['written'] += written
+            self._counters['failed'] += failed
+            self._counters['flushes'] += 1
+            self._last_flush_ms = int((time.monotonic() - started) * 1000)
+
+    def _ensure_thread(self):
+        # Started lazily and again after a fork, where the parent's thread is gone
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='api-audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._buffer) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditLogWriter()
+                atexit.register(_writer.flush)
+    return _writer
+
+
+def record_api_request(**entry):
+    """
+    Queue an APIRequestLog row. request_body/response_body are raw bytes or
+    anything else prepare_body() accepts. With API_AUDIT_ASYNC off the row is
+    written before returning.
+    """
+    writer = get_audit_writer()
+    if not should_sample(entry['method'], entry['status_code'] or 0):
+        writer.skip()
+        return
+    if getattr(settings, 'API_AUDIT_ASYNC', True):
+        writer.enqueue(entry)
+    else:
+        writer._write([entry])
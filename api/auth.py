@@ -1,9 +1,9 @@
 import hashlib
-import redis
-from django.conf import settings
 from django.utils import timezone
 from rest_framework import authentication, exceptions
 from accounts.models import APIKey
+from api.key_cache import get_principal, last_used
+from api.ratelimit import api_key_rules, get_rate_limiter
 import logging
 logger = logging.getLogger(__name__)
 
@@ -20,14 +20,11 @@ class APIKeyAuthentication(authentication.BaseAuthentication):
         prefix = api_key_header[:8]
         key_hash = hashlib.sha256(api_key_header.encode()).hexdigest()
 
-        try:
-            key_obj = APIKey.objects.select_related('tenant', 'tenant__subscription', 'tenant__subscription__plan').get(
-                key_prefix=prefix,
-                key_hash=key_hash,
-                is_active=True
-            )
-        except APIKey.DoesNotExist:
+        # Key, tenant, subscription, plan, branch and admin profile (cached, see api/key_cache.py)
+        principal = get_principal(prefix, key_hash)
+        if principal is None:
             raise exceptions.AuthenticationFailed('Invalid or inactive API key')
+        key_obj, admin_user = principal
 
         # 1. Check Subscription Plan (skip for internal POS keys)
         tenant = key_obj.tenant
@@ -45,19 +42,15 @@ class APIKeyAuthentication(authentication.BaseAuthentication):
             if not plan or not plan.api_access:
                 raise exceptions.AuthenticationFailed(f'Your current plan ({plan.name if plan else "N/A"}) does not include API access')
 
-            # 2. Daily Quota Enforcement (Redis) - only for non-internal keys
-            self.check_quota(tenant, plan.api_daily_limit)
+            # 2. Per-key, per-tenant and daily plan quotas - only for non-internal keys
+            self.check_quota(request, key_obj, tenant, plan)
 
-        # Update last used
-        # We use a threshold to avoid constant DB writes
-        # (This is a simplified version)
-        key_obj.last_used_at = timezone.now()
-        key_obj.save(update_fields=['last_used_at'])
+        # Update last used (coalesced and written in the background)
+        last_used.touch(key_obj.pk, timezone.now())
 
         # Return (User, Auth)
         # Note: API keys are linked to Tenants, but for DRF we need a user object.
         # We'll return the tenant's primary admin or a placeholder.
-        admin_user = tenant.users.filter(role='admin').first()
         user = admin_user.user if admin_user else None
         
         if user and admin_user:
@@ -99,51 +92,19 @@ class APIKeyAuthentication(authentication.BaseAuthentication):
         
         return (user, api_key_header)
 
-    def check_quota(self, tenant, daily_limit):
-        if not settings.REDIS_URL:
-            return  # Skip if Redis not configured
-
-        r = redis.from_url(settings.REDIS_URL)
-        now = timezone.now().timestamp()
-        
-        # 1. Daily Sliding Window (24 hours)
-        daily_key = f"api_sliding_daily:{tenant.id}"
-        daily_window = 86400  # 24 hours
-        
-        # 2. Minute Burst Window (60 seconds)
-        minute_key = f"api_sliding_minute:{tenant.id}"
-        minute_window = 60
-        minute_limit = 60 # 60 requests per minute burst limit
+    def check_quota(self, request, key_obj, tenant, plan):
+        result = get_rate_limiter().check(api_key_rules(key_obj, tenant, plan))
+        if result is None:
+            return
 
-        try:
-            pipe = r.pipeline()
-            # Clean up old entries
-            pipe.zremrangebyscore(daily_key, 0, now - daily_window)
-            pipe.zremrangebyscore(minute_key, 0, now - minute_window)
-            
-            # Get current counts
-            pipe.zcard(daily_key)
-            pipe.zcard(minute_key)
-            
-            results = pipe.execute()
-            daily_count = results[2]
-            minute_count = results[3]
-
-            if minute_count >= minute_limit:
-                 raise exceptions.PermissionDenied('Burst rate limit exceeded (60 req/min)')
-
-            if daily_count >= daily_limit:
-                raise exceptions.PermissionDenied('Daily API quota exceeded (Sliding 24h)')
-
-            # Add current request
-            pipe.zadd(daily_key, {str(now): now})
-            pipe.zadd(minute_key, {str(now): now})
-            pipe.expire(daily_key, daily_window + 60)
-            pipe.expire(minute_key, minute_window + 60)
-            pipe.execute()
-
-        except redis.RedisError:
-            pass  # Fallback to allow if Redis is down
+        # APIRateLimitMiddleware adds the RateLimit-* headers to the response
+        request._request.api_rate_limit = result
+        if not result.allowed:
+            if result.rule.window == 86400:
+                detail = 'Daily API quota exceeded (Sliding 24h)'
+            else:
+                detail = f'Burst rate limit exceeded ({result.rule.limit} req/{result.rule.window}s)'
+            raise exceptions.Throttled(wait=result.retry_after, detail=detail)
 
 from rest_framework import permissions
 
@@ -193,11 +154,10 @@ def require_api_key_django(view_func):
         try:
             prefix = api_key[:8]
             key_hash = hashlib.sha256(api_key.encode()).hexdigest()
-            key_obj = APIKey.objects.select_related('tenant').get(
-                key_prefix=prefix, 
-                key_hash=key_hash, 
-                is_active=True
-            )
+            principal = get_principal(prefix, key_hash)
+            if principal is None:
+                raise APIKey.DoesNotExist
+            key_obj, admin_profile = principal
             
             request.tenant = key_obj.tenant
             
@@ -224,7 +184,7 @@ def require_api_key_django(view_func):
                         # User is authenticated but has no profile in this tenant
                         # This is okay for API calls - we'll use a fallback for the request context
                         # but we MUST NOT modify request.user to preserve the session
-                        profile = key_obj.tenant.users.filter(role='admin').first()
+                        profile = admin_profile
                         if profile:
                             # Store in a separate attribute to avoid session conflicts
                             request.api_user_profile = profile
@@ -233,7 +193,7 @@ def require_api_key_django(view_func):
             else:
                 # Not authenticated via session - use API key to determine user
                 # This is safe because there's no session to preserve
-                profile = key_obj.tenant.users.filter(role='admin').first()
+                profile = admin_profile
                 if profile:
                     request.user = profile.user
                     request.user.profile = profile
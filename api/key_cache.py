@@ -0,0 +1,155 @@
+"""
+Cache of resolved API key principals.
+
+Authenticating an API key needs the key with its tenant, subscription, plan
+and branch, plus the tenant's admin profile. That graph is cached in two tiers:
+
+- In process for API_KEY_CACHE_LOCAL_TTL seconds (default 5). This is the
+  only tier that can serve a stale principal: another worker's change is seen
+  here once the entry expires.
+- In the default cache for API_KEY_CACHE_TTL seconds (default 300). Entries
+  are deleted by the signals in accounts/signals.py when a key, subscription,
+  plan, tenant, branch or admin profile changes.
+
+Entries are stored pickled and unpickled on every hit, so each request gets its
+own model instances and nothing a view sets on them leaks into other requests.
+
+`last_used_at` is not written per request: LastUsedTracker keeps the latest
+timestamp per key and writes them all in one UPDATE every
+API_KEY_LAST_USED_FLUSH_SECONDS.
+"""
+import atexit
+import logging
+import pickle
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _cache_key(key_hash):
+    return f"api_key_principal:{key_hash}"
+
+
+def load_principal(prefix, key_hash):
+    """Return (APIKey, admin UserProfile or None) from the database, or None for an unknown key."""
+    from accounts.models import APIKey
+
+    key_obj = APIKey.objects.select_related(
+        'tenant', 'tenant__subscription', 'tenant__subscription__plan', 'branch'
+    ).filter(key_prefix=prefix, key_hash=key_hash, is_active=True).first()
+    if key_obj is None:
+        return None
+    admin_profile = key_obj.tenant.users.filter(role='admin').select_related('user').first()
+    return key_obj, admin_profile
+
+
+def get_principal(prefix, key_hash):
+    """
+    Resolve an API key to (APIKey, admin UserProfile or None), or None when the
+    key is unknown or inactive. Unknown keys are not cached.
+    """
+    now = time.monotonic()
+    entry = _local.get(key_hash)
+    if entry is not None and entry[0] > now:
+        return pickle.loads(entry[1])
+
+    blob = None
+    try:
+        blob = cache.get(_cache_key(key_hash))
+    except Exception as e:
+        logger.warning(f"API key cache unavailable: {str(e)}")
+
+    if blob is None:
+        principal = load_principal(prefix, key_hash)
+        if principal is None:
+            return None
+        blob = pickle.dumps(principal)
+        try:
+            cache.set(_cache_key(key_hash), blob, getattr(settings, 'API_KEY_CACHE_TTL', 300))
+        except Exception:
+            pass
+
+    with _local_lock:
+        if len(_local) >= getattr(settings, 'API_KEY_CACHE_LOCAL_SIZE', 1000):
+            _local.clear()
+        _local[key_hash] = (now + getattr(settings, 'API_KEY_CACHE_LOCAL_TTL', 5), blob)
+    return pickle.loads(blob)
+
+
+def invalidate_api_keys(key_hashes):
+    key_hashes = list(key_hashes)
+    if not key_hashes:
+        return
+    with _local_lock:
+        for key_hash in key_hashes:
+            _local.pop(key_hash, None)
+    try:
+        cache.delete_many([_cache_key(key_hash) for key_hash in key_hashes])
+    except Exception as e:
+        logger.warning(f"Failed to invalidate cached API keys: {str(e)}")
+
+
+def invalidate_tenant_api_keys(**filters):
+    """Invalidate the cached principals of every APIKey matching `filters`."""
+    from accounts.models import APIKey
+    invalidate_api_keys(APIKey.objects.filter(**filters).values_list('key_hash', flat=True))
+
+
+class LastUsedTracker:
+    """Coalesces last_used_at updates and writes them from a background thread."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'API_KEY_LAST_USED_FLUSH_SECONDS', 60)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, key_id, when):
+        with self._lock:
+            self._pending[key_id] = when
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='api-key-last-used', daemon=True)
+                    self._thread.start()
+
+    def flush(self):
+        from accounts.models import APIKey
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            # Greatest() keeps a newer value written by another worker (and
+            # ignores NULLs on PostgreSQL)
+            APIKey.objects.filter(pk__in=list(pending)).update(last_used_at=Greatest(
+                'last_used_at',
+                Case(
+                    *[When(pk=pk, then=Value(when)) for pk, when in pending.items()],
+                    output_field=DateTimeField(),
+                ),
+            ))
+        except Exception as e:
+            logger.warning(f"Failed to update last_used_at for {len(pending)} API keys: {str(e)}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+last_used = LastUsedTracker()
+atexit.register(last_used.flush)
@@ -1,9 +1,12 @@
 """
 API Middleware
 """
-from django.core.cache import cache
+from django.conf import settings
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
+from api.audit import record_api_request
+from api.ratelimit import apply_headers, get_rate_limiter, ip_rules
+from api.security import get_client_ip
 import logging
 logger = logging.getLogger(__name__)
 import time
@@ -11,35 +14,32 @@ import time
 
 class APIRateLimitMiddleware(MiddlewareMixin):
     """
-    Rate limiting middleware for API endpoints
+    Rate limiting middleware for API endpoints: API_RATELIMIT_IP_LIMIT requests
+    per API_RATELIMIT_IP_WINDOW seconds per client IP. Responses carry the
+    RateLimit-* headers of the tightest limit that applied, including the
+    per-key and per-tenant limits checked by APIKeyAuthentication.
     """
     def process_request(self, request):
-        if request.path.startswith('/api/'):
-            # Get client IP
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(',')[0]
-            else:
-                ip = request.META.get('REMOTE_ADDR')
-            
-            # Rate limit: 100 requests per minute
-            cache_key = f'api_rate_limit_{ip}'
-            requests = cache.get(cache_key, [])
-            now = time.time()
-            
-            # Remove requests older than 1 minute
-            requests = [req_time for req_time in requests if now - req_time < 60]
-            
-            if len(requests) >= 100:
-                return JsonResponse({
-                    'error': 'Rate limit exceeded. Please try again later.'
-                }, status=429)
-            
-            requests.append(now)
-            cache.set(cache_key, requests, 60)
-        
+        if not request.path.startswith('/api/') or not getattr(settings, 'RATELIMIT_ENABLE', True):
+            return None
+
+        result = get_rate_limiter().check(ip_rules(get_client_ip(request)))
+        if result is None:
+            return None
+        request.ip_rate_limit = result
+        if not result.allowed:
+            response = JsonResponse({
+                'error': 'Rate limit exceeded. Please try again later.'
+            }, status=429)
+            return apply_headers(response, result)
         return None
 
+    def process_response(self, request, response):
+        results = [r for r in (getattr(request, 'ip_rate_limit', None), getattr(request, 'api_rate_limit', None)) if r]
+        if results:
+            apply_headers(response, min(results, key=lambda r: (r.allowed, r.remaining)))
+        return response
+
 
 class APIKeyCsrfExemptMiddleware(MiddlewareMixin):
     """
@@ -120,7 +120,6 @@ class APIAuditMiddleware(MiddlewareMixin):
             return response
         
         # Skip if audit logging is disabled
-        from django.conf import settings
         if not getattr(settings, 'ENABLE_API_AUDIT_LOGGING', True):
             return response
         
@@ -138,44 +137,28 @@ class APIAuditMiddleware(MiddlewareMixin):
             # Get user (may be None for unauthenticated requests)
             user = request.user if request.user.is_authenticated else None
             
-            # Get client IP
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip_address = x_forwarded_for.split(',')[0].strip()
-            else:
-                ip_address = request.META.get('REMOTE_ADDR', '')
-            
-            # Get request body (limit size)
-            request_body = {}
+            # Bodies are captured as bytes here; decoding and redaction
+            # happen on the audit writer thread (see api/audit.py)
+            max_body_size = getattr(settings, 'API_AUDIT_MAX_BODY_SIZE', self.MAX_BODY_SIZE)
+            request_body = None
             if request.method in ['POST', 'PUT', 'PATCH']:
                 try:
                     body = request.body
-                    if len(body) <= self.MAX_BODY_SIZE:
-                        request_body = body.decode('utf-8')
-                    else:
-                        request_body = f"[Body too large: {len(body)} bytes]"
+                    request_body = body if len(body) <= max_body_size else len(body)
                 except Exception:
                     request_body = "[Unable to decode body]"
             
-            # Get response body (limit size)
-            response_body = {}
+            response_body = None
             if hasattr(response, 'content'):
-                try:
-                    content = response.content
-                    if len(content) <= self.MAX_BODY_SIZE:
-                        response_body = content.decode('utf-8')
-                    else:
-                        response_body = f"[Body too large: {len(content)} bytes]"
-                except Exception:
-                    response_body = "[Unable to decode body]"
+                content = response.content
+                response_body = content if len(content) <= max_body_size else len(content)
             
-            # Create log entry asynchronously to avoid blocking the response
-            self._create_log_entry(
-                tenant=tenant,
-                user=user,
+            record_api_request(
+                tenant_id=getattr(tenant, 'pk', None),
+                user_id=user.pk if user else None,
                 endpoint=request.path,
                 method=request.method,
-                ip_address=ip_address,
+                ip_address=get_client_ip(request) or None,
                 user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
                 request_body=request_body,
                 status_code=response.status_code,
@@ -188,14 +171,3 @@ class APIAuditMiddleware(MiddlewareMixin):
             logger.error(f"Failed to log API request: {str(e)}")
         
         return response
-    
-    def _create_log_entry(self, **kwargs):
-        """
-        Create the log entry in the database.
-        In production, this should be done asynchronously (e.g., via Celery).
-        """
-        try:
-            from accounts.models import APIRequestLog
-            APIRequestLog.objects.create(**kwargs)
-        except Exception as e:
-            logger.error(f"Failed to create API log entry: {str(e)}")
@@ -0,0 +1,67 @@
+import io
+import json
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body too large.'
+    default_code = 'request_too_large'
+
+
+class BatchJSONParser(JSONParser):
+    """
+    JSONParser for the offline batch endpoint. Reads at most
+    OFFLINE_SYNC_BATCH_MAX_BYTES, so a body without a Content-Length
+    (chunked) is refused as soon as it runs over.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        max_bytes = settings.OFFLINE_SYNC_BATCH_MAX_BYTES
+        body = stream.read(max_bytes + 1)
+        if len(body) > max_bytes:
+            raise RequestTooLarge(f'Batch body exceeds {max_bytes} bytes')
+        return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline-delimited JSON: one object per line, blank lines ignored.
+    Parsed into a list so views can treat it like a JSON array body.
+
+    Bytes and items are counted while reading; going over
+    OFFLINE_SYNC_BATCH_MAX_BYTES or OFFLINE_SYNC_BATCH_MAX_ITEMS stops the
+    parse with a 413, declared Content-Length or not.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_bytes = settings.OFFLINE_SYNC_BATCH_MAX_BYTES
+        max_items = settings.OFFLINE_SYNC_BATCH_MAX_ITEMS
+        items = []
+        read = 0
+        line_number = 0
+        while True:
+            # Never asks for more than one byte past the limit, even for one long line
+            line = stream.readline(max_bytes - read + 1)
+            if not line:
+                break
+            read += len(line)
+            if read > max_bytes:
+                raise RequestTooLarge(f'Batch body exceeds {max_bytes} bytes')
+            line_number += 1
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            if len(items) >= max_items:
+                raise RequestTooLarge(f'Batch exceeds {max_items} transactions')
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {line_number}: {exc}')
+        return items
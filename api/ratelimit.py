@@ -0,0 +1,305 @@
+"""
+API rate limiting.
+
+Every request is checked against a list of rules (per IP, per API key, per
+tenant, per plan quota) in a single atomic Redis Lua call: the script evaluates
+all rules first and only consumes from them when every rule allows the request,
+so a rejected request never eats into another rule's budget.
+
+Two modes:
+
+- 'sliding': sliding window counter. Keeps the current and previous fixed
+  window counts and weights the previous one by how much of it still overlaps
+  the window. O(1) memory per key however large the limit (daily quotas).
+- 'bucket': token bucket holding `limit` tokens, refilled at limit/window per
+  second. Allows short bursts up to `limit` with a smooth sustained rate.
+
+When Redis is unavailable the same algorithms run in-process (per worker), so
+limits degrade to approximate instead of disappearing.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SLIDING = 'sliding'
+BUCKET = 'bucket'
+
+Rule = namedtuple('Rule', ['key', 'limit', 'window', 'mode'])
+Rule.__new__.__defaults__ = (SLIDING,)
+
+
+class RateLimitResult:
+    """Outcome of one check, reported for the most restrictive rule."""
+
+    def __init__(self, allowed, limit, remaining, reset, retry_after=0, rule=None):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(0, remaining)
+        self.reset = max(0, reset)
+        self.retry_after = max(0, retry_after)
+        self.rule = rule
+
+    def headers(self):
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset),
+        }
+        if self.rule is not None:
+            headers['RateLimit-Policy'] = f"{self.rule.limit};w={self.rule.window}"
+        if not self.allowed:
+            headers['Retry-After'] = str(max(1, self.retry_after))
+        return headers
+
+
+def apply_headers(response, result):
+    for name, value in result.headers().items():
+        response[name] = value
+    return response
+
+
+def _summarize(rules, states):
+    """
+    Pick the rule to report: the denying rule with the longest wait, otherwise
+    the one with the least headroom. `states` holds (allowed, remaining, reset_ms, retry_ms).
+    """
+    denied = [(s[3], i) for i, s in enumerate(states) if not s[0]]
+    if denied:
+        index = max(denied)[1]
+    else:
+        index = min(range(len(states)), key=lambda i: (states[i][1], -states[i][2]))
+    allowed, remaining, reset_ms, retry_ms = states[index]
+    return RateLimitResult(
+        allowed=not denied,
+        limit=rules[index].limit,
+        remaining=int(remaining),
+        reset=math.ceil(reset_ms / 1000),
+        retry_after=math.ceil(retry_ms / 1000),
+        rule=rules[index],
+    )
+
+
+class RedisRateLimitBackend:
+    """All rules checked and consumed in one EVALSHA round trip."""
+
+    # KEYS = one per rule
+    # ARGV[1] = cost, then per rule: mode, limit, window (ms)
+    # Returns per rule: allowed, remaining, reset_ms, retry_ms
+    CHECK_SCRIPT = """
+    if redis.replicate_commands then redis.replicate_commands() end
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+    local cost = tonumber(ARGV[1])
+    local states, writes, out = {}, {}, {}
+    local all_allowed = true
+
+    for i = 1, #KEYS do
+        local mode = ARGV[i * 3 - 1]
+        local limit = tonumber(ARGV[i * 3])
+        local window = tonumber(ARGV[i * 3 + 1])
+        local allowed, remaining, reset, retry
+
+        if mode == 'bucket' then
+            local rate = limit / window
+            local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+            local tokens = tonumber(state[1]) or limit
+            local ts = tonumber(state[2]) or now
+            tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+            allowed = tokens >= cost
+            local left = allowed and (tokens - cost) or tokens
+            remaining = math.floor(left)
+            reset = math.ceil((limit - left) / rate)
+            retry = allowed and 0 or math.ceil((cost - tokens) / rate)
+            writes[i] = {'HSET', KEYS[i], 'tokens', tostring(tokens - cost), 'ts', now}
+        else
+            local current = math.floor(now / window)
+            local state = redis.call('HMGET', KEYS[i], 'win', 'cur', 'prev')
+            local win = tonumber(state[1])
+            local cur = tonumber(state[2]) or 0
+            local prev = tonumber(state[3]) or 0
+            if win ~= current then
+                if win == current - 1 then prev = cur else prev = 0 end
+                cur = 0
+            end
+            local elapsed = now - current * window
+            local used = prev * (window - elapsed) / window + cur
+            allowed = used + cost <= limit
+            remaining = math.floor(limit - used - (allowed and cost or 0))
+            reset = window - elapsed
+            if allowed then
+                retry = 0
+            elseif cur + cost > limit or prev == 0 then
+                retry = window - elapsed
+            else
+                retry = math.ceil((used + cost - limit) * window / prev)
+            end
+            writes[i] = {'HSET', KEYS[i], 'win', current, 'cur', cur + cost, 'prev', prev}
+        end
+
+        if not allowed then all_allowed = false end
+        out[#out + 1] = allowed and 1 or 0
+        out[#out + 1] = remaining
+        out[#out + 1] = reset
+        out[#out + 1] = retry
+    end
+
+    if all_allowed then
+        for i = 1, #KEYS do
+            redis.call(unpack(writes[i]))
+            redis.call('PEXPIRE', KEYS[i], tonumber(ARGV[i * 3 + 1]) * 2)
+        end
+    end
+    return out
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._script = None
+
+    def _get_script(self):
+        if self._script is None:
+            from django_redis import get_redis_connection
+            self._script = get_redis_connection(self.alias).register_script(self.CHECK_SCRIPT)
+        return self._script
+
+    def check(self, rules, cost=1):
+        args = [cost]
+        for rule in rules:
+            args.extend([rule.mode, rule.limit, rule.window * 1000])
+        values = self._get_script()(keys=[f"ratelimit:{rule.key}" for rule in rules], args=args)
+        return [
+            (bool(values[i]), values[i + 1], values[i + 2], values[i + 3])
+            for i in range(0, len(values), 4)
+        ]
+
+
+class LocalRateLimitBackend:
+    """
+    The same algorithms in process memory, used when Redis is down or not
+    configured. Limits apply per worker process. Least recently used keys are
+    dropped past `max_keys`.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, rules, cost=1):
+        now = int(time.time() * 1000)
+        with self._lock:
+            results, writes = [], []
+            for rule in rules:
+                window = rule.window * 1000
+                state = self._states.get(rule.key)
+                if rule.mode == BUCKET:
+                    result, write = self._bucket(state, rule.limit, window, now, cost)
+                else:
+                    result, write = self._sliding(state, rule.limit, window, now, cost)
+                results.append(result)
+                writes.append((rule.key, write))
+
+            if all(result[0] for result in results):
+                for key, write in writes:
+                    self._states[key] = write
+                    self._states.move_to_end(key)
+                while len(self._states) > self.max_keys:
+                    self._states.popitem(last=False)
+            return results
+
+    def _bucket(self, state, limit, window, now, cost):
+        rate = limit / window
+        tokens, ts = state or (limit, now)
+        tokens = min(limit, tokens + max(0, now - ts) * rate)
+        allowed = tokens >= cost
+        left = tokens - cost if allowed else tokens
+        retry = 0 if allowed else math.ceil((cost - tokens) / rate)
+        return (allowed, math.floor(left), math.ceil((limit - left) / rate), retry), (tokens - cost, now)
+
+    def _sliding(self, state, limit, window, now, cost):
+        current = now // window
+        win, cur, prev = state or (None, 0, 0)
+        if win != current:
+            prev = cur if win == current - 1 else 0
+            cur = 0
+        elapsed = now - current * window
+        used = prev * (window - elapsed) / window + cur
+        allowed = used + cost <= limit
+        remaining = math.floor(limit - used - (cost if allowed else 0))
+        if allowed:
+            retry = 0
+        elif cur + cost > limit or prev == 0:
+            retry = window - elapsed
+        else:
+            retry = math.ceil((used + cost - limit) * window / prev)
+        return (allowed, remaining, window - elapsed, retry), (current, cur + cost, prev)
+
+
+class RateLimiter:
+    """
+    Checks rules against Redis, switching to the local backend for
+    API_RATELIMIT_FAILOVER_SECONDS after a Redis error instead of retrying the
+    connection on every request.
+    """
+
+    def __init__(self, backend=None):
+        self.local = LocalRateLimitBackend()
+        if backend is None:
+            backend = getattr(settings, 'API_RATELIMIT_BACKEND', 'redis')
+        self.remote = RedisRateLimitBackend() if backend == 'redis' else None
+        self._remote_down_until = 0
+
+    def check(self, rules, cost=1):
+        """Return a RateLimitResult for `rules`, or None when there are none."""
+        rules = [rule for rule in rules if rule.limit > 0]
+        if not rules:
+            return None
+
+        if self.remote is not None and time.monotonic() >= self._remote_down_until:
+            try:
+                return _summarize(rules, self.remote.check(rules, cost))
+            except Exception as e:
+                self._remote_down_until = time.monotonic() + getattr(settings, 'API_RATELIMIT_FAILOVER_SECONDS', 30)
+                logger.warning(f"Rate limiter falling back to local limits: {str(e)}")
+        return _summarize(rules, self.local.check(rules, cost))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
+
+
+def ip_rules(ip):
+    return [Rule(f"ip:{ip}", getattr(settings, 'API_RATELIMIT_IP_LIMIT', 100), getattr(settings, 'API_RATELIMIT_IP_WINDOW', 60))]
+
+
+def api_key_rules(key_obj, tenant, plan):
+    """
+    Limits for an authenticated API key:
+    - per key: a token bucket of API_RATELIMIT_KEY_LIMIT per API_RATELIMIT_KEY_WINDOW
+    - per tenant: the plan's per-minute burst limit, shared by all the tenant's keys
+    - per plan: the plan's daily quota over a sliding 24 hours
+    """
+    return [
+        Rule(
+            f"key:{key_obj.pk}",
+            getattr(settings, 'API_RATELIMIT_KEY_LIMIT', 120),
+            getattr(settings, 'API_RATELIMIT_KEY_WINDOW', 60),
+            BUCKET,
+        ),
+        Rule(f"tenant:{tenant.pk}:minute", plan.api_burst_limit, 60, SLIDING),
+        Rule(f"tenant:{tenant.pk}:daily", plan.api_daily_limit, 86400, SLIDING),
+    ]
@@ -35,5 +35,5 @@ class WebhookEndpointSerializer(serializers.ModelSerializer):
 class WebhookEventSerializer(serializers.ModelSerializer):
     class Meta:
         model = WebhookEvent
-        fields = ['id', 'event_type', 'payload', 'status_code', 'response_body', 'error_message', 'timestamp']
+        fields = ['id', 'event_type', 'payload', 'status', 'attempts', 'next_attempt_at', 'delivered_at', 'status_code', 'response_body', 'error_message', 'timestamp']
         read_only_fields = ['id', 'timestamp']
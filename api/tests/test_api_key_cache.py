@@ -0,0 +1,89 @@
+"""
+Tests for cached API key authentication and the last_used_at write-behind.
+"""
+import hashlib
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from accounts.models import APIKey, UserProfile
+from billing.models import Plan, Subscription
+from api import key_cache
+from api.auth import APIKeyAuthentication
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api-key-tests'}}
+RAW_KEY = 'pb_testkey_0123456789abcdef'
+
+
+@override_settings(CACHES=LOCMEM_CACHE, API_RATELIMIT_BACKEND='local', API_RATELIMIT_KEY_LIMIT=0)
+class APIKeyCacheTests(TenantTestCase):
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.subdomain = 'apikeytest'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        key_cache._local.clear()
+        self.plan = Plan.objects.create(name="API", api_access=True, api_daily_limit=0, api_burst_limit=0)
+        self.subscription = Subscription.objects.create(tenant=self.tenant, plan=self.plan, status='active')
+        self.user = User.objects.create_user(username="owner")
+        UserProfile.objects.create(user=self.user, tenant=self.tenant, role='admin')
+        self.key = APIKey.objects.create(
+            tenant=self.tenant, name="Integration", key_prefix=RAW_KEY[:8],
+            key_hash=hashlib.sha256(RAW_KEY.encode()).hexdigest(),
+        )
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/api/v1/products/', HTTP_X_API_KEY=RAW_KEY, HTTP_HOST='apikeytest.localhost')
+        return APIKeyAuthentication().authenticate(Request(request))
+
+    def test_warm_key_needs_no_queries(self):
+        user, _ = self.authenticate()
+        self.assertEqual(user, self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            user, _ = self.authenticate()
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual(user.profile.role, 'admin')
+
+    def test_deactivated_key_is_rejected_after_commit(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.key.is_active = False
+            self.key.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    def test_canceled_subscription_is_rejected_after_commit(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscription.status = 'canceled'
+            self.subscription.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    def test_last_used_at_is_coalesced(self):
+        tracker = key_cache.LastUsedTracker(interval=3600)
+        earlier = timezone.now() - timezone.timedelta(minutes=5)
+        later = timezone.now()
+        tracker._pending = {self.key.pk: earlier}
+        tracker._pending[self.key.pk] = later
+
+        with CaptureQueriesContext(connection) as queries:
+            tracker.flush()
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.key.refresh_from_db()
+        self.assertEqual(self.key.last_used_at, later)
+
+        # An older timestamp never moves last_used_at backwards
+        tracker._pending = {self.key.pk: earlier}
+        tracker.flush()
+        self.key.refresh_from_db()
+        self.assertEqual(self.key.last_used_at, later)
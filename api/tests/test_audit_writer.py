@@ -0,0 +1,93 @@
+"""
+Tests for the buffered API audit log writer.
+"""
+import json
+import pytest
+from unittest import mock
+from django.test import override_settings
+from api.audit import AuditLogWriter, prepare_body, record_api_request, should_sample
+
+
+def entry(method='POST', status_code=201, **kwargs):
+    values = {
+        'tenant_id': None,
+        'user_id': None,
+        'endpoint': '/api/v1/orders/',
+        'method': method,
+        'ip_address': '10.0.0.1',
+        'user_agent': 'pytest',
+        'request_body': json.dumps({'total': 10, 'card_number': '4242'}).encode(),
+        'status_code': status_code,
+        'response_body': None,
+        'response_time_ms': 12,
+    }
+    values.update(kwargs)
+    return values
+
+
+class TestBodyPolicy:
+    @override_settings(API_AUDIT_REDACT_FIELDS=['password', 'card_number', 'pin'])
+    def test_redacts_nested_json(self):
+        body = json.dumps({
+            'new_password': 'x',
+            'payment': {'card_number': '4242', 'amount': 5},
+            'shipping': 'keep',
+            'items': [{'pin': '1234'}],
+        }).encode()
+        assert prepare_body(body) == {
+            'new_password': '[REDACTED]',
+            'payment': {'card_number': '[REDACTED]', 'amount': 5},
+            'shipping': 'keep',
+            'items': [{'pin': '[REDACTED]'}],
+        }
+
+    def test_non_json_and_oversized_bodies(self):
+        assert prepare_body(b'plain text') == 'plain text'
+        assert prepare_body(b'\xff\xfe') == '[Unable to decode body]'
+        assert prepare_body(20000) == '[Body too large: 20000 bytes]'
+        assert prepare_body(None) == {}
+
+    @override_settings(API_AUDIT_SAMPLE_RATE=0.0)
+    def test_sampling_keeps_writes_and_errors(self):
+        assert not should_sample('GET', 200)
+        assert should_sample('GET', 500)
+        assert should_sample('POST', 201)
+
+
+class TestAuditLogWriter:
+    def test_ring_buffer_drops_oldest(self):
+        writer = AuditLogWriter(capacity=3, batch_size=10)
+        with mock.patch.object(writer, '_ensure_thread'):
+            for i in range(5):
+                writer.enqueue(entry(response_time_ms=i))
+        stats = writer.stats()
+        assert stats['depth'] == 3
+        assert stats['dropped'] == 2
+        assert [e['response_time_ms'] for e in writer._buffer] == [2, 3, 4]
+
+    @pytest.mark.django_db
+    def test_flush_bulk_creates_in_batches(self):
+        from accounts.models import APIRequestLog
+
+        writer = AuditLogWriter(capacity=100, batch_size=2)
+        with mock.patch.object(writer, '_ensure_thread'):
+            for _ in range(5):
+                writer.enqueue(entry())
+        writer.flush()
+
+        stats = writer.stats()
+        assert stats['written'] == 5
+        assert stats['flushes'] == 3
+        assert stats['depth'] == 0
+        log = APIRequestLog.objects.first()
+        assert log.request_body['card_number'] == '[REDACTED]'
+
+    @pytest.mark.django_db
+    @override_settings(API_AUDIT_ASYNC=False, API_AUDIT_SAMPLE_RATE=0.0)
+    def test_sampled_out_reads_are_not_written(self):
+        from accounts.models import APIRequestLog
+
+        APIRequestLog.objects.all().delete()
+        record_api_request(**entry(method='GET', status_code=200))
+        record_api_request(**entry(method='GET', status_code=404))
+        assert APIRequestLog.objects.count() == 1
@@ -0,0 +1,126 @@
+"""
+Tests for the offline batch sync endpoint.
+"""
+import io
+import json
+import uuid
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django_tenants.test.cases import TenantTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+from accounts.models import Branch, UserProfile
+from main.models import Product, Order
+from api.parsers import NDJSONParser
+from api.views import OfflineSyncViewSet
+
+
+class OfflineBatchSyncTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.user = User.objects.create_user(username="till", password="password")
+        self.profile = UserProfile.objects.create(user=self.user, tenant=self.tenant, branch=self.branch, role='admin')
+        self.product = Product.objects.create(
+            tenant=self.tenant, branch=self.branch, name="Water", sku="W-1", price=2.00, stock_quantity=100
+        )
+        self.view = OfflineSyncViewSet.as_view({'post': 'sync_batch'})
+        self.factory = APIRequestFactory()
+
+    def order(self, quantity=1, order_uuid=None):
+        return {
+            'uuid': order_uuid or str(uuid.uuid4()),
+            'type': 'order',
+            'data': {
+                'branch_id': str(self.branch.id),
+                'total_amount': 2.00 * quantity,
+                'items': [{'id': str(self.product.id), 'quantity': quantity, 'price': 2.00}],
+            },
+        }
+
+    def post(self, body, content_type='application/json'):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        request = self.factory.post('/api/v1/offline/batch/', body, content_type=content_type)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def test_batch_applies_each_transaction_and_reports_per_item(self):
+        existing = self.order()
+        self.post([existing])
+
+        bad = self.order()
+        bad['data']['items'][0]['id'] = str(uuid.uuid4())
+        fresh = self.order(quantity=3)
+        response = self.post([existing, bad, fresh, fresh])
+
+        results = response.data['data']['results']
+        self.assertEqual([r['status'] for r in results], ['exists', 'error', 'success', 'exists'])
+        self.assertEqual(Order.objects.count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 96)
+
+    def test_ndjson_body(self):
+        body = "\n".join(json.dumps(self.order()) for _ in range(3)) + "\n"
+        response = self.post(body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['data']['summary'], {'success': 3})
+
+    @override_settings(OFFLINE_SYNC_BATCH_MAX_ITEMS=2)
+    def test_batch_size_is_bounded(self):
+        response = self.post([self.order() for _ in range(3)])
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Order.objects.exists())
+
+    def test_batch_requires_authentication(self):
+        request = self.factory.post('/api/v1/offline/batch/', json.dumps([self.order()]), content_type='application/json')
+        request.tenant = self.tenant
+        self.assertIn(self.view(request).status_code, (401, 403))
+        self.assertFalse(Order.objects.exists())
+
+
+def test_ndjson_parser_reports_bad_line():
+    from rest_framework.exceptions import ParseError
+    stream = io.BytesIO(b'{"uuid": "a"}\n\nnot json\n')
+    try:
+        NDJSONParser().parse(stream)
+    except ParseError as exc:
+        assert 'line 3' in str(exc.detail)
+    else:
+        raise AssertionError('ParseError not raised')
+
+
+def test_ndjson_parser_stops_at_the_limits():
+    from api.parsers import RequestTooLarge
+    with override_settings(OFFLINE_SYNC_BATCH_MAX_ITEMS=2, OFFLINE_SYNC_BATCH_MAX_BYTES=64):
+        # Stops at the third item, before reading the malformed rest
+        stream = io.BytesIO(b'{"a": 1}\n{"a": 2}\n{"a": 3}\nnot json\n')
+        try:
+            NDJSONParser().parse(stream)
+        except RequestTooLarge as exc:
+            assert '2 transactions' in str(exc.detail)
+        else:
+            raise AssertionError('RequestTooLarge not raised')
+
+        # One line longer than the whole budget is not read to its end
+        stream = io.BytesIO(b'{"pad": "' + b'x' * 10000 + b'"}\n')
+        try:
+            NDJSONParser().parse(stream)
+        except RequestTooLarge as exc:
+            assert '64 bytes' in str(exc.detail)
+        else:
+            raise AssertionError('RequestTooLarge not raised')
+        assert stream.tell() <= 65
+
+
+def test_json_batch_parser_stops_at_the_byte_limit():
+    from api.parsers import BatchJSONParser, RequestTooLarge
+    with override_settings(OFFLINE_SYNC_BATCH_MAX_BYTES=64):
+        assert BatchJSONParser().parse(io.BytesIO(b'[{"a": 1}]')) == [{'a': 1}]
+        stream = io.BytesIO(b'[{"pad": "' + b'x' * 10000 + b'"}]')
+        try:
+            BatchJSONParser().parse(stream)
+        except RequestTooLarge:
+            pass
+        else:
+            raise AssertionError('RequestTooLarge not raised')
+        assert stream.tell() <= 65
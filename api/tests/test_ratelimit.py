@@ -0,0 +1,116 @@
+"""
+Tests for the API rate limiter (local backend, failover and headers).
+"""
+import pytest
+from unittest import mock
+from django.http import HttpResponse
+from api.ratelimit import (
+    BUCKET, LocalRateLimitBackend, RateLimiter, Rule, _summarize, apply_headers,
+)
+
+
+class FakeClock:
+    def __init__(self, start=1_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with mock.patch('api.ratelimit.time.time', fake):
+        yield fake
+
+
+def check(backend, rules, cost=1):
+    return _summarize(rules, backend.check(rules, cost))
+
+
+class TestSlidingWindow:
+    def test_blocks_over_limit(self, clock):
+        backend = LocalRateLimitBackend()
+        rules = [Rule('ip:1', 3, 60)]
+        results = [check(backend, rules) for _ in range(4)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[2].remaining == 0
+        assert results[3].retry_after > 0
+
+    def test_previous_window_decays(self, clock):
+        backend = LocalRateLimitBackend()
+        rules = [Rule('ip:1', 10, 60)]
+        for _ in range(10):
+            assert check(backend, rules).allowed
+        assert not check(backend, rules).allowed
+
+        # Half of the previous window still overlaps: 5 of its 10 requests count
+        clock.now += 60 - (clock.now % 60) + 30
+        results = [check(backend, rules) for _ in range(6)]
+        assert [r.allowed for r in results] == [True] * 5 + [False]
+
+    def test_forgets_after_two_windows(self, clock):
+        backend = LocalRateLimitBackend()
+        rules = [Rule('ip:1', 1, 60)]
+        assert check(backend, rules).allowed
+        clock.now += 120
+        assert check(backend, rules).allowed
+
+
+class TestTokenBucket:
+    def test_burst_then_refill(self, clock):
+        backend = LocalRateLimitBackend()
+        rules = [Rule('key:1', 5, 60, BUCKET)]
+        assert all(check(backend, rules).allowed for _ in range(5))
+        denied = check(backend, rules)
+        assert not denied.allowed
+        assert denied.retry_after == 12
+
+        clock.now += 12
+        assert check(backend, rules).allowed
+        assert not check(backend, rules).allowed
+
+
+class TestRuleCombination:
+    def test_denied_request_consumes_nothing(self, clock):
+        backend = LocalRateLimitBackend()
+        tight = Rule('tenant:1:minute', 1, 60)
+        loose = Rule('key:1', 10, 60, BUCKET)
+        assert check(backend, [tight, loose]).allowed
+        result = check(backend, [tight, loose])
+        assert not result.allowed
+        assert result.rule == tight
+        # The key's bucket was only charged for the allowed request
+        assert check(backend, [loose]).remaining == 8
+
+    def test_reports_tightest_rule(self, clock):
+        backend = LocalRateLimitBackend()
+        result = check(backend, [Rule('a', 100, 60), Rule('b', 5, 60)])
+        assert result.limit == 5
+        assert result.remaining == 4
+
+
+class TestRateLimiter:
+    def test_unlimited_rules_are_skipped(self):
+        assert RateLimiter(backend='local').check([Rule('tenant:1:daily', 0, 86400)]) is None
+
+    def test_falls_back_to_local_when_redis_fails(self, clock):
+        limiter = RateLimiter(backend='redis')
+        limiter.remote = mock.Mock()
+        limiter.remote.check.side_effect = ConnectionError('down')
+        rules = [Rule('ip:1', 1, 60)]
+
+        assert limiter.check(rules).allowed
+        assert not limiter.check(rules).allowed
+        # Redis is not retried during the failover period
+        assert limiter.remote.check.call_count == 1
+
+    def test_headers(self, clock):
+        backend = LocalRateLimitBackend()
+        rules = [Rule('ip:1', 1, 60)]
+        check(backend, rules)
+        response = apply_headers(HttpResponse(status=429), check(backend, rules))
+        assert response['RateLimit-Limit'] == '1'
+        assert response['RateLimit-Remaining'] == '0'
+        assert response['RateLimit-Policy'] == '1;w=60'
+        assert int(response['Retry-After']) >= 1
@@ -6,6 +6,44 @@ from django.db.models import Q
 from accounts.models import WebhookEndpoint, WebhookEvent
 from .serializers import UserProfileSerializer, WebhookEndpointSerializer, WebhookEventSerializer
 from .base_views import StandardizedAPIView, StandardizedViewSet, StandardizedReadOnlyViewSet
+from .parsers import BatchJSONParser, NDJSONParser
+
+def catalog_response(request, service, variant='raw', wrap=None):
+    """
+    Catalog endpoint body shared by the POS and kiosk sync views.
+
+    `?since=<cursor>` returns only the changes after that cursor (upserts and
+    tombstones). Without it the full snapshot is served from cache, gzipped when
+    the client accepts it, with an ETag so an unchanged catalog costs a 304.
+    """
+    import gzip
+    from django.http import HttpResponse
+    from django.utils.cache import patch_vary_headers
+
+    since = request.query_params.get('since')
+    if since not in (None, ''):
+        try:
+            cursor = int(since)
+        except ValueError:
+            return Response({'error': 'since must be an integer cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(service.changes_since(cursor))
+
+    version = service.current_version()
+    etag = service.etag(version)
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+    _, body = service.snapshot(version, variant=variant, wrap=wrap)
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(body, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(body), content_type='application/json')
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
 
 class LogoutAPIView(StandardizedAPIView):
 
@@ -112,142 +150,266 @@ class OfflineSyncViewSet(StandardizedViewSet, viewsets.ViewSet):
                 else:
                     return Response({'error': 'Tenant context missing'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Idempotency Check
-            if transaction_type == 'order':
-                from branches.services.pos import POSService
-                
-                cashier_id = transaction_data.get('cashier_id')
-                cashier = None
-                if cashier_id:
-                    cashier = UserProfile.objects.filter(user__id=cashier_id).first()
-                if not cashier and hasattr(request.user, 'profile'):
-                     cashier = request.user.profile
-                
-                pos_service = POSService(tenant=request.tenant, user_profile=cashier)
-                result = pos_service.sync_order(uuid, transaction_data)
-                
-                if result['status'] == 'already_synced':
-                    return Response({'status': 'exists', 'message': result['message']}, status=status.HTTP_200_OK)
-                elif result['status'] == 'success':
-                    return Response({
-                        'status': 'success', 
-                        'id': str(result['order_id']),
-                        'order_number': result.get('order_number')
-                    }, status=status.HTTP_201_CREATED)
-                else:
-                    return Response({'error': result['message']}, status=status.HTTP_400_BAD_REQUEST)
+            return self._process_transaction(request, uuid, transaction_type, transaction_data)
 
-            elif transaction_type == 'complete_order':
-                from branches.services.pos import POSService
-                order_id = transaction_data.get('order_id')
-                cashier_id = transaction_data.get('cashier_id')
-                
-                if not order_id:
-                    return Response({'error': 'order_id required'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                cashier = None
-                if cashier_id:
-                    cashier = UserProfile.objects.filter(user__id=cashier_id).first()
-                
-                pos_service = POSService(tenant=request.tenant, user_profile=cashier)
-                result = pos_service.complete_pending_order(order_id)
-                
-                if result['status'] == 'success':
-                    return Response({'status': 'success', 'message': result['message']})
-                else:
-                    return Response({'error': result['message']}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            elif transaction_type == 'shift_close':
-                 # Logic for shift close
-                 pass
+    @action(detail=False, methods=['post'], url_path='batch', parser_classes=[BatchJSONParser, NDJSONParser])
+    def sync_batch(self, request):
+        """
+        Replay a backlog of queued offline transactions in one request.
 
-            elif transaction_type == 'create_po':
-                from branches.services.purchase_orders import PurchaseOrderService
-                from accounts.models import Branch
-                
-                branch_id = transaction_data.get('branch_id')
-                supplier_id = transaction_data.get('supplier')
-                expected_date = transaction_data.get('expected_date')
-                items = transaction_data.get('items')
-                
-                if not all([branch_id, supplier_id, items]):
-                    return Response({'error': 'branch_id, supplier, and items are required'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                branch = get_object_or_404(Branch, pk=branch_id, tenant=request.tenant)
-                
-                user_profile = getattr(request.user, 'profile', None) if request.user.is_authenticated else None
-                po_service = PurchaseOrderService(tenant=request.tenant, user_profile=user_profile)
-                result = po_service.create_po(
-                    branch=branch,
-                    supplier_id=supplier_id,
-                    expected_date=expected_date,
-                    items_data=items,
-                    notes=transaction_data.get('notes'),
-                    uuid=uuid
-                )
-                
-                if result['status'] == 'already_synced':
-                    return Response({'status': 'exists', 'message': result['message']}, status=status.HTTP_200_OK)
-                elif result['status'] == 'success':
-                    return Response({'status': 'success', 'id': result['po_id'], 'reference': result['reference_id']}, status=status.HTTP_201_CREATED)
+        Body is a JSON array (or {"transactions": [...]}) or an NDJSON stream of
+        {"uuid", "type", "data"} objects. Each transaction runs in its own
+        transaction/savepoint, so one failure does not discard the rest; the
+        response holds one result per submitted item, in submission order.
+
+        Ordering: items are applied in the order submitted, and only one batch per
+        branch is processed at a time, so a till retrying a batch cannot interleave
+        with (or double-apply) the batch still in flight.
+        """
+        from contextlib import ExitStack
+        from django.conf import settings
+        from django.core.cache import cache
+        from django.db import transaction
+        from main.models import Order
+
+        # The parsers enforce both limits while reading (bodies without a
+        # Content-Length included); a declared length is refused up front
+        max_bytes = settings.OFFLINE_SYNC_BATCH_MAX_BYTES
+        max_items = settings.OFFLINE_SYNC_BATCH_MAX_ITEMS
+
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_bytes:
+            return Response({'error': f'Batch body exceeds {max_bytes} bytes'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('transactions')
+        if not isinstance(items, list):
+            return Response({'error': 'Expected an array of transactions'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > max_items:
+            return Response({'error': f'Batch exceeds {max_items} transactions'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # Ensure tenant is set (Session Auth Fallback)
+        if not hasattr(request, 'tenant'):
+            if hasattr(request.user, 'profile'):
+                request.tenant = request.user.profile.tenant
+            else:
+                return Response({'error': 'Tenant context missing'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Dedupe orders against the database in one query
+        order_uuids = [
+            str(item.get('uuid')) for item in items
+            if isinstance(item, dict) and item.get('type') == 'order' and item.get('uuid')
+        ]
+        synced = set(Order.objects.filter(offline_uuid__in=order_uuids).values_list('offline_uuid', flat=True)) if order_uuids else set()
+
+        branch_ids = sorted({
+            str(item['data'].get('branch_id') or item['data'].get('source_branch_id'))
+            for item in items
+            if isinstance(item, dict) and isinstance(item.get('data'), dict)
+            and (item['data'].get('branch_id') or item['data'].get('source_branch_id'))
+        })
+
+        results = []
+        seen = set()
+        with ExitStack() as stack:
+            # Locks are taken in sorted order so overlapping batches cannot deadlock
+            if hasattr(cache, 'lock'):
+                for branch_id in branch_ids:
+                    lock = cache.lock(f"offline_sync:{request.tenant.id}:{branch_id}", timeout=300, blocking_timeout=30)
+                    try:
+                        acquired = lock.acquire()
+                    except Exception:
+                        # Redis unavailable: offline_uuid uniqueness still prevents double-applying orders
+                        continue
+                    if not acquired:
+                        return Response({'error': 'Another batch for this branch is still processing, retry later'}, status=status.HTTP_409_CONFLICT)
+                    stack.callback(lock.release)
+
+            for item in items:
+                if not isinstance(item, dict):
+                    results.append({'uuid': None, 'status': 'error', 'code': 400, 'error': 'Transaction must be an object'})
+                    continue
+
+                uuid = item.get('uuid')
+                transaction_type = item.get('type')
+                transaction_data = item.get('data')
+                result = {'uuid': uuid, 'type': transaction_type}
+
+                if not all([uuid, transaction_type, transaction_data]):
+                    result.update({'status': 'error', 'code': 400, 'error': 'Missing required fields'})
+                elif str(uuid) in seen or (transaction_type == 'order' and str(uuid) in synced):
+                    result.update({'status': 'exists', 'code': 200, 'message': 'Transaction already processed'})
                 else:
-                    return Response({'error': result['message']}, status=status.HTTP_400_BAD_REQUEST)
+                    try:
+                        with transaction.atomic():
+                            response = self._process_transaction(request, uuid, transaction_type, transaction_data)
+                            if response.status_code >= 400:
+                                # Roll back anything the failed transaction wrote
+                                transaction.set_rollback(True)
+                        result.update(response.data)
+                        result['code'] = response.status_code
+                        result.setdefault('status', 'error' if response.status_code >= 400 else 'success')
+                    except Exception as e:
+                        result.update({'status': 'error', 'code': 500, 'error': str(e)})
 
-            elif transaction_type == 'create_transfer':
-                from branches.services.transfers import TransferService
-                from accounts.models import Branch
-                
-                source_branch_id = transaction_data.get('source_branch_id')
-                dest_branch_id = transaction_data.get('destination_branch')
-                items = transaction_data.get('items')
-                reference_id = transaction_data.get('reference_id')
-                
-                if not all([source_branch_id, dest_branch_id, items]):
-                    return Response({'error': 'source_branch_id, destination_branch, and items are required'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                source_branch = get_object_or_404(Branch, pk=source_branch_id, tenant=request.tenant)
-                dest_branch = get_object_or_404(Branch, pk=dest_branch_id, tenant=request.tenant)
-                
-                user_profile = getattr(request.user, 'profile', None) if request.user.is_authenticated else None
-                transfer_service = TransferService(tenant=request.tenant, user_profile=user_profile)
-                
-                # Enhanced idempotency check - check both UUID and reference_id
-                from branches.models import StockTransfer
-                existing = StockTransfer.objects.filter(
-                    tenant=request.tenant
-                ).filter(
-                    Q(id=uuid) | Q(reference_id=reference_id)
-                ).first()
-                
-                if existing:
-                    return Response({
-                        'status': 'exists', 
-                        'message': 'Transfer already exists',
-                        'id': str(existing.id),
-                        'reference': existing.reference_id
-                    }, status=status.HTTP_200_OK)
-                
-                try:
-                    from django.db import transaction
-                    with transaction.atomic():
-                        transfer = transfer_service.request_transfer(
-                            source_branch=source_branch,
-                            destination_branch=dest_branch,
-                            items_data=items,
-                            notes=transaction_data.get('notes')
-                        )
-                        # Override ID to match offline UUID
-                        transfer.id = uuid
-                        transfer.save()
-                    
-                    return Response({'status': 'success', 'id': str(transfer.id), 'reference': transfer.reference_id}, status=status.HTTP_201_CREATED)
-                except Exception as e:
-                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-            return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
+                if result['status'] != 'error':
+                    seen.add(str(uuid))
+                results.append(result)
 
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+
+        return Response({'results': results, 'summary': summary}, status=status.HTTP_200_OK)
+
+    def _process_transaction(self, request, uuid, transaction_type, transaction_data):
+        """
+        Apply one queued offline transaction and return its Response.
+        Shared by the single and batch sync endpoints.
+        """
+        from django.shortcuts import get_object_or_404
+        from accounts.models import UserProfile
+
+        # Idempotency Check
+        if transaction_type == 'order':
+            from branches.services.pos import POSService
+
+            cashier_id = transaction_data.get('cashier_id')
+            cashier = None
+            if cashier_id:
+                cashier = UserProfile.objects.filter(user__id=cashier_id).first()
+            if not cashier and hasattr(request.user, 'profile'):
+                 cashier = request.user.profile
+
+            pos_service = POSService(tenant=request.tenant, user_profile=cashier)
+            result = pos_service.sync_order(uuid, transaction_data)
+
+            if result['status'] == 'already_synced':
+                return Response({'status': 'exists', 'message': result['message']}, status=status.HTTP_200_OK)
+            elif result['status'] == 'success':
+                return Response({
+                    'status': 'success', 
+                    'id': str(result['order_id']),
+                    'order_number': result.get('order_number')
+                }, status=status.HTTP_201_CREATED)
+            else:
+                return Response({'error': result['message']}, status=status.HTTP_400_BAD_REQUEST)
+
+        elif transaction_type == 'complete_order':
+            from branches.services.pos import POSService
+            order_id = transaction_data.get('order_id')
+            cashier_id = transaction_data.get('cashier_id')
+
+            if not order_id:
+                return Response({'error': 'order_id required'}, status=status.HTTP_400_BAD_REQUEST)
+
+            cashier = None
+            if cashier_id:
+                cashier = UserProfile.objects.filter(user__id=cashier_id).first()
+
+            pos_service = POSService(tenant=request.tenant, user_profile=cashier)
+            result = pos_service.complete_pending_order(order_id)
+
+            if result['status'] == 'success':
+                return Response({'status': 'success', 'message': result['message']})
+            else:
+                return Response({'error': result['message']}, status=status.HTTP_400_BAD_REQUEST)
+
+        elif transaction_type == 'shift_close':
+             # Logic for shift close
+             pass
+
+        elif transaction_type == 'create_po':
+            from branches.services.purchase_orders import PurchaseOrderService
+            from accounts.models import Branch
+
+            branch_id = transaction_data.get('branch_id')
+            supplier_id = transaction_data.get('supplier')
+            expected_date = transaction_data.get('expected_date')
+            items = transaction_data.get('items')
+
+            if not all([branch_id, supplier_id, items]):
+                return Response({'error': 'branch_id, supplier, and items are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+            branch = get_object_or_404(Branch, pk=branch_id, tenant=request.tenant)
+
+            user_profile = getattr(request.user, 'profile', None) if request.user.is_authenticated else None
+            po_service = PurchaseOrderService(tenant=request.tenant, user_profile=user_profile)
+            result = po_service.create_po(
+                branch=branch,
+                supplier_id=supplier_id,
+                expected_date=expected_date,
+                items_data=items,
+                notes=transaction_data.get('notes'),
+                uuid=uuid
+            )
+
+            if result['status'] == 'already_synced':
+                return Response({'status': 'exists', 'message': result['message']}, status=status.HTTP_200_OK)
+            elif result['status'] == 'success':
+                return Response({'status': 'success', 'id': result['po_id'], 'reference': result['reference_id']}, status=status.HTTP_201_CREATED)
+            else:
+                return Response({'error': result['message']}, status=status.HTTP_400_BAD_REQUEST)
+
+        elif transaction_type == 'create_transfer':
+            from branches.services.transfers import TransferService
+            from accounts.models import Branch
+
+            source_branch_id = transaction_data.get('source_branch_id')
+            dest_branch_id = transaction_data.get('destination_branch')
+            items = transaction_data.get('items')
+            reference_id = transaction_data.get('reference_id')
+
+            if not all([source_branch_id, dest_branch_id, items]):
+                return Response({'error': 'source_branch_id, destination_branch, and items are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+            source_branch = get_object_or_404(Branch, pk=source_branch_id, tenant=request.tenant)
+            dest_branch = get_object_or_404(Branch, pk=dest_branch_id, tenant=request.tenant)
+
+            user_profile = getattr(request.user, 'profile', None) if request.user.is_authenticated else None
+            transfer_service = TransferService(tenant=request.tenant, user_profile=user_profile)
+
+            # Enhanced idempotency check - check both UUID and reference_id
+            from branches.models import StockTransfer
+            existing = StockTransfer.objects.filter(
+                tenant=request.tenant
+            ).filter(
+                Q(id=uuid) | Q(reference_id=reference_id)
+            ).first()
+
+            if existing:
+                return Response({
+                    'status': 'exists', 
+                    'message': 'Transfer already exists',
+                    'id': str(existing.id),
+                    'reference': existing.reference_id
+                }, status=status.HTTP_200_OK)
+
+            try:
+                from django.db import transaction
+                with transaction.atomic():
+                    transfer = transfer_service.request_transfer(
+                        source_branch=source_branch,
+                        destination_branch=dest_branch,
+                        items_data=items,
+                        notes=transaction_data.get('notes')
+                    )
+                    # Override ID to match offline UUID
+                    transfer.id = uuid
+                    transfer.save()
+
+                return Response({'status': 'success', 'id': str(transfer.id), 'reference': transfer.reference_id}, status=status.HTTP_201_CREATED)
+            except Exception as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='pin-login')
     def pin_login(self, request):
@@ -299,14 +461,13 @@ class OfflineSyncViewSet(StandardizedViewSet, viewsets.ViewSet):
     @action(detail=False, methods=['get'], url_path='data/(?P<branch_id>[^/.]+)', permission_classes=[permissions.AllowAny])
     def sync_data(self, request, branch_id=None):
         """
-        Fetch data for offline caching.
+        Fetch data for offline caching: the full snapshot, or only the changes
+        after `?since=<cursor>` (see catalog_response).
         """
         from django.shortcuts import get_object_or_404
-        from accounts.models import Branch, UserProfile
-        from main.models import Product, Customer, Category, CRMSettings
-        from django.utils import timezone
-        import datetime
-        from branches.api_serializers import ProductSerializer, CategorySerializer, CustomerSerializer
+        from accounts.models import Branch
+        from main.models import Product
+        from branches.services.catalog_sync import CatalogSyncService
         
         branch = get_object_or_404(Branch, pk=branch_id)
         
@@ -314,33 +475,20 @@ class OfflineSyncViewSet(StandardizedViewSet, viewsets.ViewSet):
         from django.db import connection
         
         with schema_context(branch.tenant.schema_name):
-            # Products
-            products = Product.objects.filter(branch=branch, is_active=True)
-            products_data = ProductSerializer(products, many=True).data
-            
-            # Categories
-            categories = Category.objects.filter(branch=branch)
-            categories_data = CategorySerializer(categories, many=True).data
-            
-            # Customers
-            customers = Customer.objects.filter(tenant=branch.tenant)
-            customers_data = CustomerSerializer(customers, many=True).data
-            
-            return Response({
-                'products': products_data,
-                'categories': categories_data,
-                'customers': customers_data,
-                'timestamp': timezone.now(),
-                'server_schema': connection.get_schema(),
-                'products_count': len(products_data),
-                'debug_meta': {
+            service = CatalogSyncService(tenant=branch.tenant, branch=branch)
+
+            def wrap(payload):
+                payload['debug_meta'] = {
                     'schema': connection.get_schema(),
                     'branch_id': str(branch.id),
                     'tenant_schema': branch.tenant.schema_name,
-                    'product_count_filtered': products.count(),
+                    'product_count_filtered': payload['products_count'],
                     'product_count_total': Product.objects.count(),
                 }
-            })
+                # Cached bodies skip finalize_response, so apply the standard envelope here
+                return {'status': 'success', 'code': 200, 'data': payload, 'message': 'Operation successful'}
+
+            return catalog_response(request, service, variant='offline', wrap=wrap)
 
     @action(detail=False, methods=['get'], url_path='inventory/(?P<branch_id>[^/.]+)', permission_classes=[permissions.AllowAny])
     def inventory(self, request, branch_id=None):
@@ -372,32 +520,14 @@ class KioskViewSet(viewsets.ViewSet):
     def data(self, request, branch_id=None):
         from django.shortcuts import get_object_or_404
         from accounts.models import Branch
-        from main.models import Product, Customer, Category
-        from django.utils import timezone
-        from branches.api_serializers import ProductSerializer, CategorySerializer, CustomerSerializer
         from django_tenants.utils import schema_context
-        from django.db import connection
+        from branches.services.catalog_sync import CatalogSyncService
 
         branch = get_object_or_404(Branch, pk=branch_id)
         
         with schema_context(branch.tenant.schema_name):
-            products = Product.objects.filter(branch=branch, is_active=True)
-            products_data = ProductSerializer(products, many=True).data
-            
-            categories = Category.objects.filter(branch=branch)
-            categories_data = CategorySerializer(categories, many=True).data
-            
-            customers = Customer.objects.filter(tenant=branch.tenant)
-            customers_data = CustomerSerializer(customers, many=True).data
-            
-            return Response({
-                'products': products_data,
-                'categories': categories_data,
-                'customers': customers_data,
-                'timestamp': timezone.now(),
-                'server_schema': connection.get_schema(),
-                'products_count': len(products_data),
-            })
+            service = CatalogSyncService(tenant=branch.tenant, branch=branch)
+            return catalog_response(request, service, variant='kiosk')
 
     @action(detail=False, methods=['post'], url_path='transaction')
     def transaction(self, request):
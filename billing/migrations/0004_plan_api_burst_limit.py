@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_leadershipmember'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='api_burst_limit',
+            field=models.PositiveIntegerField(default=60, help_text="API requests per minute across all of a tenant's keys (0 = unlimited)"),
+        ),
+        migrations.AlterField(
+            model_name='plan',
+            name='api_daily_limit',
+            field=models.PositiveIntegerField(default=0, help_text='Daily API request limit (0 = unlimited)'),
+        ),
+    ]
@@ -23,7 +23,8 @@ class Plan(models.Model):
     max_branches = models.PositiveIntegerField(default=1, help_text="Maximun number of branches allowed")
     max_users = models.PositiveIntegerField(default=1, help_text="Maximum number of users allowed")
     api_access = models.BooleanField(default=False, help_text="Whether API access is allowed")
-    api_daily_limit = models.PositiveIntegerField(default=0, help_text="Daily API request limit")
+    api_daily_limit = models.PositiveIntegerField(default=0, help_text="Daily API request limit (0 = unlimited)")
+    api_burst_limit = models.PositiveIntegerField(default=60, help_text="API requests per minute across all of a tenant's keys (0 = unlimited)")
     
     # Features (Simple JSON implementation for now)
     features = models.JSONField(default=dict, blank=True, help_text="JSON object of features enabled")
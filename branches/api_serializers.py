@@ -54,6 +54,13 @@ class ProductSerializer(serializers.ModelSerializer):
             'metadata', 'created_at', 'updated_at'
         ]
 
+    def validate_sku(self, value):
+        # branch is not a serializer field, so the (branch, sku) constraint is checked here
+        branch = self.instance.branch if self.instance else self.context.get('branch')
+        if branch and Product.objects.filter(branch=branch, sku=value).exclude(pk=getattr(self.instance, 'pk', None)).exists():
+            raise serializers.ValidationError("A product with this SKU already exists in this branch.")
+        return value
+
 class CustomerSerializer(serializers.ModelSerializer):
     tier_name = serializers.CharField(source='tier.name', read_only=True)
     
@@ -22,6 +22,7 @@ from .models import (
     StocktakeSession, CashDrawerSession
 )
 from api.base_views import StandardizedViewSet, StandardizedReadOnlyViewSet
+from .services.report_cache import cached_report
 from .api_serializers import (
     CategorySerializer, ProductSerializer, 
     CustomerSerializer, OrderSerializer, OrderCreateSerializer,
@@ -284,25 +285,28 @@ class ReportViewSet(viewsets.ViewSet):
         tenant = request.user.profile.tenant
         start_date, end_date = self._get_date_range(request)
         
-        orders = Order.objects.filter(tenant=tenant, status='completed')
-        if start_date:
-            orders = orders.filter(created_at__date__gte=start_date)
-        if end_date:
-            orders = orders.filter(created_at__date__lte=end_date)
+        def build():
+            orders = Order.objects.filter(tenant=tenant, status='completed')
+            if start_date:
+                orders = orders.filter(created_at__date__gte=start_date)
+            if end_date:
+                orders = orders.filter(created_at__date__lte=end_date)
+                
+            total_revenue = orders.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+            total_orders = orders.count()
+            avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
             
-        total_revenue = orders.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_orders = orders.count()
-        avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
-        
-        return Response({
-            'total_revenue': total_revenue,
-            'total_orders': total_orders,
-            'avg_order_value': avg_order_value,
-            'period': {
-                'start': start_date,
-                'end': end_date
+            return {
+                'total_revenue': total_revenue,
+                'total_orders': total_orders,
+                'avg_order_value': avg_order_value,
+                'period': {
+                    'start': start_date,
+                    'end': end_date
+                }
             }
-        })
+        
+        return Response(cached_report('financial_summary', tenant.pk, build, start=start_date, end=end_date))
 
     @action(detail=False, methods=['get'])
     def daily_sales(self, request):
@@ -313,21 +317,23 @@ class ReportViewSet(viewsets.ViewSet):
             end_date = timezone.now().date()
             start_date = end_date - timedelta(days=30)
 
-        orders = Order.objects.filter(
-            tenant=tenant, 
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        
-        daily_data = orders.annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            revenue=Sum('total_amount'),
-            orders=Count('id')
-        ).order_by('date')
+        def build():
+            orders = Order.objects.filter(
+                tenant=tenant, 
+                status='completed',
+                created_at__date__gte=start_date,
+                created_at__date__lte=end_date
+            )
+            
+            daily_data = orders.annotate(
+                date=TruncDate('created_at')
+            ).values('date').annotate(
+                revenue=Sum('total_amount'),
+                orders=Count('id')
+            ).order_by('date')
+            return list(daily_data)
         
-        return Response(list(daily_data))
+        return Response(cached_report('daily_sales', tenant.pk, build, start=start_date, end=end_date))
 
     @action(detail=False, methods=['get'])
     def top_products(self, request):
@@ -338,20 +344,22 @@ class ReportViewSet(viewsets.ViewSet):
         
         start_date, end_date = self._get_date_range(request)
         
-        items = OrderItem.objects.filter(order__tenant=tenant, order__status='completed')
-        if start_date:
-            items = items.filter(order__created_at__date__gte=start_date)
-        if end_date:
-            items = items.filter(order__created_at__date__lte=end_date)
-            
-        top_items = items.values(
-            'product__id', 'product__name', 'product__sku'
-        ).annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum(F('price') * F('quantity'))
-        ).order_by('-quantity_sold')[:10]
+        def build():
+            items = OrderItem.objects.filter(order__tenant=tenant, order__status='completed')
+            if start_date:
+                items = items.filter(order__created_at__date__gte=start_date)
+            if end_date:
+                items = items.filter(order__created_at__date__lte=end_date)
+                
+            top_items = items.values(
+                'product__id', 'product__name', 'product__sku'
+            ).annotate(
+                quantity_sold=Sum('quantity'),
+                revenue=Sum(F('price') * F('quantity'))
+            ).order_by('-quantity_sold')[:10]
+            return list(top_items)
         
-        return Response(list(top_items))
+        return Response(cached_report('top_products', tenant.pk, build, start=start_date, end=end_date))
 
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
@@ -562,10 +570,16 @@ class ReturnViewSet(StandardizedViewSet):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False) or not self.request.user.is_authenticated:
             return Return.objects.none()
-        return Return.objects.filter(tenant=self.request.user.profile.tenant).select_related(
+        queryset = Return.objects.filter(tenant=self.request.user.profile.tenant).select_related(
             'order', 'customer', 'created_by__user'
         ).prefetch_related('items__product')
 
+        # Exact order number match through the blind index (order_number is encrypted)
+        order_number = self.request.query_params.get('order_number')
+        if order_number:
+            queryset = queryset.filter(order__order_number__blind=order_number)
+        return queryset
+
     def perform_create(self, serializer):
         serializer.save(
             tenant=self.request.user.profile.tenant,
@@ -14,6 +14,13 @@ class CSVParser:
         # file_content is bytes, we need to decode it
         self.file_content = file_content
 
+    def estimate_rows(self):
+        """Number of lines (header included); quoted multi-line cells make this an upper bound."""
+        lines = self.file_content.count(b'\n')
+        if self.file_content and not self.file_content.endswith(b'\n'):
+            lines += 1
+        return lines
+
     def parse(self):
         """Yields rows as lists of values."""
         try:
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:40
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_identifiersequence'),
+        ('branches', '0001_initial'),
+        ('main', '0012_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('cart_key', models.CharField(help_text='Session key or cart ID holding the units', max_length=64)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='accounts.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='main.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='accounts.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'expires_at'], name='reservation_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('cart_key', 'product'), name='unique_reservation_per_cart')],
+            },
+        ),
+    ]
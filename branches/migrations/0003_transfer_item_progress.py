@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0002_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktransferitem',
+            name='shipped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stocktransferitem',
+            name='received_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
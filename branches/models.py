@@ -34,6 +34,9 @@ class StockTransferItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE) # Source Product
     quantity = models.PositiveIntegerField(default=1)
     transfer_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Price per unit for this transfer")
+    # Set per line as it is applied, so a chunked ship/receive can resume
+    shipped_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
@@ -112,6 +115,30 @@ class StockMovement(models.Model):
         return f"{self.movement_type}: {self.product.name} ({self.quantity_change})"
 
 
+
+class StockReservation(models.Model):
+    """Units held for an online or kiosk cart until it checks out or expires"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.DO_NOTHING)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    cart_key = models.CharField(max_length=64, help_text="Session key or cart ID holding the units")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='unique_reservation_per_cart'),
+        ]
+        indexes = [
+            # Units held on a product (see branches/services/stock_ledger.py)
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} for {self.cart_key}"
+
 class PurchaseOrder(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     STATUS_CHOICES = (
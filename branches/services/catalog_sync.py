@@ -0,0 +1,213 @@
+"""
+Delta sync for the POS/kiosk catalog (products, categories and customers).
+
+Saves and deletes of synced objects are recorded in main.CatalogChange (fed by
+signals in main/signals.py) with a per-tenant version from the 'catalog'
+sequence. The database sequence backend is always used here: its row stays
+locked until the change row commits, so versions become visible in order and a
+client cursor can never skip a change that committed late.
+
+Clients either download a full snapshot (cached gzip JSON, ETag = version) or
+ask for the changes after their cursor and get upserts plus tombstones.
+"""
+import gzip
+import json
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from rest_framework.utils.encoders import JSONEncoder
+from utils.encryption import get_cipher
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# Entity name -> key in snapshot/delta payloads
+CATALOG_ENTITIES = {
+    'product': 'products',
+    'category': 'categories',
+    'customer': 'customers',
+}
+
+
+def record_catalog_change(entity, tenant_id, object_ids):
+    """
+    Queue a change for the given objects; the versions are written in one
+    statement once the surrounding transaction commits.
+    """
+    if not tenant_id:
+        return
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = set()
+    schema_name = connection.schema_name
+    for object_id in object_ids:
+        pending.add((schema_name, tenant_id, entity, object_id))
+    transaction.on_commit(flush_catalog_changes)
+
+
+def flush_catalog_changes():
+    """
+    Write queued changes. Runs after commit; extra callbacks for the same
+    transaction find the queue empty. Entries left behind by a rolled back
+    transaction are flushed with the next one, which is harmless: the client
+    just receives the object's current state (or a tombstone) again.
+    """
+    from accounts.models import Tenant
+    from main.models import CatalogChange
+    from utils.sequences import get_backend
+
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+
+    groups = {}
+    for schema_name, tenant_id, entity, object_id in pending:
+        groups.setdefault((schema_name, tenant_id), []).append((entity, object_id))
+
+    for (schema_name, tenant_id), keys in groups.items():
+        # Sorted so concurrent upserts lock rows in the same order
+        keys.sort(key=lambda key: (key[0], str(key[1])))
+        try:
+            with schema_context(schema_name), transaction.atomic():
+                tenant = Tenant.objects.get(pk=tenant_id)
+                last_version = get_backend('db').allocate(tenant, 'catalog', len(keys), None)
+                first_version = last_version - len(keys) + 1
+                CatalogChange.objects.bulk_create(
+                    [
+                        CatalogChange(tenant=tenant, entity=entity, object_id=object_id, version=first_version + i)
+                        for i, (entity, object_id) in enumerate(keys)
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['tenant', 'entity', 'object_id'],
+                    update_fields=['version', 'changed_at'],
+                )
+        except Exception as e:
+            logger.warning(f"Failed to record catalog changes for {schema_name}: {str(e)}")
+
+
+def cached_blob(key, build):
+    """
+    Return the bytes cached under `key`, building and caching them on a miss.
+    Snapshots hold decrypted customer fields, so they are Fernet-encrypted in
+    the cache like they are in the database. Cache errors fall back to `build`.
+    """
+    cipher = get_cipher()
+    try:
+        token = cache.get(key)
+        if token is not None:
+            return cipher.decrypt(token)
+    except Exception:
+        pass
+
+    blob = build()
+    try:
+        cache.set(key, cipher.encrypt(blob), getattr(settings, 'CATALOG_SNAPSHOT_TTL', 86400))
+    except Exception:
+        pass
+    return blob
+
+
+class CatalogSyncService:
+    """Snapshots and deltas of the catalog a branch's tills and kiosks cache offline."""
+
+    def __init__(self, tenant, branch):
+        self.tenant = tenant
+        self.branch = branch
+
+    def get_querysets(self):
+        from main.models import Product, Category, Customer
+        return {
+            'product': Product.objects.filter(branch=self.branch, is_active=True)
+                .select_related('category').prefetch_related('variants', 'components__component_product'),
+            'category': Category.objects.filter(branch=self.branch),
+            'customer': Customer.objects.filter(tenant=self.tenant).select_related('tier'),
+        }
+
+    def get_serializers(self):
+        from branches.api_serializers import ProductSerializer, CategorySerializer, CustomerSerializer
+        return {
+            'product': ProductSerializer,
+            'category': CategorySerializer,
+            'customer': CustomerSerializer,
+        }
+
+    def current_version(self):
+        from main.models import CatalogChange
+        return CatalogChange.objects.filter(tenant=self.tenant).aggregate(version=Max('version'))['version'] or 0
+
+    def etag(self, version):
+        return f'"catalog-{self.branch.pk}-{version}"'
+
+    def build_snapshot(self, version):
+        serializers = self.get_serializers()
+        data = {
+            CATALOG_ENTITIES[entity]: serializers[entity](queryset, many=True).data
+            for entity, queryset in self.get_querysets().items()
+        }
+        data.update({
+            'cursor': version,
+            'timestamp': timezone.now(),
+            'server_schema': connection.schema_name,
+            'products_count': len(data['products']),
+        })
+        return data
+
+    def snapshot(self, version=None, variant='raw', wrap=None):
+        """
+        Return (version, gzip bytes) of the full catalog. Cached per version, so
+        the serialization cost is paid once per change rather than per till.
+        `wrap` turns the payload into the response body for `variant`.
+        """
+        if version is None:
+            version = self.current_version()
+        key = f"catalog_snapshot:{connection.schema_name}:{self.branch.pk}:{version}:{variant}"
+
+        def build():
+            payload = self.build_snapshot(version)
+            if wrap:
+                payload = wrap(payload)
+            return gzip.compress(json.dumps(payload, cls=JSONEncoder).encode('utf-8'))
+
+        body = cached_blob(key, build)
+        return version, body
+
+    def changes_since(self, cursor, limit=None):
+        """
+        Upserts and tombstones for everything changed after `cursor`, oldest first.
+        Objects that are deleted or no longer visible to this branch (inactive,
+        moved) come back as tombstones. Follow `has_more` until it is False.
+        """
+        from main.models import CatalogChange
+
+        limit = limit or getattr(settings, 'CATALOG_SYNC_PAGE_SIZE', 1000)
+        changes = list(
+            CatalogChange.objects.filter(tenant=self.tenant, version__gt=cursor)
+            .order_by('version').values_list('entity', 'object_id', 'version')[:limit + 1]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        if not changes and cursor > self.current_version():
+            # Cursor from another database (restore, tenant move): start over
+            return {'reset': True, 'cursor': 0, 'has_more': False}
+
+        changed = {}
+        for entity, object_id, _ in changes:
+            changed.setdefault(entity, set()).add(object_id)
+
+        serializers = self.get_serializers()
+        result = {'cursor': changes[-1][2] if changes else cursor, 'has_more': has_more, 'deleted': {}}
+        for entity, queryset in self.get_querysets().items():
+            name = CATALOG_ENTITIES[entity]
+            ids = changed.get(entity, set())
+            objects = list(queryset.filter(id__in=ids)) if ids else []
+            result[name] = serializers[entity](objects, many=True).data
+            result['deleted'][name] = [str(object_id) for object_id in ids - {obj.id for obj in objects}]
+        return result
@@ -0,0 +1,125 @@
+"""
+Demand forecasting behind the reorder recommendations.
+
+The input is one daily sales series per product (units per calendar day,
+oldest first, zero-filled), all of the same length and built from a single
+grouped query per branch. For every product the engine derives:
+
+- velocity: mean daily sales over the window,
+- demand: an exponentially weighted moving average (EWMA) of daily sales,
+  so recent days count more, shaped by the branch's weekday profile,
+- safety stock: Z x standard deviation of daily sales x sqrt(lead time),
+- days left: days until the stock is used up at the forecast demand,
+- reorder quantity: enough for REORDER_COVERAGE_DAYS of demand plus the
+  safety stock, less what is on hand.
+
+A product needs reordering once its stock is at or below the reorder point
+(demand over the lead time plus safety stock). The series are short (one
+value per day of the lookback), so this is plain Python; the cost is the one
+query that feeds it.
+"""
+import math
+from datetime import timedelta
+
+LOOKBACK_DAYS = 30
+EWMA_SPAN = 7
+LEAD_TIME_DAYS = 7
+REORDER_COVERAGE_DAYS = 14
+# ~95% service level
+SAFETY_Z = 1.65
+# Weekday shares need at least two of each weekday
+MIN_PROFILE_DAYS = 14
+
+FLAT_PROFILE = [1.0] * 7
+
+# Float slack when stock is used up exactly
+_EPSILON = 1e-9
+
+
+def ewma(series, span=EWMA_SPAN):
+    alpha = 2 / (span + 1)
+    value = series[0]
+    for units in series[1:]:
+        value = alpha * units + (1 - alpha) * value
+    return value
+
+
+def weekday_profile(totals, first_day):
+    """
+    Relative demand per weekday (Monday first, averaging 1) from the
+    branch-wide daily totals starting at `first_day`.
+    """
+    if len(totals) < MIN_PROFILE_DAYS or not any(totals):
+        return FLAT_PROFILE
+    sums = [0.0] * 7
+    counts = [0] * 7
+    for offset, units in enumerate(totals):
+        weekday = (first_day + timedelta(days=offset)).weekday()
+        sums[weekday] += units
+        counts[weekday] += 1
+    means = [sums[day] / counts[day] if counts[day] else 0.0 for day in range(7)]
+    overall = sum(means) / 7
+    return [mean / overall for mean in means]
+
+
+def days_until_stockout(stock, demand, profile, start_weekday):
+    """Whole days `stock` lasts at `demand` per day, following the weekday profile."""
+    # Skip whole weeks (each uses 7 x demand whatever the profile), keeping
+    # the last one to walk through day by day
+    weeks = max(int(stock // (demand * 7)) - 1, 0)
+    remaining = stock - weeks * demand * 7
+    days = weeks * 7
+    weekday = start_weekday
+    while remaining > _EPSILON and remaining >= demand * profile[weekday] - _EPSILON:
+        remaining -= demand * profile[weekday]
+        days += 1
+        weekday = (weekday + 1) % 7
+    return days
+
+
+def forecast(stock_levels, sales, first_day):
+    """
+    Forecast every product of `stock_levels` ({product_id: stock}) from
+    `sales` ({product_id: [daily units]}, products without sales may be
+    missing). The series start at `first_day` and end today.
+
+    Returns {product_id: {'velocity', 'demand', 'safety_stock', 'days_left',
+    'reorder_point', 'reorder_quantity', 'reorder'}} for the products that
+    sold anything in the window.
+    """
+    length = max((len(series) for series in sales.values()), default=0)
+    if not length:
+        return {}
+    totals = [0] * length
+    for series in sales.values():
+        for offset, units in enumerate(series):
+            totals[offset] += units
+    profile = weekday_profile(totals, first_day)
+    today = first_day + timedelta(days=length - 1)
+    # Demand is spread over the coming days by the weekday profile, and
+    # today's partial sales already left the stock
+    tomorrow = (today.weekday() + 1) % 7
+
+    results = {}
+    for product_id, stock in stock_levels.items():
+        series = sales.get(product_id)
+        if not series or not any(series):
+            continue
+        velocity = sum(series) / length
+        demand = ewma(series)
+        if demand <= 0:
+            demand = velocity
+        deviation = math.sqrt(sum((units - velocity) ** 2 for units in series) / length)
+        safety_stock = SAFETY_Z * deviation * math.sqrt(LEAD_TIME_DAYS)
+        reorder_point = demand * LEAD_TIME_DAYS + safety_stock
+        on_hand = max(stock, 0)
+        results[product_id] = {
+            'velocity': velocity,
+            'demand': demand,
+            'safety_stock': safety_stock,
+            'days_left': days_until_stockout(on_hand, demand, profile, tomorrow),
+            'reorder_point': reorder_point,
+            'reorder_quantity': max(1, math.ceil(demand * REORDER_COVERAGE_DAYS + safety_stock - on_hand)),
+            'reorder': on_hand <= reorder_point,
+        }
+    return results
@@ -1,146 +1,154 @@
-import requests
 import datetime
-from django.core.files.base import ContentFile
+from decimal import Decimal
 from django.db import transaction
 from main.models import Product, Category
 
 class InventoryService:
+    # Column limits of Product/Category, checked before rows reach the database
+    MAX_LENGTHS = {
+        'name': 200,
+        'sku': 50,
+        'category': 100,
+        'barcode': 100,
+        'batch_number': 100,
+        'invoice_waybill_number': 100,
+        'country_of_origin': 100,
+        'manufacturer_name': 200,
+    }
+    # DecimalField(max_digits=10, decimal_places=2)
+    MAX_DECIMAL = Decimal('100000000')
+
     def __init__(self, tenant, branch):
         self.tenant = tenant
         self.branch = branch
 
-    def import_from_parser(self, parser):
+    def import_from_parser(self, parser, chunk_size=None, progress=None):
         """
-        Processes product import from an XLSXParser instance.
+        Processes product import from an XLSXParser/CSVParser instance.
+        Rows are streamed and written in chunks (see services/product_import.py).
         """
-        success_count = 0
-        skip_count = 0
-        errors = []
-        
-        data_iter = parser.parse()
-        next(data_iter, None) # Skip header
+        from .product_import import ProductImporter
+        return ProductImporter(self, chunk_size=chunk_size).run(parser, progress=progress)
 
-        for row_idx, row in enumerate(data_iter, start=2):
-            success, result_signal = self.import_row(row, row_idx)
-            
-            # If result_signal starts with 'skipped_', it was a skip
-            if success and result_signal and str(result_signal).startswith('skipped_'):
-                skip_count += 1
-                if skip_count <= 5: # Only collect first 5 previews
-                    errors.append(f"Diagnostic (Row {row_idx}): {result_signal}")
-            elif success and result_signal == 'imported':
-                success_count += 1
-            else:
-                errors.append(result_signal)
+    def parse_row(self, row, row_idx):
+        """
+        Validates a sheet row. Returns ('skipped', preview), ('error', message)
+        or ('ok', values) where values holds 'sku', 'category_name', 'image_url'
+        and 'fields' (Product field values; optional columns only when filled).
+        """
+        if not row or len(row) < 4: 
+            return 'error', f"Row {row_idx}: Incomplete data"
+        
+        # Extract and clean fields
+        name = str(row[0]).strip() if len(row) > 0 else ''
+        sku = str(row[1]).strip() if len(row) > 1 else ''
+        cat_name = str(row[2]).strip() if len(row) > 2 else ''
+        
+        # Skip completely empty rows (common in Excel files)
+        if not name and not sku and not cat_name:
+            row_preview = "|".join([str(c) for c in row[:5]])
+            return 'skipped', f"skipped_{row_preview}"
         
-        return {
-            'success': success_count,
-            'skipped': skip_count,
-            'errors': errors
+        if not name or not sku: 
+            fields_found = []
+            if name: fields_found.append(f"Name='{name}'")
+            if sku: fields_found.append(f"SKU='{sku}'")
+            found_str = ", ".join(fields_found) if fields_found else "both empty"
+            return 'error', f"Row {row_idx}: Name and SKU are required (Found: {found_str})"
+        
+        # Critical: Ensure price is assigned!
+        price = self._clean_decimal(row[3]) if len(row) > 3 else Decimal('0.00')
+        
+        wholesale = self._clean_decimal(row[4]) if len(row) > 4 else Decimal('0.00')
+        min_qty = self._clean_int(row[5]) if len(row) > 5 else 1
+        cost = self._clean_decimal(row[6]) if len(row) > 6 else Decimal('0.00')
+        stock = self._clean_int(row[7]) if len(row) > 7 else 0
+        low_stock = self._clean_int(row[8]) if len(row) > 8 else 10
+        barcode = str(row[9]).strip() if len(row) > 9 else ''
+        expiry_str = str(row[10]).strip() if len(row) > 10 else ''
+        batch = str(row[11]).strip() if len(row) > 11 else ''
+        invoice = str(row[12]).strip() if len(row) > 12 else ''
+        desc = str(row[13]).strip() if len(row) > 13 else ''
+        active_str = str(row[14]).strip().upper() if len(row) > 14 else 'TRUE'
+        image_url = str(row[15]).strip() if len(row) > 15 else ''
+        
+        # Extended Manufacturing Data
+        mfg_date_str = str(row[16]).strip() if len(row) > 16 else ''
+        country_origin = str(row[17]).strip() if len(row) > 17 else ''
+        mfg_name = str(row[18]).strip() if len(row) > 18 else ''
+        mfg_address = str(row[19]).strip() if len(row) > 19 else ''
+
+        fields = {
+            'name': name,
+            'price': price,
+            'wholesale_price': wholesale,
+            'minimum_wholesale_quantity': min_qty,
+            'cost_price': cost,
+            'stock_quantity': stock,
+            'low_stock_threshold': low_stock,
+            'barcode': barcode,
+            'batch_number': batch,
+            'invoice_waybill_number': invoice,
+            'description': desc,
+            'is_active': active_str in ['TRUE', '1', 'YES', 'T'],
         }
 
+        # Optional columns only overwrite existing values when filled in
+        expiry_date = self._parse_excel_date(expiry_str)
+        if expiry_date is not None:
+            fields['expiry_date'] = expiry_date
+        mfg_date = self._parse_excel_date(mfg_date_str)
+        if mfg_date is not None:
+            fields['manufacturing_date'] = mfg_date
+        if country_origin:
+            fields['country_of_origin'] = country_origin
+        if mfg_name:
+            fields['manufacturer_name'] = mfg_name
+        if mfg_address:
+            fields['manufacturer_address'] = mfg_address
+
+        # Checks the database would otherwise fail a whole batch on
+        for field_name, value in [('sku', sku), ('category', cat_name)] + list(fields.items()):
+            max_length = self.MAX_LENGTHS.get(field_name)
+            if max_length and len(value) > max_length:
+                return 'error', f"Row {row_idx}: {field_name} is longer than {max_length} characters"
+        for field_name in ('price', 'wholesale_price', 'cost_price'):
+            if abs(fields[field_name]) >= self.MAX_DECIMAL:
+                return 'error', f"Row {row_idx}: {field_name} is too large"
+        for field_name in ('stock_quantity', 'minimum_wholesale_quantity'):
+            if fields[field_name] < 0:
+                return 'error', f"Row {row_idx}: {field_name} cannot be negative"
+
+        return 'ok', {'sku': sku, 'category_name': cat_name, 'image_url': image_url, 'fields': fields}
+
     def import_row(self, row, row_idx):
         """
         Imports a single product row. Returns (success, error_message).
         """
         try:
-            if not row or len(row) < 4: 
-                return False, f"Row {row_idx}: Incomplete data"
-            
-            # Extract and clean fields
-            name = str(row[0]).strip() if len(row) > 0 else ''
-            sku = str(row[1]).strip() if len(row) > 1 else ''
-            cat_name = str(row[2]).strip() if len(row) > 2 else ''
-            
-            # Skip completely empty rows (common in Excel files)
-            if not name and not sku and not cat_name:
-                row_preview = "|".join([str(c) for c in row[:5]])
-                return True, f"skipped_{row_preview}"
-            
-            if not name or not sku: 
-                fields_found = []
-                if name: fields_found.append(f"Name='{name}'")
-                if sku: fields_found.append(f"SKU='{sku}'")
-                found_str = ", ".join(fields_found) if fields_found else "both empty"
-                return False, f"Row {row_idx}: Name and SKU are required (Found: {found_str})"
-            
-            # Critical: Ensure price is assigned!
-            price = self._clean_float(row[3]) if len(row) > 3 else 0.0
-            
-            wholesale = self._clean_float(row[4]) if len(row) > 4 else 0.0
-            min_qty = self._clean_int(row[5]) if len(row) > 5 else 1
-            cost = self._clean_float(row[6]) if len(row) > 6 else 0.0
-            stock = self._clean_int(row[7]) if len(row) > 7 else 0
-            low_stock = self._clean_int(row[8]) if len(row) > 8 else 10
-            barcode = str(row[9]).strip() if len(row) > 9 else ''
-            expiry_str = str(row[10]).strip() if len(row) > 10 else ''
-            batch = str(row[11]).strip() if len(row) > 11 else ''
-            invoice = str(row[12]).strip() if len(row) > 12 else ''
-            desc = str(row[13]).strip() if len(row) > 13 else ''
-            active_str = str(row[14]).strip().upper() if len(row) > 14 else 'TRUE'
-            image_url = str(row[15]).strip() if len(row) > 15 else ''
-            
-            # Extended Manufacturing Data
-            mfg_date_str = str(row[16]).strip() if len(row) > 16 else ''
-            country_origin = str(row[17]).strip() if len(row) > 17 else ''
-            mfg_name = str(row[18]).strip() if len(row) > 18 else ''
-            mfg_address = str(row[19]).strip() if len(row) > 19 else ''
+            status, result = self.parse_row(row, row_idx)
+            if status == 'skipped':
+                return True, result
+            if status == 'error':
+                return False, result
 
             # Process Category
             category = None
-            if cat_name:
+            if result['category_name']:
                 category, _ = Category.objects.get_or_create(
                     branch=self.branch,
-                    name__iexact=cat_name,
-                    defaults={'name': cat_name, 'tenant': self.tenant}
+                    name__iexact=result['category_name'],
+                    defaults={'name': result['category_name'], 'tenant': self.tenant}
                 )
-            
-            # Process Expiry
-            expiry_date = self._parse_excel_date(expiry_str)
-            update_expiry = expiry_date is not None
-
-            is_active = active_str in ['TRUE', '1', 'YES', 'T']
-
-            # Process Manufacturing Date (Optional)
-            mfg_date = self._parse_excel_date(mfg_date_str)
-            update_mfg = mfg_date is not None
 
             # Update or Create Product
-            defaults = {
-                'name': name,
-                'category': category,
-                'price': price,
-                'wholesale_price': wholesale,
-                'minimum_wholesale_quantity': min_qty,
-                'cost_price': cost,
-                'stock_quantity': stock,
-                'low_stock_threshold': low_stock,
-                'barcode': barcode,
-                'batch_number': batch,
-                'invoice_waybill_number': invoice,
-                'description': desc,
-                'is_active': is_active,
-                'tenant': self.tenant
-            }
-            
-            if update_expiry:
-                defaults['expiry_date'] = expiry_date
-            
-            if update_mfg:
-                defaults['manufacturing_date'] = mfg_date
-                
-            if country_origin:
-                defaults['country_of_origin'] = country_origin
-            if mfg_name:
-                defaults['manufacturer_name'] = mfg_name
-            if mfg_address:
-                defaults['manufacturer_address'] = mfg_address
+            defaults = dict(result['fields'], category=category, tenant=self.tenant)
 
             with transaction.atomic():
                 try:
                     product, created = Product.objects.update_or_create(
                         branch=self.branch,
-                        sku=sku,
+                        sku=result['sku'],
                         defaults=defaults
                     )
                 except Exception as db_err:
@@ -148,9 +156,10 @@ class InventoryService:
                     db_info = f"Available Connections: {list(connections.databases.keys())}"
                     raise Exception(f"DATABASE ERROR: {str(db_err)} | {db_info}")
 
-                if image_url and image_url.startswith('http'):
-                    # Optimized download with shorter timeout to prevent Daphne timeout
-                    self._download_product_image(product, image_url)
+            image_url = result['image_url']
+            if image_url and image_url.startswith('http'):
+                # Optimized download with shorter timeout to prevent Daphne timeout
+                self._download_product_image(product, image_url)
 
             return True, 'imported'
             
@@ -161,26 +170,16 @@ class InventoryService:
 
     def _download_product_image(self, product, url):
         """
-        Internal helper to download and save product images.
-        Uses a short timeout to prevent blocking the import process.
+        Internal helper to download and save a single product image
+        (resized, with a thumbnail). Failures are logged, never raised.
         """
-        try:
-            # Shortened timeout to prevent worker killing (Daphne/Gunicorn)
-            img_response = requests.get(url, timeout=3)
-            if img_response.status_code == 200:
-                ext = url.split('.')[-1].split('?')[0].lower()
-                if ext not in ['jpg', 'jpeg', 'png', 'webp', 'gif']:
-                    ext = 'jpg'
-                filename = f"{product.sku}.{ext}"
-                product.image.save(filename, ContentFile(img_response.content), save=True)
-        except Exception as img_err:
-            # Non-blocking error logging
-            pass
+        from .product_images import ingest_product_images
+        ingest_product_images(self.tenant, self.branch, [(product.pk, url)])
+
+    def _clean_decimal(self, val):
+        try: return Decimal(str(val).strip()).quantize(Decimal('0.01'))
+        except: return Decimal('0.00')
 
-    def _clean_float(self, val):
-        try: return float(str(val).strip()) 
-        except: return 0.0
-    
     def _clean_int(self, val):
         try: return int(float(str(val).strip()))
         except: return 0
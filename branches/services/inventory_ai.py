@@ -1,10 +1,17 @@
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Sum
+from django.db.models.functions import TruncDate
 from datetime import timedelta
 from main.models import Product
 from branches.models import StockMovement, InventoryRecommendation
+from branches.services.forecasting import LOOKBACK_DAYS, forecast
+from branches.services.sales_rollup import created_between
 from decimal import Decimal
 
+# Recommendations written per INSERT
+UPSERT_BATCH_SIZE = 1000
+
 class InventoryAIService:
     """
     Service to analyze stock trends and generate reorder recommendations.
@@ -18,7 +25,7 @@ class InventoryAIService:
         """
         if branch:
             return self._analyze_branch(branch)
-        
+
         results = []
         for branch in self.tenant.branches.all():
             results.append(self._analyze_branch(branch))
@@ -26,68 +33,69 @@ class InventoryAIService:
 
     def _analyze_branch(self, branch):
         """
-        Core logic for a single branch.
+        Core logic for a single branch: forecast every active product from the
+        branch's sales movements (see branches/services/forecasting.py) and
+        replace the branch's recommendations with the products that reached
+        their reorder point.
         """
-        products = Product.objects.filter(branch=branch, tenant=self.tenant, is_active=True)
-        recommendations_count = 0
-        
-        # Consider the last 30 days for velocity calculation
-        lookback_days = 30
-        since_date = timezone.now() - timedelta(days=lookback_days)
+        today = timezone.localdate()
+        first_day = today - timedelta(days=LOOKBACK_DAYS - 1)
+        stock_levels = dict(
+            Product.objects.filter(branch=branch, tenant=self.tenant, is_active=True).values_list('id', 'stock_quantity')
+        )
+        forecasts = forecast(stock_levels, self._daily_sales(branch, first_day), first_day)
 
-        for product in products:
-            velocity = self._calculate_velocity(product, since_date, lookback_days)
-            
-            if velocity > 0:
-                # Calculate estimated days remaining
-                days_remaining = int(product.stock_quantity / velocity) if product.stock_quantity > 0 else 0
-                
-                # If we have less than 7 days of stock left, or we are already out
-                if days_remaining <= 7:
-                    # Recommend 14 days worth of stock
-                    recommended_qty = int(velocity * 14)
-                    
-                    # Ensure minimum of 1 recommendation if velocity is high
-                    if recommended_qty == 0 and velocity > 0:
-                        recommended_qty = 1
+        recommendations = [
+            InventoryRecommendation(
+                tenant=self.tenant,
+                branch=branch,
+                product_id=product_id,
+                predicted_velocity=Decimal(str(round(result['demand'], 2))),
+                current_stock=stock_levels[product_id],
+                estimated_days_left=result['days_left'],
+                recommended_reorder_quantity=result['reorder_quantity'],
+                is_dismissed=False # Reset dismissal on re-analysis if still critical
+            )
+            for product_id, result in forecasts.items() if result['reorder']
+        ]
 
-                    InventoryRecommendation.objects.update_or_create(
-                        branch=branch,
-                        product=product,
-                        defaults={
-                            'tenant': self.tenant,
-                            'predicted_velocity': velocity,
-                            'current_stock': product.stock_quantity,
-                            'estimated_days_left': days_remaining,
-                            'recommended_reorder_quantity': recommended_qty,
-                            'is_dismissed': False # Reset dismissal on re-analysis if still critical
-                        }
-                    )
-                    recommendations_count += 1
-            else:
-                # If velocity is 0 and we have a recommendation, we might want to keep it or delete it.
-                # For now, if no sales in 30 days, we remove the recommendation.
-                InventoryRecommendation.objects.filter(branch=branch, product=product).delete()
+        with transaction.atomic():
+            InventoryRecommendation.objects.bulk_create(
+                recommendations,
+                batch_size=UPSERT_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['branch', 'product'],
+                update_fields=[
+                    'tenant', 'predicted_velocity', 'current_stock', 'estimated_days_left',
+                    'recommended_reorder_quantity', 'is_dismissed', 'last_analyzed_at',
+                ],
+            )
+            # Products that no longer need reordering (or stopped selling)
+            InventoryRecommendation.objects.filter(branch=branch).exclude(
+                product_id__in=[recommendation.product_id for recommendation in recommendations]
+            ).delete()
 
         return {
             'branch': branch.name,
-            'processed_count': products.count(),
-            'recommendations_created': recommendations_count
+            'processed_count': len(stock_levels),
+            'recommendations_created': len(recommendations)
         }
 
-    def _calculate_velocity(self, product, since_date, days):
+    def _daily_sales(self, branch, first_day):
         """
-        Calculates average daily sales for a product.
+        Units sold per product and day since first_day, in one grouped query:
+        {product_id: [units, ...]} with one zero-filled value per day up to today.
         """
-        # Sum all 'sale' movements
-        total_sales = StockMovement.objects.filter(
-            product=product,
-            movement_type='sale',
-            created_at__gte=since_date
-        ).aggregate(total=Sum('quantity_change'))['total'] or 0
-        
-        # quantity_change for sales is negative, so we use absolute value
-        abs_sales = abs(total_sales)
-        
-        # Return average per day
-        return Decimal(abs_sales) / Decimal(days)
+        length = (timezone.localdate() - first_day).days + 1
+        sales = {}
+        rows = StockMovement.objects.filter(
+            branch=branch, movement_type='sale', **created_between(first_day, None)
+        ).annotate(day=TruncDate('created_at')).values('product_id', 'day').annotate(
+            total=Sum('quantity_change')
+        ).order_by()
+        for row in rows:
+            offset = (row['day'] - first_day).days
+            if 0 <= offset < length:
+                # quantity_change for sales is negative, so we use absolute value
+                sales.setdefault(row['product_id'], [0] * length)[offset] += abs(row['total'])
+        return sales
@@ -1,6 +1,9 @@
 import json
+import uuid
 from decimal import Decimal
-from django.db import transaction
+from django.db import router, transaction
+from django.db.models import F
+from django.db.models.signals import post_save
 from django.utils import timezone
 from main.models import (
     Product, Customer, Order, OrderItem, 
@@ -9,15 +12,29 @@ from main.models import (
     Payment, PaymentMethod,
     CustomerCreditTransaction
 )
+from branches.services.stock_ledger import StockLedger
+from utils.identifier_generator import generate_order_number, generate_item_numbers
+
+# Customer columns a checkout changes
+CUSTOMER_BALANCE_FIELDS = [
+    'store_credit_balance', 'loyalty_points', 'outstanding_debt', 'total_spend', 'total_orders', 'last_purchase_at',
+]
 
 class PaymentService:
     def __init__(self, user, branch, data):
         self.user = user
         self.branch = branch
         self.data = data
-        self.tenant = user.profile.tenant
+        self.user_profile = user.profile
+        self.tenant = self.user_profile.tenant
 
     def process_checkout(self):
+        """
+        Checkout pipeline for a POS basket. Customer, products, gift cards and
+        settings are fetched up front, everything is validated in memory, and
+        items, payments and ledger entries are written with one INSERT each, so
+        the number of queries does not grow with the basket.
+        """
         items = self.data.get('items', [])
         customer_id = self.data.get('customer_id')
         
@@ -38,7 +55,7 @@ class PaymentService:
 
         try:
             with transaction.atomic():
-                # 1. Determine Customer
+                # 1. Resolve Customer, Products, Gift Cards and Settings
                 customer = None
                 is_wholesale = False
                 if customer_id:
@@ -46,7 +63,25 @@ class PaymentService:
                     if customer and customer.customer_type == 'wholesale':
                         is_wholesale = True
 
-                # 2. Calculate Total and Validate Stock
+                product_ids = {uuid.UUID(str(item['id'])) for item in items if item.get('type') != 'gift_card'}
+                products = {}
+                if product_ids:
+                    products = Product.objects.filter(pk__in=product_ids, branch=self.branch).prefetch_related(
+                        'components__component_product'
+                    ).in_bulk()
+                    if len(products) != len(product_ids):
+                        raise Product.DoesNotExist("Product matching query does not exist.")
+
+                codes = {p.get('gift_card_code') for p in payments_data if p.get('method') == 'gift_card' and p.get('gift_card_code')}
+                gift_cards = {}
+                if codes:
+                    gift_cards = {gc.code: gc for gc in GiftCard.objects.filter(tenant=self.tenant, code__in=codes)}
+
+                crm_settings = None
+                if customer:
+                    crm_settings, _ = CRMSettings.objects.get_or_create(tenant=self.tenant)
+
+                # 2. Calculate Total
                 total_amount = Decimal('0.00')
                 validated_items = []
                 
@@ -64,12 +99,9 @@ class PaymentService:
                         })
                         continue
 
-                    product = Product.objects.get(pk=item['id'], branch=self.branch)
+                    product = products[uuid.UUID(str(item['id']))]
                     qty = int(item['quantity'])
                     
-                    if product.stock_quantity < qty:
-                        raise Exception(f'Not enough stock for {product.name}')
-                    
                     price_to_charge = product.price
                     if is_wholesale and product.wholesale_price > 0:
                         price_to_charge = product.wholesale_price
@@ -82,9 +114,13 @@ class PaymentService:
                         'price': price_to_charge
                     })
 
-                # 3. Validate Payments and Balances
+                # 3. Validate Payments and Balances (totals per source, for split payments)
                 total_paid = Decimal('0.00')
                 valid_payments = []
+                gift_card_spend = {}
+                store_credit_spend = Decimal('0.00')
+                points_to_redeem = Decimal('0.00')
+                credit_spend = Decimal('0.00')
                 
                 # If only one payment and no amount specified, it's the full total
                 if len(payments_data) == 1 and payments_data[0].get('amount') is None:
@@ -105,35 +141,35 @@ class PaymentService:
                         code = p_data.get('gift_card_code')
                         if not code:
                             return {'success': False, 'error': 'Gift Card code required'}
-                        try:
-                            gift_card = GiftCard.objects.get(code=code, tenant=self.tenant)
-                            if gift_card.status != 'active':
-                                return {'success': False, 'error': f'Gift Card {code} is not active'}
-                            if gift_card.expiry_date and gift_card.expiry_date < timezone.now().date():
-                                return {'success': False, 'error': f'Gift Card {code} has expired'}
-                            if gift_card.balance < p_amount:
-                                return {'success': False, 'error': f'Insufficient Gift Card balance for {code}. Balance: {gift_card.balance}'}
-                            p_info['gift_card'] = gift_card
-                        except GiftCard.DoesNotExist:
+                        gift_card = gift_cards.get(code)
+                        if not gift_card:
                             return {'success': False, 'error': f'Invalid Gift Card code: {code}'}
+                        if gift_card.status != 'active':
+                            return {'success': False, 'error': f'Gift Card {code} is not active'}
+                        if gift_card.expiry_date and gift_card.expiry_date < timezone.now().date():
+                            return {'success': False, 'error': f'Gift Card {code} has expired'}
+                        gift_card_spend[code] = gift_card_spend.get(code, Decimal('0.00')) + p_amount
+                        if gift_card.balance < gift_card_spend[code]:
+                            return {'success': False, 'error': f'Insufficient Gift Card balance for {code}. Balance: {gift_card.balance}'}
                     
                     elif method == 'store_credit':
                         if not customer:
                             return {'success': False, 'error': 'Customer required for Store Credit'}
-                        if customer.store_credit_balance < p_amount:
+                        store_credit_spend += p_amount
+                        if customer.store_credit_balance < store_credit_spend:
                             return {'success': False, 'error': f'Insufficient Store Credit. Balance: {customer.store_credit_balance}'}
                     
                     elif method == 'loyalty_points':
                         if not customer:
                             return {'success': False, 'error': 'Customer required for Loyalty Points'}
                         
-                        settings, _ = CRMSettings.objects.get_or_create(tenant=self.tenant)
-                        if settings.redemption_rate <= 0:
+                        if crm_settings.redemption_rate <= 0:
                             return {'success': False, 'error': 'System error: Redemption rate is not configured correctly'}
                         
-                        required_points = p_amount / settings.redemption_rate
-                        if customer.loyalty_points < required_points:
-                            return {'success': False, 'error': f'Insufficient Loyalty Points. Balance: {customer.loyalty_points}, Required: {required_points:.0f}'}
+                        required_points = p_amount / crm_settings.redemption_rate
+                        points_to_redeem += required_points
+                        if customer.loyalty_points < points_to_redeem:
+                            return {'success': False, 'error': f'Insufficient Loyalty Points. Balance: {customer.loyalty_points}, Required: {points_to_redeem:.0f}'}
                         p_info['loyalty_points_to_redeem'] = required_points
                     
                     elif method == 'credit':
@@ -145,7 +181,8 @@ class PaymentService:
                         if not is_privileged and not self.user_profile.can_perform_credit_sales:
                             return {'success': False, 'error': 'You do not have permission to perform credit transactions.'}
                         
-                        potential_debt = customer.outstanding_debt + p_amount
+                        credit_spend += p_amount
+                        potential_debt = customer.outstanding_debt + credit_spend
                         if customer.credit_limit > 0 and potential_debt > customer.credit_limit:
                             return {'success': False, 'error': f'Credit limit exceeded. Limit: {customer.credit_limit}, New Debt: {potential_debt}'}
                         if customer.credit_limit <= 0 and p_amount > 0:
@@ -157,7 +194,6 @@ class PaymentService:
                     return {'success': False, 'error': f'Insufficient payment. Paid: {total_paid}, Required: {total_amount}'}
 
                 # 4. Create Order
-                from utils.identifier_generator import generate_order_number, generate_item_number
                 order_number = generate_order_number(self.tenant)
                 
                 # Determine order-level payment method (mark as split if multiple)
@@ -166,7 +202,7 @@ class PaymentService:
                 order = Order.objects.create(
                     tenant=self.tenant,
                     branch=self.branch,
-                    cashier=self.user.profile,
+                    cashier=self.user_profile,
                     customer=customer,
                     order_number=order_number,
                     total_amount=total_amount,
@@ -176,141 +212,173 @@ class PaymentService:
                     payment_reference=valid_payments[0]['ref'] if valid_payments else None
                 )
 
-                # 5. Create Order Items and Deduct Stock / Issue Gift Cards
-                for item in validated_items:
-                    OrderItem.objects.create(
+                # 5. Create Order Items, Issue Gift Cards and Deduct Stock
+                # Reserve every item number for the basket in one allocation
+                item_numbers = generate_item_numbers(order, len(validated_items))
+                OrderItem.objects.bulk_create([
+                    OrderItem(
                         order=order,
                         product=item['product'],
-                        item_number=generate_item_number(order),
+                        item_number=item_number,
                         quantity=item['qty'],
                         price=item['price']
                     )
-                    
-                    if item['type'] == 'gift_card':
-                        # Automatically create and activate the gift card
-                        import uuid
-                        gc_code = item['gc_code'] or f"GC-{uuid.uuid4().hex[:8].upper()}"
-                        GiftCard.objects.create(
-                            tenant=self.tenant,
-                            code=gc_code,
-                            balance=item['price'],
-                            status='active',
-                            customer=customer # Assign to customer if known
-                        )
-                    else:
-                        # Deduct Stock
-                        item['product'].stock_quantity -= item['qty']
-                        item['product'].save()
-
-                # 6. Finalize Payment Deductions and Create Payment Records
-                for p in valid_payments:
-                    method = p['method']
-                    amount = p['amount']
-                    
-                    # Create Payment record for split tracing
-                    Payment.objects.create(
+                    for item, item_number in zip(validated_items, item_numbers)
+                ])
+
+                # Automatically create and activate sold gift cards
+                issued_cards = [
+                    GiftCard(
+                        tenant=self.tenant,
+                        code=item['gc_code'] or f"GC-{uuid.uuid4().hex[:8].upper()}",
+                        balance=item['price'],
+                        status='active',
+                        customer=customer # Assign to customer if known
+                    )
+                    for item in validated_items if item['type'] == 'gift_card'
+                ]
+                if issued_cards:
+                    GiftCard.objects.bulk_create(issued_cards)
+
+                # One conditional UPDATE for the basket, so concurrent tills
+                # cannot sell the same units (raises InsufficientStock)
+                StockLedger(self.tenant, self.user_profile).deduct(
+                    [(item['product'], item['qty']) for item in validated_items if item['type'] == 'product'],
+                    self.branch, reference=f"Order {order.order_number}"
+                )
+
+                # 6. Create Payment Records and Deduct Gift Card Balances
+                payment_methods = self._get_payment_methods({p['method'] for p in valid_payments})
+                Payment.objects.bulk_create([
+                    Payment(
                         tenant=self.tenant,
                         order=order,
-                        # We try to match with a PaymentMethod object if possible, 
-                        # but for simple Cash/GiftCard we might not have a formal provider record.
-                        # For now, we'll need to handle this carefully.
-                        # Maybe we shouldn't enforce PaymentMethod FK if it's not a gateway.
-                        # But the model says it's required.
-                        # Let's find or create a default PaymentMethod for 'cash', 'gift_card', etc.
-                        payment_method=self._get_or_create_payment_method(method),
-                        amount=amount,
+                        payment_method=payment_methods[p['method']],
+                        amount=p['amount'],
                         status='completed',
                         transaction_id=p['ref']
                     )
+                    for p in valid_payments
+                ])
 
-                    if method == 'gift_card':
-                        gc = p['gift_card']
-                        gc.balance -= amount
-                        gc.save()
-
-                    elif method == 'store_credit':
-                        customer.store_credit_balance -= amount
-                        customer.save()
-                        StoreCreditTransaction.objects.create(
-                            tenant=self.tenant,
-                            customer=customer,
-                            amount=-amount,
-                            reference=f"Order Payment #{order.order_number}"
-                        )
-
-                    elif method == 'loyalty_points':
-                        points_to_redeem = p['loyalty_points_to_redeem']
-                        customer.loyalty_points -= points_to_redeem
-                        customer.save()
-                        LoyaltyTransaction.objects.create(
-                            tenant=self.tenant,
-                            customer=customer,
-                            order=order,
-                            points=-points_to_redeem,
-                            transaction_type='redeem',
-                            description=f"Redeemed for Order #{order.order_number}"
-                        )
+                for code, amount in gift_card_spend.items():
+                    # Conditional, so two tills cannot spend the same balance
+                    if not GiftCard.objects.filter(pk=gift_cards[code].pk, balance__gte=amount).update(balance=F('balance') - amount):
+                        raise Exception(f'Insufficient Gift Card balance for {code}')
 
-                    elif method == 'credit':
-                        customer.outstanding_debt += amount
-                        customer.save()
-                        CustomerCreditTransaction.objects.create(
-                            tenant=self.tenant,
-                            customer=customer,
-                            amount=amount,
-                            transaction_type='purchase',
-                            reference=f"Order #{order.order_number}",
-                            created_by=self.user.profile
-                        )
-
-                # 7. CRM: Loyalty Points & Tier Upgrades (only for non-points portions?)
-                # Usually points are earned on the total value of the order, 
-                # but some businesses only award points on the portion NOT paid by points.
-                # Here we'll award on the total_amount for simplicity, same as before.
+                # 7. Customer Ledger Entries, Balances, Loyalty Points & Tier Upgrades
+                # Points are earned on the total_amount, including any portion paid with points.
                 if customer:
-                    customer.total_spend += total_amount
-                    customer.total_orders += 1
-                    customer.last_purchase_at = timezone.now()
-                    
-                    is_first_purchase = (customer.total_orders == 1)
-                    
-                    # Loyalty Points Earning
-                    settings, _ = CRMSettings.objects.get_or_create(tenant=self.tenant)
-                    points_earned = total_amount * settings.points_per_currency
-                    
-                    if points_earned > 0:
-                        customer.loyalty_points += points_earned
-                        LoyaltyTransaction.objects.create(
-                            tenant=self.tenant,
-                            customer=customer,
-                            order=order,
-                            points=points_earned,
-                            transaction_type='earn',
-                            description=f"Earned from Order #{order.order_number}"
-                        )
-                    
-                    tier_changed = customer.calculate_tier()
-                    customer.save()
-
-                    # Trigger Marketing Automation
-                    from main.services.marketing_service import trigger_automated_campaigns
-                    if is_first_purchase:
-                        trigger_automated_campaigns('first_purchase', customer)
-                    if tier_changed:
-                        trigger_automated_campaigns('tier_up', customer)
+                    self._settle_customer(
+                        customer, order, total_amount, crm_settings, valid_payments,
+                        store_credit_spend, points_to_redeem, credit_spend
+                    )
 
                 # 8. Workforce: Evaluate Achievements
                 from branches.services.gamification_service import GamificationService
                 gamification = GamificationService(tenant=self.tenant)
-                gamification.evaluate_achievements(self.user.profile)
+                gamification.evaluate_achievements(self.user_profile)
 
                 return {'success': True, 'order_id': order.id}
 
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def _get_or_create_payment_method(self, method_name):
-        """Helper to get a PaymentMethod object for the given name/provider"""
+    def _settle_customer(self, customer, order, total_amount, crm_settings, payments,
+                         store_credit_spend, points_to_redeem, credit_spend):
+        """
+        Write the customer's ledger entries (one INSERT per ledger) and apply
+        every balance change in a single F-expression UPDATE, guarded so that
+        concurrent checkouts cannot overdraw the customer.
+        """
+        store_credit_entries = []
+        loyalty_entries = []
+        credit_entries = []
+        for p in payments:
+            if p['method'] == 'store_credit':
+                store_credit_entries.append(StoreCreditTransaction(
+                    tenant=self.tenant,
+                    customer=customer,
+                    amount=-p['amount'],
+                    reference=f"Order Payment #{order.order_number}"
+                ))
+            elif p['method'] == 'loyalty_points':
+                loyalty_entries.append(LoyaltyTransaction(
+                    tenant=self.tenant,
+                    customer=customer,
+                    order=order,
+                    points=-p['loyalty_points_to_redeem'],
+                    transaction_type='redeem',
+                    description=f"Redeemed for Order #{order.order_number}"
+                ))
+            elif p['method'] == 'credit':
+                credit_entries.append(CustomerCreditTransaction(
+                    tenant=self.tenant,
+                    customer=customer,
+                    amount=p['amount'],
+                    transaction_type='purchase',
+                    reference=f"Order #{order.order_number}",
+                    created_by=self.user_profile
+                ))
+
+        points_earned = total_amount * crm_settings.points_per_currency
+        if points_earned > 0:
+            loyalty_entries.append(LoyaltyTransaction(
+                tenant=self.tenant,
+                customer=customer,
+                order=order,
+                points=points_earned,
+                transaction_type='earn',
+                description=f"Earned from Order #{order.order_number}"
+            ))
+        else:
+            points_earned = Decimal('0.00')
+
+        for model, entries in (
+            (StoreCreditTransaction, store_credit_entries),
+            (LoyaltyTransaction, loyalty_entries),
+            (CustomerCreditTransaction, credit_entries),
+        ):
+            if entries:
+                model.objects.bulk_create(entries)
+
+        balances = Customer.objects.filter(pk=customer.pk)
+        if store_credit_spend:
+            balances = balances.filter(store_credit_balance__gte=store_credit_spend)
+        if points_to_redeem:
+            balances = balances.filter(loyalty_points__gte=points_to_redeem)
+        if credit_spend and customer.credit_limit > 0:
+            balances = balances.filter(outstanding_debt__lte=F('credit_limit') - credit_spend)
+        updated = balances.update(
+            store_credit_balance=F('store_credit_balance') - store_credit_spend,
+            loyalty_points=F('loyalty_points') - points_to_redeem + points_earned,
+            outstanding_debt=F('outstanding_debt') + credit_spend,
+            total_spend=F('total_spend') + total_amount,
+            total_orders=F('total_orders') + 1,
+            last_purchase_at=timezone.now()
+        )
+        if not updated:
+            raise Exception('Customer balance changed during checkout. Please try again.')
+
+        customer.refresh_from_db(fields=CUSTOMER_BALANCE_FIELDS)
+        is_first_purchase = (customer.total_orders == 1)
+        tier_changed = customer.calculate_tier()
+
+        # The UPDATE bypasses save(); let the customer receivers see the change
+        post_save.send(
+            sender=Customer, instance=customer, created=False,
+            update_fields=frozenset(CUSTOMER_BALANCE_FIELDS), raw=False, using=router.db_for_write(Customer)
+        )
+
+        # Trigger Marketing Automation
+        from main.services.marketing_service import trigger_automated_campaigns
+        if is_first_purchase:
+            trigger_automated_campaigns('first_purchase', customer)
+        if tier_changed:
+            trigger_automated_campaigns('tier_up', customer)
+
+    def _get_payment_methods(self, method_names):
+        """PaymentMethod objects for the given POS method names, fetched in one query"""
         # Map simple POS methods to providers
         provider_map = {
             'cash': 'cash',
@@ -323,15 +391,23 @@ class PaymentService:
             'stripe': 'stripe',
             'paystack': 'card', # Usually card
         }
-        
-        provider = provider_map.get(method_name, 'cash')
-        
-        pm, _ = PaymentMethod.objects.get_or_create(
-            tenant=self.tenant,
-            name=method_name.capitalize(),
-            defaults={'provider': provider, 'is_active': True}
-        )
-        return pm
+
+        names = {method_name: method_name.capitalize() for method_name in method_names}
+        existing = {}
+        for pm in PaymentMethod.objects.filter(tenant=self.tenant, name__in=names.values()).order_by('created_at'):
+            existing.setdefault(pm.name, pm)
+
+        methods = {}
+        for method_name, name in names.items():
+            if name not in existing:
+                # First payment of this kind for the tenant
+                existing[name], _ = PaymentMethod.objects.get_or_create(
+                    tenant=self.tenant,
+                    name=name,
+                    defaults={'provider': provider_map.get(method_name, 'cash'), 'is_active': True}
+                )
+            methods[method_name] = existing[name]
+        return methods
 
     @staticmethod
     def record_customer_payment(customer, amount, user, notes=""):
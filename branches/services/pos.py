@@ -4,8 +4,8 @@ from django.db import transaction
 from django.shortcuts import get_object_or_404
 from main.models import Product, Customer, Order, OrderItem
 from accounts.models import Branch, UserProfile
-from branches.models import StockMovement
-from utils.identifier_generator import generate_order_number, generate_item_number
+from branches.services.stock_ledger import StockLedger
+from utils.identifier_generator import generate_order_number, generate_item_numbers
 
 class POSService:
     def __init__(self, tenant, user_profile=None):
@@ -16,51 +16,12 @@ class POSService:
         """
         Retrieves and serializes all data needed for the POS interface.
         """
-        from main.models import Product, Customer, Category
         from storefront.models import StorefrontSettings
-        import json
+        from branches.services.catalog_sync import CatalogSyncService
 
-        products = Product.objects.filter(branch=branch, is_active=True, stock_quantity__gte=0).select_related('category')
-        categories = Category.objects.filter(branch=branch)
-        customers = Customer.objects.filter(tenant=self.tenant)
-        
-        # Serialize products
-        products_json = []
-        for p in products:
-            products_json.append({
-                'id': str(p.id),
-                'name': p.name,
-                'price': float(p.price),
-                'wholesale_price': float(p.wholesale_price),
-                'stock': p.stock_quantity,
-                'sku': p.sku,
-                'category': p.category.name if p.category else 'Uncategorized',
-                'category_id': str(p.category.id) if p.category else 0,
-                'image_url': p.image_url
-            })
-            
-        # Serialize customers
-        customers_json = []
-        for c in customers:
-            customers_json.append({
-                'id': str(c.id),
-                'name': c.name,
-                'phone': c.phone or '',
-                'email': c.email or '',
-                'customer_type': c.customer_type,
-                'loyalty_points': float(c.loyalty_points),
-                'store_credit': float(c.store_credit_balance),
-                'credit_limit': float(c.credit_limit),
-                'outstanding_debt': float(c.outstanding_debt)
-            })
-
-        # Serialize categories
-        categories_json = []
-        for c in categories:
-            categories_json.append({
-                'id': str(c.id),
-                'name': c.name
-            })
+        # Read the cursor first: changes made while building are re-sent by the next delta
+        version = CatalogSyncService(self.tenant, branch).current_version()
+        catalog = self._build_pos_catalog(branch)
 
         # Fetch Payment Settings
         store_settings = StorefrontSettings.objects.filter(tenant=self.tenant).first()
@@ -84,14 +45,83 @@ class POSService:
                 payment_config['paystack_key'] = store_settings.paystack_public_key
 
         return {
-            'products': products_json,
-            'customers': customers_json,
-            'categories': categories_json,
+            'products': catalog['products'],
+            'customers': catalog['customers'],
+            'categories': catalog['categories'],
+            'catalog_cursor': version,
             'payment_config': payment_config,
             'branch_id': str(branch.id),
             'branch_name': branch.name
         }
 
+    def _build_pos_catalog(self, branch):
+        """
+        Catalog part of the POS payload, read as plain rows rather than model
+        instances (only customer contact fields need decrypting).
+        """
+        from django.core.files.storage import default_storage
+        from django.templatetags.static import static
+        from main.models import Category
+        from utils.encryption import iterate_decrypted
+
+        default_image = static('images/default_product.png')
+
+        def image_url(name):
+            if name:
+                try:
+                    return default_storage.url(name)
+                except Exception:
+                    pass
+            return default_image
+
+        products = Product.objects.filter(branch=branch, is_active=True, stock_quantity__gte=0).values_list(
+            'id', 'name', 'price', 'wholesale_price', 'stock_quantity', 'sku', 'category_id', 'category__name', 'image'
+        )
+        products_json = [
+            {
+                'id': str(product_id),
+                'name': name,
+                'price': float(price),
+                'wholesale_price': float(wholesale_price),
+                'stock': stock,
+                'sku': sku,
+                'category': category_name or 'Uncategorized',
+                'category_id': str(category_id) if category_id else 0,
+                'image_url': image_url(image)
+            }
+            for product_id, name, price, wholesale_price, stock, sku, category_id, category_name, image in products
+        ]
+
+        customers = Customer.objects.filter(tenant=self.tenant).only(
+            'id', 'name', 'phone', 'email', 'customer_type', 'loyalty_points',
+            'store_credit_balance', 'credit_limit', 'outstanding_debt'
+        )
+        customers_json = [
+            {
+                'id': str(c.id),
+                'name': c.name,
+                'phone': c.phone or '',
+                'email': c.email or '',
+                'customer_type': c.customer_type,
+                'loyalty_points': float(c.loyalty_points),
+                'store_credit': float(c.store_credit_balance),
+                'credit_limit': float(c.credit_limit),
+                'outstanding_debt': float(c.outstanding_debt)
+            }
+            for c in iterate_decrypted(customers)
+        ]
+
+        categories_json = [
+            {'id': str(category_id), 'name': name}
+            for category_id, name in Category.objects.filter(branch=branch).values_list('id', 'name')
+        ]
+
+        return {
+            'products': products_json,
+            'customers': customers_json,
+            'categories': categories_json,
+        }
+
     def void_order(self, order_id):
         """
         Voids an order, restores stock, and updates status.
@@ -138,9 +168,12 @@ class POSService:
                 
                 # 2. Deduct Inventory (Skip for online orders as they deduct at creation)
                 if order.ordering_type != 'online':
-                    for item in order.items.all():
-                        if item.product:
-                            self._deduct_stock(item.product, item.quantity, order, order.branch)
+                    lines = [
+                        (item.product, -item.quantity)
+                        for item in order.items.select_related('product').prefetch_related('product__components__component_product')
+                        if item.product
+                    ]
+                    self._apply_stock_changes(lines, order, order.branch)
                     print(f"[POSService] Stock deducted for {order.ordering_type} order {order.order_number}")
                 else:
                     print(f"[POSService] Skipping stock deduction for Online order {order.order_number} (already handled)")
@@ -200,24 +233,13 @@ class POSService:
                 )
 
                 # 5. Process Items
-                items = transaction_data.get('items', [])
-                for item_data in items:
-                    prod_id = item_data.get('product_id') or item_data.get('id')
-                    if not prod_id:
-                        continue
-                        
-                    product = Product.objects.get(id=prod_id, tenant=self.tenant)
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        quantity=item_data['quantity'],
-                        price=item_data['price'],
-                        item_number=generate_item_number(order)
-                    )
-                    
-                    # 6. Inventory Deduction (Skip for online orders)
-                    if order.status == 'completed' and order.ordering_type != 'online':
-                        self._deduct_stock(product, item_data['quantity'], order, branch)
+                items = [
+                    item_data for item_data in transaction_data.get('items', [])
+                    if item_data.get('product_id') or item_data.get('id')
+                ]
+                # 6. Inventory Deduction (Skip for online orders)
+                deduct = order.status == 'completed' and order.ordering_type != 'online'
+                self._create_order_items(order, items, branch, deduct_stock=deduct)
 
                 return {
                     'status': 'success',
@@ -305,21 +327,65 @@ class POSService:
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
 
+    def _create_order_items(self, order, items, branch, deduct_stock=True):
+        """
+        Set-based item write for a synced basket: products are fetched in one query,
+        items inserted in one INSERT and stock deducted through _apply_stock_changes,
+        so the query count does not grow with the number of lines.
+        """
+        if not items:
+            return []
+
+        product_ids = [uuid.UUID(str(item.get('product_id') or item.get('id'))) for item in items]
+        products = Product.objects.filter(id__in=set(product_ids), tenant=self.tenant)
+        if deduct_stock:
+            products = products.prefetch_related('components__component_product')
+        products = {product.id: product for product in products}
+        if len(products) != len(set(product_ids)):
+            raise Product.DoesNotExist("Product matching query does not exist.")
+
+        # Reserve every item number for the basket in one allocation
+        item_numbers = generate_item_numbers(order, len(items))
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=products[product_id],
+                quantity=item_data['quantity'],
+                price=item_data['price'],
+                item_number=item_number
+            )
+            for item_data, product_id, item_number in zip(items, product_ids, item_numbers)
+        ])
+
+        if deduct_stock:
+            self._apply_stock_changes(
+                [(products[product_id], -int(item_data['quantity'])) for item_data, product_id in zip(items, product_ids)],
+                order, branch
+            )
+        return order_items
+
+    def _apply_stock_changes(self, lines, reference_order=None, branch=None, movement_type='sale'):
+        """
+        Apply a list of (product, quantity_change) pairs in bulk through the stock
+        ledger: composite products are expanded into their components (prefetch
+        `components__component_product`), all changes land in a single UPDATE and
+        movements are logged in one INSERT. Synced sales already happened, so the
+        changes are applied whatever the stock.
+        """
+        StockLedger(self.tenant, self.user_profile).apply(
+            lines, branch or (reference_order.branch if reference_order else None), movement_type,
+            reference=f"Order {reference_order.order_number if reference_order else 'Internal'}"
+        )
+
     def _deduct_stock(self, product, quantity, reference_order=None, branch=None):
         """
         Internal helper for stock deduction including composite products and movement logging.
+        Raises InsufficientStock instead of selling units that are not there.
         """
-        if product.is_composite:
-            for component in product.components.all():
-                qty_to_deduct = component.quantity * quantity
-                component.component_product.stock_quantity -= qty_to_deduct
-                component.component_product.save()
-                
-                self._log_movement(component.component_product, -qty_to_deduct, reference_order, branch)
-        else:
-            product.stock_quantity -= quantity
-            product.save()
-            self._log_movement(product, -quantity, reference_order, branch)
+        StockLedger(self.tenant, self.user_profile).deduct(
+            [(product, quantity)], branch or (reference_order.branch if reference_order else None),
+            reference=f"Order {reference_order.order_number if reference_order else 'Internal'}"
+        )
 
     def _log_movement(self, product, change, order=None, branch=None):
         """Helper to create audit trails"""
@@ -0,0 +1,127 @@
+"""
+Precomputed POS bootstrap payload (the body of pos_data_api).
+
+The payload is rendered once per branch into the cache as compressed JSON and
+served as-is. Each branch has a generation counter that product, category,
+customer, branch and storefront-settings signals bump after commit. The counter
+is part of the snapshot key, so a stale snapshot is never read again, and a
+build that raced with a change is written under a generation nobody asks for.
+
+A warm request costs two cache reads and no database queries.
+"""
+import gzip
+import json
+import logging
+import threading
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from branches.services.catalog_sync import cached_blob
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+# Keys use the branch id alone (UUIDs are unique across tenant schemas), so a
+# branch edited from the public schema still invalidates its tenant's snapshot
+
+def _generation_key(branch_id):
+    return f"pos_snapshot_gen:{branch_id}"
+
+
+def _new_generation():
+    # A lost (evicted) counter restarts from the clock, never from a value an
+    # older snapshot may still be cached under
+    return time.time_ns() // 1000
+
+
+def get_generation(branch_id):
+    key = _generation_key(branch_id)
+    try:
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, _new_generation(), timeout=None)
+            generation = cache.get(key)
+        return generation
+    except Exception:
+        return None
+
+
+def invalidate_pos_snapshot(tenant_id=None, branch_ids=None):
+    """
+    Mark the snapshots of `branch_ids` (or of every branch of `tenant_id`) stale
+    once the current transaction commits. Repeated calls in one transaction
+    (e.g. a basket touching many products) bump each branch only once.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = set()
+    if branch_ids is None:
+        from accounts.models import Branch
+        branch_ids = Branch.objects.filter(tenant_id=tenant_id).values_list('id', flat=True)
+    for branch_id in branch_ids:
+        if branch_id:
+            pending.add(branch_id)
+    transaction.on_commit(_flush_invalidations)
+
+
+def _flush_invalidations():
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+    for branch_id in pending:
+        key = _generation_key(branch_id)
+        try:
+            # incr() raises on a missing key; add() starts the counter instead
+            if not cache.add(key, _new_generation(), timeout=None):
+                cache.incr(key)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate POS snapshot for branch {branch_id}: {str(e)}")
+
+
+def get_pos_snapshot(service, branch, encoding='gzip', if_none_match=None):
+    """
+    Return (etag, body, encoding) for the branch's POS payload, building it on a miss.
+    `encoding` is 'br', 'gzip' or 'identity'; brotli falls back to gzip when the
+    brotli package is not installed. body is None when `if_none_match` is current.
+    """
+    if encoding == 'br' and brotli is None:
+        encoding = 'gzip'
+
+    generation = get_generation(branch.pk)
+    if generation is None:
+        # Cache unavailable: build uncached
+        return None, _render(service, branch, encoding), encoding
+
+    etag = f'"pos-{branch.pk}-{generation}"'
+    if if_none_match == etag:
+        return etag, None, encoding
+
+    stored = 'br' if encoding == 'br' else 'gzip'
+    key = f"pos_snapshot:{branch.pk}:{generation}:{stored}"
+    body = cached_blob(key, lambda: _render(service, branch, stored))
+    if encoding == 'identity':
+        body = gzip.decompress(body)
+    return etag, body, encoding
+
+
+def _render(service, branch, encoding):
+    body = json.dumps({
+        "status": "success",
+        "code": 200,
+        "data": service.get_pos_data(branch),
+        "message": "POS data hydrated successfully"
+    }, cls=DjangoJSONEncoder).encode('utf-8')
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body)
+    return body
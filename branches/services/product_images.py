@@ -0,0 +1,309 @@
+"""
+Product image ingestion for imports.
+
+Image URLs from an import file are fetched off the database path by a
+bounded thread pool (IMPORT_IMAGE_WORKERS). Each worker keeps a pooled
+requests.Session. The importer submits each chunk's URLs once the chunk has
+committed and carries on with the next chunk while the images download.
+
+- A URL is fetched once per ingestor, however many products use it.
+- Stored files are named after the SHA-256 of the downloaded bytes, so the
+  same picture behind different URLs is processed and stored once.
+- Images are re-encoded, resized to IMPORT_IMAGE_MAX_DIMENSION and given a
+  IMPORT_IMAGE_THUMBNAIL_SIZE thumbnail (Product.thumbnail).
+- Timeouts, connection errors, 429 and 5xx responses are retried in the
+  worker with backoff. URLs that still fail are handed to
+  retry_product_images_task, which tries again later (up to
+  IMPORT_IMAGE_RETRY_ROUNDS times). The retries store their files from a
+  Celery worker, so the workers need the same default_storage as web and
+  nginx (the shared media volume, see docs/DEPLOYMENT.md).
+
+Workers only talk to HTTP and storage. Product rows are updated on the
+calling thread, which holds the tenant's database connection.
+"""
+import hashlib
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from io import BytesIO
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from main.models import Product
+from branches.services.catalog_sync import record_catalog_change
+from branches.services.pos_snapshot import invalidate_pos_snapshot
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = 'products/imported'
+THUMBNAIL_DIR = 'products/thumbs'
+MAX_REDIRECTS = 3
+
+
+class ImageFetchError(Exception):
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+_local = threading.local()
+_store_lock = threading.Lock()
+
+
+def _session():
+    """Per-thread pooled session (Session objects are not thread-safe)."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=4)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = 'Puxbay-ImageImport/1.0'
+    return session
+
+
+def _check_host(url):
+    """Only http(s) URLs on public addresses are fetched, unless IMPORT_IMAGE_ALLOW_PRIVATE_HOSTS."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ImageFetchError(f"Unsupported image URL: {url}")
+    if settings.IMPORT_IMAGE_ALLOW_PRIVATE_HOSTS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, None)}
+    except socket.gaierror as e:
+        raise ImageFetchError(f"Could not resolve {parsed.hostname}: {e}", retryable=True)
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise ImageFetchError(f"Image host {parsed.hostname} is not a public address")
+
+
+def fetch_image(url):
+    """Download `url` (following a few redirects) and return its bytes. Raises ImageFetchError."""
+    max_bytes = settings.IMPORT_IMAGE_MAX_BYTES
+    for _ in range(MAX_REDIRECTS + 1):
+        _check_host(url)
+        try:
+            response = _session().get(url, timeout=settings.IMPORT_IMAGE_TIMEOUT, stream=True, allow_redirects=False)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise ImageFetchError(f"Could not fetch {url}: {e}", retryable=True)
+        except requests.RequestException as e:
+            raise ImageFetchError(f"Could not fetch {url}: {e}")
+
+        with response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers.get('Location', ''))
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                raise ImageFetchError(f"{url} returned {response.status_code}", retryable=True)
+            if response.status_code != 200:
+                raise ImageFetchError(f"{url} returned {response.status_code}")
+            if int(response.headers.get('Content-Length') or 0) > max_bytes:
+                raise ImageFetchError(f"{url} is larger than {max_bytes} bytes")
+
+            content = bytearray()
+            try:
+                for block in response.iter_content(64 * 1024):
+                    content.extend(block)
+                    if len(content) > max_bytes:
+                        raise ImageFetchError(f"{url} is larger than {max_bytes} bytes")
+            except requests.RequestException as e:
+                raise ImageFetchError(f"Could not fetch {url}: {e}", retryable=True)
+            return bytes(content)
+    raise ImageFetchError(f"Too many redirects for {url}")
+
+
+def process_image(content):
+    """
+    Validate and re-encode downloaded bytes. Returns (extension, image bytes,
+    thumbnail bytes). Transparent images stay PNG, everything else is JPEG.
+    """
+    try:
+        with Image.open(BytesIO(content)) as probe:
+            probe.verify()
+        image = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError, ValueError) as e:
+        raise ImageFetchError(f"Not a valid image: {e}")
+
+    transparent = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if transparent:
+        image_format, extension = 'PNG', 'png'
+        image = image.convert('RGBA')
+    else:
+        image_format, extension = 'JPEG', 'jpg'
+        image = image.convert('RGB')
+
+    def encode(img):
+        output = BytesIO()
+        if image_format == 'JPEG':
+            img.save(output, image_format, quality=85, optimize=True)
+        else:
+            img.save(output, image_format, optimize=True)
+        return output.getvalue()
+
+    max_dimension = settings.IMPORT_IMAGE_MAX_DIMENSION
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    thumbnail = image.copy()
+    thumbnail.thumbnail((settings.IMPORT_IMAGE_THUMBNAIL_SIZE, settings.IMPORT_IMAGE_THUMBNAIL_SIZE), Image.LANCZOS)
+    return extension, encode(image), encode(thumbnail)
+
+
+def store_image(url):
+    """
+    Fetch, process and store one URL, retrying transient failures. Returns
+    the storage names (image, thumbnail).
+    """
+    attempts = max(settings.IMPORT_IMAGE_RETRIES, 0) + 1
+    for attempt in range(attempts):
+        try:
+            content = fetch_image(url)
+            break
+        except ImageFetchError as e:
+            if not e.retryable or attempt == attempts - 1:
+                raise
+            time.sleep(min(0.5 * 2 ** attempt, 5))
+
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    for extension in ('jpg', 'png'):
+        name = f'{IMAGE_DIR}/{digest}.{extension}'
+        thumbnail_name = f'{THUMBNAIL_DIR}/{digest}.{extension}'
+        if default_storage.exists(name) and default_storage.exists(thumbnail_name):
+            return name, thumbnail_name
+
+    extension, image_bytes, thumbnail_bytes = process_image(content)
+    name = f'{IMAGE_DIR}/{digest}.{extension}'
+    thumbnail_name = f'{THUMBNAIL_DIR}/{digest}.{extension}'
+    # Two URLs serving the same bytes may finish together; only one saves
+    with _store_lock:
+        if not (default_storage.exists(name) and default_storage.exists(thumbnail_name)):
+            name = default_storage.save(name, ContentFile(image_bytes))
+            thumbnail_name = default_storage.save(thumbnail_name, ContentFile(thumbnail_bytes))
+    return name, thumbnail_name
+
+
+class ImageIngestor:
+    """
+    Bounded concurrent image pipeline for one branch. submit() never blocks
+    on the network unless IMPORT_IMAGE_MAX_PENDING fetches are in flight;
+    close() waits for the rest and returns the stats.
+    """
+
+    def __init__(self, tenant, branch, workers=None, retry_round=0):
+        self.tenant = tenant
+        self.branch = branch
+        self.workers = workers or settings.IMPORT_IMAGE_WORKERS
+        self.retry_round = retry_round
+        self._executor = None
+        self._pending = {}      # future -> url
+        self._products = {}     # url -> product ids waiting for it
+        self._done = {}         # url -> (image, thumbnail) for later duplicates
+        self._latest = {}       # product id -> url most recently submitted for it
+        self._retry = {}        # url -> product ids to hand to the retry task
+        self.stats = {'submitted': 0, 'fetched': 0, 'deduplicated': 0, 'updated': 0, 'failed': 0, 'retrying': 0, 'errors': []}
+
+    def submit(self, product_id, url):
+        self.stats['submitted'] += 1
+        self._latest[product_id] = url
+        if url in self._done:
+            self.stats['deduplicated'] += 1
+            self._apply({url: self._done[url]}, {url: [product_id]})
+            return
+        if url in self._products:
+            self.stats['deduplicated'] += 1
+            self._products[url].append(product_id)
+            return
+
+        self._products[url] = [product_id]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='product-images')
+        self._pending[self._executor.submit(store_image, url)] = url
+        if len(self._pending) >= settings.IMPORT_IMAGE_MAX_PENDING:
+            self._collect(wait(self._pending, return_when=FIRST_COMPLETED).done)
+        else:
+            self._collect([future for future in self._pending if future.done()])
+
+    def close(self):
+        """Wait for all fetches, apply them and queue failures for retry. Returns the stats."""
+        if self._executor is not None:
+            self._collect(wait(self._pending).done)
+            self._executor.shutdown()
+            self._executor = None
+        if self._retry:
+            self._queue_retry()
+        return self.stats
+
+    def _collect(self, futures):
+        results = {}
+        waiting = {}
+        for future in futures:
+            url = self._pending.pop(future)
+            product_ids = self._products.pop(url)
+            try:
+                results[url] = self._done[url] = future.result()
+                waiting[url] = product_ids
+                self.stats['fetched'] += 1
+            except ImageFetchError as e:
+                self._fail(url, product_ids, str(e), e.retryable)
+            except Exception as e:
+                self._fail(url, product_ids, f"{url}: {e}", True)
+        if results:
+            self._apply(results, waiting)
+
+    def _fail(self, url, product_ids, message, retryable):
+        logger.info(f"Product image failed ({message})")
+        if retryable and self.retry_round < settings.IMPORT_IMAGE_RETRY_ROUNDS:
+            self._retry[url] = product_ids
+            self.stats['retrying'] += 1
+        else:
+            self.stats['failed'] += 1
+            if len(self.stats['errors']) < 20:
+                self.stats['errors'].append(message)
+
+    def _apply(self, results, waiting):
+        updated = []
+        with transaction.atomic():
+            for url, (name, thumbnail_name) in results.items():
+                # A product re-submitted with another URL keeps the newer one
+                product_ids = [pk for pk in waiting[url] if self._latest.get(pk) == url]
+                if product_ids:
+                    Product.objects.filter(pk__in=product_ids).update(
+                        image=name, thumbnail=thumbnail_name, updated_at=timezone.now()
+                    )
+                    updated.extend(product_ids)
+            if updated:
+                record_catalog_change('product', self.tenant.pk, updated)
+                invalidate_pos_snapshot(branch_ids=[self.branch.pk])
+        self.stats['updated'] += len(updated)
+
+    def _queue_retry(self):
+        from branches.tasks import retry_product_images_task
+
+        jobs = [[url, [str(pk) for pk in product_ids]] for url, product_ids in self._retry.items()]
+        self._retry = {}
+        try:
+            retry_product_images_task.apply_async(
+                (str(self.tenant.pk), str(self.branch.pk), jobs, self.retry_round + 1),
+                countdown=settings.IMPORT_IMAGE_RETRY_DELAY * (2 ** self.retry_round)
+            )
+        except Exception as e:
+            logger.warning(f"Could not queue product image retry: {e}")
+            self.stats['failed'] += self.stats['retrying']
+            self.stats['retrying'] = 0
+
+
+def ingest_product_images(tenant, branch, jobs, retry_round=0):
+    """Fetch images for (product_id, url) pairs and attach them. Returns the stats."""
+    ingestor = ImageIngestor(tenant, branch, retry_round=retry_round)
+    for product_id, url in jobs:
+        ingestor.submit(product_id, url)
+    return ingestor.close()
@@ -0,0 +1,215 @@
+"""
+Chunked product import (InventoryService.import_from_parser).
+
+Rows are pulled from the parser's generator PRODUCT_IMPORT_CHUNK_SIZE at a
+time, so only one chunk is held in memory. Per chunk:
+
+1. Validate every row with InventoryService.parse_row.
+2. Resolve categories from a cache loaded once per file; missing ones are
+   bulk-created.
+3. Write the products with INSERT ... ON CONFLICT (branch_id, sku) DO UPDATE
+   (one statement per set of filled-in optional columns, usually one). If the
+   statement fails, the chunk is retried row by row to report the bad rows.
+4. Report progress.
+
+bulk_create sends no post_save signals, so the importer records the catalog
+delta versions, invalidates the branch's POS snapshot and bumps
+TenantMetrics.total_products itself. Per-product low-stock notifications and
+webhooks are not sent for imported rows.
+
+Image URLs are handed to an ImageIngestor (services/product_images.py) once
+their chunk commits; the images download in the background while later chunks
+are written.
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from main.models import Product, Category, TenantMetrics
+from branches.services.catalog_sync import record_catalog_change
+from branches.services.pos_snapshot import invalidate_pos_snapshot
+from branches.services.product_images import ImageIngestor
+
+logger = logging.getLogger(__name__)
+
+# Error messages kept in the result; the total is always counted
+MAX_REPORTED_ERRORS = 100
+
+
+class ProductImporter:
+    def __init__(self, service, chunk_size=None):
+        self.service = service
+        self.tenant = service.tenant
+        self.branch = service.branch
+        self.chunk_size = chunk_size or getattr(settings, 'PRODUCT_IMPORT_CHUNK_SIZE', 1000)
+        self.categories = None
+        self.images = None
+
+    def run(self, parser, progress=None):
+        """
+        Import every row after the header. `progress(result)` is called after
+        each chunk. Returns counts plus the first MAX_REPORTED_ERRORS errors.
+        """
+        result = {
+            'processed': 0,
+            'success': 0,
+            'created': 0,
+            'updated': 0,
+            'skipped': 0,
+            'total_errors': 0,
+            'errors': [],
+        }
+
+        rows = parser.parse()
+        next(rows, None)  # Skip header
+
+        try:
+            chunk = []
+            for row_idx, row in enumerate(rows, start=2):
+                chunk.append((row_idx, row))
+                if len(chunk) >= self.chunk_size:
+                    self.process_chunk(chunk, result)
+                    chunk = []
+                    if progress:
+                        progress(result)
+            if chunk:
+                self.process_chunk(chunk, result)
+                if progress:
+                    progress(result)
+        finally:
+            if self.images is not None:
+                result['images'] = self.images.close()
+        return result
+
+    def process_chunk(self, chunk, result):
+        # Last row wins when a SKU repeats, as with row-by-row upserts
+        valid = {}
+        row_counts = {}
+        for row_idx, row in chunk:
+            status, value = self.service.parse_row(row, row_idx)
+            if status == 'skipped':
+                result['skipped'] += 1
+                if result['skipped'] <= 5:  # Only collect first 5 previews
+                    self._add_message(result, f"Diagnostic (Row {row_idx}): {value}")
+            elif status == 'error':
+                self._add_error(result, value)
+            else:
+                valid[value['sku']] = (row_idx, value)
+                row_counts[value['sku']] = row_counts.get(value['sku'], 0) + 1
+        result['processed'] += len(chunk)
+        if not valid:
+            return
+
+        self._resolve_categories([value['category_name'] for _, value in valid.values()])
+
+        items = list(valid.values())
+        try:
+            with transaction.atomic():
+                written, created = self._write(items)
+        except Exception as e:
+            logger.info(f"Import chunk failed ({str(e)}), retrying row by row")
+            written, created = [], 0
+            for item in items:
+                try:
+                    with transaction.atomic():
+                        row_written, row_created = self._write([item])
+                    written.extend(row_written)
+                    created += row_created
+                except Exception as row_err:
+                    self._add_error(result, f"Row {item[0]}: {str(row_err)}")
+
+        result['success'] += sum(row_counts[product.sku] for product, _ in written)
+        result['created'] += created
+        result['updated'] += len(written) - created
+
+        for product, image_url in written:
+            if image_url and image_url.startswith('http'):
+                if self.images is None:
+                    self.images = ImageIngestor(self.tenant, self.branch)
+                self.images.submit(product.pk, image_url)
+
+    def _resolve_categories(self, names):
+        """Fill the per-file category cache (lowercased name -> id), creating missing categories."""
+        if self.categories is None:
+            self.categories = {}
+            for category_id, name in Category.objects.filter(branch=self.branch).values_list('id', 'name'):
+                self.categories.setdefault(name.lower(), category_id)
+
+        missing = {}
+        for name in names:
+            if name and name.lower() not in self.categories:
+                missing.setdefault(name.lower(), name)
+        if not missing:
+            return
+
+        with transaction.atomic():
+            created = Category.objects.bulk_create([
+                Category(tenant=self.tenant, branch=self.branch, name=name) for name in missing.values()
+            ])
+            record_catalog_change('category', self.tenant.pk, [category.pk for category in created])
+            invalidate_pos_snapshot(branch_ids=[self.branch.pk])
+        for category in created:
+            self.categories[category.name.lower()] = category.pk
+
+    def _write(self, items):
+        """
+        Upsert `items` ((row_idx, values) pairs). Returns ([(product, image_url)], created count).
+        Must run inside a transaction.
+        """
+        skus = [values['sku'] for _, values in items]
+        existing = dict(Product.objects.filter(branch=self.branch, sku__in=skus).values_list('sku', 'id'))
+
+        # Optional columns are only updated when filled in, so rows are grouped
+        # by the columns they set
+        groups = {}
+        for _, values in items:
+            groups.setdefault(tuple(sorted(values['fields'])), []).append(values)
+
+        written = []
+        for columns, group in groups.items():
+            products = [
+                Product(
+                    tenant=self.tenant,
+                    branch=self.branch,
+                    sku=values['sku'],
+                    category_id=self.categories.get(values['category_name'].lower()) if values['category_name'] else None,
+                    **values['fields']
+                )
+                for values in group
+            ]
+            # bulk_create does not copy back the primary key of objects that
+            # already have one (the uuid default), so updated rows get theirs here
+            for product in products:
+                if product.sku in existing:
+                    product.id = existing[product.sku]
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['branch', 'sku'],
+                update_fields=list(columns) + ['category', 'tenant', 'updated_at'],
+            )
+            written.extend(zip(products, [values['image_url'] for values in group]))
+
+        # A SKU created by someone else since the lookup was updated instead,
+        # under the id it already had
+        new_skus = set(skus) - set(existing)
+        if new_skus:
+            ids = dict(Product.objects.filter(branch=self.branch, sku__in=new_skus).values_list('sku', 'id'))
+            for product, _ in written:
+                if product.sku in ids:
+                    product.id = ids[product.sku]
+
+        created = len(new_skus)
+        record_catalog_change('product', self.tenant.pk, [product.pk for product, _ in written])
+        invalidate_pos_snapshot(branch_ids=[self.branch.pk])
+        if created:
+            TenantMetrics.objects.filter(tenant=self.tenant).update(total_products=F('total_products') + created)
+        return written, created
+
+    def _add_error(self, result, message):
+        result['total_errors'] += 1
+        self._add_message(result, message)
+
+    def _add_message(self, result, message):
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append(message)
@@ -0,0 +1,192 @@
+"""
+Cached report payloads, versioned by the writes that change them.
+
+cached_report() keeps the result of a report builder in the cache under
+(tenant, branch, report, date range, params). Every tenant and branch has two
+generation counters that are part of the key:
+
+- 'live' is bumped by orders, expenses and returns dated today,
+- 'history' by rows dated before today (back-dated expenses, voiding an old
+  order, a return against last week's sale).
+
+A range that includes today (or is open-ended) is keyed on both counters and
+kept for REPORT_CACHE_TTL_LIVE; its key also carries today's date, so rolling
+periods move on at midnight. A closed range is keyed on 'history' alone, so
+the day's sales do not evict it, and is kept for REPORT_CACHE_TTL_CLOSED.
+Signals in main/signals.py bump the counters after commit; a build that raced
+with a write is stored under a generation nobody asks for.
+
+Hits and misses are counted in the cache (across workers) and reported by
+report_cache_stats() on the metrics endpoint.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_STATS_KEYS = {'hits': 'report_cache:hits', 'misses': 'report_cache:misses'}
+
+
+def _scope(tenant_id, branch_id):
+    return f"branch:{branch_id}" if branch_id else f"tenant:{tenant_id}"
+
+
+def _generation_key(scope, kind):
+    return f"report_gen:{scope}:{kind}"
+
+
+def _new_generation():
+    # A lost (evicted) counter restarts from the clock, never from a value an
+    # older payload may still be cached under
+    return time.time_ns() // 1000
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        # A field assigned from raw input keeps its string until reloaded
+        value = parse_datetime(value) or parse_date(value)
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _get_generations(keys):
+    found = cache.get_many(keys)
+    for key in keys:
+        if found.get(key) is None:
+            cache.add(key, _new_generation(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _count(outcome):
+    key = _STATS_KEYS[outcome]
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception:
+        pass
+
+
+def cached_report(report, tenant_id, build, branch_id=None, start=None, end=None, params=None):
+    """
+    Return build() for `report`, from the cache when a current copy exists.
+
+    start and end (dates or datetimes; None leaves that end open) are the
+    range the report covers, and `params` holds any other input the payload
+    depends on. build() must return plain picklable data, not querysets.
+    Reports without a branch are invalidated by writes to any branch.
+    """
+    today = timezone.localdate()
+    start, end = _as_date(start), _as_date(end)
+    live = end is None or end >= today
+    timeout = settings.REPORT_CACHE_TTL_LIVE if live else settings.REPORT_CACHE_TTL_CLOSED
+    if timeout <= 0:
+        return build()
+
+    scope = _scope(tenant_id, branch_id)
+    try:
+        generations = _get_generations([
+            _generation_key(scope, kind) for kind in (('history', 'live') if live else ('history',))
+        ])
+        digest = hashlib.md5(json.dumps(params or {}, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+        key = f"report:{tenant_id}:{branch_id or '-'}:{report}:{start}:{end}:{digest}:{'.'.join(map(str, generations))}"
+        if live:
+            key += f":{today}"
+        payload = cache.get(key)
+    except Exception as e:
+        # Cache unavailable: build uncached
+        logger.warning(f"Report cache unavailable for {report}: {str(e)}")
+        return build()
+
+    if payload is not None:
+        _count('hits')
+        return payload
+
+    _count('misses')
+    payload = build()
+    try:
+        cache.set(key, payload, timeout)
+    except Exception as e:
+        logger.warning(f"Failed to cache report {report}: {str(e)}")
+    return payload
+
+
+def report_cache_stats():
+    """Hits, misses and hit ratio of cached_report() since the counters were last cleared."""
+    try:
+        values = cache.get_many(list(_STATS_KEYS.values()))
+    except Exception:
+        return {'hits': None, 'misses': None, 'hit_ratio': None}
+    hits = values.get(_STATS_KEYS['hits'], 0)
+    misses = values.get(_STATS_KEYS['misses'], 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+
+def invalidate_reports(tenant_id, writes):
+    """
+    Mark the cached reports of `tenant_id` stale once the current transaction
+    commits. `writes` holds the (branch_id, day) of each row written; day is a
+    date or datetime, and None counts as today. Each counter is bumped once
+    per transaction however many rows were written.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = set()
+    today = timezone.localdate()
+    for branch_id, day in writes:
+        day = _as_date(day)
+        kind = 'history' if day is not None and day < today else 'live'
+        if tenant_id:
+            pending.add(_generation_key(_scope(tenant_id, None), kind))
+        if branch_id:
+            pending.add(_generation_key(_scope(None, branch_id), kind))
+    transaction.on_commit(_flush_invalidations)
+
+
+def _flush_invalidations():
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+    for key in pending:
+        try:
+            # incr() raises on a missing key; add() starts the counter instead
+            if not cache.add(key, _new_generation(), timeout=None):
+                cache.incr(key)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate cached reports ({key}): {str(e)}")
+
+
+def remember_report_scope(instance, date_field):
+    """post_init: note the branch and day a row was loaded with."""
+    # Read from __dict__ so deferred fields are not fetched
+    instance._report_scope = (instance.__dict__.get('branch_id'), instance.__dict__.get(date_field))
+
+
+def record_report_write(instance, date_field):
+    """
+    post_save / post_delete of an Order, Expense or Return: invalidate the
+    reports covering the row's day, and the day and branch it was loaded
+    with when an edit moved it.
+    """
+    writes = [(instance.branch_id, getattr(instance, date_field))]
+    previous = getattr(instance, '_report_scope', None)
+    if previous and previous[1] is not None and previous != writes[0]:
+        writes.append(previous)
+    invalidate_reports(instance.tenant_id, writes)
@@ -1,9 +1,16 @@
 from django.db.models import Sum, Count, F, Case, When, Value, DecimalField
 from django.utils import timezone
 from datetime import timedelta
-from main.models import Order, OrderItem, Product
+from main.models import Order, Product, BranchSalesDaily, ProductSalesDaily
+from branches.services.sales_rollup import created_between, dates_between
 
 class ReportingService:
+    """
+    Branch and company reports. Sales figures are read from the daily rollup
+    tables (see branches/services/sales_rollup.py); a start or end date of
+    None leaves that side of the range open.
+    """
+
     def __init__(self, tenant, branch):
         self.tenant = tenant
         self.branch = branch
@@ -43,42 +50,48 @@ class ReportingService:
             
         return start, end
 
+    def _branch_days(self, start_date, end_date):
+        return BranchSalesDaily.objects.filter(branch=self.branch, **dates_between(start_date, end_date))
+
+    def _product_days(self, start_date, end_date):
+        return ProductSalesDaily.objects.filter(branch=self.branch, **dates_between(start_date, end_date))
+
+    def _company_branch_days(self, start_date, end_date):
+        return BranchSalesDaily.objects.filter(tenant=self.tenant, **dates_between(start_date, end_date))
+
+    def _company_product_days(self, start_date, end_date):
+        return ProductSalesDaily.objects.filter(tenant=self.tenant, **dates_between(start_date, end_date))
+
+    @staticmethod
+    def _with_margin(product_sales):
+        return product_sales.annotate(
+            profit=F('revenue') - F('cost'),
+            margin_percent=Case(
+                When(revenue__gt=0, then=(F('profit') * 100.0 / F('revenue'))),
+                default=Value(0),
+                output_field=DecimalField()
+            )
+        )
+
     def get_top_products(self, start_date, end_date, limit=10):
         """
         Calculates top selling products by quantity.
         """
-        orders_query = Order.objects.filter(
-            branch=self.branch, 
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        items_query = OrderItem.objects.filter(order__in=orders_query)
-        
-        return items_query.values(
+        return self._product_days(start_date, end_date).values(
             'product__id', 'product__name', 'product__sku'
         ).annotate(
             quantity_sold=Sum('quantity'),
-            revenue=Sum(F('price') * F('quantity'))
+            revenue=Sum('total_revenue')
         ).order_by('-quantity_sold')[:limit]
 
     def get_daily_revenue(self, start_date, end_date):
         """
         Calculates daily revenue for chart visualization.
         """
-        from django.db.models.functions import TruncDay
-        
-        orders_query = Order.objects.filter(
-            branch=self.branch, 
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-
-        return orders_query.annotate(
-            day=TruncDay('created_at')
-        ).values('day').annotate(
-            revenue=Sum('total_amount')
+        return self._branch_days(start_date, end_date).values(
+            day=F('date')
+        ).annotate(
+            revenue=Sum('total_revenue')
         ).order_by('day')
 
     def get_cashier_performance(self, start_date, end_date):
@@ -88,8 +101,7 @@ class ReportingService:
         orders_query = Order.objects.filter(
             branch=self.branch, 
             status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
+            **created_between(start_date, end_date)
         )
         
         return orders_query.values(
@@ -103,17 +115,11 @@ class ReportingService:
         """
         Calculates key financial metrics for the branch within a date range.
         """
-        orders_query = Order.objects.filter(
-            branch=self.branch, 
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        
-        metrics = orders_query.aggregate(
-            revenue=Sum('total_amount'),
-            order_count=Count('id'),
-            total_items=Sum('items__quantity')
+        metrics = self._branch_days(start_date, end_date).aggregate(
+            revenue=Sum('total_revenue'),
+            cost=Sum('total_cost'),
+            order_count=Sum('order_count'),
+            total_items=Sum('items_sold')
         )
         
         total_revenue = metrics['revenue'] or 0
@@ -122,12 +128,7 @@ class ReportingService:
         avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
         
         # Profit Calculation
-        items_query = OrderItem.objects.filter(order__in=orders_query)
-        total_cost = items_query.aggregate(
-            cost=Sum(F('product__cost_price') * F('quantity'))
-        )['cost'] or 0
-        
-        total_profit = total_revenue - total_cost
+        total_profit = total_revenue - (metrics['cost'] or 0)
         profit_margin = (total_profit * 100 / total_revenue) if total_revenue > 0 else 0
         
         return {
@@ -143,52 +144,22 @@ class ReportingService:
         """
         Calculates product-related metrics: top products, margins, and stock status.
         """
-        orders_query = Order.objects.filter(
-            branch=self.branch, 
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        items_query = OrderItem.objects.filter(order__in=orders_query)
-        
-        # 1. Top Products
-        top_products = items_query.values(
-            'product__name', 'product__sku'
-        ).annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum(F('price') * F('quantity'))
-        ).order_by('-quantity_sold')[:limit]
-        
-        # 2. Best Sellers
-        best_sellers = items_query.values(
+        product_sales = self._product_days(start_date, end_date).values(
             'product__id', 'product__name', 'product__sku'
         ).annotate(
             quantity_sold=Sum('quantity'),
-            revenue=Sum(F('price') * F('quantity'))
-        ).order_by('-quantity_sold')[:limit]
+            revenue=Sum('total_revenue'),
+            cost=Sum('total_cost')
+        )
+        
+        # 1. Top Products / 2. Best Sellers
+        best_sellers = product_sales.order_by('-quantity_sold')[:limit]
         
         # 3. Worst Performers
-        worst_performers = items_query.values(
-            'product__id', 'product__name', 'product__sku'
-        ).annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum(F('price') * F('quantity'))
-        ).order_by('quantity_sold')[:limit]
+        worst_performers = product_sales.order_by('quantity_sold')[:limit]
 
         # 4. Product Margins
-        product_margins = items_query.values(
-            'product__id', 'product__name', 'product__sku'
-        ).annotate(
-            revenue=Sum(F('price') * F('quantity')),
-            cost=Sum(F('product__cost_price') * F('quantity'))
-        ).annotate(
-            profit=F('revenue') - F('cost'),
-            margin_percent=Case(
-                When(revenue__gt=0, then=(F('profit') * 100.0 / F('revenue'))),
-                default=Value(0),
-                output_field=DecimalField()
-            )
-        ).order_by('-profit')[:limit]
+        product_margins = self._with_margin(product_sales).order_by('-profit')[:limit]
         
         # 5. Stock Status
         all_products = Product.objects.filter(branch=self.branch, is_active=True)
@@ -205,7 +176,7 @@ class ReportingService:
         out_of_stock_count = all_products.filter(stock_quantity=0).count()
         
         return {
-            'top_products': top_products,
+            'top_products': best_sellers,
             'best_sellers': best_sellers,
             'worst_performers': worst_performers,
             'product_margins': product_margins,
@@ -219,16 +190,11 @@ class ReportingService:
         """
         Calculates aggregate financial metrics across all branches for the tenant.
         """
-        orders_query = Order.objects.filter(
-            tenant=self.tenant,
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        
-        metrics = orders_query.aggregate(
-            revenue=Sum('total_amount'),
-            order_count=Count('id')
+        branch_days = self._company_branch_days(start_date, end_date)
+        metrics = branch_days.aggregate(
+            revenue=Sum('total_revenue'),
+            cost=Sum('total_cost'),
+            order_count=Sum('order_count')
         )
         
         total_revenue = metrics['revenue'] or 0
@@ -236,22 +202,13 @@ class ReportingService:
         avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
         
         # Profit Calculation (Aggregate across all branches for tenant)
-        items_query = OrderItem.objects.filter(order__in=orders_query)
-        total_cost = items_query.aggregate(
-            cost=Sum(F('product__cost_price') * F('quantity'))
-        )['cost'] or 0
-        total_profit = total_revenue - total_cost
+        total_profit = total_revenue - (metrics['cost'] or 0)
         profit_margin = (total_profit * 100 / total_revenue) if total_revenue > 0 else 0
         
         # Branch-wise breakdown
-        branch_performance = Order.objects.filter(
-            tenant=self.tenant,
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        ).values('branch__id', 'branch__name').annotate(
-            revenue=Sum('total_amount'),
-            orders=Count('id')
+        branch_performance = branch_days.values('branch__id', 'branch__name').annotate(
+            revenue=Sum('total_revenue'),
+            orders=Sum('order_count')
         ).order_by('-revenue')
         
         return {
@@ -281,19 +238,13 @@ class ReportingService:
         out_of_stock_count = all_products.filter(stock_quantity=0).count()
         
         # Company-wide product margins
-        items_query = OrderItem.objects.filter(order__tenant=self.tenant, order__status='completed')
-        product_margins = items_query.values(
-            'product__id', 'product__name', 'product__sku'
-        ).annotate(
-            revenue=Sum(F('price') * F('quantity')),
-            cost=Sum(F('product__cost_price') * F('quantity')),
-            quantity_sold=Sum('quantity')
-        ).annotate(
-            profit=F('revenue') - F('cost'),
-            margin_percent=Case(
-                When(revenue__gt=0, then=(F('profit') * 100.0 / F('revenue'))),
-                default=Value(0),
-                output_field=DecimalField()
+        product_margins = self._with_margin(
+            self._company_product_days(None, None).values(
+                'product__id', 'product__name', 'product__sku'
+            ).annotate(
+                revenue=Sum('total_revenue'),
+                cost=Sum('total_cost'),
+                quantity_sold=Sum('quantity')
             )
         ).order_by('-profit')[:limit]
         
@@ -308,18 +259,10 @@ class ReportingService:
         """
         Calculates top selling products across all company branches.
         """
-        orders_query = Order.objects.filter(
-            tenant=self.tenant,
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        items_query = OrderItem.objects.filter(order__in=orders_query)
-        
-        return items_query.values(
+        return self._company_product_days(start_date, end_date).values(
             'product__id', 'product__name', 'product__sku'
         ).annotate(
-            revenue=Sum(F('price') * F('quantity')),
+            revenue=Sum('total_revenue'),
             quantity_sold=Sum('quantity')
         ).order_by('-revenue')[:limit]
 
@@ -327,20 +270,12 @@ class ReportingService:
         """
         Calculates revenue breakdown by category across all branches.
         """
-        orders_query = Order.objects.filter(
-            tenant=self.tenant,
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        items_query = OrderItem.objects.filter(order__in=orders_query)
-        
-        return items_query.filter(
+        return self._company_product_days(start_date, end_date).filter(
             product__category__isnull=False
         ).values(
             'product__category__name'
         ).annotate(
-            revenue=Sum(F('price') * F('quantity')),
+            revenue=Sum('total_revenue'),
             quantity_sold=Sum('quantity')
         ).order_by('-revenue')
 
@@ -348,19 +283,11 @@ class ReportingService:
         """
         Calculates revenue breakdown by product category.
         """
-        orders_query = Order.objects.filter(
-            branch=self.branch, 
-            status='completed',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        items_query = OrderItem.objects.filter(order__in=orders_query)
-        
-        return items_query.filter(
+        return self._product_days(start_date, end_date).filter(
             product__category__isnull=False
         ).values(
             'product__category__id', 'product__category__name'
         ).annotate(
-            revenue=Sum(F('price') * F('quantity')),
+            revenue=Sum('total_revenue'),
             quantity_sold=Sum('quantity')
         ).order_by('-revenue')
@@ -0,0 +1,271 @@
+"""
+Daily sales rollups behind the branch and company reports.
+
+main.BranchSalesDaily holds one row per branch, day and payment method
+(revenue, cost, orders, items) and main.ProductSalesDaily one row per branch,
+product and day (quantity, revenue, cost). Reports sum these rows instead of
+scanning orders, so their cost grows with days x products, not with orders.
+
+The tables are kept current by signals in main/signals.py: when an order
+becomes 'completed' its totals are added, and when a completed order is
+voided (or deleted) they are subtracted. Deltas are applied with a single
+INSERT ... ON CONFLICT per table once the order's transaction commits, after
+its items have been written.
+
+rebuild_sales_rollups() recomputes a date range from the orders. It backs the
+backfill_sales_rollups command and the nightly rebuild of recent days, which
+also repairs drift from writes that bypass signals (queryset.update()).
+Rebuilding the current day can race with live deltas, so the nightly task
+only touches closed days.
+
+Notes:
+- Days are calendar days in the current time zone, like `created_at__date`.
+- Cost is the item's cost_price snapshot, or the product's cost price at the
+  time the order is rolled up when no snapshot was taken.
+- Orders without a branch are not rolled up.
+"""
+import logging
+import uuid
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
+from django.db import connection, transaction
+from django.db.models import Sum, Count, F, Q, Case, When, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT when rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+_MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+LINE_REVENUE = ExpressionWrapper(F('price') * F('quantity'), output_field=_MONEY)
+
+LINE_COST = ExpressionWrapper(
+    Case(
+        When(cost_price__gt=0, then=F('cost_price')),
+        default=Coalesce(F('product__cost_price'), Value(Decimal('0'))),
+        output_field=_MONEY,
+    ) * F('quantity'),
+    output_field=_MONEY,
+)
+
+
+def created_between(start_date, end_date, field='created_at'):
+    """
+    Filter kwargs selecting `field` within the calendar days start_date..end_date
+    (either may be None for an open range). Unlike `__date` lookups these
+    compare the raw column, so its index is used.
+    """
+    bounds = {}
+    if start_date:
+        bounds[f'{field}__gte'] = timezone.make_aware(datetime.combine(start_date, time.min))
+    if end_date:
+        bounds[f'{field}__lt'] = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return bounds
+
+
+def dates_between(start_date, end_date, field='date'):
+    """Filter kwargs for a DateField range; either end may be None."""
+    bounds = {}
+    if start_date:
+        bounds[f'{field}__gte'] = start_date
+    if end_date:
+        bounds[f'{field}__lte'] = end_date
+    return bounds
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+def remember_order_status(order):
+    """post_init: note the status the order was loaded with."""
+    # Read from __dict__ so a deferred status is not fetched
+    order._rollup_status = order.__dict__.get('status')
+
+
+def record_order_status(order, created):
+    """
+    post_save: queue the order's totals when it moves into 'completed' (+1)
+    or out of it (-1).
+    """
+    status = order.__dict__.get('status')
+    if status is None:
+        return
+    was_counted = not created and getattr(order, '_rollup_status', None) == 'completed'
+    order._rollup_status = status
+    counted = status == 'completed'
+    if counted == was_counted or not order.branch_id:
+        return
+    transaction.on_commit(partial(apply_order_deltas, connection.schema_name, [order.pk], 1 if counted else -1))
+
+
+def record_order_deleted(order):
+    """pre_delete: subtract a completed order while its items still exist."""
+    if order.__dict__.get('status') != 'completed' or not order.branch_id:
+        return
+    branch_rows, product_rows = order_contributions([order.pk])
+    transaction.on_commit(partial(_apply_in_schema, connection.schema_name, branch_rows, product_rows, -1))
+
+
+def apply_order_deltas(schema_name, order_ids, sign):
+    """Add (sign=1) or subtract (sign=-1) the totals of the given orders."""
+    try:
+        with schema_context(schema_name):
+            branch_rows, product_rows = order_contributions(order_ids)
+            apply_deltas(branch_rows, product_rows, sign)
+    except Exception as e:
+        # The nightly rebuild repairs the affected days
+        logger.error(f"Could not update sales rollups for orders {order_ids}: {e}")
+
+
+def _apply_in_schema(schema_name, branch_rows, product_rows, sign):
+    try:
+        with schema_context(schema_name):
+            apply_deltas(branch_rows, product_rows, sign)
+    except Exception as e:
+        logger.error(f"Could not update sales rollups: {e}")
+
+
+def order_contributions(order_ids):
+    """
+    Totals of the given orders as rollup rows:
+    ({(tenant_id, branch_id, date, payment_method): [revenue, cost, orders, items]},
+     {(tenant_id, branch_id, product_id, date): [quantity, revenue, cost]})
+    """
+    from main.models import Order, OrderItem
+
+    orders = {}
+    branch_rows = {}
+    for pk, tenant_id, branch_id, created_at, method, total in Order.objects.filter(
+        pk__in=order_ids, branch__isnull=False
+    ).values_list('pk', 'tenant_id', 'branch_id', 'created_at', 'payment_method', 'total_amount'):
+        key = (tenant_id, branch_id, timezone.localdate(created_at), method)
+        orders[pk] = key
+        row = branch_rows.setdefault(key, [Decimal('0'), Decimal('0'), 0, 0])
+        row[0] += total
+        row[2] += 1
+
+    product_rows = {}
+    items = OrderItem.objects.filter(order_id__in=orders).annotate(
+        line_revenue=LINE_REVENUE, line_cost=LINE_COST
+    ).values_list('order_id', 'product_id', 'quantity', 'line_revenue', 'line_cost')
+    for order_id, product_id, quantity, revenue, cost in items:
+        tenant_id, branch_id, day, method = key = orders[order_id]
+        row = branch_rows[key]
+        row[1] += cost
+        row[3] += quantity
+        if product_id:
+            row = product_rows.setdefault((tenant_id, branch_id, product_id, day), [0, Decimal('0'), Decimal('0')])
+            row[0] += quantity
+            row[1] += revenue
+            row[2] += cost
+    return branch_rows, product_rows
+
+
+def apply_deltas(branch_rows, product_rows, sign=1):
+    """
+    Add the rows (as returned by order_contributions) to the rollup tables,
+    multiplied by `sign`. Rows left empty by a subtraction are removed.
+    """
+    from main.models import BranchSalesDaily, ProductSalesDaily
+
+    if not branch_rows and not product_rows:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Sorted so concurrent upserts lock rows in the same order
+        if branch_rows:
+            _upsert(
+                cursor, BranchSalesDaily._meta.db_table,
+                ['tenant_id', 'branch_id', 'date', 'payment_method'],
+                ['total_revenue', 'total_cost', 'order_count', 'items_sold'],
+                [key + tuple(value * sign for value in values) for key, values in sorted(branch_rows.items(), key=_sort_key)],
+                conflict=['branch_id', 'date', 'payment_method'],
+            )
+        if product_rows:
+            _upsert(
+                cursor, ProductSalesDaily._meta.db_table,
+                ['tenant_id', 'branch_id', 'product_id', 'date'],
+                ['quantity', 'total_revenue', 'total_cost'],
+                [key + tuple(value * sign for value in values) for key, values in sorted(product_rows.items(), key=_sort_key)],
+                conflict=['branch_id', 'product_id', 'date'],
+            )
+        if sign < 0:
+            branch_ids = {key[1] for key in branch_rows} | {key[1] for key in product_rows}
+            days = {key[2] for key in branch_rows} | {key[3] for key in product_rows}
+            BranchSalesDaily.objects.filter(branch_id__in=branch_ids, date__in=days, order_count__lte=0).delete()
+            ProductSalesDaily.objects.filter(branch_id__in=branch_ids, date__in=days, quantity__lte=0).delete()
+
+
+def _sort_key(item):
+    return tuple(str(part) for part in item[0])
+
+
+def _upsert(cursor, table, key_columns, value_columns, rows, conflict):
+    columns = ['id'] + key_columns + value_columns
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    updates = ', '.join(f'{column} = {table}.{column} + EXCLUDED.{column}' for column in value_columns)
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(rows))} "
+        f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {updates}",
+        [value for row in rows for value in (uuid.uuid4(),) + tuple(row)]
+    )
+
+
+# ---------------------------------------------------------------------------
+# Rebuilds
+# ---------------------------------------------------------------------------
+
+def rebuild_sales_rollups(tenant, start_date, end_date, branch_ids=None):
+    """
+    Recompute the rollups of `tenant` for the days start_date..end_date from
+    its completed orders, replacing what is stored. Returns the number of
+    (branch rows, product rows) written.
+    """
+    from main.models import Order, OrderItem, BranchSalesDaily, ProductSalesDaily
+
+    orders = Order.objects.filter(
+        tenant=tenant, status='completed', branch__isnull=False, **created_between(start_date, end_date)
+    )
+    if branch_ids is not None:
+        orders = orders.filter(branch_id__in=branch_ids)
+    items = OrderItem.objects.filter(order__in=orders).annotate(day=TruncDate('order__created_at'))
+
+    branch_rows = {}
+    for row in orders.annotate(day=TruncDate('created_at')).values('branch_id', 'day', 'payment_method').annotate(
+        revenue=Sum('total_amount'), order_count=Count('id')
+    ).order_by():
+        branch_rows[(row['branch_id'], row['day'], row['payment_method'])] = BranchSalesDaily(
+            tenant=tenant, branch_id=row['branch_id'], date=row['day'], payment_method=row['payment_method'],
+            total_revenue=row['revenue'], order_count=row['order_count']
+        )
+    for row in items.values('order__branch_id', 'day', 'order__payment_method').annotate(
+        items_sold=Sum('quantity'), cost=Sum(LINE_COST)
+    ).order_by():
+        rollup = branch_rows[(row['order__branch_id'], row['day'], row['order__payment_method'])]
+        rollup.items_sold = row['items_sold']
+        rollup.total_cost = row['cost']
+
+    product_rows = [
+        ProductSalesDaily(
+            tenant=tenant, branch_id=row['order__branch_id'], product_id=row['product_id'], date=row['day'],
+            quantity=row['units'], total_revenue=row['revenue'], total_cost=row['cost']
+        )
+        for row in items.filter(product__isnull=False).values('order__branch_id', 'product_id', 'day').annotate(
+            units=Sum('quantity'), revenue=Sum(LINE_REVENUE), cost=Sum(LINE_COST)
+        ).order_by()
+    ]
+
+    stale = Q(tenant=tenant, **dates_between(start_date, end_date))
+    if branch_ids is not None:
+        stale &= Q(branch_id__in=branch_ids)
+    with transaction.atomic():
+        BranchSalesDaily.objects.filter(stale).delete()
+        ProductSalesDaily.objects.filter(stale).delete()
+        BranchSalesDaily.objects.bulk_create(branch_rows.values(), batch_size=REBUILD_BATCH_SIZE)
+        ProductSalesDaily.objects.bulk_create(product_rows, batch_size=REBUILD_BATCH_SIZE)
+    return len(branch_rows), len(product_rows)
@@ -0,0 +1,198 @@
+"""
+Stock ledger: the one place product stock is changed.
+
+Every change of a basket, transfer or order lands in a single UPDATE over
+all of its products, followed by one INSERT of the StockMovement rows, so
+concurrent tills never read-modify-write a product:
+
+- deduct() is conditional. Each row is only decremented WHERE the stock
+  (less the units other carts hold) still covers the quantity, and RETURNING
+  tells which rows were; if any product falls short nothing is applied and
+  InsufficientStock is raised.
+- apply() adds signed changes unconditionally, for stock that already moved
+  (synced offline sales, receipts, voids).
+
+Rows are locked in primary key order, so two baskets sharing products wait
+for each other instead of deadlocking. The stock column is a
+PositiveIntegerField, so the database refuses a negative balance either way.
+
+Online carts can hold units for STOCK_RESERVATION_TTL seconds with reserve().
+Held units are not sold to anybody else until they expire, are released or
+the cart checks out (deduct() with its reservation_key).
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, router, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from main.models import Product
+from branches.models import StockMovement, StockReservation
+
+
+class InsufficientStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f"Not enough stock for {', '.join(product.name for product in products)}")
+
+
+class StockLedger:
+    def __init__(self, tenant, user_profile=None):
+        self.tenant = tenant
+        self.user_profile = user_profile
+
+    def deduct(self, lines, branch=None, movement_type='sale', reference='', notes='',
+               reservation_key=None, expand_composites=True):
+        """
+        Take (product, quantity) pairs out of stock, all or none. Composite
+        products are expanded into their components unless told otherwise
+        (prefetch `components__component_product`). Units held by
+        `reservation_key` may be used and its reservations are released.
+        """
+        return self._write(
+            [(product, -quantity) for product, quantity in lines], branch, movement_type, reference, notes,
+            expand_composites, conditional=True, reservation_key=reservation_key
+        )
+
+    def apply(self, lines, branch=None, movement_type='sale', reference='', notes='', expand_composites=True):
+        """Apply signed (product, quantity_change) pairs whatever the stock."""
+        return self._write(lines, branch, movement_type, reference, notes, expand_composites, conditional=False)
+
+    def _write(self, lines, branch, movement_type, reference, notes, expand_composites, conditional, reservation_key=None):
+        expanded = []
+        for product, change in lines:
+            if expand_composites and product.is_composite:
+                for component in product.components.all():
+                    expanded.append((component.component_product, change * component.quantity))
+            else:
+                expanded.append((product, change))
+        if not expanded:
+            return []
+
+        totals = {}
+        instances = {}
+        for product, change in expanded:
+            totals[product.id] = totals.get(product.id, 0) + change
+            instances.setdefault(product.id, []).append(product)
+
+        with transaction.atomic():
+            balances = self._update(totals, conditional, reservation_key)
+            if len(balances) < len(totals):
+                # Raising rolls back the rows that were decremented
+                raise InsufficientStock([instances[product_id][0] for product_id in totals if product_id not in balances])
+
+            if reservation_key:
+                StockReservation.objects.filter(cart_key=reservation_key).delete()
+
+            # Replay the changes from the pre-update balance so each movement records its own running balance
+            running = {product_id: balances[product_id] - total for product_id, total in totals.items()}
+            movements = []
+            for product, change in expanded:
+                running[product.id] += change
+                movements.append(StockMovement(
+                    tenant=self.tenant,
+                    branch_id=branch.pk if branch else product.branch_id,
+                    product=product,
+                    quantity_change=change,
+                    balance_after=running[product.id],
+                    movement_type=movement_type,
+                    reference=reference,
+                    notes=notes,
+                    created_by=self.user_profile
+                ))
+            StockMovement.objects.bulk_create(movements)
+
+        # The UPDATE bypasses save(); keep instances current and let the low-stock
+        # receivers see the new balances
+        using = router.db_for_write(Product)
+        for product_id, products in instances.items():
+            for product in products:
+                product.stock_quantity = balances[product_id]
+            post_save.send(
+                sender=Product, instance=products[0], created=False,
+                update_fields=frozenset(['stock_quantity', 'updated_at']), raw=False, using=using
+            )
+        return movements
+
+    def _update(self, totals, conditional, reservation_key):
+        """
+        Add `totals` ({product_id: change}) to the stock in one statement and
+        return the new balance of every row that was updated.
+        """
+        product_table = Product._meta.db_table
+        changes = sorted(totals.items(), key=lambda item: str(item[0]))
+        params = [value for product_id, change in changes for value in (str(product_id), change)]
+        now = timezone.now()
+
+        held_join = condition = ''
+        ctes = [f"changes (id, change) AS (VALUES {', '.join(['(%s::uuid, %s::integer)'] * len(changes))})"]
+        if conditional and settings.STOCK_RESERVATION_TTL > 0:
+            # Units other carts still hold are not for sale
+            ctes.append(
+                f"held AS (SELECT r.product_id, SUM(r.quantity) AS quantity "
+                f"FROM {StockReservation._meta.db_table} r JOIN changes c ON c.id = r.product_id "
+                f"WHERE r.expires_at > %s AND r.cart_key <> %s GROUP BY r.product_id)"
+            )
+            params += [now, reservation_key or '']
+            held_join = "LEFT JOIN held h ON h.product_id = c.id"
+            condition = "AND (c.change >= 0 OR p.stock_quantity + c.change >= COALESCE(h.quantity, 0))"
+        elif conditional:
+            condition = "AND (c.change >= 0 OR p.stock_quantity + c.change >= 0)"
+        ctes.append(
+            f"locked AS (SELECT p.id FROM {product_table} p JOIN changes c ON c.id = p.id ORDER BY p.id FOR UPDATE OF p)"
+        )
+        params.append(now)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH {', '.join(ctes)} "
+                f"UPDATE {product_table} p SET stock_quantity = p.stock_quantity + c.change, updated_at = %s "
+                f"FROM changes c {held_join} "
+                f"WHERE p.id = c.id AND p.id IN (SELECT id FROM locked) {condition} "
+                f"RETURNING p.id, p.stock_quantity",
+                params
+            )
+            return dict(cursor.fetchall())
+
+    # ------------------------------------------------------------------
+    # Cart reservations
+    # ------------------------------------------------------------------
+
+    def reserve(self, product, quantity, reservation_key, branch=None):
+        """
+        Hold `quantity` units of `product` for the cart `reservation_key`,
+        replacing what it held before (0 releases them). Returns False, holding
+        nothing new, when fewer units are free.
+        """
+        ttl = settings.STOCK_RESERVATION_TTL
+        if ttl <= 0:
+            return True
+        if quantity <= 0:
+            self.release(reservation_key, product)
+            return True
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Serialises with sales and other carts on this product
+            stock = Product.objects.select_for_update().filter(pk=product.pk).values_list('stock_quantity', flat=True).first()
+            holds = StockReservation.objects.filter(product=product)
+            holds.filter(expires_at__lte=now).delete()
+            held = sum(holds.exclude(cart_key=reservation_key).values_list('quantity', flat=True))
+            if stock is None or stock - held < quantity:
+                return False
+            StockReservation.objects.update_or_create(
+                cart_key=reservation_key, product=product,
+                defaults={
+                    'tenant': self.tenant,
+                    'branch_id': branch.pk if branch else product.branch_id,
+                    'quantity': quantity,
+                    'expires_at': now + timedelta(seconds=ttl),
+                }
+            )
+        return True
+
+    def release(self, reservation_key, product=None):
+        """Drop the units `reservation_key` holds (of `product` only, if given)."""
+        holds = StockReservation.objects.filter(cart_key=reservation_key)
+        if product is not None:
+            holds = holds.filter(product=product)
+        holds.delete()
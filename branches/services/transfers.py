@@ -1,11 +1,20 @@
 import uuid
 import json
 from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 from main.models import Product
-from ..models import StockTransfer, StockTransferItem, StockMovement
+from main.services import outbox
+from ..models import StockTransfer, StockTransferItem
+from .stock_ledger import StockLedger
 
 class TransferService:
+    # action: (status it starts from, status it ends in, per-line marker)
+    STEPS = {
+        'ship': ('approved', 'shipped', 'shipped_at'),
+        'receive': ('shipped', 'completed', 'received_at'),
+    }
+
     def __init__(self, tenant, user_profile=None):
         self.tenant = tenant
         self.user_profile = user_profile
@@ -58,98 +67,118 @@ class TransferService:
         except StockTransfer.DoesNotExist:
             return {'status': 'error', 'message': 'Transfer not found.'}
 
-    def ship_transfer(self, transfer_id):
+    def ship_transfer(self, transfer_id, chunk_size=None):
         """
         Marks a transfer as shipped and deducts stock from the source branch.
+        With chunk_size, lines are shipped that many per transaction (see _process).
         """
-        try:
-            with transaction.atomic():
-                transfer = StockTransfer.objects.select_for_update().get(id=transfer_id, tenant=self.tenant)
-                if transfer.status != 'approved':
-                    return {'status': 'error', 'message': f'Transfer must be approved before shipping (Status: {transfer.status}).'}
-
-                # Deduct stock and record movement
-                for item in transfer.items.all():
-                    source_product = item.product
-                    
-                    if source_product.stock_quantity < item.quantity:
-                        raise Exception(f"Insufficient stock for {source_product.name} at {transfer.source_branch.name}")
-
-                    source_product.stock_quantity -= item.quantity
-                    source_product.save()
-
-                    StockMovement.objects.create(
-                        tenant=self.tenant,
-                        branch=transfer.source_branch,
-                        product=source_product,
-                        quantity_change=-item.quantity,
-                        balance_after=source_product.stock_quantity,
-                        movement_type='transfer_out',
-                        reference=transfer.reference_id,
-                        created_by=self.user_profile,
-                        notes=f"Shipped to {transfer.destination_branch.name}"
-                    )
-
-                transfer.status = 'shipped'
-                transfer.save()
-                return {'status': 'success', 'transfer': transfer}
-        except Exception as e:
-            return {'status': 'error', 'message': str(e)}
+        return self._process(transfer_id, 'ship', chunk_size)
 
-    def receive_transfer(self, transfer_id):
+    def receive_transfer(self, transfer_id, chunk_size=None):
         """
         Marks a transfer as completed and adds stock to the destination branch.
+        With chunk_size, lines are received that many per transaction (see _process).
+        """
+        return self._process(transfer_id, 'receive', chunk_size)
+
+    def progress(self, transfer):
+        """(lines applied, total lines) of the step the transfer is waiting on"""
+        marker = 'shipped_at' if transfer.status == 'approved' else 'received_at'
+        totals = transfer.items.aggregate(
+            done=Count('id', filter=Q(**{f'{marker}__isnull': False})), total=Count('id')
+        )
+        return totals['done'], totals['total']
+
+    def _process(self, transfer_id, action, chunk_size=None):
+        """
+        Bulk transfer engine. The pending lines are applied set-wise: one query
+        resolves the destination SKUs, missing products are bulk-created, each
+        side's stock changes in one ledger UPDATE and movements in one INSERT.
+
+        Without chunk_size every line is applied in one transaction. With it,
+        each chunk commits on its own and stamps its lines (shipped_at /
+        received_at), holding the transfer lock only for that chunk. Calling
+        again after a failure resumes with the lines still pending; the status
+        moves on once the last chunk is in.
         """
+        required_status, done_status, marker = self.STEPS[action]
         try:
-            with transaction.atomic():
-                transfer = StockTransfer.objects.select_for_update().get(id=transfer_id, tenant=self.tenant)
-                if transfer.status != 'shipped':
-                    return {'status': 'error', 'message': f'Cannot receive transfer. status: {transfer.status}. Must be shipped first.'}
-
-                # Add stock and record movement
-                for item in transfer.items.all():
-                    # Find or create product in destination branch
-                    dest_product = Product.objects.filter(
-                        branch=transfer.destination_branch,
-                        sku=item.product.sku,
-                        tenant=self.tenant
-                    ).first()
-
-                    if not dest_product:
-                        # Auto-create product in destination if it doesn't exist
-                        # Note: In a production app, we might want a mapping or a more robust sync
-                        source_p = item.product
-                        dest_product = Product.objects.create(
-                            tenant=self.tenant,
-                            branch=transfer.destination_branch,
-                            category=source_p.category, # Warning: Category might also be branch-tied
-                            name=source_p.name,
-                            sku=source_p.sku,
-                            price=source_p.price,
-                            stock_quantity=0,
-                            description=source_p.description,
-                            cost_price=item.transfer_price or source_p.cost_price,
-                            is_active=True
-                        )
-
-                    dest_product.stock_quantity += item.quantity
-                    dest_product.save()
-
-                    StockMovement.objects.create(
-                        tenant=self.tenant,
-                        branch=transfer.destination_branch,
-                        product=dest_product,
-                        quantity_change=item.quantity,
-                        balance_after=dest_product.stock_quantity,
-                        movement_type='transfer_in',
-                        reference=transfer.reference_id,
-                        created_by=self.user_profile,
-                        notes=f"Received from {transfer.source_branch.name}"
-                    )
-
-                transfer.status = 'completed'
-                transfer.completed_at = timezone.now()
-                transfer.save()
-                return {'status': 'success', 'transfer': transfer}
+            while True:
+                with transaction.atomic():
+                    transfer = StockTransfer.objects.select_for_update().select_related(
+                        'source_branch', 'destination_branch'
+                    ).get(id=transfer_id, tenant=self.tenant)
+                    if transfer.status != required_status:
+                        if action == 'ship':
+                            return {'status': 'error', 'message': f'Transfer must be approved before shipping (Status: {transfer.status}).'}
+                        return {'status': 'error', 'message': f'Cannot receive transfer. status: {transfer.status}. Must be shipped first.'}
+
+                    pending = transfer.items.filter(**{f'{marker}__isnull': True}).select_related('product').order_by('id')
+                    items = list(pending[:chunk_size] if chunk_size else pending)
+                    if items:
+                        if action == 'ship':
+                            self._ship_items(transfer, items)
+                        else:
+                            self._receive_items(transfer, items)
+                        StockTransferItem.objects.filter(id__in=[item.id for item in items]).update(**{marker: timezone.now()})
+
+                    if not chunk_size or len(items) < chunk_size:
+                        transfer.status = done_status
+                        if action == 'receive':
+                            transfer.completed_at = timezone.now()
+                        transfer.save()
+                        return {'status': 'success', 'transfer': transfer}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
+
+    def _ship_items(self, transfer, items):
+        # One conditional UPDATE (raises InsufficientStock if the source branch ran short)
+        StockLedger(self.tenant, self.user_profile).deduct(
+            [(item.product, item.quantity) for item in items],
+            transfer.source_branch, movement_type='transfer_out', reference=transfer.reference_id,
+            notes=f"Shipped to {transfer.destination_branch.name}", expand_composites=False
+        )
+
+    def _receive_items(self, transfer, items):
+        destination = transfer.destination_branch
+        dest_products = {
+            product.sku: product
+            for product in Product.objects.filter(
+                branch=destination, tenant=self.tenant, sku__in={item.product.sku for item in items}
+            )
+        }
+
+        # Auto-create products missing at the destination
+        # Note: In a production app, we might want a mapping or a more robust sync
+        missing = {}
+        for item in items:
+            source_p = item.product
+            if source_p.sku not in dest_products and source_p.sku not in missing:
+                missing[source_p.sku] = Product(
+                    tenant=self.tenant,
+                    branch=destination,
+                    category_id=source_p.category_id, # Warning: Category might also be branch-tied
+                    name=source_p.name,
+                    sku=source_p.sku,
+                    price=source_p.price,
+                    stock_quantity=0,
+                    description=source_p.description,
+                    cost_price=item.transfer_price or source_p.cost_price,
+                    is_active=True
+                )
+        if missing:
+            # A product created meanwhile is kept instead of failing the chunk. The
+            # rows are re-read, because a conflicting object keeps the id it was
+            # given, which matches no row
+            Product.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            created = 0
+            for product in Product.objects.filter(branch=destination, tenant=self.tenant, sku__in=missing):
+                created += product.pk == missing[product.sku].pk
+                dest_products[product.sku] = product
+            outbox.count(self.tenant.pk, 'total_products', created)
+
+        StockLedger(self.tenant, self.user_profile).apply(
+            [(dest_products[item.product.sku], item.quantity) for item in items],
+            destination, movement_type='transfer_in', reference=transfer.reference_id,
+            notes=f"Received from {transfer.source_branch.name}", expand_composites=False
+        )
@@ -1,19 +1,24 @@
 import logging
-import base64
 from celery import shared_task
+from django.conf import settings
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django_tenants.utils import tenant_context
-from accounts.models import Tenant, Branch
+from accounts.models import Tenant, Branch, UserProfile
 from .xlsx_utils import XLSXParser
+from .csv_utils import CSVParser
 from .services.inventory import InventoryService
 
 logger = logging.getLogger(__name__)
 
 @shared_task(bind=True)
-def import_products_task(self, tenant_id, branch_id, file_content):
+def import_products_task(self, tenant_id, branch_id, file_name):
     """
-    Background task to import products from an XLSX file.
-    file_content should be bytes or base64-encoded string
+    Background task to import products from an uploaded .xlsx or .csv file.
+    file_name is the upload's name in default_storage. Worksheets are streamed
+    from it, so memory stays bounded however large the file is, and the file
+    is deleted once the import ends. The web process saves the upload, so the
+    worker must share its storage (the media volume, see docs/DEPLOYMENT.md).
     """
     task_id = self.request.id
     cache_key = f"import_progress_{task_id}"
@@ -29,64 +34,43 @@ def import_products_task(self, tenant_id, branch_id, file_content):
     }
     cache.set(cache_key, progress, timeout=3600)
 
+    upload = None
     try:
-        # Handle base64-encoded content if needed
-        if isinstance(file_content, str):
-            try:
-                file_content = base64.b64decode(file_content)
-            except Exception as decode_err:
-                logger.error(f"Failed to decode base64 content: {decode_err}")
-                raise ValueError("Invalid file content encoding")
-        
         tenant = Tenant.objects.get(id=tenant_id)
         with tenant_context(tenant):
             branch = Branch.objects.get(id=branch_id)
             logger.info(f"Starting import for branch: {branch.name}")
             
-            # Parse the XLSX file
+            # Parse the file (rows are streamed, never held in a list)
+            upload = default_storage.open(file_name, 'rb')
             try:
-                parser = XLSXParser(file_content)
-                data_generator = parser.parse()
+                if file_name.lower().endswith('.csv'):
+                    parser = CSVParser(upload.read())
+                else:
+                    parser = XLSXParser(upload)
             except Exception as parse_err:
-                logger.error(f"Failed to parse XLSX file: {parse_err}")
-                raise ValueError(f"Invalid XLSX file: {str(parse_err)}")
-            
-            # Convert to list to get total and avoid generator issues
-            all_rows = list(data_generator)
-            total_rows = len(all_rows) - 1 if len(all_rows) > 0 else 0
+                logger.error(f"Failed to parse import file: {parse_err}")
+                raise ValueError(f"Invalid import file: {str(parse_err)}")
             
-            logger.info(f"Found {total_rows} rows to process.")
+            estimated_rows = parser.estimate_rows()
+            total_rows = max(estimated_rows - 1, 0) if estimated_rows else 0
+            logger.info(f"Found {total_rows or 'an unknown number of'} rows to process.")
             
             progress['total'] = total_rows
             cache.set(cache_key, progress, timeout=3600)
             
-            # Simple iteration
-            inventory_service = InventoryService(tenant=tenant, branch=branch)
-            data_rows = all_rows[1:] if len(all_rows) > 1 else []
-            
-            for idx, row in enumerate(data_rows, start=1):
-                try:
-                    success, error = inventory_service.import_row(row, idx + 1)
-                    
-                    if success:
-                        progress['success'] += 1
-                    else:
-                        progress['total_errors'] += 1
-                        err_str = f"Row {idx+1}: {str(error)}"
-                        progress['errors'].append(err_str)
-                        if len(progress['errors']) > 10:
-                            progress['errors'].pop(0)
-                except Exception as row_err:
-                    logger.error(f"Error processing row {idx+1}: {row_err}")
-                    progress['total_errors'] += 1
-                    progress['errors'].append(f"Row {idx+1}: {str(row_err)}")
-                
-                # Update progress
-                progress['current'] = idx
+            def report(result):
+                # Called once per chunk
+                progress['current'] = result['processed']
+                progress['success'] = result['success']
+                progress['total_errors'] = result['total_errors']
+                progress['errors'] = result['errors'][-10:]
                 if total_rows > 0:
-                    progress['progress'] = int((idx / total_rows) * 100)
-                
+                    progress['progress'] = min(int((result['processed'] / total_rows) * 100), 99)
                 cache.set(cache_key, progress, timeout=3600)
+            
+            inventory_service = InventoryService(tenant=tenant, branch=branch)
+            inventory_service.import_from_parser(parser, progress=report)
 
             progress['status'] = 'completed'
             progress['progress'] = 100
@@ -107,4 +91,47 @@ def import_products_task(self, tenant_id, branch_id, file_content):
         })
         cache.set(cache_key, progress, timeout=3600)
         raise
+    finally:
+        if upload is not None:
+            upload.close()
+        default_storage.delete(file_name)
+
+
+
+@shared_task
+def retry_product_images_task(tenant_id, branch_id, jobs, retry_round):
+    """
+    Retry product images that failed with a transient error during an import.
+    jobs: [[url, [product_id, ...]], ...]
+    """
+    from .services.product_images import ingest_product_images
+
+    tenant = Tenant.objects.get(id=tenant_id)
+    with tenant_context(tenant):
+        branch = Branch.objects.get(id=branch_id)
+        pairs = [(product_id, url) for url, product_ids in jobs for product_id in product_ids]
+        stats = ingest_product_images(tenant, branch, pairs, retry_round=retry_round)
+
+    logger.info(f"Product image retry round {retry_round}: {stats['updated']} updated, {stats['failed']} failed")
+    return {key: value for key, value in stats.items() if key != 'errors'}
+
+
+@shared_task
+def process_transfer_task(tenant_id, transfer_id, action, user_profile_id=None):
+    """
+    Ship or receive (`action`) a large stock transfer in chunks of
+    TRANSFER_CHUNK_SIZE lines. Re-running it resumes with the pending lines.
+    """
+    from .services.transfers import TransferService
 
+    tenant = Tenant.objects.get(id=tenant_id)
+    with tenant_context(tenant):
+        user_profile = UserProfile.objects.filter(id=user_profile_id).first() if user_profile_id else None
+        service = TransferService(tenant, user_profile)
+        if action == 'ship':
+            result = service.ship_transfer(transfer_id, chunk_size=settings.TRANSFER_CHUNK_SIZE)
+        else:
+            result = service.receive_transfer(transfer_id, chunk_size=settings.TRANSFER_CHUNK_SIZE)
+        if result['status'] != 'success':
+            logger.error(f"Transfer {transfer_id} {action} stopped: {result['message']}")
+        return result['status']
@@ -0,0 +1,76 @@
+"""
+Tests for the catalog change log and delta sync.
+"""
+import gzip
+import json
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Product, Category, Customer, CatalogChange
+from branches.services import catalog_sync
+from branches.services.catalog_sync import CatalogSyncService
+
+
+class CatalogSyncTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        # Drop changes queued by other tests whose on_commit callbacks never ran
+        catalog_sync._local.pending = set()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.service = CatalogSyncService(self.tenant, self.branch)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(tenant=self.tenant, branch=self.branch, name="Drinks")
+            self.product = Product.objects.create(
+                tenant=self.tenant, branch=self.branch, category=self.category,
+                name="Water", sku="W-1", price=2.00, stock_quantity=10
+            )
+
+    def test_changes_are_versioned_in_order(self):
+        cursor = self.service.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(tenant=self.tenant, name="Ama")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 3.00
+            self.product.save()
+
+        changes = self.service.changes_since(cursor)
+        self.assertEqual([c['id'] for c in changes['customers']], [str(customer.id)])
+        self.assertEqual([p['id'] for p in changes['products']], [str(self.product.id)])
+        self.assertEqual(changes['cursor'], self.service.current_version())
+        self.assertEqual(self.service.changes_since(changes['cursor'])['products'], [])
+
+    def test_deleted_and_hidden_objects_become_tombstones(self):
+        cursor = self.service.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_active = False
+            self.product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            category_id = self.category.id
+            self.category.delete()
+
+        changes = self.service.changes_since(cursor)
+        self.assertEqual(changes['deleted']['products'], [str(self.product.id)])
+        self.assertEqual(changes['deleted']['categories'], [str(category_id)])
+        # One row per object, not per change
+        self.assertEqual(CatalogChange.objects.filter(object_id=self.product.id).count(), 1)
+
+    def test_paging(self):
+        cursor = self.service.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                Customer.objects.create(tenant=self.tenant, name=f"C{i}")
+
+        first = self.service.changes_since(cursor, limit=2)
+        self.assertTrue(first['has_more'])
+        second = self.service.changes_since(first['cursor'], limit=2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len(first['customers']) + len(second['customers']), 3)
+
+    def test_cursor_ahead_of_server_requests_reset(self):
+        self.assertTrue(self.service.changes_since(self.service.current_version() + 100)['reset'])
+
+    def test_snapshot_matches_version(self):
+        version, body = self.service.snapshot()
+        payload = json.loads(gzip.decompress(body))
+        self.assertEqual(payload['cursor'], version)
+        self.assertEqual([p['id'] for p in payload['products']], [str(self.product.id)])
+        self.assertEqual(self.service.etag(version), f'"catalog-{self.branch.pk}-{version}"')
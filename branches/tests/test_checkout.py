@@ -0,0 +1,71 @@
+"""
+Tests for the bulk POS checkout pipeline.
+"""
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch, UserProfile
+from main.models import Customer, GiftCard, LoyaltyTransaction, OrderItem, Payment, Product, StoreCreditTransaction
+from branches.services.payments import PaymentService
+
+
+class CheckoutPipelineTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.user = User.objects.create_user(username="cashier", password="pw")
+        self.user.profile = UserProfile.objects.create(user=self.user, tenant=self.tenant, branch=self.branch, role='admin')
+        self.customer = Customer.objects.create(tenant=self.tenant, name="Ada", store_credit_balance=Decimal('1000.00'))
+        self.gift_card = GiftCard.objects.create(tenant=self.tenant, code="GC-1", balance=Decimal('1000.00'))
+        self.products = Product.objects.bulk_create([
+            Product(tenant=self.tenant, branch=self.branch, name=f"Item {i}", sku=f"ITEM-{i}", price=Decimal('2.00'), stock_quantity=100)
+            for i in range(20)
+        ])
+
+    def checkout(self, products, quantity=1):
+        total = Decimal('2.00') * quantity * len(products)
+        return PaymentService(self.user, self.branch, {
+            'customer_id': str(self.customer.pk),
+            'items': [{'id': str(product.pk), 'quantity': quantity} for product in products],
+            'payments': [
+                {'method': 'store_credit', 'amount': str(total / 2)},
+                {'method': 'gift_card', 'amount': str(total / 2), 'gift_card_code': "GC-1"},
+            ],
+        }).process_checkout()
+
+    def test_query_count_does_not_depend_on_basket_size(self):
+        # First checkout creates the payment methods and settings
+        self.assertTrue(self.checkout(self.products[:1])['success'])
+
+        counts = []
+        for size in (1, 20):
+            with CaptureQueriesContext(connection) as ctx:
+                result = self.checkout(self.products[:size])
+            self.assertTrue(result['success'], result)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+        order_id = result['order_id']
+        self.assertEqual(OrderItem.objects.filter(order_id=order_id).count(), 20)
+        self.assertEqual(Payment.objects.filter(order_id=order_id).count(), 2)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 97)
+        self.assertEqual(Product.objects.get(pk=self.products[19].pk).stock_quantity, 99)
+
+        # 2 + 2 + 40 spent, half from each source
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.store_credit_balance, Decimal('978.00'))
+        self.assertEqual(self.customer.total_spend, Decimal('44.00'))
+        self.assertEqual(self.customer.total_orders, 3)
+        self.assertEqual(GiftCard.objects.get(pk=self.gift_card.pk).balance, Decimal('978.00'))
+        self.assertEqual(StoreCreditTransaction.objects.filter(customer=self.customer).count(), 3)
+        self.assertEqual(LoyaltyTransaction.objects.filter(customer=self.customer, transaction_type='earn').count(), 3)
+
+    def test_failed_checkout_leaves_no_trace(self):
+        result = self.checkout(self.products[:2], quantity=101)
+
+        self.assertEqual(result, {'success': False, 'error': "Not enough stock for Item 0, Item 1"})
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.store_credit_balance, Decimal('1000.00'))
+        self.assertFalse(OrderItem.objects.exists())
@@ -0,0 +1,93 @@
+"""
+Tests for the reorder forecasting engine.
+"""
+from datetime import date, timedelta
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Product
+from branches.models import StockMovement, InventoryRecommendation
+from branches.services.forecasting import FLAT_PROFILE, days_until_stockout, forecast, weekday_profile
+from branches.services.inventory_ai import InventoryAIService
+
+
+class ForecastTests(SimpleTestCase):
+    def test_days_until_stockout_follows_the_profile(self):
+        self.assertEqual(days_until_stockout(20, 2, FLAT_PROFILE, 0), 10)
+        self.assertEqual(days_until_stockout(0, 2, FLAT_PROFILE, 0), 0)
+        self.assertEqual(days_until_stockout(14, 2, FLAT_PROFILE, 0), 7)
+        self.assertEqual(days_until_stockout(100, 2, FLAT_PROFILE, 3), 50)
+        # Nothing sells at weekends: a week's stock runs out on Friday, or
+        # lasts the week when counted from Saturday
+        weekdays_only = [1.4] * 5 + [0.0, 0.0]
+        self.assertEqual(days_until_stockout(7, 1, weekdays_only, 0), 5)
+        self.assertEqual(days_until_stockout(7, 1, weekdays_only, 5), 7)
+
+    def test_weekday_profile(self):
+        monday = date(2026, 3, 2)
+        # Saturdays sell three times as much as any other day
+        totals = [3 if (monday + timedelta(days=i)).weekday() == 5 else 1 for i in range(28)]
+        profile = weekday_profile(totals, monday)
+        self.assertAlmostEqual(sum(profile), 7)
+        self.assertAlmostEqual(profile[5] / profile[0], 3)
+        self.assertEqual(weekday_profile(totals[:7], monday), FLAT_PROFILE)
+
+    def test_steady_and_spiky_sellers(self):
+        first_day = date(2026, 3, 2)
+        result = forecast({'steady': 10, 'idle': 5}, {'steady': [2] * 30}, first_day)
+
+        self.assertEqual(set(result), {'steady'})
+        steady = result['steady']
+        self.assertEqual((steady['velocity'], steady['safety_stock'], steady['days_left']), (2, 0, 5))
+        self.assertTrue(steady['reorder'])
+        self.assertEqual(steady['reorder_quantity'], 18)
+
+        # Fewer units, sold in bursts: the safety stock makes up for the variance
+        spiky = forecast({'spiky': 30}, {'spiky': [0] * 9 + [12] + [0] * 9 + [12] + [0] * 9 + [12]}, first_day)['spiky']
+        self.assertLess(spiky['velocity'], 2)
+        self.assertGreater(spiky['safety_stock'], 10)
+        self.assertTrue(spiky['reorder'])
+
+
+class InventoryAnalysisTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.low = self.product("LOW", 4)
+        self.plenty = self.product("PLENTY", 500)
+        self.idle = self.product("IDLE", 1)
+
+    def product(self, sku, stock):
+        return Product.objects.create(tenant=self.tenant, branch=self.branch, name=sku, sku=sku, price=1, stock_quantity=stock)
+
+    def sell(self, product, units, days_ago):
+        movement = StockMovement.objects.create(
+            tenant=self.tenant, branch=self.branch, product=product, quantity_change=-units,
+            balance_after=product.stock_quantity, movement_type='sale'
+        )
+        StockMovement.objects.filter(pk=movement.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_recommendations_are_replaced_in_bulk(self):
+        for days_ago in range(10):
+            self.sell(self.low, 2, days_ago)
+            self.sell(self.plenty, 2, days_ago)
+        InventoryRecommendation.objects.create(
+            tenant=self.tenant, branch=self.branch, product=self.idle, predicted_velocity=1,
+            current_stock=1, estimated_days_left=1, recommended_reorder_quantity=5, is_dismissed=True
+        )
+
+        # Products, movements, upsert, delete (plus the savepoint pair)
+        with self.assertNumQueries(6):
+            result = InventoryAIService(self.tenant).run_analysis(self.branch)
+
+        self.assertEqual(result, {'branch': "Main", 'processed_count': 3, 'recommendations_created': 1})
+        recommendation = InventoryRecommendation.objects.get(branch=self.branch)
+        self.assertEqual(recommendation.product, self.low)
+        self.assertEqual(recommendation.current_stock, 4)
+        self.assertGreater(recommendation.recommended_reorder_quantity, 0)
+
+        # Re-running updates the row in place
+        InventoryRecommendation.objects.filter(pk=recommendation.pk).update(is_dismissed=True)
+        InventoryAIService(self.tenant).run_analysis(self.branch)
+        self.assertFalse(InventoryRecommendation.objects.get(pk=recommendation.pk).is_dismissed)
@@ -0,0 +1,63 @@
+"""
+Tests for the precomputed POS bootstrap snapshot.
+"""
+import gzip
+import json
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Product, Customer
+from branches.services.pos import POSService
+from branches.services.pos_snapshot import get_pos_snapshot
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pos-snapshot-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class POSSnapshotTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.service = POSService(self.tenant)
+        self.product = Product.objects.create(
+            tenant=self.tenant, branch=self.branch, name="Water", sku="W-1", price=2.00, stock_quantity=10
+        )
+
+    def payload(self, body):
+        return json.loads(gzip.decompress(body))['data']
+
+    def test_warm_path_has_no_queries(self):
+        etag, body, encoding = get_pos_snapshot(self.service, self.branch)
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual([p['name'] for p in self.payload(body)['products']], ['Water'])
+
+        with CaptureQueriesContext(connection) as queries:
+            warm_etag, warm_body, _ = get_pos_snapshot(self.service, self.branch)
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual((warm_etag, warm_body), (etag, body))
+
+        self.assertIsNone(get_pos_snapshot(self.service, self.branch, if_none_match=etag)[1])
+
+    def test_changes_invalidate_after_commit(self):
+        etag, _, _ = get_pos_snapshot(self.service, self.branch)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 3.00
+            self.product.save()
+        etag_after_product, body, _ = get_pos_snapshot(self.service, self.branch)
+        self.assertNotEqual(etag_after_product, etag)
+        self.assertEqual(self.payload(body)['products'][0]['price'], 3.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(tenant=self.tenant, name="Ama", phone="0244000000")
+        _, body, _ = get_pos_snapshot(self.service, self.branch)
+        self.assertEqual(self.payload(body)['customers'][0]['phone'], "0244000000")
+
+    def test_identity_encoding(self):
+        _, body, encoding = get_pos_snapshot(self.service, self.branch, encoding='identity')
+        self.assertEqual(encoding, 'identity')
+        self.assertEqual(json.loads(body)['status'], 'success')
@@ -0,0 +1,144 @@
+"""
+Tests for product image ingestion, against a local stand-in HTTP server.
+"""
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from PIL import Image
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, override_settings
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Product
+from branches.services.product_images import ImageFetchError, ImageIngestor, fetch_image, store_image
+
+
+def png_bytes(size=(2000, 1000), color=(200, 30, 30)):
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+class ImageServer:
+    """Serves `routes` ({path: [(status, body), ...]}); the last response repeats."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.hits = Counter()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits[self.path] += 1
+                responses = server.routes.get(self.path, [(404, b'')])
+                status, body = responses[min(server.hits[self.path], len(responses)) - 1]
+                self.send_response(status)
+                if status in (301, 302):
+                    self.send_header('Location', body.decode())
+                    body = b''
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root, IMPORT_IMAGE_ALLOW_PRIVATE_HOSTS=True, IMPORT_IMAGE_RETRY_ROUNDS=0)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+
+class ImageFetchTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.image = png_bytes()
+        self.server = ImageServer({
+            '/a.png': [(200, self.image)],
+            '/copy.png': [(200, self.image)],
+            '/flaky.png': [(503, b''), (200, self.image)],
+            '/moved': [(302, b'/a.png')],
+            '/huge.png': [(200, b'x' * 2048)],
+            '/text': [(200, b'not an image')],
+        })
+        self.addCleanup(self.server.stop)
+
+    def test_image_is_resized_with_thumbnail(self):
+        name, thumbnail_name = store_image(f"{self.server.url}/a.png")
+
+        self.assertTrue(name.endswith('.jpg'))
+        with default_storage.open(name) as f:
+            self.assertEqual(Image.open(f).size, (1600, 800))
+        with default_storage.open(thumbnail_name) as f:
+            self.assertEqual(Image.open(f).size, (320, 160))
+
+    def test_same_content_is_stored_once(self):
+        first = store_image(f"{self.server.url}/a.png")
+        second = store_image(f"{self.server.url}/copy.png")
+        self.assertEqual(first, second)
+
+    def test_transient_errors_are_retried(self):
+        store_image(f"{self.server.url}/flaky.png")
+        self.assertEqual(self.server.hits['/flaky.png'], 2)
+
+    def test_redirects_are_followed(self):
+        self.assertEqual(fetch_image(f"{self.server.url}/moved"), self.image)
+
+    def test_permanent_failures(self):
+        with self.assertRaises(ImageFetchError) as missing:
+            fetch_image(f"{self.server.url}/missing.png")
+        self.assertFalse(missing.exception.retryable)
+
+        with override_settings(IMPORT_IMAGE_MAX_BYTES=1024), self.assertRaises(ImageFetchError):
+            fetch_image(f"{self.server.url}/huge.png")
+        with self.assertRaises(ImageFetchError):
+            store_image(f"{self.server.url}/text")
+        with self.assertRaises(ImageFetchError):
+            fetch_image("file:///etc/passwd")
+
+    def test_private_hosts_are_refused_by_default(self):
+        with override_settings(IMPORT_IMAGE_ALLOW_PRIVATE_HOSTS=False), self.assertRaises(ImageFetchError):
+            fetch_image(f"{self.server.url}/a.png")
+        self.assertEqual(self.server.hits['/a.png'], 0)
+
+
+class ImageIngestorTests(MediaRootMixin, TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = ImageServer({'/shared.png': [(200, png_bytes())]})
+        self.addCleanup(self.server.stop)
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.products = [
+            Product.objects.create(tenant=self.tenant, branch=self.branch, name=f"P{n}", sku=f"P-{n}", price=1)
+            for n in range(3)
+        ]
+
+    def test_url_is_fetched_once_for_all_products(self):
+        ingestor = ImageIngestor(self.tenant, self.branch, workers=2)
+        for product in self.products:
+            ingestor.submit(product.pk, f"{self.server.url}/shared.png")
+        ingestor.submit(self.products[0].pk, f"{self.server.url}/missing.png")
+        stats = ingestor.close()
+
+        self.assertEqual(self.server.hits['/shared.png'], 1)
+        self.assertEqual((stats['fetched'], stats['updated'], stats['failed']), (1, 2, 1))
+        # The first product was re-submitted with a URL that failed, so it keeps no image
+        images = dict(Product.objects.values_list('sku', 'thumbnail'))
+        self.assertFalse(images['P-0'])
+        self.assertTrue(images['P-1'].startswith('products/thumbs/'))
@@ -0,0 +1,153 @@
+"""
+Tests for the chunked product import pipeline.
+"""
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Product, Category, CatalogChange
+from branches.csv_utils import CSVParser
+from branches.xlsx_utils import XLSXParser
+from branches.services.inventory import InventoryService
+from branches.tasks import import_products_task
+from branches.api_serializers import ProductSerializer
+from main.forms import ProductForm
+
+HEADER = "Name,SKU,Category,Price,Wholesale,Min Qty,Cost,Stock,Low Stock,Barcode,Expiry\n"
+
+
+class ProductImportTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.service = InventoryService(self.tenant, self.branch)
+
+    def run_import(self, body, chunk_size=None, progress=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.service.import_from_parser(CSVParser((HEADER + body).encode()), chunk_size=chunk_size, progress=progress)
+
+    def test_creates_and_updates_by_sku(self):
+        old = Product.objects.create(tenant=self.tenant, branch=self.branch, name="Old", sku="A-1", price=1, stock_quantity=5)
+
+        result = self.run_import(
+            "Apple,A-1,Fruit,2.50,2,10,1.20,40,5,,2030-01-31\n"
+            "Pear,P-1,fruit,3.00,2.5,10,1.50,20,5,,\n"
+        )
+
+        self.assertEqual((result['success'], result['created'], result['updated']), (2, 1, 1))
+        apple = Product.objects.get(branch=self.branch, sku="A-1")
+        self.assertEqual((apple.name, apple.stock_quantity, str(apple.price)), ("Apple", 40, "2.50"))
+        self.assertEqual(str(apple.expiry_date), "2030-01-31")
+        # Categories match case-insensitively and are created once
+        self.assertEqual(Category.objects.filter(branch=self.branch).count(), 1)
+        self.assertEqual(Product.objects.get(sku="P-1").category, apple.category)
+        self.assertEqual(apple.pk, old.pk)
+        # Tills are sent the ids of the real rows, the updated one included
+        changed = set(CatalogChange.objects.filter(tenant=self.tenant, entity='product').values_list('object_id', flat=True))
+        self.assertEqual(changed, {old.pk, Product.objects.get(sku="P-1").pk})
+
+    def test_blank_optional_columns_keep_existing_values(self):
+        self.run_import("Apple,A-1,,2.50,2,10,1.20,40,5,,2030-01-31\n")
+        self.run_import("Apple,A-1,,2.75,2,10,1.20,35,5,,\n")
+
+        apple = Product.objects.get(sku="A-1")
+        self.assertEqual(str(apple.price), "2.75")
+        self.assertEqual(str(apple.expiry_date), "2030-01-31")
+
+    def test_invalid_rows_are_reported_without_failing_the_chunk(self):
+        result = self.run_import(
+            "Apple,A-1,Fruit,2.50\n"
+            ",B-1,Fruit,2.50\n"
+            "Pear,P-1,Fruit,not-a-price,0,-1\n"
+            ",,,\n"
+        )
+
+        self.assertEqual(result['success'], 1)
+        self.assertEqual(result['skipped'], 1)
+        self.assertEqual(result['total_errors'], 2)
+        self.assertTrue(any("Name and SKU are required" in e for e in result['errors']))
+        self.assertTrue(any("cannot be negative" in e for e in result['errors']))
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ["A-1"])
+
+    def test_repeated_sku_in_a_chunk_keeps_last_row(self):
+        result = self.run_import("Apple,A-1,,2.50\nGreen Apple,A-1,,2.60\n")
+
+        self.assertEqual(result['success'], 2)
+        self.assertEqual(Product.objects.get(sku="A-1").name, "Green Apple")
+
+    def test_queries_do_not_grow_with_rows_and_progress_per_chunk(self):
+        body = "".join(f"Item {n},SKU-{n},Cat {n % 3},1.00\n" for n in range(250))
+        reports = []
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.run_import(body, chunk_size=100, progress=lambda r: reports.append(r['processed']))
+
+        self.assertEqual(result['created'], 250)
+        self.assertEqual(reports, [100, 200, 250])
+        self.assertLess(len(queries.captured_queries), 40)
+
+    def test_bundled_sample_file(self):
+        path = os.path.join(settings.BASE_DIR, 'sample_products_300.xlsx')
+        with open(path, 'rb') as f:
+            parser = XLSXParser(f.read())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.service.import_from_parser(parser)
+
+        self.assertEqual(result['success'], 300)
+        self.assertEqual(Product.objects.filter(branch=self.branch).count(), 300)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'import-tests'}})
+    def test_task_streams_the_stored_upload_and_deletes_it(self):
+        path = os.path.join(settings.BASE_DIR, 'sample_products_300.xlsx')
+        with open(path, 'rb') as f:
+            file_name = default_storage.save('product_imports/test.xlsx', f)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_products_task.apply(args=(str(self.tenant.pk), str(self.branch.pk), file_name)).get()
+
+        self.assertEqual(result['success'], 300)
+        self.assertEqual(Product.objects.filter(branch=self.branch).count(), 300)
+        self.assertFalse(default_storage.exists(file_name))
+
+
+class ProductSkuValidationTests(TenantTestCase):
+    """The (branch, sku) constraint surfaces as a field error, not an IntegrityError."""
+
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.other = Branch.objects.create(tenant=self.tenant, name="Other")
+        Product.objects.create(tenant=self.tenant, branch=self.branch, name="Apple", sku="A-1", price=1)
+
+    def sku_errors(self, sku, **kwargs):
+        form = ProductForm({'name': "Pear", 'sku': sku, 'price': '2.00'}, **kwargs)
+        form.is_valid()
+        return form.errors.get('sku')
+
+    def test_form_rejects_a_sku_taken_in_the_branch(self):
+        self.assertTrue(self.sku_errors("A-1", branch=self.branch))
+        self.assertIsNone(self.sku_errors("A-1", branch=self.other))
+
+    def test_form_edit_keeps_its_own_sku_but_not_anothers(self):
+        pear = Product.objects.create(tenant=self.tenant, branch=self.branch, name="Pear", sku="P-1", price=2)
+
+        self.assertIsNone(self.sku_errors("P-1", instance=pear))
+        self.assertTrue(self.sku_errors("A-1", instance=pear))
+
+    def test_serializer_rejects_a_sku_taken_in_the_branch(self):
+        pear = Product.objects.create(tenant=self.tenant, branch=self.branch, name="Pear", sku="P-1", price=2)
+
+        serializer = ProductSerializer(pear, data={'sku': "A-1"}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('sku', serializer.errors)
+
+        self.assertTrue(ProductSerializer(pear, data={'sku': "P-1"}, partial=True).is_valid())
+        serializer = ProductSerializer(data={'name': "Kiwi", 'sku': "A-1", 'price': '1.00'}, context={'branch': self.branch})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('sku', serializer.errors)
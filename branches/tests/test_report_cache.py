@@ -0,0 +1,119 @@
+"""
+Tests for the report cache and its invalidation.
+"""
+from datetime import timedelta
+from unittest import mock
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Order, Expense, ExpenseCategory
+from branches.services.report_cache import cached_report, invalidate_reports, report_cache_stats
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'report-cache-tests'}}
+
+
+class Builder:
+    """Counts builds and returns the build number as the payload"""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'build': self.calls}
+
+
+# Run on_commit callbacks at once, as outside a transaction, without touching the database
+@override_settings(CACHES=LOCMEM_CACHE, REPORT_CACHE_TTL_LIVE=60, REPORT_CACHE_TTL_CLOSED=3600)
+@mock.patch('branches.services.report_cache.transaction.on_commit', lambda callback: callback())
+class ReportCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        self.last_week = (self.today - timedelta(days=14), self.today - timedelta(days=7))
+
+    def test_hits_and_params(self):
+        build = Builder()
+        self.assertEqual(cached_report('summary', 1, build, params={'limit': 10}), {'build': 1})
+        self.assertEqual(cached_report('summary', 1, build, params={'limit': 10}), {'build': 1})
+        self.assertEqual(cached_report('summary', 1, build, params={'limit': 5}), {'build': 2})
+        self.assertEqual(cached_report('summary', 2, build, params={'limit': 10}), {'build': 3})
+        self.assertEqual(report_cache_stats(), {'hits': 1, 'misses': 3, 'hit_ratio': 0.25})
+
+    def test_writes_today_leave_closed_ranges_cached(self):
+        live, closed = Builder(), Builder()
+        start, end = self.last_week
+        cached_report('summary', 1, live, branch_id='b1', start=start, end=self.today)
+        cached_report('summary', 1, closed, branch_id='b1', start=start, end=end)
+
+        invalidate_reports(1, [('b1', timezone.now())])
+        cached_report('summary', 1, live, branch_id='b1', start=start, end=self.today)
+        cached_report('summary', 1, closed, branch_id='b1', start=start, end=end)
+        self.assertEqual((live.calls, closed.calls), (2, 1))
+
+        # A back-dated write reaches both
+        invalidate_reports(1, [('b1', end)])
+        cached_report('summary', 1, live, branch_id='b1', start=start, end=self.today)
+        cached_report('summary', 1, closed, branch_id='b1', start=start, end=end)
+        self.assertEqual((live.calls, closed.calls), (3, 2))
+
+    def test_branch_writes_reach_tenant_reports_only(self):
+        company, other_branch = Builder(), Builder()
+        cached_report('summary', 1, company)
+        cached_report('summary', 1, other_branch, branch_id='b2')
+
+        invalidate_reports(1, [('b1', None)])
+        cached_report('summary', 1, company)
+        cached_report('summary', 1, other_branch, branch_id='b2')
+        self.assertEqual((company.calls, other_branch.calls), (2, 1))
+
+    @override_settings(REPORT_CACHE_TTL_LIVE=0)
+    def test_zero_ttl_disables_caching(self):
+        build = Builder()
+        cached_report('summary', 1, build)
+        cached_report('summary', 1, build)
+        self.assertEqual(build.calls, 2)
+        self.assertEqual(report_cache_stats()['hit_ratio'], None)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, REPORT_CACHE_TTL_LIVE=60, REPORT_CACHE_TTL_CLOSED=3600)
+class ReportInvalidationTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.category = ExpenseCategory.objects.create(tenant=self.tenant, name="Rent")
+        self.today = timezone.localdate()
+
+    def revenue(self, start=None, end=None):
+        return cached_report(
+            'revenue', self.tenant.pk,
+            lambda: sum(Order.objects.filter(status='completed').values_list('total_amount', flat=True)),
+            start=start, end=end
+        )
+
+    def test_order_and_expense_writes_invalidate_after_commit(self):
+        self.assertEqual(self.revenue(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(tenant=self.tenant, branch=self.branch, status='completed', total_amount=Decimal("12.50"))
+        self.assertEqual(self.revenue(), Decimal("12.50"))
+
+        month_ago = self.today - timedelta(days=30)
+        closed = self.revenue(month_ago, self.today - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            expense = Expense.objects.create(
+                tenant=self.tenant, branch=self.branch, category=self.category, amount=Decimal("40.00"), date=self.today
+            )
+        # Still served from the cache: nothing before today changed
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revenue(month_ago, self.today - timedelta(days=1)), closed)
+
+        # Moving the expense back in time changes the closed range
+        expense = Expense.objects.get(pk=expense.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.date = month_ago
+            expense.save()
+        with self.assertNumQueries(1):
+            self.revenue(month_ago, self.today - timedelta(days=1))
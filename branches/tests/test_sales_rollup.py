@@ -0,0 +1,112 @@
+"""
+Tests for the daily sales rollups and the reports that read them.
+"""
+from decimal import Decimal
+from django.core.management import call_command
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Order, OrderItem, Product, BranchSalesDaily, ProductSalesDaily
+from branches.services.reporting import ReportingService
+from branches.services.sales_rollup import rebuild_sales_rollups
+
+
+class SalesRollupTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.rice = Product.objects.create(
+            tenant=self.tenant, branch=self.branch, name="Rice", sku="R-1", price=Decimal("10.00"), cost_price=Decimal("6.00")
+        )
+        self.oil = Product.objects.create(
+            tenant=self.tenant, branch=self.branch, name="Oil", sku="O-1", price=Decimal("4.00"), cost_price=Decimal("1.00")
+        )
+        self.today = timezone.localdate()
+
+    def sell(self, lines, status='completed', payment_method='cash'):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                tenant=self.tenant, branch=self.branch, status=status, payment_method=payment_method,
+                total_amount=sum(product.price * quantity for product, quantity in lines)
+            )
+            for product, quantity in lines:
+                OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        return order
+
+    def rollups(self):
+        branch_rows = {
+            row.payment_method: (row.total_revenue, row.total_cost, row.order_count, row.items_sold)
+            for row in BranchSalesDaily.objects.filter(branch=self.branch, date=self.today)
+        }
+        product_rows = {
+            row.product.sku: (row.quantity, row.total_revenue, row.total_cost)
+            for row in ProductSalesDaily.objects.filter(branch=self.branch, date=self.today).select_related('product')
+        }
+        return branch_rows, product_rows
+
+    def test_completed_orders_are_added(self):
+        self.sell([(self.rice, 2), (self.oil, 1)])
+        self.sell([(self.rice, 1)], payment_method='card')
+        self.sell([(self.oil, 5)], status='pending')
+
+        branch_rows, product_rows = self.rollups()
+        self.assertEqual(branch_rows['cash'], (Decimal("24.00"), Decimal("13.00"), 1, 3))
+        self.assertEqual(branch_rows['card'], (Decimal("10.00"), Decimal("6.00"), 1, 1))
+        self.assertEqual(product_rows, {'R-1': (3, Decimal("30.00"), Decimal("18.00")), 'O-1': (1, Decimal("4.00"), Decimal("1.00"))})
+
+    def test_status_changes_and_deletes_apply_deltas(self):
+        pending = self.sell([(self.oil, 2)], status='pending')
+        voided = self.sell([(self.rice, 1)])
+        kept = self.sell([(self.rice, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pending.status = 'completed'
+            pending.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            voided = Order.objects.get(pk=voided.pk)
+            voided.status = 'cancelled'
+            voided.save()
+        self.assertEqual(self.rollups()[0]['cash'][2], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.get(pk=kept.pk).delete()
+        branch_rows, product_rows = self.rollups()
+        self.assertEqual(branch_rows['cash'], (Decimal("8.00"), Decimal("2.00"), 1, 2))
+        # Rows emptied by a subtraction are removed
+        self.assertEqual(set(product_rows), {'O-1'})
+
+    def test_rebuild_matches_incremental_rows(self):
+        self.sell([(self.rice, 2), (self.oil, 3)])
+        self.sell([(self.oil, 1)], payment_method='mobile')
+        incremental = self.rollups()
+
+        # Writes that bypass signals are repaired by a rebuild
+        Order.objects.filter(branch=self.branch).update(payment_method='card')
+        self.assertEqual(rebuild_sales_rollups(self.tenant, self.today, self.today), (1, 2))
+        branch_rows, product_rows = self.rollups()
+        self.assertEqual(product_rows, incremental[1])
+        self.assertEqual(branch_rows['card'][2], 2)
+
+        BranchSalesDaily.objects.all().delete()
+        ProductSalesDaily.objects.all().delete()
+        call_command('backfill_sales_rollups', schema=self.tenant.schema_name, days=1, stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.rollups()[1], incremental[1])
+
+    def test_reports_read_the_rollups(self):
+        self.sell([(self.rice, 2), (self.oil, 1)])
+        self.sell([(self.oil, 4)], payment_method='card')
+        service = ReportingService(self.tenant, self.branch)
+
+        summary = service.get_financial_summary(self.today, self.today)
+        self.assertEqual(
+            (summary['total_revenue'], summary['total_orders'], summary['total_items_sold'], summary['total_profit']),
+            (Decimal("40.00"), 2, 7, Decimal("21.00"))
+        )
+        top = list(service.get_top_products(self.today, self.today))
+        self.assertEqual([(p['product__sku'], p['quantity_sold'], p['revenue']) for p in top], [("O-1", 5, Decimal("20.00")), ("R-1", 2, Decimal("20.00"))])
+        self.assertEqual(list(service.get_daily_revenue(self.today, self.today)), [{'day': self.today, 'revenue': Decimal("40.00")}])
+
+        # 'all' leaves the range open
+        start, end = service.get_date_range('all')
+        self.assertEqual(service.get_company_financial_summary(start, end)['total_orders'], 2)
+        self.assertEqual(len(service.get_cashier_performance(start, end)), 1)
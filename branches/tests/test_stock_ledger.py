@@ -0,0 +1,70 @@
+"""
+Tests for the conditional stock ledger and cart reservations.
+"""
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Product, ProductComponent
+from branches.models import StockMovement, StockReservation
+from branches.services.stock_ledger import InsufficientStock, StockLedger
+
+
+@override_settings(STOCK_RESERVATION_TTL=900)
+class StockLedgerTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.ledger = StockLedger(self.tenant)
+        self.apple = self.product("APPLE", 10)
+        self.pear = self.product("PEAR", 2)
+
+    def product(self, sku, stock, **kwargs):
+        return Product.objects.create(tenant=self.tenant, branch=self.branch, name=sku, sku=sku, price=1, stock_quantity=stock, **kwargs)
+
+    def stock(self, product):
+        return Product.objects.values_list('stock_quantity', flat=True).get(pk=product.pk)
+
+    def test_basket_is_deducted_in_one_update_with_movements(self):
+        bundle = self.product("BUNDLE", 0, is_composite=True)
+        ProductComponent.objects.create(parent_product=bundle, component_product=self.apple, quantity=2)
+        bundle = Product.objects.prefetch_related('components__component_product').get(pk=bundle.pk)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.ledger.deduct([(self.apple, 3), (self.pear, 2), (bundle, 1)], self.branch, reference="Order 1")
+
+        stock_writes = [query['sql'] for query in ctx.captured_queries if 'UPDATE' in query['sql'] and 'stock_quantity' in query['sql']]
+        self.assertEqual(len(stock_writes), 1)
+
+        self.assertEqual((self.stock(self.apple), self.stock(self.pear)), (5, 0))
+        self.assertEqual(self.apple.stock_quantity, 5)
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(product=self.apple).values_list('quantity_change', 'balance_after')),
+            [(-3, 7), (-2, 5)]
+        )
+
+    def test_short_basket_changes_nothing(self):
+        with self.assertRaisesMessage(InsufficientStock, "Not enough stock for PEAR"):
+            self.ledger.deduct([(self.apple, 1), (self.pear, 3)], self.branch)
+
+        self.assertEqual((self.stock(self.apple), self.stock(self.pear)), (10, 2))
+        self.assertFalse(StockMovement.objects.exists())
+
+        # Stock that already moved is applied regardless of the condition
+        self.ledger.apply([(self.pear, 5)], self.branch, movement_type='receive')
+        self.assertEqual(self.stock(self.pear), 7)
+
+    def test_reserved_units_are_kept_for_their_cart(self):
+        self.assertTrue(self.ledger.reserve(self.apple, 8, "cart-1"))
+        self.assertFalse(self.ledger.reserve(self.apple, 3, "cart-2"))
+        self.assertTrue(self.ledger.reserve(self.apple, 2, "cart-2"))
+
+        # A till can only sell what no cart holds
+        with self.assertRaises(InsufficientStock):
+            self.ledger.deduct([(self.apple, 1)], self.branch)
+
+        # The cart checks out with its own units and gives up its hold
+        self.ledger.deduct([(self.apple, 8)], self.branch, reservation_key="cart-1")
+        self.assertEqual(self.stock(self.apple), 2)
+        self.assertEqual(list(StockReservation.objects.values_list('cart_key', flat=True)), ["cart-2"])
@@ -1,8 +1,11 @@
 import uuid
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django_tenants.test.cases import TenantTestCase
 from django.contrib.auth.models import User
 from accounts.models import Tenant, Branch, UserProfile
 from main.models import Product, Category, Order, ProductComponent
+from branches.models import StockMovement
 from branches.services.pos import POSService
 
 class SyncLifecycleTests(TenantTestCase):
@@ -110,6 +113,70 @@ class SyncLifecycleTests(TenantTestCase):
         self.assertEqual(res2['status'], 'already_synced')
         self.assertEqual(Order.objects.count(), initial_order_count)
 
+    def test_sync_order_repeated_lines_and_movements(self):
+        """Lines for the same product are deducted together and each gets its own movement"""
+        order_uuid = str(uuid.uuid4())
+        data = {
+            'branch_id': str(self.branch.id),
+            'total_amount': 450.00,
+            'payment_method': 'cash',
+            'items': [
+                {'id': str(self.product_a.id), 'quantity': 1, 'price': 100.00},
+                {'id': str(self.bundle.id), 'quantity': 1, 'price': 150.00},
+                {'id': str(self.product_a.id), 'quantity': 2, 'price': 100.00},
+            ]
+        }
+
+        result = self.pos_service.sync_order(order_uuid, data)
+        self.assertEqual(result['status'], 'success', result.get('message'))
+
+        self.product_a.refresh_from_db()
+        self.assertEqual(self.product_a.stock_quantity, 47)
+        balances = list(StockMovement.objects.filter(product=self.product_a).order_by('balance_after').values_list('quantity_change', 'balance_after'))
+        self.assertEqual(balances, [(-2, 47), (-1, 49)])
+        self.assertEqual(Order.objects.get(offline_uuid=order_uuid).items.count(), 3)
+
+    def test_sync_order_query_count_is_independent_of_basket_size(self):
+        def basket(size):
+            products = [
+                Product.objects.create(
+                    tenant=self.tenant, branch=self.branch, category=self.category,
+                    name=f"P{size}-{i}", sku=f"SKU-{size}-{i}", price=5.00, stock_quantity=100
+                )
+                for i in range(size)
+            ]
+            return {
+                'branch_id': str(self.branch.id),
+                'total_amount': 5.00 * size,
+                'payment_method': 'cash',
+                'items': [{'id': str(p.id), 'quantity': 1, 'price': 5.00} for p in products]
+            }
+
+        # Warm up the sequences so both runs take the same allocation path
+        self.pos_service.sync_order(str(uuid.uuid4()), basket(1))
+        small, large = basket(2), basket(40)
+        with CaptureQueriesContext(connection) as small_queries:
+            self.pos_service.sync_order(str(uuid.uuid4()), small)
+        with CaptureQueriesContext(connection) as large_queries:
+            self.pos_service.sync_order(str(uuid.uuid4()), large)
+        self.assertEqual(len(small_queries.captured_queries), len(large_queries.captured_queries))
+
+    def test_sync_order_unknown_product_rolls_back(self):
+        order_uuid = str(uuid.uuid4())
+        data = {
+            'branch_id': str(self.branch.id),
+            'total_amount': 100.00,
+            'items': [
+                {'id': str(self.product_a.id), 'quantity': 1, 'price': 100.00},
+                {'id': str(uuid.uuid4()), 'quantity': 1, 'price': 100.00},
+            ]
+        }
+        result = self.pos_service.sync_order(order_uuid, data)
+        self.assertEqual(result['status'], 'error')
+        self.assertFalse(Order.objects.filter(offline_uuid=order_uuid).exists())
+        self.product_a.refresh_from_db()
+        self.assertEqual(self.product_a.stock_quantity, 50)
+
     def test_create_transfer(self):
         """Test stock transfer creation and deduction"""
         # Create another branch
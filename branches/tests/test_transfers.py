@@ -0,0 +1,101 @@
+"""
+Tests for bulk and chunked stock transfer shipping/receiving.
+"""
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Product
+from branches.models import StockMovement, StockTransfer, StockTransferItem
+from branches.services.transfers import TransferService
+
+
+class TransferEngineTests(TenantTestCase):
+    # Quantities stay clear of the low-stock threshold, whose per-product
+    # notification receiver would add queries of its own
+    def setUp(self):
+        super().setUp()
+        self.source = Branch.objects.create(tenant=self.tenant, name="Warehouse")
+        self.destination = Branch.objects.create(tenant=self.tenant, name="Shop")
+        self.service = TransferService(self.tenant)
+        # The shop already stocks the first two SKUs
+        Product.objects.bulk_create([
+            Product(tenant=self.tenant, branch=self.destination, name=f"Line {i}", sku=f"LINE-{i}", price=1, stock_quantity=1)
+            for i in range(2)
+        ])
+
+    def transfer(self, lines, stock=100):
+        products = Product.objects.bulk_create([
+            Product(tenant=self.tenant, branch=self.source, name=f"Line {i}", sku=f"LINE-{i}", price=1, stock_quantity=stock)
+            for i in range(lines)
+        ])
+        transfer = StockTransfer.objects.create(
+            tenant=self.tenant, source_branch=self.source, destination_branch=self.destination,
+            reference_id=f"TRF-{lines}", status='approved'
+        )
+        StockTransferItem.objects.bulk_create([StockTransferItem(transfer=transfer, product=p, quantity=30) for p in products])
+        return transfer
+
+    def queries(self, method, transfer):
+        with CaptureQueriesContext(connection) as ctx:
+            result = method(transfer.pk)
+        self.assertEqual(result['status'], 'success', result)
+        return len(ctx.captured_queries)
+
+    def test_ship_and_receive_in_bulk(self):
+        small = self.transfer(5)
+        ship_queries = self.queries(self.service.ship_transfer, small)
+        receive_queries = self.queries(self.service.receive_transfer, small)
+
+        self.assertEqual(
+            sorted(Product.objects.filter(branch=self.destination).values_list('sku', 'stock_quantity')),
+            [("LINE-0", 31), ("LINE-1", 31), ("LINE-2", 30), ("LINE-3", 30), ("LINE-4", 30)]
+        )
+        self.assertEqual(Product.objects.filter(branch=self.source, stock_quantity=70).count(), 5)
+        self.assertEqual(StockMovement.objects.filter(reference="TRF-5").count(), 10)
+
+        # Fifty lines cost the same statements as five
+        Product.objects.filter(branch=self.source).delete()
+        Product.objects.filter(branch=self.destination, sku__in=["LINE-2", "LINE-3", "LINE-4"]).delete()
+        large = self.transfer(50)
+        self.assertEqual(self.queries(self.service.ship_transfer, large), ship_queries)
+        self.assertEqual(self.queries(self.service.receive_transfer, large), receive_queries)
+
+    def test_chunked_ship_resumes_where_it_stopped(self):
+        transfer = self.transfer(5)
+        # The fourth line (by id) runs short, after the first chunk of two
+        items = list(transfer.items.order_by('id'))
+        Product.objects.filter(pk=items[3].product_id).update(stock_quantity=1)
+
+        result = self.service.ship_transfer(transfer.pk, chunk_size=2)
+        self.assertEqual(result['status'], 'error')
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, 'approved')
+        self.assertEqual(self.service.progress(transfer), (2, 5))
+
+        # Restocked: the remaining lines ship, the first two are not charged again
+        Product.objects.filter(pk=items[3].product_id).update(stock_quantity=100)
+        self.assertEqual(self.service.ship_transfer(transfer.pk, chunk_size=2)['status'], 'success')
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, 'shipped')
+        self.assertEqual(Product.objects.filter(branch=self.source, stock_quantity=70).count(), 5)
+        self.assertEqual(StockMovement.objects.filter(reference=transfer.reference_id).count(), 5)
+
+    def test_receive_picks_up_a_product_created_meanwhile(self):
+        transfer = self.transfer(3)
+        self.assertEqual(self.service.ship_transfer(transfer.pk)['status'], 'success')
+        bulk_create = Product.objects.bulk_create
+
+        def create_first(products, **kwargs):
+            # The shop adds LINE-2 itself between the lookup and the insert
+            Product.objects.create(tenant=self.tenant, branch=self.destination, name="Shop's own", sku="LINE-2", price=1, stock_quantity=5)
+            return bulk_create(products, **kwargs)
+
+        with mock.patch.object(Product.objects, 'bulk_create', side_effect=create_first):
+            result = self.service.receive_transfer(transfer.pk)
+
+        self.assertEqual(result['status'], 'success', result)
+        shop_line = Product.objects.get(branch=self.destination, sku="LINE-2")
+        self.assertEqual((shop_line.name, shop_line.stock_quantity), ("Shop's own", 35))
+        self.assertTrue(StockMovement.objects.filter(product=shop_line, movement_type='transfer_in', quantity_change=30).exists())
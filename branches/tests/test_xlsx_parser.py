@@ -0,0 +1,96 @@
+"""
+Tests for the streaming XLSX reader and writer.
+"""
+import zipfile
+from decimal import Decimal
+from io import BytesIO
+from django.test import SimpleTestCase
+from branches.xlsx_utils import XLSXParser, XLSXGenerator, XLSXStreamWriter, stream_xlsx
+
+SHEET = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<x:worksheet xmlns:x="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<x:dimension ref="A1:C3"/>
+<x:sheetData>
+<x:row r="1"><x:c r="A1" t="s"><x:v>0</x:v></x:c><x:c r="C1" t="s"><x:v>1</x:v></x:c></x:row>
+<x:row r="2"><x:c t="s"><x:v>2</x:v></x:c><x:c><x:v>12.5</x:v></x:c><x:c t="s"><x:v>99</x:v></x:c></x:row>
+<x:row r="3"><x:c r="AA3" t="inlineStr"><x:is><x:r><x:t>Inline </x:t></x:r><x:r><x:t>runs</x:t></x:r></x:is></x:c></x:row>
+</x:sheetData>
+</x:worksheet>"""
+
+SHARED_STRINGS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="3" uniqueCount="3">
+<si><t>Name</t></si>
+<si><t> SKU </t></si>
+<si><r><t>Rich</t></r><r><t> text</t></r><rPh><t>ignored</t></rPh></si>
+</sst>"""
+
+
+def workbook(**members):
+    output = BytesIO()
+    with zipfile.ZipFile(output, 'w') as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+    return output.getvalue()
+
+
+class XLSXParserTests(SimpleTestCase):
+    def test_rows_match_cell_positions(self):
+        content = workbook(**{'xl/worksheets/sheet1.xml': SHEET, 'xl/sharedStrings.xml': SHARED_STRINGS})
+        rows = list(XLSXParser(content).parse())
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(rows[0]), 20)
+        self.assertEqual(rows[0][:3], ["Name", "", "SKU"])
+        # Cells without a reference fill the next column; unknown shared strings are blank
+        self.assertEqual(rows[1][:3], ["Rich text", "12.5", ""])
+        self.assertEqual(len(rows[2]), 27)
+        self.assertEqual(rows[2][26], "Inline runs")
+
+    def test_missing_shared_strings_table(self):
+        rows = list(XLSXParser(workbook(**{'xl/worksheets/sheet1.xml': SHEET})).parse())
+        self.assertEqual(rows[0][:3], ["", "", ""])
+
+    def test_reads_from_path_or_file(self):
+        generator = XLSXGenerator()
+        generator.writerow(["Name", "SKU"])
+        generator.writerow(["Apple & Pear", "A-1"])
+        content = generator.generate()
+
+        self.assertEqual(list(XLSXParser(BytesIO(content)).parse()), list(XLSXParser(content).parse()))
+        self.assertEqual(next(XLSXParser(content).parse())[:2], ["Name", "SKU"])
+
+    def test_estimate_rows(self):
+        content = workbook(**{'xl/worksheets/sheet1.xml': SHEET})
+        self.assertEqual(XLSXParser(content).estimate_rows(), 3)
+
+    def test_truncated_sheet_yields_rows_before_the_error(self):
+        content = workbook(**{'xl/worksheets/sheet1.xml': SHEET[:SHEET.index('<x:row r="3">') + 20]})
+        self.assertEqual(len(list(XLSXParser(content).parse())), 2)
+
+
+class XLSXStreamWriterTests(SimpleTestCase):
+    def test_round_trip_through_an_unseekable_stream(self):
+        rows = [["Name", "Qty", "Price"], [" Apple ", 3, Decimal("2.50")], [" Apple ", None, 1.5], ["Ctrl\x01<&>", True, "x"]]
+        content = b"".join(stream_xlsx(iter(rows), "Sales <Report>"))
+
+        parsed = [row[:3] for row in XLSXParser(content).parse()]
+        self.assertEqual(parsed, [["Name", "Qty", "Price"], ["Apple", "3", "2.50"], ["Apple", "", "1.5"], ["Ctrl<&>", "True", "x"]])
+
+        with zipfile.ZipFile(BytesIO(content)) as zf:
+            sheet = zf.read('xl/worksheets/sheet1.xml').decode()
+            # Repeated text is stored once; numbers are numeric cells
+            self.assertIn('uniqueCount="7"', zf.read('xl/sharedStrings.xml').decode())
+            self.assertIn('<c r="B2"><v>3</v></c>', sheet)
+            self.assertIn('<c r="A1" s="1" t="s">', sheet)
+            self.assertIn('<col min="1" max="1" width="10" customWidth="1"/>', sheet)
+
+    def test_rows_beyond_the_width_sample_are_streamed(self):
+        output = BytesIO()
+        writer = XLSXStreamWriter(output)
+        for n in range(XLSXStreamWriter.WIDTH_SAMPLE_ROWS * 3):
+            writer.writerow([f"Row {n}", n])
+        writer.close()
+
+        rows = list(XLSXParser(output.getvalue()).parse())
+        self.assertEqual(len(rows), XLSXStreamWriter.WIDTH_SAMPLE_ROWS * 3)
+        self.assertEqual(rows[-1][:2], [f"Row {len(rows) - 1}", str(len(rows) - 1)])
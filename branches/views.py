@@ -30,6 +30,7 @@ import requests
 from django.core.files.base import ContentFile
 from django.http import HttpResponse
 from django.utils import timezone
+from django.conf import settings
 import datetime
 from api.auth import require_api_key_django
 
@@ -369,7 +370,7 @@ def product_create(request, branch_id):
     from main.forms import ProductForm, ProductComponentFormSet
     
     if request.method == 'POST':
-        form = ProductForm(request.POST, request.FILES)
+        form = ProductForm(request.POST, request.FILES, branch=branch)
         formset = ProductComponentFormSet(request.POST)
         
         if form.is_valid() and formset.is_valid():
@@ -402,9 +403,8 @@ def product_create(request, branch_id):
 @login_required
 def export_products(request, branch_id):
     branch = get_object_or_404(Branch, pk=branch_id, tenant=request.user.profile.tenant)
-    from .xlsx_utils import XLSXGenerator
-    
-    generator = XLSXGenerator()
+    from django.http import StreamingHttpResponse
+    from .xlsx_utils import stream_xlsx
     
     # Header - 16 Fields
     headers = [
@@ -414,45 +414,59 @@ def export_products(request, branch_id):
         'Description', 'Is Active', 'Image URL',
         'Manufacturing Date (YYYY-MM-DD)', 'Country of Origin', 'Manufacturer Name', 'Manufacturer Address'
     ]
-    generator.writerow(headers)
-    
-    # Template download
-    if request.GET.get('template'):
-        generator.writerow([
-            'Sample Product', 'SKU12345', 'General', '10.00', '8.00', 
-            '5', '5.00', '100', '10', 
-            '123456789', '2025-12-31', 'BATCH001', 'INV-2023-001', 
-            'Product description here', 'TRUE', 'https://example.com/sample-image.jpg',
-            '2023-01-01', 'USA', 'Acme Corp', '123 Factory Rd'
-        ])
-    else:
-        products = Product.objects.filter(branch=branch, is_active=True).select_related('category')
-        for p in products:
-            generator.writerow([
-                p.name,
-                p.sku,
-                p.category.name if p.category else '',
-                p.price,
-                p.wholesale_price,
-                p.minimum_wholesale_quantity,
-                p.cost_price,
-                p.stock_quantity,
-                p.low_stock_threshold,
-                p.barcode or '',
-                p.expiry_date.strftime('%Y-%m-%d') if p.expiry_date else '',
-                p.batch_number or '',
-                p.invoice_waybill_number or '',
-                p.description or '',
-                'TRUE' if p.is_active else 'FALSE',
-                request.build_absolute_uri(p.image.url) if p.image else '',
-                p.manufacturing_date.strftime('%Y-%m-%d') if p.manufacturing_date else '',
-                p.country_of_origin or '',
-                p.manufacturer_name or '',
-                p.manufacturer_address or ''
-            ])
-
-    response = HttpResponse(
-        generator.generate(),
+    
+    def rows():
+        yield headers
+        
+        # Template download
+        if request.GET.get('template'):
+            yield [
+                'Sample Product', 'SKU12345', 'General', '10.00', '8.00', 
+                '5', '5.00', '100', '10', 
+                '123456789', '2025-12-31', 'BATCH001', 'INV-2023-001', 
+                'Product description here', 'TRUE', 'https://example.com/sample-image.jpg',
+                '2023-01-01', 'USA', 'Acme Corp', '123 Factory Rd'
+            ]
+            return
+        
+        image_storage = Product._meta.get_field('image').storage
+        products = Product.objects.filter(branch=branch, is_active=True).values_list(
+            'name', 'sku', 'category__name', 'price', 'wholesale_price',
+            'minimum_wholesale_quantity', 'cost_price', 'stock_quantity', 'low_stock_threshold',
+            'barcode', 'expiry_date', 'batch_number', 'invoice_waybill_number',
+            'description', 'is_active', 'image',
+            'manufacturing_date', 'country_of_origin', 'manufacturer_name', 'manufacturer_address'
+        )
+        for row in products.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            (name, sku, category_name, price, wholesale_price, min_wholesale_qty, cost_price,
+             stock_quantity, low_stock_threshold, barcode, expiry_date, batch_number, invoice_number,
+             description, is_active, image, manufacturing_date, country_of_origin,
+             manufacturer_name, manufacturer_address) = row
+            yield [
+                name,
+                sku,
+                category_name or '',
+                price,
+                wholesale_price,
+                min_wholesale_qty,
+                cost_price,
+                stock_quantity,
+                low_stock_threshold,
+                barcode or '',
+                expiry_date.strftime('%Y-%m-%d') if expiry_date else '',
+                batch_number or '',
+                invoice_number or '',
+                description or '',
+                'TRUE' if is_active else 'FALSE',
+                request.build_absolute_uri(image_storage.url(image)) if image else '',
+                manufacturing_date.strftime('%Y-%m-%d') if manufacturing_date else '',
+                country_of_origin or '',
+                manufacturer_name or '',
+                manufacturer_address or ''
+            ]
+
+    response = StreamingHttpResponse(
+        stream_xlsx(rows(), 'Sheet1', styled_header=False),
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
     response['Content-Disposition'] = f'attachment; filename="products_{branch.name}_{timezone.now().strftime("%Y%m%d")}.xlsx"'
@@ -462,7 +476,8 @@ def export_products(request, branch_id):
 def import_products(request, branch_id):
     branch = get_object_or_404(Branch, pk=branch_id, tenant=request.user.profile.tenant)
     from .forms import ProductImportForm
-    import base64
+    import uuid
+    from django.core.files.storage import default_storage
     
     if request.method == 'POST':
         form = ProductImportForm(request.POST, request.FILES)
@@ -475,9 +490,6 @@ def import_products(request, branch_id):
                     messages.error(request, 'Please upload a valid .xlsx or .csv file.')
                     return redirect('import_products', branch_id=branch.id)
                 
-                # Read file content
-                file_content = f.read()
-                
                 # Try to use Celery for async processing
                 try:
                     # FORCE SYNC for debugging (User reported async issues)
@@ -485,15 +497,22 @@ def import_products(request, branch_id):
 
                     from .tasks import import_products_task
                     
-                    # Encode as base64 for safe Celery serialization
-                    file_content_b64 = base64.b64encode(file_content).decode('utf-8')
+                    # Only the stored file's name goes through the broker; the
+                    # task streams the file from storage and deletes it
+                    file_name = default_storage.save(
+                        f"product_imports/{uuid.uuid4().hex}{'.csv' if is_csv else '.xlsx'}", f
+                    )
                     
                     # Queue the task asynchronously
-                    task = import_products_task.delay(
-                        str(request.user.profile.tenant.id),
-                        str(branch.id),
-                        file_content_b64
-                    )
+                    try:
+                        task = import_products_task.delay(
+                            str(request.user.profile.tenant.id),
+                            str(branch.id),
+                            file_name
+                        )
+                    except Exception:
+                        default_storage.delete(file_name)
+                        raise
                     
                     messages.success(
                         request, 
@@ -510,9 +529,10 @@ def import_products(request, branch_id):
                     from .services.inventory import InventoryService
                     
                     if is_csv:
-                         parser = CSVParser(file_content)
+                         parser = CSVParser(f.read())
                     else:
-                         parser = XLSXParser(file_content)
+                         # Streamed from the upload (a temporary file when large)
+                         parser = XLSXParser(f)
                     service = InventoryService(tenant=request.user.profile.tenant, branch=branch)
                     
                     results = service.import_from_parser(parser)
@@ -529,8 +549,10 @@ def import_products(request, branch_id):
                     if errors:
                         for err in errors[:5]:
                             messages.warning(request, err)
-                        if len(errors) > 5:
-                            messages.warning(request, f"...and {len(errors) - 5} more errors.")
+                        # errors is capped; it also holds up to 5 skipped-row previews
+                        remaining = results['total_errors'] + min(skip_count, 5) - 5
+                        if remaining > 0:
+                            messages.warning(request, f"...and {remaining} more errors.")
                 
                 return redirect('product_list', branch_id=branch.id)
                 
@@ -825,17 +847,34 @@ def pos_data_api(request, branch_id):
     """
     JSON API for fetching latest POS data.
     """
+    from django.utils.cache import patch_vary_headers
     from .services.pos import POSService
+    from .services.pos_snapshot import get_pos_snapshot
     branch = get_object_or_404(Branch, pk=branch_id, tenant=request.user.profile.tenant)
     pos_service = POSService(request.user.profile.tenant, request.user.profile)
-    
-    data = pos_service.get_pos_data(branch)
-    return JsonResponse({
-        "status": "success",
-        "code": 200,
-        "data": data,
-        "message": "POS data hydrated successfully"
-    })
+
+    # Served from the precomputed snapshot (see services/pos_snapshot.py)
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if 'br' in accept_encoding:
+        encoding = 'br'
+    elif 'gzip' in accept_encoding:
+        encoding = 'gzip'
+    else:
+        encoding = 'identity'
+
+    etag, body, encoding = get_pos_snapshot(
+        pos_service, branch, encoding, if_none_match=request.META.get('HTTP_IF_NONE_MATCH')
+    )
+    if body is None:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    if etag:
+        response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
 
 
 from django.views.decorators.csrf import csrf_exempt
@@ -901,9 +940,8 @@ def transaction_list(request, branch_id):
             uuid_obj = uuid.UUID(search_query)
             orders = orders.filter(id=uuid_obj)
         except ValueError:
-            # Otherwise search by order_number (exact match due to possible encryption)
-            # fallback to exact case-insensitive if not encrypted, but exact is safest for encrypted
-            orders = orders.filter(order_number=search_query)
+            # Otherwise search by order_number through its blind index (the column is encrypted)
+            orders = orders.filter(order_number__blind=search_query)
 
     if status_filter:
         orders = orders.filter(status=status_filter)
@@ -987,7 +1025,7 @@ def online_transaction_list(request, branch_id):
             uuid_obj = uuid.UUID(search_query)
             orders = orders.filter(id=uuid_obj)
         except ValueError:
-            orders = orders.filter(order_number=search_query)
+            orders = orders.filter(order_number__blind=search_query)
 
     if status_filter:
         orders = orders.filter(status=status_filter)
@@ -1525,9 +1563,16 @@ def transfer_detail(request, branch_id, pk):
              messages.error(request, "Permission denied: Access to this transfer is restricted.")
              return redirect('transfer_list', branch_id=branch.id)
 
+    lines_done = lines_total = 0
+    if transfer.status in ('approved', 'shipped'):
+        # Lines already applied by a chunked ship/receive
+        lines_done, lines_total = TransferService(tenant=request.user.profile.tenant).progress(transfer)
+
     context = {
         'branch': branch,
         'transfer': transfer,
+        'lines_done': lines_done,
+        'lines_total': lines_total,
         'is_source': (branch.id == transfer.source_branch.id),
         'is_destination': (branch.id == transfer.destination_branch.id),
         'title': f'Transfer {transfer.reference_id}'
@@ -1548,12 +1593,22 @@ def transfer_approve(request, branch_id, pk):
             
     return redirect('transfer_detail', branch_id=branch.id, pk=pk)
 
+def _is_large_transfer(request, pk):
+    """Transfers above TRANSFER_CHUNK_SIZE lines are shipped/received by a background task"""
+    lines = StockTransferItem.objects.filter(transfer_id=pk, transfer__tenant=request.user.profile.tenant).count()
+    return lines > settings.TRANSFER_CHUNK_SIZE
+
 @login_required
 def transfer_ship(request, branch_id, pk):
     branch = get_object_or_404(Branch, pk=branch_id, tenant=request.user.profile.tenant)
     transfer_service = TransferService(tenant=request.user.profile.tenant, user_profile=request.user.profile)
     
     if request.method == 'POST':
+        if _is_large_transfer(request, pk):
+            from .tasks import process_transfer_task
+            process_transfer_task.delay(str(request.user.profile.tenant.id), str(pk), 'ship', str(request.user.profile.id))
+            messages.info(request, "Shipping this transfer in the background. Refresh to follow its progress.")
+            return redirect('transfer_detail', branch_id=branch.id, pk=pk)
         result = transfer_service.ship_transfer(pk)
         if result['status'] == 'success':
             messages.success(request, "Stock shipped from source branch.")
@@ -1568,6 +1623,11 @@ def transfer_receive(request, branch_id, pk):
     transfer_service = TransferService(tenant=request.user.profile.tenant, user_profile=request.user.profile)
     
     if request.method == 'POST':
+        if _is_large_transfer(request, pk):
+            from .tasks import process_transfer_task
+            process_transfer_task.delay(str(request.user.profile.tenant.id), str(pk), 'receive', str(request.user.profile.id))
+            messages.info(request, "Receiving this transfer in the background. Refresh to follow its progress.")
+            return redirect('transfer_detail', branch_id=branch.id, pk=pk)
         result = transfer_service.receive_transfer(pk)
         if result['status'] == 'success':
             messages.success(request, "Transfer completed. Stock added to destination.")
@@ -2282,26 +2342,29 @@ def analytics_dashboard(request, branch_id):
 @login_required
 def export_sales_csv(request, branch_id):
     branch = get_object_or_404(Branch, pk=branch_id, tenant=request.user.profile.tenant)
+    from django.http import StreamingHttpResponse
+    from main.services.exports import stream_csv
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="sales_report_{branch.name}.csv"'
+    payment_methods = dict(Order._meta.get_field('payment_method').flatchoices)
     
-    writer = csv.writer(response)
-    writer.writerow(['Order ID', 'Date', 'Customer', 'Cashier', 'Status', 'Total', 'Payment Method'])
-    
-    orders = Order.objects.filter(branch=branch).order_by('-created_at')
-    
-    for order in orders:
-        writer.writerow([
-            order.id,
-            order.created_at.strftime('%Y-%m-%d %H:%M'),
-            order.customer.name if order.customer else 'Guest',
-            order.cashier.user.username if order.cashier else 'Unknown',
-            order.status,
-            order.total_amount,
-            order.get_payment_method_display()
-        ])
-        
+    def rows():
+        yield ['Order ID', 'Date', 'Customer', 'Cashier', 'Status', 'Total', 'Payment Method']
+        orders = Order.objects.filter(branch=branch).order_by('-created_at').values_list(
+            'id', 'created_at', 'customer__name', 'cashier__user__username', 'status', 'total_amount', 'payment_method'
+        )
+        for order_id, created_at, customer_name, cashier_username, status, total_amount, payment_method in orders.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            yield [
+                order_id,
+                created_at.strftime('%Y-%m-%d %H:%M'),
+                customer_name if customer_name is not None else 'Guest',
+                cashier_username if cashier_username is not None else 'Unknown',
+                status,
+                total_amount,
+                payment_methods.get(payment_method, payment_method)
+            ]
+    
+    response = StreamingHttpResponse(stream_csv(rows()), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="sales_report_{branch.name}.csv"'
     return response
 @require_api_key_django
 def validate_pos_pin(request, branch_id):
@@ -286,7 +286,7 @@ def product_create(request, branch_id):
     branch = get_object_or_404(Branch, pk=branch_id, tenant=request.user.profile.tenant)
     
     if request.method == 'POST':
-        form = ProductForm(request.POST)
+        form = ProductForm(request.POST, branch=branch)
         if form.is_valid():
             product = form.save(commit=False)
             product.tenant = request.user.profile.tenant
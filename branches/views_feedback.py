@@ -57,7 +57,7 @@ def public_feedback_submit(request, tenant_id, order_uuid=None):
             from main.models import Customer
             customer = Customer.objects.filter(tenant=tenant, email=email).first()
             if not customer and phone:
-                 customer = Customer.objects.filter(tenant=tenant, phone=phone).first()
+                 customer = Customer.objects.filter(tenant=tenant, phone__blind=phone).first()
             
             if not customer:
                 # Create Guest Customer
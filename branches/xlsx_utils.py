@@ -2,11 +2,21 @@ import zipfile
 import xml.etree.ElementTree as ET
 from io import BytesIO
 import datetime
+import decimal
 import re
+import sys
 import logging
+from xml.sax.saxutils import escape, quoteattr
 
 logger = logging.getLogger(__name__)
 
+# Characters XML 1.0 does not allow; dropped from cell text
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# Bytes handed to the output per write when streaming
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
 class XLSXGenerator:
     """Generates a simple .xlsx file without external dependencies."""
     
@@ -21,235 +31,362 @@ class XLSXGenerator:
     def generate(self):
         """Returns the bytes of the .xlsx file."""
         output = BytesIO()
-        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # [Content_Types].xml
-            zf.writestr('[Content_Types].xml', self._content_types_xml())
-            # _rels/.rels
-            zf.writestr('_rels/.rels', self._rels_xml())
-            # xl/workbook.xml
-            zf.writestr('xl/workbook.xml', self._workbook_xml())
-            # xl/_rels/workbook.xml.rels
-            zf.writestr('xl/_rels/workbook.xml.rels', self._workbook_rels_xml())
-            # xl/styles.xml (Minimal styles)
-            zf.writestr('xl/styles.xml', self._styles_xml())
-            # xl/worksheets/sheet1.xml
-            zf.writestr('xl/worksheets/sheet1.xml', self._worksheet_xml())
-
+        writer = XLSXStreamWriter(output)
+        for row in self.rows:
+            writer.writerow(row)
+        writer.close()
         return output.getvalue()
 
-    def _content_types_xml(self):
-        return """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+
+class XLSXStreamWriter:
+    """
+    Writes an .xlsx file row by row into a binary file object, which may be
+    unseekable (e.g. a response stream).
+
+    Rows are written straight into the deflated worksheet member; text is
+    stored once in the shared strings table, which is written after the sheet.
+    Numbers are written as numeric cells and None as an empty cell. Column
+    widths are sized from the first WIDTH_SAMPLE_ROWS rows, which are held back
+    until the widths are known.
+    """
+
+    WIDTH_SAMPLE_ROWS = 100
+    MAX_COLUMN_WIDTH = 50
+
+    def __init__(self, fileobj, sheet_name='Sheet1', styled_header=False):
+        self.sheet_name = sheet_name[:31] or 'Sheet1'
+        self.styled_header = styled_header
+        self._zf = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+        self._sheet = None
+        self._pending = []
+        self._buffer = []
+        self._buffered = 0
+        self._row_num = 0
+        self._strings = {}
+        self._col_letters = []
+
+    def writerow(self, row_data):
+        """Add a row of data (list or tuple)."""
+        if self._sheet is None:
+            self._pending.append(row_data)
+            if len(self._pending) >= self.WIDTH_SAMPLE_ROWS:
+                self._start_sheet()
+        else:
+            self._write_row(row_data)
+
+    def close(self):
+        """Finish the sheet and write the remaining workbook parts."""
+        if self._sheet is None:
+            self._start_sheet()
+        self._write('</sheetData></worksheet>')
+        self._flush()
+        self._sheet.close()
+
+        with self._zf.open('xl/sharedStrings.xml', 'w', force_zip64=True) as sst:
+            self._sheet = sst
+            self._write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                f'count="{len(self._strings)}" uniqueCount="{len(self._strings)}">'
+            )
+            for text in self._strings:
+                space = ' xml:space="preserve"' if text != text.strip() else ''
+                self._write(f'<si><t{space}>{escape(text)}</t></si>')
+            self._write('</sst>')
+            self._flush()
+        self._strings = {}
+
+        self._zf.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        self._zf.writestr('_rels/.rels', RELS_XML)
+        self._zf.writestr('xl/workbook.xml', WORKBOOK_XML.format(name=quoteattr(_clean_text(self.sheet_name))))
+        self._zf.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML)
+        self._zf.writestr('xl/styles.xml', STYLES_XML)
+        self._zf.close()
+
+    def _start_sheet(self):
+        self._sheet = self._zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        )
+        widths = self._sample_widths()
+        if widths:
+            self._write('<cols>')
+            for col_idx, width in enumerate(widths, start=1):
+                self._write(f'<col min="{col_idx}" max="{col_idx}" width="{width}" customWidth="1"/>')
+            self._write('</cols>')
+        self._write('<sheetData>')
+
+        pending, self._pending = self._pending, []
+        for row_data in pending:
+            self._write_row(row_data)
+
+    def _sample_widths(self):
+        widths = []
+        for row_data in self._pending:
+            for col_idx, val in enumerate(row_data):
+                length = len(str(val)) if val is not None else 0
+                if col_idx >= len(widths):
+                    widths.append(0)
+                widths[col_idx] = max(widths[col_idx], length)
+        return [min(width + 2, self.MAX_COLUMN_WIDTH) for width in widths]
+
+    def _write_row(self, row_data):
+        self._row_num += 1
+        row_num = self._row_num
+        style = ' s="1"' if self.styled_header and row_num == 1 else ''
+        while len(self._col_letters) < len(row_data):
+            self._col_letters.append(self._get_col_letter(len(self._col_letters) + 1))
+
+        parts = [f'<row r="{row_num}">']
+        for col_letter, val in zip(self._col_letters, row_data):
+            if val is None:
+                continue
+            if isinstance(val, (int, float, decimal.Decimal)) and not isinstance(val, bool) and _is_finite(val):
+                parts.append(f'<c r="{col_letter}{row_num}"{style}><v>{val}</v></c>')
+            else:
+                text = _clean_text(str(val))
+                idx = self._strings.get(text)
+                if idx is None:
+                    idx = self._strings[text] = len(self._strings)
+                parts.append(f'<c r="{col_letter}{row_num}"{style} t="s"><v>{idx}</v></c>')
+        parts.append('</row>')
+        self._write(''.join(parts))
+
+    def _write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= STREAM_CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._sheet.write(''.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+            self._buffered = 0
+
+    def _get_col_letter(self, col_idx):
+        """1 -> A, 2 -> B, ..., 26 -> Z, 27 -> AA"""
+        string = ""
+        while col_idx > 0:
+            col_idx, remainder = divmod(col_idx - 1, 26)
+            string = chr(65 + remainder) + string
+        return string
+
+
+class _ChunkSink:
+    """Write-only file object collecting bytes for stream_xlsx."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def stream_xlsx(rows, sheet_name='Sheet1', styled_header=True):
+    """
+    Yields an .xlsx file containing `rows` (the first row is the header) as
+    byte chunks, for StreamingHttpResponse.
+    """
+    sink = _ChunkSink()
+    writer = XLSXStreamWriter(sink, sheet_name, styled_header)
+    for row in rows:
+        writer.writerow(row)
+        if sink.size >= STREAM_CHUNK_SIZE:
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _clean_text(text):
+    return _ILLEGAL_XML_CHARS.sub('', text)
+
+
+def _is_finite(val):
+    try:
+        return val == val and val not in (float('inf'), float('-inf'))
+    except decimal.InvalidOperation:
+        return False
+
+
+CONTENT_TYPES_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
 <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
 <Default Extension="xml" ContentType="application/xml"/>
 <Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
 <Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
 <Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
 </Types>"""
 
-    def _rels_xml(self):
-        return """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+RELS_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
 <Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
 </Relationships>"""
 
-    def _workbook_xml(self):
-        return """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+WORKBOOK_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
 <sheets>
-<sheet name="Sheet1" sheetId="1" r:id="rId1"/>
+<sheet name={name} sheetId="1" r:id="rId1"/>
 </sheets>
 </workbook>"""
 
-    def _workbook_rels_xml(self):
-        return """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+WORKBOOK_RELS_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
 <Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
 <Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
 </Relationships>"""
 
-    def _styles_xml(self):
-         return """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+# Style 1 is the export header: bold white text on blue, centred
+STYLES_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
-<fonts count="1"><font><name val="Calibri"/><sz val="11"/><color theme="1"/><family val="2"/><scheme val="minor"/></font></fonts>
-<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<fonts count="2"><font><name val="Calibri"/><sz val="11"/><color theme="1"/><family val="2"/><scheme val="minor"/></font><font><b/><sz val="12"/><color rgb="FFFFFFFF"/><name val="Calibri"/><family val="2"/></font></fonts>
+<fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill><fill><patternFill patternType="solid"><fgColor rgb="FF3B82F6"/><bgColor rgb="FF3B82F6"/></patternFill></fill></fills>
 <borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
 <cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
-<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>
+<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
 </styleSheet>"""
 
-    def _worksheet_xml(self):
-        xml = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>']
-        xml.append('<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">')
-        xml.append('<sheetData>')
-        
-        for i, row in enumerate(self.rows):
-            xml.append(f'<row r="{i+1}">')
-            for j, val in enumerate(row):
-                col_letter = self._get_col_letter(j + 1)
-                cell_ref = f"{col_letter}{i+1}"
-                
-                if val is None:
-                    continue
-                    
-                val_str = str(val)
-                # Escape XML special characters
-                val_str = val_str.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
-                
-                # Inline String (simplest way to write strings without sharedStrings table)
-                xml.append(f'<c r="{cell_ref}" t="inlineStr"><is><t>{val_str}</t></is></c>')
-            xml.append('</row>')
-            
-        xml.append('</sheetData>')
-        xml.append('</worksheet>')
-        return "".join(xml)
 
-    def _get_col_letter(self, col_idx):
-        """1 -> A, 2 -> B, ..., 26 -> Z, 27 -> AA"""
-        string = ""
-        while col_idx > 0:
-            col_idx, remainder = divmod(col_idx - 1, 26)
-            string = chr(65 + remainder) + string
-        return string
+class XLSXParser:
+    """
+    Parses a .xlsx file and yields rows.
 
+    The worksheet and the shared strings table are streamed from the zip with
+    iterparse and every row is discarded once yielded, so memory stays flat
+    however large the sheet is. `file_content` is the file's bytes, a path or
+    a seekable binary file object.
+    """
 
-class XLSXParser:
-    """Parses a .xlsx file and yields rows."""
-    
     def __init__(self, file_content):
         self.file_content = file_content
-        self.shared_strings = []
+        self.shared_strings = None
 
     def parse(self):
         """Yields rows as lists of values."""
-        zf = zipfile.ZipFile(BytesIO(self.file_content))
-        
-        # 1. Shared Strings
-        if 'xl/sharedStrings.xml' in zf.namelist():
-            self.shared_strings = self._parse_shared_strings(zf.read('xl/sharedStrings.xml'))
-        
-        # 2. Find any worksheet (robust to different names/cases)
-        worksheet_path = None
-        for name in zf.namelist():
-            if name.lower().startswith('xl/worksheets/sheet') and name.lower().endswith('.xml'):
-                worksheet_path = name
-                break
-        
-        if not worksheet_path:
-            # Fallback to any xml in worksheets
-            worksheets = [f for f in zf.namelist() if f.lower().startswith('xl/worksheets/') and f.lower().endswith('.xml')]
-            if worksheets: worksheet_path = worksheets[0]
-
-        if worksheet_path:
-            yield from self._parse_sheet(zf.read(worksheet_path))
-
-    def _find_tag(self, element, tag_name, ns=None):
-        """Finds a tag regardless of namespace prefix."""
-        # 1. Try with provided namespace
-        if ns:
-            res = element.find(f'ns:{tag_name}', ns)
-            if res is not None: return res
-        
-        # 2. Try absolute match (no namespace)
-        res = element.find(tag_name)
-        if res is not None: return res
-        
-        # 3. Try searching all children for tag name matching the end
-        suffix = f"}}{tag_name}"
-        for child in element:
-            if child.tag == tag_name or child.tag.endswith(suffix):
-                return child
-        
-        # 4. Deep search as last resort
-        for child in element.iter():
-            if child.tag == tag_name or child.tag.endswith(suffix):
-                return child
-        return None
-
-    def _findall_tags(self, element, tag_name, ns=None):
-        """Finds all tags regardless of namespace prefix."""
-        results = []
-        if ns:
-            results = element.findall(f'ns:{tag_name}', ns)
-            if results: return results
-            
-        results = element.findall(tag_name)
-        if results: return results
-        
-        suffix = f"}}{tag_name}"
-        return [child for child in element.iter() if child.tag == tag_name or child.tag.endswith(suffix)]
-
-    def _parse_shared_strings(self, xml_content):
-        strings = []
-        try:
-            root = ET.fromstring(xml_content)
-        except: return []
+        with self._open() as zf:
+            # 1. Shared strings (read on demand while the sheet is streamed)
+            if 'xl/sharedStrings.xml' in zf.namelist():
+                self.shared_strings = SharedStrings(zf, 'xl/sharedStrings.xml')
 
-        ns_url = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
-        if root.tag.startswith('{'):
-            ns_url = root.tag.split('}')[0].strip('{')
-        ns = {'ns': ns_url}
+            # 2. Find any worksheet (robust to different names/cases)
+            worksheet_path = self._find_worksheet(zf)
+            if not worksheet_path:
+                return
+            try:
+                with zf.open(worksheet_path) as sheet:
+                    yield from self._parse_sheet(sheet)
+            finally:
+                if self.shared_strings is not None:
+                    self.shared_strings.close()
 
-        for si in self._findall_tags(root, 'si', ns):
-            t_tags = self._findall_tags(si, 't', ns)
-            text = "".join([t.text for t in t_tags if t.text is not None])
-            strings.append(text)
-        return strings
-
-    def _parse_sheet(self, xml_content):
+    def estimate_rows(self):
+        """
+        Number of rows (header included) from the sheet's <dimension> element,
+        read from the first few KB of the sheet. None when it is missing.
+        """
         try:
-            root = ET.fromstring(xml_content)
-        except: return
+            with self._open() as zf:
+                worksheet_path = self._find_worksheet(zf)
+                if not worksheet_path:
+                    return None
+                with zf.open(worksheet_path) as sheet:
+                    head = sheet.read(4096).decode('utf-8', errors='ignore')
+        except Exception:
+            return None
+        match = re.search(r'<(?:\w+:)?dimension[^>]*ref="[A-Z]+\d+:[A-Z]+(\d+)"', head)
+        return int(match.group(1)) if match else None
+
+    def _open(self):
+        if isinstance(self.file_content, (bytes, bytearray)):
+            return zipfile.ZipFile(BytesIO(self.file_content))
+        if hasattr(self.file_content, 'seek'):
+            self.file_content.seek(0)
+        return zipfile.ZipFile(self.file_content)
 
-        ns_url = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
-        if root.tag.startswith('{'):
-            ns_url = root.tag.split('}')[0].strip('{')
-        ns = {'ns': ns_url}
+    def _find_worksheet(self, zf):
+        for name in zf.namelist():
+            if name.lower().startswith('xl/worksheets/sheet') and name.lower().endswith('.xml'):
+                return name
 
-        sheet_data = self._find_tag(root, 'sheetData', ns)
-        if sheet_data is None: return
+        # Fallback to any xml in worksheets
+        worksheets = [f for f in zf.namelist() if f.lower().startswith('xl/worksheets/') and f.lower().endswith('.xml')]
+        return worksheets[0] if worksheets else None
 
-        for row in self._findall_tags(sheet_data, 'row', ns):
+    def _parse_sheet(self, stream):
+        events = ET.iterparse(stream, events=('start', 'end'))
+        try:
+            # The namespace is taken from the root element once; tags are then
+            # compared as plain strings
+            _, root = next(events)
+            ns = _namespace(root.tag)
+            sheet_data_tag, row_tag, cell_tag = f'{ns}sheetData', f'{ns}row', f'{ns}c'
+            v_tag, is_tag = f'{ns}v', f'{ns}is'
+
+            sheet_data = None
             parsed_row_data = {}
             max_col = 0
-            cells = self._findall_tags(row, 'c', ns)
+            for event, elem in events:
+                if event == 'start':
+                    if elem.tag == sheet_data_tag:
+                        sheet_data = elem
+                    continue
 
-            for cell in cells:
-                r_attr = cell.get('r')
-                if r_attr:
-                    col_str = "".join([c for c in r_attr if c.isalpha()])
-                    col_idx = self._col_str_to_index(col_str)
-                    max_col = max(max_col, col_idx)
-                else:
-                    col_idx = len(parsed_row_data) + 1
+                if elem.tag == cell_tag and sheet_data is not None:
+                    r_attr = elem.get('r')
+                    if r_attr:
+                        col_idx = self._col_str_to_index("".join([c for c in r_attr if c.isalpha()]))
+                    else:
+                        col_idx = len(parsed_row_data) + 1
                     max_col = max(max_col, col_idx)
 
-                t_attr = cell.get('t')
-                v_tag = self._find_tag(cell, 'v', ns)
-                val = v_tag.text if v_tag is not None else ""
-                
-                final_val = ""
-                if t_attr == 's' and val != "":
-                    try:
-                        idx = int(val)
-                        if 0 <= idx < len(self.shared_strings):
-                            final_val = self.shared_strings[idx]
-                    except: pass
-                elif t_attr == 'inlineStr' or self._find_tag(cell, 'is', ns) is not None:
-                    is_tag = self._find_tag(cell, 'is', ns)
-                    t_tag = self._find_tag(is_tag, 't', ns) if is_tag is not None else None
-                    if t_tag is not None:
-                        final_val = t_tag.text or ""
-                else:
-                    final_val = val
-                
-                parsed_row_data[col_idx] = final_val
-
-            row_list = []
-            for i in range(1, max(max_col, 20) + 1):
-                row_list.append(str(parsed_row_data.get(i, "")).strip())
-            
-            yield row_list
+                    t_attr = elem.get('t')
+                    v_elem = elem.find(v_tag)
+                    val = (v_elem.text or "") if v_elem is not None else ""
+                    is_elem = elem.find(is_tag)
+
+                    final_val = ""
+                    if t_attr == 's' and val != "":
+                        if self.shared_strings is not None:
+                            try:
+                                final_val = self.shared_strings.get(int(val))
+                            except ValueError:
+                                pass
+                    elif t_attr == 'inlineStr' or is_elem is not None:
+                        if is_elem is not None:
+                            final_val = _rich_text(is_elem, ns)
+                    else:
+                        final_val = val
+
+                    parsed_row_data[col_idx] = final_val
+
+                elif elem.tag == row_tag and sheet_data is not None:
+                    row_list = []
+                    for i in range(1, max(max_col, 20) + 1):
+                        row_list.append(str(parsed_row_data.get(i, "")).strip())
+                    parsed_row_data = {}
+                    max_col = 0
+                    # Drop the finished row (and its cells) from the tree
+                    sheet_data.clear()
+
+                    yield row_list
+        except (ET.ParseError, StopIteration) as e:
+            logger.warning(f"XLSX worksheet could not be parsed: {e}")
 
     def _col_str_to_index(self, col_str):
         """Convert column string (A, B, AA) to 1-based index."""
@@ -257,3 +394,61 @@ class XLSXParser:
         for c in col_str:
             num = num * 26 + (ord(c.upper()) - ord('A')) + 1
         return num
+
+
+class SharedStrings:
+    """
+    Shared strings table of a workbook, streamed from its zip member on
+    demand: entries are only parsed up to the highest index a cell has asked
+    for so far. Repeated values are interned.
+    """
+
+    def __init__(self, zf, path):
+        self._strings = []
+        self._entries = self._iter_entries(zf, path)
+
+    def get(self, idx):
+        """Text of entry `idx`, or "" when the table has no such entry."""
+        if idx < 0:
+            return ""
+        while idx >= len(self._strings):
+            text = next(self._entries, None)
+            if text is None:
+                return ""
+            self._strings.append(text)
+        return self._strings[idx]
+
+    def close(self):
+        self._entries.close()
+
+    def _iter_entries(self, zf, path):
+        with zf.open(path) as stream:
+            events = ET.iterparse(stream, events=('start', 'end'))
+            try:
+                _, root = next(events)
+                ns = _namespace(root.tag)
+                si_tag = f'{ns}si'
+                for event, elem in events:
+                    if event == 'end' and elem.tag == si_tag:
+                        text = sys.intern(_rich_text(elem, ns))
+                        root.clear()
+                        yield text
+            except (ET.ParseError, StopIteration) as e:
+                logger.warning(f"XLSX shared strings could not be parsed: {e}")
+
+
+def _namespace(tag):
+    """'{uri}name' -> '{uri}', 'name' -> ''."""
+    return tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+
+
+def _rich_text(elem, ns):
+    """Text of an <si> or <is> element: its <t>, or the <t> of each <r> run (phonetic runs are skipped)."""
+    t_tag, r_tag = f'{ns}t', f'{ns}r'
+    parts = []
+    for child in elem:
+        if child.tag == t_tag:
+            parts.append(child.text or "")
+        elif child.tag == r_tag:
+            parts.extend(t.text or "" for t in child if t.tag == t_tag)
+    return "".join(parts)
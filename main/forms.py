@@ -40,7 +40,19 @@ class ProductForm(forms.ModelForm):
             'manufacturing_date': forms.DateInput(attrs={'type': 'date'}),
             'image': forms.FileInput(attrs={'class': 'hidden', 'accept': 'image/*', 'id': 'product-image-input'}),
         }
-        
+
+    def __init__(self, *args, **kwargs):
+        branch = kwargs.pop('branch', None)
+        super().__init__(*args, **kwargs)
+        # branch is not a form field, so validate_unique skips the (branch, sku) constraint
+        self.branch = branch or self.instance.branch
+
+    def clean_sku(self):
+        sku = self.cleaned_data.get('sku')
+        if self.branch and Product.objects.filter(branch=self.branch, sku=sku).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("A product with this SKU already exists in this branch.")
+        return sku
+
 class GiftCardForm(forms.ModelForm):
     class Meta:
         model = GiftCard
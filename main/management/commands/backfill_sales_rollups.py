@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from accounts.models import Tenant
+from main.models import Order
+from branches.services.sales_rollup import rebuild_sales_rollups
+
+# Days rebuilt per transaction
+WINDOW_DAYS = 31
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollup tables from completed orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Only this tenant schema (default: every tenant)')
+        parser.add_argument('--start', help='First day to rebuild, YYYY-MM-DD (default: first order)')
+        parser.add_argument('--end', help='Last day to rebuild, YYYY-MM-DD (default: today)')
+        parser.add_argument('--days', type=int, help='Rebuild the last N days instead of --start/--end')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            start = self._parse_date(options['start'])
+            end = self._parse_date(options['end']) or today
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+        if options['days']:
+            start, end = today - timedelta(days=options['days'] - 1), today
+
+        tenants = Tenant.objects.exclude(schema_name='public')
+        if options['schema']:
+            tenants = tenants.filter(schema_name=options['schema'])
+            if not tenants.exists():
+                raise CommandError(f"No tenant with schema '{options['schema']}'")
+
+        for tenant in tenants:
+            with schema_context(tenant.schema_name):
+                tenant_start = start
+                if tenant_start is None:
+                    first = Order.objects.filter(tenant=tenant, status='completed').aggregate(first=Min('created_at'))['first']
+                    if first is None:
+                        self.stdout.write(f"{tenant.schema_name}: no completed orders")
+                        continue
+                    tenant_start = timezone.localdate(first)
+
+                branch_rows = product_rows = 0
+                window_start = tenant_start
+                while window_start <= end:
+                    window_end = min(window_start + timedelta(days=WINDOW_DAYS - 1), end)
+                    written = rebuild_sales_rollups(tenant, window_start, window_end)
+                    branch_rows += written[0]
+                    product_rows += written[1]
+                    window_start = window_end + timedelta(days=1)
+
+                self.stdout.write(self.style.SUCCESS(
+                    f"{tenant.schema_name}: {tenant_start} to {end}, "
+                    f"{branch_rows} branch rows, {product_rows} product rows"
+                ))
+
+    @staticmethod
+    def _parse_date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
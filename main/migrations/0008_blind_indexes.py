@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-17 19:54
+
+import utils.encryption
+from django.db import migrations
+
+
+BLIND_INDEXES = [
+    ('Customer', 'phone_index'),
+    ('Supplier', 'phone_index'),
+    ('Order', 'order_number_index'),
+    ('OrderItem', 'item_number_index'),
+]
+
+
+def backfill_blind_indexes(apps, schema_editor):
+    """Hash the existing plaintext of every indexed encrypted column."""
+    for model_name, index_name in BLIND_INDEXES:
+        model = apps.get_model('main', model_name)
+        index_field = model._meta.get_field(index_name)
+        batch = []
+        for obj in model.objects.only('pk', index_field.source).iterator(chunk_size=2000):
+            setattr(obj, index_name, index_field.compute(obj))
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, [index_name])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, [index_name])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_feedbackreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_index',
+            field=utils.encryption.BlindIndexField(blank=True, db_index=True, editable=False, max_length=64, normalizer=utils.encryption.normalize_phone, null=True, source='phone'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='order_number_index',
+            field=utils.encryption.BlindIndexField(blank=True, db_index=True, editable=False, max_length=64, normalizer=utils.encryption.normalize_identifier, null=True, source='order_number'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='item_number_index',
+            field=utils.encryption.BlindIndexField(blank=True, db_index=True, editable=False, max_length=64, normalizer=utils.encryption.normalize_identifier, null=True, source='item_number'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='phone_index',
+            field=utils.encryption.BlindIndexField(blank=True, db_index=True, editable=False, max_length=64, normalizer=utils.encryption.normalize_phone, null=True, source='phone'),
+        ),
+        migrations.RunPython(backfill_blind_indexes, migrations.RunPython.noop),
+    ]
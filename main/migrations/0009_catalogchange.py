@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-17 21:10
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_identifiersequence'),
+        ('main', '0008_blind_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('entity', models.CharField(choices=[('product', 'Product'), ('category', 'Category'), ('customer', 'Customer')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('version', models.BigIntegerField(db_index=True)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_changes', to='accounts.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'version'], name='main_catalo_tenant__afae4e_idx')],
+                'unique_together': {('tenant', 'entity', 'object_id')},
+            },
+        ),
+    ]
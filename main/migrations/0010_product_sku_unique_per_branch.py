@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_catalogchange'),
+    ]
+
+    operations = [
+        # Keep the oldest product per (branch, sku) and suffix the SKUs of later
+        # duplicates so the unique constraint can be created
+        migrations.RunSQL(
+            sql="""
+                UPDATE main_product AS p
+                SET sku = LEFT(p.sku, 40) || '-DUP' || d.rn
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY branch_id, sku ORDER BY created_at, id) AS rn
+                    FROM main_product
+                    WHERE branch_id IS NOT NULL
+                ) AS d
+                WHERE p.id = d.id AND d.rn > 1
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('branch', 'sku'), name='unique_product_sku_per_branch'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_product_sku_unique_per_branch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail',
+            field=models.ImageField(blank=True, help_text='Small copy of the image, generated by imports', null=True, upload_to='products/thumbs/'),
+        ),
+    ]
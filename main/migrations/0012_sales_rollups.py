@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:10
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_identifiersequence'),
+        ('main', '0011_product_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchSalesDaily',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('card', 'Card'), ('mobile', 'Mobile Money'), ('gift_card', 'Gift Card'), ('store_credit', 'Store Credit'), ('loyalty_points', 'Loyalty Points'), ('stripe', 'Stripe'), ('paystack', 'Paystack'), ('credit', 'On Credit / Account'), ('split', 'Split Payment')], max_length=20)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('items_sold', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_daily', to='accounts.branch')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branch_sales_daily', to='accounts.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'date'], name='main_branch_tenant__802d21_idx')],
+                'unique_together': {('branch', 'date', 'payment_method')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales_daily', to='accounts.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_daily', to='main.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales_daily', to='accounts.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['branch', 'date'], name='main_produc_branch__16f352_idx'), models.Index(fields=['tenant', 'date'], name='main_produc_tenant__0c328d_idx')],
+                'unique_together': {('branch', 'product', 'date')},
+            },
+        ),
+    ]
@@ -1,8 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from accounts.models import Branch, Tenant, UserProfile
 import uuid
-from utils.encryption import EncryptedTextField
+from utils.encryption import EncryptedTextField, BlindIndexField, normalize_identifier, normalize_phone
 import datetime
 
 class Supplier(models.Model):
@@ -12,6 +12,7 @@ class Supplier(models.Model):
     contact_person = models.CharField(max_length=100, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
     phone = EncryptedTextField(blank=True, null=True)
+    phone_index = BlindIndexField(source='phone', normalizer=normalize_phone)
     address = EncryptedTextField(blank=True, null=True)
     tax_id = models.CharField(max_length=50, blank=True, null=True)
     
@@ -60,6 +61,7 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField(default=0)
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    thumbnail = models.ImageField(upload_to='products/thumbs/', blank=True, null=True, help_text="Small copy of the image, generated by imports")
     
     # Extended Details
     expiry_date = models.DateField(blank=True, null=True)
@@ -93,6 +95,12 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # Target of the import upsert (INSERT ... ON CONFLICT (branch_id, sku))
+            models.UniqueConstraint(fields=['branch', 'sku'], name='unique_product_sku_per_branch'),
+        ]
+
     @property
     def image_url(self):
         from django.templatetags.static import static
@@ -125,9 +133,27 @@ class Product(models.Model):
             
         return float(total_sold) / days
 
-    def get_days_until_stockout(self):
-        """Predict days until stock runs out based on 30-day velocity"""
-        velocity = self.get_daily_sales_velocity(days=30)
+    @classmethod
+    def get_daily_sales_velocities(cls, products, days=30):
+        """get_daily_sales_velocity() of many products (a queryset or ids) in one query: {product_id: velocity}"""
+        from django.db.models import Sum
+        from django.utils import timezone
+        import datetime
+        
+        start_date = timezone.now() - datetime.timedelta(days=days)
+        
+        totals = OrderItem.objects.filter(
+            product__in=products,
+            order__created_at__gte=start_date,
+            order__status='completed'
+        ).values('product_id').annotate(total=Sum('quantity')).order_by().values_list('product_id', 'total')
+        
+        return {product_id: float(total) / days for product_id, total in totals if total}
+
+    def get_days_until_stockout(self, velocity=None):
+        """Predict days until stock runs out based on 30-day velocity (pass it when already known)"""
+        if velocity is None:
+            velocity = self.get_daily_sales_velocity(days=30)
         if velocity <= 0:
             return 999 # Technically infinite, but we return a high number
         
@@ -224,6 +250,7 @@ class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(blank=True, null=True)
     phone = EncryptedTextField(blank=True, null=True)
+    phone_index = BlindIndexField(source='phone', normalizer=normalize_phone)
     address = EncryptedTextField(blank=True, null=True)
     customer_type = models.CharField(max_length=20, choices=CUSTOMER_TYPES, default='retail')
     
@@ -301,6 +328,7 @@ class Order(models.Model):
     
     # Unique identifier
     order_number = EncryptedTextField(max_length=30, unique=True, db_index=True, blank=True, null=True, help_text="Human-readable order number (e.g., ORD-000001)")
+    order_number_index = BlindIndexField(source='order_number', normalizer=normalize_identifier)
     
     # Financial fields
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text="Amount before tax")
@@ -320,7 +348,11 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         if not self.order_number:
             from utils.identifier_generator import generate_order_number
-            self.order_number = generate_order_number(self.tenant)
+            # Allocate in the same transaction as the INSERT so a failed save releases the number
+            with transaction.atomic():
+                self.order_number = generate_order_number(self.tenant)
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -333,6 +365,7 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='order_items')
     item_number = EncryptedTextField(max_length=30, unique=True, db_index=True, blank=True, null=True, help_text="Human-readable item number (e.g., ITM-00001)")
+    item_number_index = BlindIndexField(source='item_number', normalizer=normalize_identifier)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2) # Snapshot of price at time of order
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00) # Snapshot of cost at time of order
@@ -340,7 +373,10 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         if not self.item_number:
             from utils.identifier_generator import generate_item_number
-            self.item_number = generate_item_number(self.order)
+            with transaction.atomic():
+                self.item_number = generate_item_number(self.order)
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -895,3 +931,90 @@ class FeedbackReport(models.Model):
         ordering = ['-created_at']
         verbose_name = "Feedback Report"
         verbose_name_plural = "Feedback Reports"
+
+
+# -----------------------------------------------------------------------------
+# SYNC MODELS
+# -----------------------------------------------------------------------------
+
+class CatalogChange(models.Model):
+    """
+    Change log behind the POS/kiosk delta sync: one row per synced object holding
+    the version of its latest change (see branches/services/catalog_sync.py).
+    Deleted objects keep their row, so tombstones are never lost.
+    """
+    ENTITY_CHOICES = (
+        ('product', 'Product'),
+        ('category', 'Category'),
+        ('customer', 'Customer'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='catalog_changes')
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    object_id = models.UUIDField()
+    version = models.BigIntegerField(db_index=True)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('tenant', 'entity', 'object_id')
+        indexes = [
+            models.Index(fields=['tenant', 'version']),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id} @ {self.version}"
+
+
+# -----------------------------------------------------------------------------
+# REPORTING ROLLUPS
+# -----------------------------------------------------------------------------
+
+class BranchSalesDaily(models.Model):
+    """
+    Completed sales of one branch on one day, split by payment method.
+    Maintained by branches/services/sales_rollup.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='branch_sales_daily')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='sales_daily')
+    date = models.DateField()
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    items_sold = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('branch', 'date', 'payment_method')
+        indexes = [
+            models.Index(fields=['tenant', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.branch_id} {self.date} {self.payment_method}: {self.total_revenue}"
+
+
+class ProductSalesDaily(models.Model):
+    """
+    Completed sales of one product in one branch on one day.
+    Maintained by branches/services/sales_rollup.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='product_sales_daily')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='product_sales_daily')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_daily')
+    date = models.DateField()
+    quantity = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('branch', 'product', 'date')
+        indexes = [
+            models.Index(fields=['branch', 'date']),
+            models.Index(fields=['tenant', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.date}: {self.quantity}"
@@ -2,52 +2,144 @@
 Alert Service for managing stock alerts.
 Handles detection, creation, and notification of low stock alerts.
 """
+import logging
 from django.utils import timezone
 from django.core.mail import send_mail
+from django.db.models import Q, F, Case, When, Value, CharField, Exists, OuterRef
 from django.template.loader import render_to_string
 from django.conf import settings
+from accounts.models import Tenant, UserProfile
 from main.models import Product, StockAlert
 
+logger = logging.getLogger(__name__)
+
+
+# Alerts written per INSERT
+ALERT_BATCH_SIZE = 1000
+
+BELOW_THRESHOLD = Q(stock_quantity=0) | Q(stock_quantity__lte=F('low_stock_threshold'))
+
+ALERT_TYPE = Case(
+    When(stock_quantity=0, then=Value('out_of_stock')),
+    default=Value('low_stock'),
+    output_field=CharField(),
+)
+
 
 def check_stock_levels(branch=None):
     """
     Check stock levels for all products and create alerts if needed.
     
+    Products at or below their threshold without an open alert are selected
+    in one query, their alerts are inserted in bulk, and one digest email is
+    sent per tenant and branch.
+    
     Args:
         branch: Optional branch to check. If None, checks all products.
     
     Returns:
         List of created alerts
     """
-    alerts_created = []
-    
-    # Get products to check
-    products = Product.objects.filter(is_active=True, alert_enabled=True)
+    open_alerts = StockAlert.objects.filter(product=OuterRef('pk'), is_resolved=False)
+    products = Product.objects.filter(BELOW_THRESHOLD, is_active=True, alert_enabled=True).filter(~Exists(open_alerts))
     if branch:
         products = products.filter(branch=branch)
     
-    for product in products:
-        # Check if product already has an unresolved alert
-        existing_alert = StockAlert.objects.filter(
-            product=product,
-            is_resolved=False
-        ).first()
-        
-        if existing_alert:
-            continue  # Skip if alert already exists
-        
-        # Determine alert type
-        alert_type = None
-        if product.stock_quantity == 0:
-            alert_type = 'out_of_stock'
-        elif product.stock_quantity <= product.low_stock_threshold:
-            alert_type = 'low_stock'
-        
-        if alert_type:
-            alert = create_alert(product, alert_type)
-            alerts_created.append(alert)
+    alerts = []
+    digests = {}
+    for row in products.annotate(alert_type=ALERT_TYPE).values(
+        'id', 'name', 'sku', 'tenant_id', 'branch_id', 'branch__name', 'alert_type', 'low_stock_threshold', 'stock_quantity'
+    ).order_by('tenant_id', 'branch__name', 'name'):
+        alert = StockAlert(
+            product_id=row['id'],
+            alert_type=row['alert_type'],
+            threshold=row['low_stock_threshold'],
+            current_stock=row['stock_quantity']
+        )
+        alerts.append(alert)
+        digests.setdefault((row['tenant_id'], row['branch_id']), []).append((alert, row))
+    
+    StockAlert.objects.bulk_create(alerts, batch_size=ALERT_BATCH_SIZE)
+    send_alert_digests(digests)
+    return alerts
+
+
+def send_alert_digests(digests):
+    """
+    Send one email per tenant and branch listing its new alerts, and mark
+    them notified.
+    
+    Args:
+        digests: {(tenant_id, branch_id): [(alert, product values), ...]}
+    """
+    if not digests:
+        return
+    tenant_ids = {tenant_id for tenant_id, _ in digests}
+    tenants = Tenant.objects.in_bulk(tenant_ids)
+    recipients = _admin_emails(tenant_ids)
     
-    return alerts_created
+    for (tenant_id, branch_id), entries in digests.items():
+        emails = recipients.get(tenant_id)
+        if not emails:
+            continue
+        try:
+            branch_name = entries[0][1]['branch__name'] or 'All branches'
+            rows = [
+                {
+                    'name': row['name'],
+                    'sku': row['sku'],
+                    'current_stock': alert.current_stock,
+                    'threshold': alert.threshold,
+                    'alert_type_display': alert.get_alert_type_display(),
+                }
+                for alert, row in entries
+            ]
+            if len(rows) == 1:
+                subject = f"{settings.EMAIL_SUBJECT_PREFIX}Stock Alert: {rows[0]['name']}"
+            else:
+                subject = f"{settings.EMAIL_SUBJECT_PREFIX}Stock Alert: {len(rows)} products at {branch_name}"
+            
+            context = {
+                'tenant': tenants.get(tenant_id),
+                'branch_name': branch_name,
+                'alerts': rows,
+            }
+            html_message = render_to_string('emails/stock_alert_digest.html', context)
+            lines = "\n".join(
+                f"- {row['name']} ({row['sku']}): {row['current_stock']} in stock, threshold {row['threshold']}"
+                for row in rows
+            )
+            plain_message = f"""
+Stock Alert: {len(rows)} product(s) need attention
+
+Branch: {branch_name}
+
+{lines}
+
+Please restock these items as soon as possible.
+            """
+            
+            send_mail(
+                subject,
+                plain_message,
+                settings.DEFAULT_FROM_EMAIL,
+                emails,
+                html_message=html_message,
+                fail_silently=True,
+            )
+            StockAlert.objects.filter(pk__in=[alert.pk for alert, _ in entries]).update(notified=True)
+        except Exception as e:
+            logger.exception(f"Error sending alert digest for branch {branch_id} of tenant {tenant_id}: {e}")
+
+
+def _admin_emails(tenant_ids):
+    """{tenant_id: [email, ...]} of the staff users of each tenant"""
+    emails = {}
+    for tenant_id, email in UserProfile.objects.filter(
+        tenant_id__in=tenant_ids, user__is_staff=True
+    ).exclude(user__email='').values_list('tenant_id', 'user__email').distinct():
+        emails.setdefault(tenant_id, []).append(email)
+    return emails
 
 
 def create_alert(product, alert_type):
@@ -89,9 +181,7 @@ def send_alert_email(alert):
         tenant = product.tenant
         
         # Get tenant admin emails
-        admin_emails = tenant.userprofile_set.filter(
-            user__is_staff=True
-        ).values_list('user__email', flat=True)
+        admin_emails = _admin_emails([tenant.pk]).get(tenant.pk)
         
         if not admin_emails:
             return
@@ -122,7 +212,7 @@ Please restock this item as soon as possible.
             subject,
             plain_message,
             settings.DEFAULT_FROM_EMAIL,
-            list(admin_emails),
+            admin_emails,
             html_message=html_message,
             fail_silently=True,
         )
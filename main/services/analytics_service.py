@@ -6,10 +6,19 @@ from django.db.models import Sum, Count, Avg, F, Q
 from django.utils import timezone
 from datetime import timedelta, datetime
 from main.models import Order, OrderItem, Product, Customer
+from main.services.timeseries import sales_series, growth, period_start
 from decimal import Decimal
 
 
-def get_sales_trends(branch=None, tenant=None, period='week'):
+PERIOD_DAYS = {
+    'day': 1,
+    'week': 7,
+    'month': 30,
+    'year': 365,
+}
+
+
+def get_sales_trends(branch=None, tenant=None, period='week', bucket='day'):
     """
     Calculate sales trends over specified time period.
     
@@ -17,29 +26,15 @@ def get_sales_trends(branch=None, tenant=None, period='week'):
         branch: Optional branch to filter by
         tenant: Tenant instance
         period: 'day', 'week', 'month', 'year'
+        bucket: Chart granularity: 'hour', 'day', 'week' or 'month'
     
     Returns:
         Dictionary with trend data and comparison
     """
     now = timezone.now()
-    
-    # Determine date ranges
-    if period == 'day':
-        current_start = now.replace(hour=0, minute=0, second=0)
-        previous_start = current_start - timedelta(days=1)
-        days_count = 1
-    elif period == 'week':
-        current_start = now - timedelta(days=7)
-        previous_start = current_start - timedelta(days=7)
-        days_count = 7
-    elif period == 'month':
-        current_start = now - timedelta(days=30)
-        previous_start = current_start - timedelta(days=30)
-        days_count = 30
-    else:  # year
-        current_start = now - timedelta(days=365)
-        previous_start = current_start - timedelta(days=365)
-        days_count = 365
+    # The period covers whole calendar days up to now; the previous period
+    # is the same length immediately before it
+    current_start = period_start(PERIOD_DAYS.get(period, 365), now)
     
     # Base query
     orders_query = Order.objects.filter(status='completed')
@@ -48,55 +43,25 @@ def get_sales_trends(branch=None, tenant=None, period='week'):
     if branch:
         orders_query = orders_query.filter(branch=branch)
     
-    # Current period metrics
-    current_orders = orders_query.filter(created_at__gte=current_start)
-    current_revenue = current_orders.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    current_count = current_orders.count()
-    
-    # Previous period metrics
-    previous_orders = orders_query.filter(
-        created_at__gte=previous_start,
-        created_at__lt=current_start
-    )
-    previous_revenue = previous_orders.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    previous_count = previous_orders.count()
-    
-    # Calculate growth
-    revenue_growth = 0
-    if previous_revenue > 0:
-        revenue_growth = ((current_revenue - previous_revenue) / previous_revenue) * 100
-    
-    order_growth = 0
-    if previous_count > 0:
-        order_growth = ((current_count - previous_count) / previous_count) * 100
-    
-    # Daily breakdown for charts
-    daily_data = []
-    for i in range(days_count):
-        day = current_start + timedelta(days=i)
-        day_end = day + timedelta(days=1)
-        
-        day_orders = orders_query.filter(
-            created_at__gte=day,
-            created_at__lt=day_end
-        )
-        day_revenue = day_orders.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-        
-        daily_data.append({
-            'date': day.strftime('%Y-%m-%d'),
-            'revenue': float(day_revenue),
-            'orders': day_orders.count()
-        })
+    trends = sales_series(orders_query, current_start, now, bucket=bucket, metrics=('revenue', 'orders', 'aov', 'items'), compare=True)
+    current = trends['current']
+    previous = trends['previous']
     
     return {
-        'current_revenue': float(current_revenue),
-        'current_orders': current_count,
-        'previous_revenue': float(previous_revenue),
-        'previous_orders': previous_count,
-        'revenue_growth': float(revenue_growth),
-        'order_growth': float(order_growth),
-        'daily_data': daily_data,
-        'period': period
+        'current_revenue': current['revenue'],
+        'current_orders': current['orders'],
+        'current_aov': current['aov'],
+        'current_items': current['items'],
+        'previous_revenue': previous['revenue'],
+        'previous_orders': previous['orders'],
+        'previous_aov': previous['aov'],
+        'previous_items': previous['items'],
+        'revenue_growth': growth(current['revenue'], previous['revenue']),
+        'order_growth': growth(current['orders'], previous['orders']),
+        'aov_growth': growth(current['aov'], previous['aov']),
+        'daily_data': trends['series'],
+        'period': period,
+        'bucket': bucket
     }
 
 
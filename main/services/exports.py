@@ -1,190 +1,295 @@
 """
 Export Service for generating CSV and Excel reports.
 Provides utilities for exporting various data types from the POS system.
+
+Rows are read with values_list(...).iterator() and written straight into a
+StreamingHttpResponse, so memory does not grow with the report. Reports
+larger than EXPORT_ASYNC_THRESHOLD rows are written to storage by
+main.tasks.export_report_task instead, and the user is sent a download link
+(ASGI servers buffer synchronous streaming responses, so large exports should
+not be served inline there).
 """
 import csv
-import io
-from datetime import datetime
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
+import logging
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F, DecimalField, ExpressionWrapper
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from branches.xlsx_utils import stream_xlsx, STREAM_CHUNK_SIZE
+from main.models import Order, Product, Customer, OrderItem
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Async exports are stored under EXPORT_STORAGE_PREFIX/<token>/<filename>
+EXPORT_STORAGE_PREFIX = 'exports'
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer: write() hands the line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, fields):
+    """
+    Yields the header, then one row per object, reading the queryset in
+    EXPORT_CHUNK_SIZE batches. Dotted field names follow relations
+    ('customer.name').
+    """
+    yield [display_name for _, display_name in fields]
+    lookups = [field_name.replace('.', '__') for field_name, _ in fields]
+    for row in queryset.values_list(*lookups).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield row
+
+
+def stream_csv(rows):
+    """Yields CSV text for `rows` in chunks of about STREAM_CHUNK_SIZE characters."""
+    writer = csv.writer(_Echo())
+    lines = []
+    size = 0
+    for row in rows:
+        line = writer.writerow(['' if value is None else str(value) for value in row])
+        lines.append(line)
+        size += len(line)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield ''.join(lines)
+
+
+def _timestamped(filename, extension):
+    return f'{filename}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
 
 
 def export_to_csv(queryset, fields, filename='export'):
     """
     Export a queryset to CSV format.
-    
+
     Args:
         queryset: Django queryset to export
         fields: List of tuples (field_name, display_name)
         filename: Base filename for the export
-    
+
     Returns:
-        HttpResponse with CSV file
+        StreamingHttpResponse with CSV file
     """
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-    
-    writer = csv.writer(response)
-    
-    # Write header
-    writer.writerow([display_name for _, display_name in fields])
-    
-    # Write data rows
-    for obj in queryset:
-        row = []
-        for field_name, _ in fields:
-            # Handle nested attributes (e.g., 'product.name')
-            value = obj
-            for attr in field_name.split('.'):
-                value = getattr(value, attr, '')
-            row.append(str(value) if value is not None else '')
-        writer.writerow(row)
-    
+    response = StreamingHttpResponse(stream_csv(export_rows(queryset, fields)), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{_timestamped(filename, "csv")}"'
     return response
 
 
 def export_to_excel(queryset, fields, filename='export', sheet_name='Data'):
     """
-    Export a queryset to Excel format with styling.
-    
+    Export a queryset to Excel format with a styled header row.
+
     Args:
         queryset: Django queryset to export
         fields: List of tuples (field_name, display_name)
         filename: Base filename for the export
         sheet_name: Name of the Excel sheet
-    
+
     Returns:
-        HttpResponse with Excel file
+        StreamingHttpResponse with Excel file
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = sheet_name
-    
-    # Header styling
-    header_fill = PatternFill(start_color='3B82F6', end_color='3B82F6', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF', size=12)
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Write header
-    for col_num, (_, display_name) in enumerate(fields, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = display_name
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-    
-    # Write data rows
-    for row_num, obj in enumerate(queryset, 2):
-        for col_num, (field_name, _) in enumerate(fields, 1):
-            # Handle nested attributes
-            value = obj
-            for attr in field_name.split('.'):
-                value = getattr(value, attr, '')
-            
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.value = str(value) if value is not None else ''
-            cell.alignment = Alignment(vertical='center')
-    
-    # Auto-adjust column widths
-    for col_num in range(1, len(fields) + 1):
-        column_letter = get_column_letter(col_num)
-        max_length = 0
-        for cell in ws[column_letter]:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Create response
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-    
-    # Save workbook to response
-    wb.save(response)
+    response = StreamingHttpResponse(stream_xlsx(export_rows(queryset, fields), sheet_name), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{_timestamped(filename, "xlsx")}"'
     return response
 
 
+SALES_FIELDS = [
+    ('order_number', 'Order Number'),
+    ('customer.name', 'Customer'),
+    ('created_at', 'Date'),
+    ('total_amount', 'Total Amount'),
+    ('payment_method', 'Payment Method'),
+    ('status', 'Status'),
+    ('branch.name', 'Branch'),
+]
+
+INVENTORY_FIELDS = [
+    ('sku', 'SKU'),
+    ('name', 'Product Name'),
+    ('category.name', 'Category'),
+    ('stock_quantity', 'Stock Quantity'),
+    ('price', 'Price'),
+    ('cost_price', 'Cost'),
+    ('branch.name', 'Branch'),
+    ('is_active', 'Active'),
+]
+
+CUSTOMER_FIELDS = [
+    ('name', 'Name'),
+    ('email', 'Email'),
+    ('phone', 'Phone'),
+    ('loyalty_points', 'Loyalty Points'),
+    ('total_spend', 'Total Purchases'),
+    ('created_at', 'Member Since'),
+]
+
+ORDER_ITEM_FIELDS = [
+    ('order.order_number', 'Order Number'),
+    ('product.name', 'Product'),
+    ('quantity', 'Quantity'),
+    ('price', 'Unit Price'),
+    ('subtotal', 'Subtotal'),
+    ('order.created_at', 'Date'),
+]
+
+
 def export_sales_report(orders, format='csv'):
     """Export sales report with order details."""
-    fields = [
-        ('order_number', 'Order Number'),
-        ('customer.name', 'Customer'),
-        ('created_at', 'Date'),
-        ('total_amount', 'Total Amount'),
-        ('payment_method', 'Payment Method'),
-        ('status', 'Status'),
-        ('branch.name', 'Branch'),
-    ]
-    
     filename = 'sales_report'
-    
+
     if format == 'excel':
-        return export_to_excel(orders, fields, filename, 'Sales Report')
+        return export_to_excel(orders, SALES_FIELDS, filename, 'Sales Report')
     else:
-        return export_to_csv(orders, fields, filename)
+        return export_to_csv(orders, SALES_FIELDS, filename)
 
 
 def export_inventory_report(products, format='csv'):
     """Export inventory report with product details."""
-    fields = [
-        ('sku', 'SKU'),
-        ('name', 'Product Name'),
-        ('category.name', 'Category'),
-        ('stock_quantity', 'Stock Quantity'),
-        ('price', 'Price'),
-        ('cost', 'Cost'),
-        ('branch.name', 'Branch'),
-        ('is_active', 'Active'),
-    ]
-    
     filename = 'inventory_report'
-    
+
     if format == 'excel':
-        return export_to_excel(products, fields, filename, 'Inventory')
+        return export_to_excel(products, INVENTORY_FIELDS, filename, 'Inventory')
     else:
-        return export_to_csv(products, fields, filename)
+        return export_to_csv(products, INVENTORY_FIELDS, filename)
 
 
 def export_customer_report(customers, format='csv'):
     """Export customer report with contact details."""
-    fields = [
-        ('name', 'Name'),
-        ('email', 'Email'),
-        ('phone', 'Phone'),
-        ('loyalty_points', 'Loyalty Points'),
-        ('total_purchases', 'Total Purchases'),
-        ('created_at', 'Member Since'),
-    ]
-    
     filename = 'customer_report'
-    
+
     if format == 'excel':
-        return export_to_excel(customers, fields, filename, 'Customers')
+        return export_to_excel(customers, CUSTOMER_FIELDS, filename, 'Customers')
     else:
-        return export_to_csv(customers, fields, filename)
+        return export_to_csv(customers, CUSTOMER_FIELDS, filename)
 
 
 def export_order_items_report(order_items, format='csv'):
     """Export detailed order items report."""
-    fields = [
-        ('order.order_number', 'Order Number'),
-        ('product.name', 'Product'),
-        ('quantity', 'Quantity'),
-        ('price', 'Unit Price'),
-        ('subtotal', 'Subtotal'),
-        ('order.created_at', 'Date'),
-    ]
-    
     filename = 'order_items_report'
-    
+    order_items = with_subtotal(order_items)
+
     if format == 'excel':
-        return export_to_excel(order_items, fields, filename, 'Order Items')
+        return export_to_excel(order_items, ORDER_ITEM_FIELDS, filename, 'Order Items')
+    else:
+        return export_to_csv(order_items, ORDER_ITEM_FIELDS, filename)
+
+
+def with_subtotal(order_items):
+    if 'subtotal' in order_items.query.annotations:
+        return order_items
+    return order_items.annotate(subtotal=ExpressionWrapper(
+        F('quantity') * F('price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+    ))
+
+
+# Report querysets, shared by the export views and export_report_task.
+# Parameters must be JSON-serialisable (they are passed to Celery).
+
+def sales_queryset(branch_id, start_date, end_date):
+    return Order.objects.filter(
+        branch_id=branch_id,
+        created_at__date__gte=start_date,
+        created_at__date__lte=end_date
+    ).order_by('-created_at')
+
+
+def inventory_queryset(branch_id):
+    return Product.objects.filter(branch_id=branch_id, is_active=True).order_by('name')
+
+
+def customers_queryset(tenant_id):
+    return Customer.objects.filter(tenant_id=tenant_id).order_by('-created_at')
+
+
+def order_items_queryset(branch_id, start_date, end_date):
+    return with_subtotal(OrderItem.objects.filter(
+        order__branch_id=branch_id,
+        order__created_at__date__gte=start_date,
+        order__created_at__date__lte=end_date
+    ).order_by('-order__created_at'))
+
+
+REPORTS = {
+    'sales': (sales_queryset, SALES_FIELDS, 'sales_report', 'Sales Report'),
+    'inventory': (inventory_queryset, INVENTORY_FIELDS, 'inventory_report', 'Inventory'),
+    'customers': (customers_queryset, CUSTOMER_FIELDS, 'customer_report', 'Customers'),
+    'order_items': (order_items_queryset, ORDER_ITEM_FIELDS, 'order_items_report', 'Order Items'),
+}
+
+
+def should_export_async(report, params):
+    """True when the report is too large to stream inside the request."""
+    threshold = settings.EXPORT_ASYNC_THRESHOLD
+    if threshold <= 0:
+        return False
+    build_queryset = REPORTS[report][0]
+    return build_queryset(**params)[:threshold + 1].count() > threshold
+
+
+def save_report(report, format_type, params, user_id):
+    """
+    Write a report to storage and return its download token. The file is
+    readable by `user_id` for EXPORT_FILE_TTL seconds.
+    """
+    build_queryset, fields, filename, sheet_name = REPORTS[report]
+    rows = export_rows(build_queryset(**params), fields)
+    if format_type == 'excel':
+        chunks = stream_xlsx(rows, sheet_name)
+        filename = _timestamped(filename, 'xlsx')
     else:
-        return export_to_csv(order_items, fields, filename)
+        chunks = (chunk.encode('utf-8') for chunk in stream_csv(rows))
+        filename = _timestamped(filename, 'csv')
+
+    # Spool to a temporary file so the storage backend gets a seekable file
+    with tempfile.TemporaryFile() as tmp:
+        for chunk in chunks:
+            tmp.write(chunk)
+        tmp.seek(0)
+        token = uuid.uuid4().hex
+        path = default_storage.save(f'{EXPORT_STORAGE_PREFIX}/{token}/{filename}', File(tmp))
+
+    cache.set(f'export_file_{token}', {'path': path, 'filename': filename, 'user_id': user_id}, timeout=settings.EXPORT_FILE_TTL)
+    return token
+
+
+def get_saved_report(token, user_id):
+    """(path, filename) of a saved report, or None when it expired or belongs to someone else."""
+    entry = cache.get(f'export_file_{token}')
+    if not entry or entry['user_id'] != user_id:
+        return None
+    return entry['path'], entry['filename']
+
+
+def purge_saved_reports(max_age_seconds):
+    """Delete saved reports older than `max_age_seconds`. Returns the number of files removed."""
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    removed = 0
+    try:
+        tokens, _ = default_storage.listdir(EXPORT_STORAGE_PREFIX)
+    except FileNotFoundError:
+        return 0
+    for token in tokens:
+        folder = f'{EXPORT_STORAGE_PREFIX}/{token}'
+        for name in default_storage.listdir(folder)[1]:
+            path = f'{folder}/{name}'
+            try:
+                if default_storage.get_modified_time(path) < cutoff:
+                    default_storage.delete(path)
+                    removed += 1
+            except Exception as e:
+                logger.warning(f"Could not purge export {path}: {e}")
+    return removed
@@ -0,0 +1,131 @@
+"""
+Transactional outbox for the side effects of model signals.
+
+Receivers in main/signals.py record what should happen instead of doing it:
+
+- webhook() queues a webhook event, if the tenant has an endpoint
+  subscribed to it (utils/webhook_index.py, no query). Events with the same
+  (tenant, event, key) collapse into the last one recorded, and an event
+  given a `window` is sent at most once per key in that many seconds (one
+  inventory.low per product per window, however often its stock is saved).
+- count() adds to a TenantMetrics counter. The deltas of a transaction are
+  coalesced into one UPDATE per tenant.
+
+The events recorded while a transaction is open are flushed once it commits:
+the counters are written, and the webhook events go to Celery as a single
+deliver_webhook_events task. Nothing is sent for a transaction that rolls
+back. Outside a transaction each event is flushed at once, as before.
+
+Notes:
+- Events recorded inside a savepoint that is rolled back, while the
+  transaction goes on, are still flushed with the rest of the transaction.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from utils import webhook_index
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class _Outbox:
+    def __init__(self):
+        self.webhooks = {}
+        self.counters = {}
+
+    def flush(self):
+        if _get_pending() is self:
+            _local.outbox = None
+        if self.counters:
+            _apply_counters(self.counters)
+        events = [
+            (str(tenant_id), event_type, payload)
+            for (tenant_id, event_type, key), (payload, window) in self.webhooks.items()
+            if not window or _claim(tenant_id, event_type, key, window)
+        ]
+        if events:
+            from main.tasks import deliver_webhook_events
+            try:
+                deliver_webhook_events.delay(events)
+            except Exception as e:
+                logger.error(f"Could not queue {len(events)} webhook events: {str(e)}")
+
+
+def _get_pending():
+    return getattr(_local, 'outbox', None)
+
+
+def _current():
+    """The outbox of the current transaction, registering its flush on first use."""
+    outbox = _get_pending()
+    # A rolled back transaction discards the flush with its other callbacks
+    if outbox is not None and any(callback == outbox.flush for _, callback, _ in connection.run_on_commit):
+        return outbox
+    outbox = _local.outbox = _Outbox()
+    transaction.on_commit(outbox.flush)
+    return outbox
+
+
+@contextmanager
+def _recording():
+    if connection.in_atomic_block:
+        yield _current()
+    else:
+        # Nothing to wait for
+        outbox = _Outbox()
+        yield outbox
+        outbox.flush()
+
+
+def webhook(tenant_id, event_type, payload, key=None, window=None):
+    """
+    Send the `event_type` webhook of `tenant_id` after commit. Events sharing
+    a key are sent once per transaction (the last payload wins) and, with a
+    `window` in seconds, at most once per window.
+    """
+    # Tenants without a subscribed endpoint (most of them) record nothing
+    if not webhook_index.is_subscribed(tenant_id, event_type):
+        return
+    with _recording() as outbox:
+        outbox.webhooks[(tenant_id, event_type, key)] = (payload, window)
+
+
+def count(tenant_id, field, delta=1):
+    """Add `delta` to TenantMetrics.<field> of `tenant_id` after commit."""
+    if not tenant_id or not delta:
+        return
+    with _recording() as outbox:
+        counters = outbox.counters.setdefault(tenant_id, {})
+        counters[field] = counters.get(field, 0) + delta
+
+
+def _claim(tenant_id, event_type, key, window):
+    """True for the first event of its key in `window` seconds."""
+    try:
+        return cache.add(f"outbox:{tenant_id}:{event_type}:{key}", 1, timeout=window)
+    except Exception:
+        # Without the cache, sending a duplicate beats dropping the event
+        return True
+
+
+def _apply_counters(counters):
+    from main.models import TenantMetrics
+
+    for tenant_id, deltas in counters.items():
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if not updates:
+            continue
+        try:
+            with transaction.atomic():
+                if not TenantMetrics.objects.filter(tenant_id=tenant_id).update(**updates):
+                    TenantMetrics.objects.get_or_create(tenant_id=tenant_id)
+                    TenantMetrics.objects.filter(tenant_id=tenant_id).update(**updates)
+        except Exception as e:
+            # Table doesn't exist in this schema (e.g. a public-schema branch save)
+            logger.warning(f"Could not update metrics of tenant {tenant_id}: {str(e)}")
+
@@ -0,0 +1,161 @@
+"""
+Time-bucketed order metrics computed in one grouped query.
+
+sales_series() groups orders into hour, day, week or month buckets (in the
+current time zone) and fills buckets without sales with zeros. With
+compare=True the previous period of the same length is read by the same
+query: its orders are shifted forward by the period length, so each lands in
+the bucket it is compared with.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db.models import (
+    Sum, Count, F, Case, When, Value, OuterRef, Subquery, BooleanField, DateTimeField, IntegerField, ExpressionWrapper,
+)
+from django.db.models.functions import Coalesce, TruncHour, TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+from main.models import OrderItem
+
+BUCKETS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# revenue, orders, aov (average order value), items (units sold), customers (distinct)
+METRICS = ('revenue', 'orders', 'aov', 'items', 'customers')
+
+
+def bucket_floor(value, bucket):
+    """Start of the bucket containing aware datetime `value`, as a naive local datetime."""
+    value = timezone.localtime(value).replace(tzinfo=None)
+    if bucket == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'week':
+        return value - timedelta(days=value.weekday())
+    if bucket == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(value, bucket):
+    if bucket == 'hour':
+        return value + timedelta(hours=1)
+    if bucket == 'week':
+        return value + timedelta(days=7)
+    if bucket == 'month':
+        return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+    return value + timedelta(days=1)
+
+
+def bucket_label(value, bucket):
+    return value.strftime('%Y-%m-%dT%H:%M' if bucket == 'hour' else '%Y-%m-%d')
+
+
+def _empty(metrics):
+    return {metric: 0 for metric in metrics}
+
+
+def _finish(values, metrics):
+    """Convert a bucket's sums to JSON-friendly numbers and derive the average order value."""
+    row = {}
+    for metric in metrics:
+        if metric == 'aov':
+            row['aov'] = float(values['revenue'] / values['orders']) if values['orders'] else 0.0
+        elif metric == 'revenue':
+            row['revenue'] = float(values['revenue'])
+        else:
+            row[metric] = values[metric]
+    return row
+
+
+def sales_series(orders, start, end, bucket='day', metrics=METRICS, compare=False):
+    """
+    Metrics of `orders` (an Order queryset, already filtered by tenant, branch
+    and status) between aware datetimes start and end, per bucket.
+
+    Returns {'bucket', 'series', 'current', 'previous'}: `series` holds one
+    dict per bucket with a 'date' label and the requested metrics (plus a
+    'previous' dict when comparing); 'current' and 'previous' are the
+    period totals ('previous' is None without compare). Distinct customers
+    are per bucket only and are left out of the totals.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'")
+    metrics = tuple(metrics)
+    # aov is derived from revenue and orders
+    sums = set(metrics) | ({'revenue', 'orders'} if 'aov' in metrics else set())
+
+    span = end - start
+    window_start = start - span if compare else start
+    orders = orders.filter(created_at__gte=window_start, created_at__lt=end)
+    if 'items' in sums:
+        units = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(units=Sum('quantity')).values('units')
+        orders = orders.annotate(item_count=Coalesce(Subquery(units, output_field=IntegerField()), 0))
+
+    aggregates = {}
+    if 'revenue' in sums:
+        aggregates['revenue'] = Coalesce(Sum('total_amount'), Value(Decimal('0')))
+    if 'orders' in sums:
+        aggregates['orders'] = Count('id')
+    if 'items' in sums:
+        aggregates['items'] = Sum('item_count')
+    if 'customers' in sums:
+        aggregates['customers'] = Count('customer', distinct=True)
+
+    shifted = Case(
+        When(created_at__gte=start, then=F('created_at')),
+        default=ExpressionWrapper(F('created_at') + span, output_field=DateTimeField()),
+        output_field=DateTimeField(),
+    )
+    rows = orders.annotate(
+        in_period=Case(When(created_at__gte=start, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        bucket=BUCKETS[bucket](shifted),
+    ).values('in_period', 'bucket').annotate(**aggregates).order_by()
+
+    found = {}
+    for row in rows:
+        key = (row['in_period'], timezone.localtime(row['bucket']).replace(tzinfo=None))
+        found[key] = row
+
+    series = []
+    totals = {True: _empty(sums), False: _empty(sums)}
+    local_end = timezone.localtime(end).replace(tzinfo=None)
+    position = bucket_floor(start, bucket)
+    while position < local_end:
+        entry = {'date': bucket_label(position, bucket)}
+        for in_period in ((True, False) if compare else (True,)):
+            values = found.get((in_period, position)) or _empty(sums)
+            values = {metric: values[metric] or 0 for metric in sums}
+            for metric in sums:
+                totals[in_period][metric] += values[metric]
+            if in_period:
+                entry.update(_finish(values, metrics))
+            else:
+                entry['previous'] = _finish(values, metrics)
+        series.append(entry)
+        position = next_bucket(position, bucket)
+
+    total_metrics = [metric for metric in metrics if metric != 'customers']
+    return {
+        'bucket': bucket,
+        'series': series,
+        'current': _finish(totals[True], total_metrics),
+        'previous': _finish(totals[False], total_metrics) if compare else None,
+    }
+
+
+def growth(current, previous):
+    """Percentage change from previous to current (0 when there is no previous value)."""
+    if not previous:
+        return 0.0
+    return float((current - previous) / previous * 100)
+
+
+def period_start(days, now=None):
+    """Local midnight `days - 1` days before today, so the period covers `days` calendar days."""
+    now = now or timezone.now()
+    today = timezone.localtime(now).date()
+    return timezone.make_aware(datetime.combine(today - timedelta(days=days - 1), datetime.min.time()))
@@ -1,12 +1,25 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.db import transaction
-from django.db.models import F
-from .models import Order, Customer, Product, TenantMetrics
+from django.conf import settings
+from .models import Order, Customer, Product, Category, ProductVariant, ProductComponent, TenantMetrics, Expense, Return
 from accounts.models import Branch, Tenant
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from utils.webhooks import WebhookService
+from main.services import outbox
+from utils.webhook_index import is_subscribed
+from branches.services.catalog_sync import record_catalog_change
+from branches.services.pos_snapshot import invalidate_pos_snapshot
+from branches.services.sales_rollup import remember_order_status, record_order_status, record_order_deleted
+from branches.services.report_cache import remember_report_scope, record_report_write
+
+# TenantMetrics counter of each counted model
+METRIC_FIELDS = {
+    Product: 'total_products',
+    Order: 'total_orders',
+    Customer: 'total_customers',
+    Branch: 'total_branches',
+}
 
 @receiver(post_save, sender=Order)
 def notify_new_order(sender, instance, created, **kwargs):
@@ -25,10 +38,15 @@ def notify_new_order(sender, instance, created, **kwargs):
                 }
             )
 
+# Webhooks and TenantMetrics counters go through the outbox
+# (main/services/outbox.py): deduplicated, and sent once the transaction commits.
+# Payloads are only built for tenants subscribed to the event (the subscription
+# index answers without a query; the order payload may load the customer)
+
 @receiver(post_save, sender=Order)
 def order_webhook_trigger(sender, instance, created, **kwargs):
     """Trigger order.created webhook when a new order is completed"""
-    if created and instance.status == 'completed':
+    if created and instance.status == 'completed' and is_subscribed(instance.tenant_id, 'order.created'):
         payload = {
             'order_id': str(instance.id),
             'order_number': instance.order_number,
@@ -36,26 +54,26 @@ def order_webhook_trigger(sender, instance, created, **kwargs):
             'customer': instance.customer.name if instance.customer else 'Guest',
             'created_at': instance.created_at.isoformat()
         }
-        WebhookService.trigger(instance.tenant, 'order.created', payload)
+        outbox.webhook(instance.tenant_id, 'order.created', payload, key=instance.pk)
 
 @receiver(post_save, sender=Customer)
 def customer_webhook_trigger(sender, instance, created, **kwargs):
     """Trigger customer.registered webhook"""
-    if created:
+    if created and is_subscribed(instance.tenant_id, 'customer.registered'):
         payload = {
             'customer_id': str(instance.id),
             'name': instance.name,
             'email': instance.email,
             'created_at': instance.created_at.isoformat()
         }
-        WebhookService.trigger(instance.tenant, 'customer.registered', payload)
+        outbox.webhook(instance.tenant_id, 'customer.registered', payload, key=instance.pk)
 
 @receiver(post_save, sender=Product)
 def inventory_low_webhook_trigger(sender, instance, **kwargs):
     """Trigger inventory.low webhook when stock falls below threshold"""
-    if instance.is_active and instance.stock_quantity <= instance.low_stock_threshold:
-        # Check if we've already triggered this recently? 
-        # For simplicity, we trigger on every low-stock save
+    if (instance.is_active and instance.stock_quantity <= instance.low_stock_threshold
+            and is_subscribed(instance.tenant_id, 'inventory.low')):
+        # Once per product per window, however many times its stock is saved
         payload = {
             'product_id': str(instance.id),
             'name': instance.name,
@@ -63,7 +81,10 @@ def inventory_low_webhook_trigger(sender, instance, **kwargs):
             'stock_quantity': instance.stock_quantity,
             'threshold': instance.low_stock_threshold
         }
-        WebhookService.trigger(instance.tenant, 'inventory.low', payload)
+        outbox.webhook(
+            instance.tenant_id, 'inventory.low', payload,
+            key=instance.pk, window=settings.INVENTORY_LOW_WEBHOOK_WINDOW
+        )
 
 @receiver(post_save, sender=Tenant)
 def create_tenant_metrics(sender, instance, created, **kwargs):
@@ -77,69 +98,98 @@ def create_tenant_metrics(sender, instance, created, **kwargs):
             pass
 
 @receiver(post_save, sender=Product)
-def update_product_metrics(sender, instance, created, **kwargs):
-    if created and instance.tenant:
-        try:
-            metrics, _ = TenantMetrics.objects.get_or_create(tenant=instance.tenant)
-            TenantMetrics.objects.filter(id=metrics.id).update(total_products=F('total_products') + 1)
-        except Exception:
-            pass
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Branch)
+def update_tenant_metrics(sender, instance, created, **kwargs):
+    if created:
+        outbox.count(instance.tenant_id, METRIC_FIELDS[sender])
 
 @receiver(post_delete, sender=Product)
-def decrement_product_metrics(sender, instance, **kwargs):
-    if instance.tenant:
-        try:
-            TenantMetrics.objects.filter(tenant=instance.tenant).update(total_products=F('total_products') - 1)
-        except Exception:
-            pass
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Branch)
+def decrement_tenant_metrics(sender, instance, **kwargs):
+    outbox.count(instance.tenant_id, METRIC_FIELDS[sender], -1)
 
-@receiver(post_save, sender=Order)
-def update_order_metrics(sender, instance, created, **kwargs):
-    if created and instance.tenant:
-        try:
-            metrics, _ = TenantMetrics.objects.get_or_create(tenant=instance.tenant)
-            TenantMetrics.objects.filter(id=metrics.id).update(total_orders=F('total_orders') + 1)
-        except Exception:
-            pass
+# Catalog delta sync (see branches/services/catalog_sync.py)
 
-@receiver(post_delete, sender=Order)
-def decrement_order_metrics(sender, instance, **kwargs):
-    if instance.tenant:
-        try:
-            TenantMetrics.objects.filter(tenant=instance.tenant).update(total_orders=F('total_orders') - 1)
-        except Exception:
-            pass
+@receiver([post_save, post_delete], sender=Product)
+def record_product_change(sender, instance, **kwargs):
+    record_catalog_change('product', instance.tenant_id, [instance.pk])
 
-@receiver(post_save, sender=Customer)
-def update_customer_metrics(sender, instance, created, **kwargs):
-    if created and instance.tenant:
-        try:
-            metrics, _ = TenantMetrics.objects.get_or_create(tenant=instance.tenant)
-            TenantMetrics.objects.filter(id=metrics.id).update(total_customers=F('total_customers') + 1)
-        except Exception:
-            pass
+@receiver([post_save, post_delete], sender=Customer)
+def record_customer_change(sender, instance, **kwargs):
+    record_catalog_change('customer', instance.tenant_id, [instance.pk])
 
-@receiver(post_delete, sender=Customer)
-def decrement_customer_metrics(sender, instance, **kwargs):
-    if instance.tenant:
-        try:
-            TenantMetrics.objects.filter(tenant=instance.tenant).update(total_customers=F('total_customers') - 1)
-        except Exception:
-            pass
+@receiver([post_save, post_delete], sender=Category)
+def record_category_change(sender, instance, **kwargs):
+    record_catalog_change('category', instance.tenant_id, [instance.pk])
+    if not kwargs.get('created', False):
+        # Products embed the category name
+        product_ids = list(Product.objects.filter(category_id=instance.pk).values_list('id', flat=True))
+        if product_ids:
+            record_catalog_change('product', instance.tenant_id, product_ids)
+
+@receiver(pre_delete, sender=Category)
+def record_category_products_before_delete(sender, instance, **kwargs):
+    # The products' category is cleared by SET_NULL without a save
+    product_ids = list(Product.objects.filter(category_id=instance.pk).values_list('id', flat=True))
+    if product_ids:
+        record_catalog_change('product', instance.tenant_id, product_ids)
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=ProductComponent)
+def record_embedded_product_change(sender, instance, **kwargs):
+    """Variants and components are serialized inside their product"""
+    product_id = instance.product_id if sender is ProductVariant else instance.parent_product_id
+    tenant_id = Product.objects.filter(pk=product_id).values_list('tenant_id', flat=True).first()
+    record_catalog_change('product', tenant_id, [product_id])
+
+# POS bootstrap snapshot (see branches/services/pos_snapshot.py)
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_branch_pos_snapshot(sender, instance, **kwargs):
+    invalidate_pos_snapshot(branch_ids=[instance.branch_id])
+
+@receiver([post_save, post_delete], sender=Customer)
+def invalidate_tenant_pos_snapshots(sender, instance, **kwargs):
+    # Customers are shared by every branch of the tenant
+    invalidate_pos_snapshot(tenant_id=instance.tenant_id)
 
 @receiver(post_save, sender=Branch)
-def update_branch_metrics(sender, instance, created, **kwargs):
-    if created and instance.tenant:
-        try:
-            metrics, _ = TenantMetrics.objects.get_or_create(tenant=instance.tenant)
-            TenantMetrics.objects.filter(id=metrics.id).update(total_branches=F('total_branches') + 1)
-        except Exception:
-            pass
+def invalidate_branch_settings_pos_snapshot(sender, instance, created, **kwargs):
+    # Name, currency and logo are part of the payload
+    if not created:
+        invalidate_pos_snapshot(branch_ids=[instance.pk])
 
-@receiver(post_delete, sender=Branch)
-def decrement_branch_metrics(sender, instance, **kwargs):
-    if instance.tenant:
-        try:
-            TenantMetrics.objects.filter(tenant=instance.tenant).update(total_branches=F('total_branches') - 1)
-        except Exception:
-            pass
+# Daily sales rollups (see branches/services/sales_rollup.py)
+
+@receiver(post_init, sender=Order)
+def remember_order_rollup_status(sender, instance, **kwargs):
+    remember_order_status(instance)
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, **kwargs):
+    record_order_status(instance, created)
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_sales_rollups(sender, instance, **kwargs):
+    record_order_deleted(instance)
+
+# Report cache (see branches/services/report_cache.py)
+
+@receiver(post_init, sender=Expense)
+def remember_expense_report_scope(sender, instance, **kwargs):
+    # An edit can move an expense to another day or branch
+    remember_report_scope(instance, 'date')
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Return)
+def invalidate_order_reports(sender, instance, **kwargs):
+    record_report_write(instance, 'created_at')
+
+@receiver([post_save, post_delete], sender=Expense)
+def invalidate_expense_reports(sender, instance, **kwargs):
+    record_report_write(instance, 'date')
@@ -32,63 +32,96 @@ def sync_global_prices_task(tenant_id, sku, new_price):
         return f"Price sync failed: {str(e)}"
 
 @shared_task
-def send_webhook_task(url, data, retries=0):
+def deliver_webhook_events(events):
     """
-    Background task to send webhooks with retry logic.
+    Deliver the webhook events recorded by a committed transaction
+    (main/services/outbox.py), given as (tenant_id, event_type, payload).
+    The deliveries are persisted first; failed ones are retried by
+    retry_webhook_deliveries.
     """
-    import requests
-    try:
-        response = requests.post(url, json=data, timeout=10)
-        response.raise_for_status()
-        return f"Webhook sent to {url}: {response.status_code}"
-    except Exception as e:
-        if retries < 3:
-            # Retry in 60 seconds
-            send_webhook_task.apply_async((url, data, retries + 1), countdown=60)
-            return f"Webhook failed, retrying in 60s. Error: {str(e)}"
-        else:
-            return f"Webhook failed after retries. Error: {str(e)}"
+    from accounts.models import WebhookEvent
+    from utils.webhooks import WebhookService
+    
+    sent = WebhookService.deliver(events)
+    delivered = sum(event.status == WebhookEvent.STATUS_DELIVERED for event in sent)
+    return f"Delivered {delivered} of {len(sent)} webhook deliveries for {len(events)} events."
+
+@shared_task
+def send_webhooks(event_ids):
+    """Send queued WebhookEvent rows (utils/webhooks.py)."""
+    from utils.webhooks import WebhookDispatcher
+    
+    sent = WebhookDispatcher().dispatch(event_ids)
+    return f"Attempted {len(sent)} webhook deliveries."
+
+@shared_task
+def retry_webhook_deliveries():
+    """
+    Periodic task sending the webhook deliveries that are due: retries, and
+    rows no worker sent.
+    """
+    from utils.webhooks import WebhookDispatcher
+    
+    sent = WebhookDispatcher().dispatch()
+    return f"Attempted {len(sent)} webhook deliveries."
 
 @shared_task
 def nightly_inventory_analysis():
     """
     Periodic task to run AI inventory analysis for all tenants.
+    Queues one analyze_branch_inventory task per tenant branch, so branches
+    are analyzed in parallel by the workers.
     """
-    from accounts.models import Tenant
-    from branches.services.inventory_ai import InventoryAIService
+    from accounts.models import Branch
     
-    tenants = Tenant.objects.all()
-    results = []
+    branches = list(
+        Branch.objects.exclude(tenant__schema_name='public').values_list('tenant__schema_name', 'id')
+    )
+    for schema_name, branch_id in branches:
+        analyze_branch_inventory.delay(schema_name, str(branch_id))
     
+    return f"Inventory analysis queued for {len(branches)} branches."
+
+
+@shared_task
+def analyze_branch_inventory(schema_name, branch_id):
+    """Refresh the reorder recommendations of one branch."""
     from django_tenants.utils import schema_context
+    from accounts.models import Branch
+    from branches.services.inventory_ai import InventoryAIService
     
-    for tenant in tenants:
-        if tenant.schema_name == 'public':
-            continue
-            
-        with schema_context(tenant.schema_name):
-            service = InventoryAIService(tenant)
-            results.append({
-                'tenant': tenant.name,
-                'analysis': service.run_analysis()
-            })
-    
-    return results
+    with schema_context(schema_name):
+        branch = Branch.objects.select_related('tenant').get(id=branch_id)
+        return InventoryAIService(branch.tenant).run_analysis(branch)
 
 
 @shared_task
 def check_low_stock():
     """
     Periodic task to check stock levels and create alerts.
-    Runs every hour to monitor inventory across all branches.
+    Runs every hour and fans out one check_tenant_stock_levels task per
+    tenant schema, so tenants are scanned in parallel by the workers.
     """
+    from accounts.models import Tenant
+    
+    schema_names = list(Tenant.objects.exclude(schema_name='public').values_list('schema_name', flat=True))
+    for schema_name in schema_names:
+        check_tenant_stock_levels.delay(schema_name)
+    return f"Stock check queued for {len(schema_names)} tenants."
+
+
+@shared_task
+def check_tenant_stock_levels(schema_name):
+    """Create the missing stock alerts of one tenant schema and email the digests."""
+    from django_tenants.utils import schema_context
     from main.services.alert_service import check_stock_levels
     
     try:
-        alerts_created = check_stock_levels()
-        return f"Stock check complete. Created {len(alerts_created)} alerts."
+        with schema_context(schema_name):
+            alerts_created = check_stock_levels()
+        return f"Stock check complete for {schema_name}. Created {len(alerts_created)} alerts."
     except Exception as e:
-        return f"Error checking stock levels: {str(e)}"
+        return f"Error checking stock levels for {schema_name}: {str(e)}"
 @shared_task
 def sync_exchange_rates():
     """
@@ -158,3 +191,69 @@ def process_scheduled_manual_campaigns():
         with schema_context(tenant.schema_name):
             process_scheduled_campaigns()
     return "Scheduled campaigns processed."
+
+@shared_task
+def export_report_task(tenant_id, user_id, report, format_type, params):
+    """
+    Writes a report that is too large to stream inside a request to storage
+    and notifies the user with a download link.
+    """
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from django_tenants.utils import tenant_context
+    from accounts.models import Tenant
+    from main.services.exports import save_report
+    from notifications.utils import send_notification
+    
+    tenant = Tenant.objects.get(id=tenant_id)
+    user = User.objects.get(id=user_id)
+    with tenant_context(tenant):
+        token = save_report(report, format_type, params, user_id)
+    
+    send_notification(
+        user,
+        "Your export is ready",
+        f"The report you requested has been generated and can be downloaded for the next {settings.EXPORT_FILE_TTL // 3600} hours.",
+        level='success',
+        category='system',
+        link=reverse('export_download', args=[token])
+    )
+    return f"Export {report} ready: {token}"
+
+@shared_task
+def purge_expired_exports():
+    """
+    Periodic task to delete reports written by export_report_task once their
+    download links have expired.
+    """
+    from django.conf import settings
+    from main.services.exports import purge_saved_reports
+    
+    removed = purge_saved_reports(settings.EXPORT_FILE_TTL)
+    return f"Purged {removed} expired exports."
+
+@shared_task
+def rebuild_recent_sales_rollups():
+    """
+    Periodic task to recompute the daily sales rollups of the last
+    SALES_ROLLUP_REBUILD_DAYS closed days for every tenant, repairing any
+    drift in the incrementally maintained rows.
+    """
+    from datetime import timedelta
+    from django.conf import settings
+    from django.utils import timezone
+    from django_tenants.utils import schema_context
+    from accounts.models import Tenant
+    from branches.services.sales_rollup import rebuild_sales_rollups
+    
+    days = settings.SALES_ROLLUP_REBUILD_DAYS
+    if days <= 0:
+        return "Sales rollup rebuild disabled."
+    end = timezone.localdate() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    
+    for tenant in Tenant.objects.exclude(schema_name='public'):
+        with schema_context(tenant.schema_name):
+            rebuild_sales_rollups(tenant, start, end)
+    return f"Sales rollups rebuilt for {start} to {end}."
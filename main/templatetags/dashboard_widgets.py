@@ -25,14 +25,17 @@ def inventory_forecast_widget(context, count=5):
             stock_quantity__gt=0
         )
         
+        velocities = Product.get_daily_sales_velocities(products)
+        
         forecasts = []
         for p in products:
-            days = p.get_days_until_stockout()
+            velocity = velocities.get(p.id, 0.0)
+            days = p.get_days_until_stockout(velocity)
             if days < 30: # Only care if running out this month
                 forecasts.append({
                     'product': p,
                     'days_left': days,
-                    'velocity': p.get_daily_sales_velocity()
+                    'velocity': velocity
                 })
         
         # Sort by days left ascending (soonest to run out first)
@@ -0,0 +1,52 @@
+"""
+Tests for blind index lookups on encrypted columns.
+"""
+from django.core.exceptions import FieldError
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Customer, Order
+from utils.encryption import blind_index, normalize_identifier, normalize_phone
+
+
+class BlindIndexTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+
+    def test_index_is_deterministic_and_normalized(self):
+        self.assertEqual(
+            blind_index('ord-000001 ', normalize_identifier),
+            blind_index('ORD-000001', normalize_identifier)
+        )
+        self.assertEqual(
+            blind_index('+1 (555) 123-4567', normalize_phone),
+            blind_index('15551234567', normalize_phone)
+        )
+        self.assertIsNone(blind_index('', normalize_phone))
+
+    def test_index_populated_on_save(self):
+        order = Order.objects.create(tenant=self.tenant, branch=self.branch, order_number="ORD-000007")
+        order.refresh_from_db()
+        self.assertEqual(order.order_number_index, blind_index("ORD-000007", normalize_identifier))
+
+    def test_order_number_lookup(self):
+        order = Order.objects.create(tenant=self.tenant, branch=self.branch, order_number="ORD-000007")
+        Order.objects.create(tenant=self.tenant, branch=self.branch, order_number="ORD-000008")
+
+        self.assertEqual(list(Order.objects.filter(order_number__blind="ord-000007")), [order])
+        self.assertEqual(Order.objects.filter(order_number__blind=["ORD-000007", "ORD-000008"]).count(), 2)
+
+    def test_phone_lookup_ignores_formatting(self):
+        customer = Customer.objects.create(tenant=self.tenant, name="Ama", phone="+233 24 000 0000")
+        self.assertEqual(Customer.objects.get(phone__blind="233240000000"), customer)
+
+    def test_lookup_updates_when_source_changes(self):
+        customer = Customer.objects.create(tenant=self.tenant, name="Ama", phone="0240000000")
+        customer.phone = "0550000000"
+        customer.save()
+        self.assertFalse(Customer.objects.filter(phone__blind="0240000000").exists())
+        self.assertTrue(Customer.objects.filter(phone__blind="0550000000").exists())
+
+    def test_lookup_requires_index(self):
+        with self.assertRaises(FieldError):
+            list(Customer.objects.filter(address__blind="Accra"))
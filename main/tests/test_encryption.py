@@ -0,0 +1,63 @@
+"""
+Tests for the cached cipher, bulk decryption and key rotation.
+"""
+from io import StringIO
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Customer
+from utils.encryption import decrypt_token, decrypt_tokens, decryption_cache, get_cipher, iterate_decrypted
+
+NEW_KEY = Fernet.generate_key()
+
+
+class EncryptionEngineTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+
+    def test_cipher_is_reused(self):
+        self.assertIs(get_cipher(), get_cipher())
+
+    def test_decrypt_tokens_preserves_order_and_none(self):
+        cipher = get_cipher()
+        token = cipher.encrypt(b'0244000000').decode()
+        self.assertEqual(decrypt_tokens([token, None, token]), ['0244000000', None, '0244000000'])
+
+    def test_undecryptable_value_is_returned_raw(self):
+        self.assertEqual(decrypt_token('not-a-token'), 'not-a-token')
+
+    def test_request_cache_skips_repeat_decryption(self):
+        token = get_cipher().encrypt(b'secret').decode()
+        with decryption_cache(maxsize=2):
+            self.assertEqual(decrypt_token(token), 'secret')
+            with override_settings(FERNET_KEY=NEW_KEY):
+                # Served from the cache even though the key no longer matches
+                self.assertEqual(decrypt_token(token), 'secret')
+        self.assertEqual(decrypt_token(token), 'secret')
+
+    def test_iterate_decrypted_matches_normal_iteration(self):
+        for i in range(5):
+            Customer.objects.create(tenant=self.tenant, name=f"C{i}", phone=f"024400000{i}")
+        qs = Customer.objects.order_by('name')
+        self.assertEqual(
+            [c.phone for c in iterate_decrypted(qs, chunk_size=2)],
+            [c.phone for c in qs]
+        )
+        # Raw mode does not leak out of the iterator
+        for customer in iterate_decrypted(qs, chunk_size=2):
+            self.assertEqual(Customer.objects.get(pk=customer.pk).phone, customer.phone)
+
+    def test_old_key_still_decrypts_and_rotation_reencrypts(self):
+        customer = Customer.objects.create(tenant=self.tenant, name="Ama", phone="0244000000")
+        old_key = settings.FERNET_KEY
+
+        with override_settings(FERNET_KEY=NEW_KEY, FERNET_OLD_KEYS=[old_key]):
+            self.assertEqual(Customer.objects.get(pk=customer.pk).phone, "0244000000")
+            call_command('rotate_encryption_keys', schema=self.tenant.schema_name, stdout=StringIO())
+
+        with override_settings(FERNET_KEY=NEW_KEY, FERNET_OLD_KEYS=[]):
+            self.assertEqual(Customer.objects.get(pk=customer.pk).phone, "0244000000")
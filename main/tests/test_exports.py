@@ -0,0 +1,72 @@
+"""
+Tests for the streaming report exports.
+"""
+import csv
+import io
+import tempfile
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Order, OrderItem, Product, Customer
+from main.services.exports import (
+    export_sales_report, order_items_queryset, should_export_async, save_report, get_saved_report,
+    export_order_items_report,
+)
+from branches.xlsx_utils import XLSXParser
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'export-tests'}}
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+
+class ExportTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        customer = Customer.objects.create(tenant=self.tenant, name="Ama")
+        product = Product.objects.create(tenant=self.tenant, branch=self.branch, name="Rice", sku="R-1", price=Decimal("12.50"))
+        self.order = Order.objects.create(tenant=self.tenant, branch=self.branch, customer=customer, total_amount=Decimal("25.00"))
+        Order.objects.create(tenant=self.tenant, branch=self.branch, total_amount=Decimal("5.00"))
+        OrderItem.objects.create(order=self.order, product=product, quantity=2, price=Decimal("12.50"))
+        self.today = self.order.created_at.date().isoformat()
+
+    def test_sales_csv_follows_relations(self):
+        rows = read_csv(export_sales_report(Order.objects.order_by('created_at')))
+
+        self.assertEqual(rows[0][:3], ['Order Number', 'Customer', 'Date'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual((rows[1][1], rows[1][3], rows[1][6]), ("Ama", "25.00", "Main"))
+        self.assertEqual(rows[2][1], "")
+
+    def test_order_items_excel_includes_subtotal(self):
+        response = export_order_items_report(order_items_queryset(str(self.branch.id), self.today, self.today), format='excel')
+        rows = list(XLSXParser(b"".join(response.streaming_content)).parse())
+
+        self.assertEqual(rows[0][4], 'Subtotal')
+        self.assertEqual(rows[1][:5], [self.order.order_number, "Rice", "2", "12.50", "25.00"])
+
+    def test_large_reports_go_to_the_background(self):
+        params = {'branch_id': str(self.branch.id), 'start_date': self.today, 'end_date': self.today}
+        with override_settings(EXPORT_ASYNC_THRESHOLD=1):
+            self.assertTrue(should_export_async('sales', params))
+        with override_settings(EXPORT_ASYNC_THRESHOLD=2):
+            self.assertFalse(should_export_async('sales', params))
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_saved_report_is_only_visible_to_its_owner(self):
+        user = User.objects.create_user(username="exporter")
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            token = save_report('customers', 'csv', {'tenant_id': str(self.tenant.id)}, user.id)
+
+            path, filename = get_saved_report(token, user.id)
+            self.assertTrue(filename.startswith('customer_report_'))
+            with default_storage.open(path) as f:
+                self.assertIn(b"Ama", f.read())
+            self.assertIsNone(get_saved_report(token, user.id + 1))
+        cache.clear()
@@ -0,0 +1,57 @@
+"""
+Tests for the per-tenant identifier allocator.
+"""
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch, IdentifierSequence
+from main.models import Order
+from utils.identifier_generator import generate_order_number, generate_item_numbers
+
+
+class IdentifierAllocationTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+
+    def test_order_numbers_are_sequential(self):
+        first = Order.objects.create(tenant=self.tenant, branch=self.branch)
+        second = Order.objects.create(tenant=self.tenant, branch=self.branch)
+        self.assertEqual(first.order_number, "ORD-000001")
+        self.assertEqual(second.order_number, "ORD-000002")
+
+    def test_sequence_is_seeded_from_existing_history(self):
+        """A tenant upgrading with existing orders continues after its highest number"""
+        IdentifierSequence.objects.filter(tenant=self.tenant, name='order').delete()
+        Order.objects.create(tenant=self.tenant, branch=self.branch, order_number="ORD-000041")
+
+        order = Order.objects.create(tenant=self.tenant, branch=self.branch)
+        self.assertEqual(order.order_number, "ORD-000042")
+
+    def test_block_reservation_is_consecutive(self):
+        order = Order.objects.create(tenant=self.tenant, branch=self.branch)
+        self.assertEqual(generate_item_numbers(order, 3), ["ITM-00001", "ITM-00002", "ITM-00003"])
+        self.assertEqual(generate_item_numbers(order, 1), ["ITM-00004"])
+
+    def test_rolled_back_allocation_is_reused(self):
+        """The DB backend is gap-free: a failed checkout gives its number back"""
+        generate_order_number(self.tenant)
+        try:
+            with transaction.atomic():
+                self.assertEqual(generate_order_number(self.tenant), "ORD-000002")
+                raise RuntimeError("checkout failed")
+        except RuntimeError:
+            pass
+        self.assertEqual(generate_order_number(self.tenant), "ORD-000002")
+
+    def test_allocation_cost_is_independent_of_history(self):
+        generate_order_number(self.tenant)
+        with CaptureQueriesContext(connection) as small:
+            generate_order_number(self.tenant)
+
+        for _ in range(50):
+            Order.objects.create(tenant=self.tenant, branch=self.branch)
+
+        with CaptureQueriesContext(connection) as large:
+            generate_order_number(self.tenant)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
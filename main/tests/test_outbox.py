@@ -0,0 +1,87 @@
+"""
+Tests for the side-effect outbox behind the Product and Order signals.
+"""
+from unittest import mock
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch, WebhookEndpoint
+from main.models import Product, TenantMetrics
+from utils import webhook_index
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'outbox-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, INVENTORY_LOW_WEBHOOK_WINDOW=3600)
+class OutboxTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        webhook_index._local.clear()
+        # Flushed here, so the tests start without a pending outbox (and with
+        # the subscription index rebuilt)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+            WebhookEndpoint.objects.create(tenant=self.tenant, url="https://example.com/hook", secret="s", events=['inventory.low'])
+        TenantMetrics.objects.get_or_create(tenant=self.tenant)
+        TenantMetrics.objects.filter(tenant=self.tenant).update(total_products=0)
+
+    def product(self, sku, stock):
+        return Product.objects.create(
+            tenant=self.tenant, branch=self.branch, name=sku, sku=sku, price=1, stock_quantity=stock, low_stock_threshold=5
+        )
+
+    @mock.patch('main.tasks.deliver_webhook_events.delay')
+    def test_side_effects_are_collapsed_and_sent_on_commit(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                low = self.product("LOW", 3)
+                for sku in ("A", "B", "C"):
+                    self.product(sku, 50)
+                for stock in (2, 1, 0):
+                    low.stock_quantity = stock
+                    low.save()
+                delay.assert_not_called()
+
+        self.assertEqual(TenantMetrics.objects.get(tenant=self.tenant).total_products, 4)
+        delay.assert_called_once()
+        (events,), _ = delay.call_args
+        self.assertEqual(len(events), 1)
+        tenant_id, event_type, payload = events[0]
+        self.assertEqual((tenant_id, event_type), (str(self.tenant.pk), 'inventory.low'))
+        # The last recorded payload wins
+        self.assertEqual(payload['stock_quantity'], 0)
+
+        # Within the window the product doesn't alert again
+        delay.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            low.save()
+        delay.assert_not_called()
+
+    @mock.patch('main.tasks.deliver_webhook_events.delay')
+    def test_rolled_back_work_is_not_sent(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.product("LOW", 1)
+                    raise ValueError
+            except ValueError:
+                pass
+            self.product("FINE", 50)
+
+        self.assertEqual(TenantMetrics.objects.get(tenant=self.tenant).total_products, 1)
+        delay.assert_not_called()
+
+    @mock.patch('main.tasks.deliver_webhook_events.delay')
+    def test_unsubscribed_events_cost_nothing(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            WebhookEndpoint.objects.filter(tenant=self.tenant).delete()
+        low = self.product("LOW", 3)
+
+        # The rebuilt index answers: no endpoint query, no task
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                low.save()
+        delay.assert_not_called()
+        table = WebhookEndpoint._meta.db_table
+        self.assertFalse([query for query in ctx.captured_queries if table in query['sql']])
@@ -0,0 +1,52 @@
+"""
+Tests for the set-based low-stock scanner.
+"""
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import override_settings
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch, UserProfile
+from main.models import Product, StockAlert
+from main.services.alert_service import check_stock_levels
+
+
+@override_settings(EMAIL_SUBJECT_PREFIX='')
+class StockAlertScanTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.main = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.annex = Branch.objects.create(tenant=self.tenant, name="Annex")
+        user = User.objects.create_user(username="owner", email="owner@example.com", password="pw", is_staff=True)
+        UserProfile.objects.create(user=user, tenant=self.tenant, role='admin')
+
+    def product(self, branch, sku, stock, **kwargs):
+        return Product.objects.create(
+            tenant=self.tenant, branch=branch, name=sku, sku=sku, price=1, stock_quantity=stock, low_stock_threshold=5, **kwargs
+        )
+
+    def test_scan_creates_missing_alerts_and_one_digest_per_branch(self):
+        empty = self.product(self.main, "EMPTY", 0)
+        low = self.product(self.main, "LOW", 3)
+        self.product(self.main, "FINE", 20)
+        self.product(self.main, "MUTED", 1, alert_enabled=False)
+        annex = self.product(self.annex, "ANNEX", 5)
+        alerted = self.product(self.annex, "ALERTED", 2)
+        StockAlert.objects.create(product=alerted, alert_type='low_stock', threshold=5, current_stock=2)
+
+        # Select, insert, tenants, recipients, and one update per digest
+        with self.assertNumQueries(6):
+            alerts = check_stock_levels()
+
+        self.assertEqual(
+            {(alert.product_id, alert.alert_type) for alert in alerts},
+            {(empty.pk, 'out_of_stock'), (low.pk, 'low_stock'), (annex.pk, 'low_stock')}
+        )
+        self.assertEqual(StockAlert.objects.filter(is_resolved=False, notified=True).count(), 3)
+        self.assertEqual(
+            sorted(message.subject for message in mail.outbox),
+            ["Stock Alert: 2 products at Main", "Stock Alert: ANNEX"]
+        )
+        self.assertEqual(mail.outbox[0].to, ["owner@example.com"])
+
+        # Open alerts are not raised again
+        self.assertEqual(check_stock_levels(), [])
@@ -0,0 +1,71 @@
+"""
+Tests for the time-bucketed sales series.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from accounts.models import Branch
+from main.models import Order, OrderItem, Product, Customer
+from main.services.timeseries import bucket_floor, next_bucket, sales_series
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class BucketTests(SimpleTestCase):
+    def test_floor_and_next(self):
+        value = aware(2026, 12, 30, 15, 45)  # a Wednesday
+        self.assertEqual(bucket_floor(value, 'hour'), datetime(2026, 12, 30, 15))
+        self.assertEqual(bucket_floor(value, 'week'), datetime(2026, 12, 28))
+        self.assertEqual(bucket_floor(value, 'month'), datetime(2026, 12, 1))
+        self.assertEqual(next_bucket(datetime(2026, 12, 1), 'month'), datetime(2027, 1, 1))
+        self.assertEqual(next_bucket(datetime(2026, 11, 1), 'month'), datetime(2026, 12, 1))
+
+
+class SalesSeriesTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(tenant=self.tenant, name="Main")
+        self.product = Product.objects.create(tenant=self.tenant, branch=self.branch, name="Rice", sku="R-1", price=Decimal("5.00"))
+        self.customer = Customer.objects.create(tenant=self.tenant, name="Ama")
+        self.start = aware(2026, 3, 10)
+        self.end = aware(2026, 3, 13)
+
+    def order(self, when, total, quantity=1, customer=None):
+        order = Order.objects.create(tenant=self.tenant, branch=self.branch, status='completed', total_amount=total, customer=customer)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=self.product.price)
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+
+    def test_buckets_are_zero_filled_and_compared(self):
+        self.order(aware(2026, 3, 10, 9), Decimal("10.00"), quantity=2, customer=self.customer)
+        self.order(aware(2026, 3, 10, 18), Decimal("30.00"), customer=self.customer)
+        self.order(aware(2026, 3, 12, 23, 59), Decimal("5.00"))
+        # Previous period (3 days earlier), and one order outside both periods
+        self.order(aware(2026, 3, 7, 12), Decimal("20.00"))
+        self.order(aware(2026, 3, 1), Decimal("99.00"))
+
+        with self.assertNumQueries(1):
+            result = sales_series(Order.objects.filter(tenant=self.tenant), self.start, self.end, compare=True)
+
+        series = result['series']
+        self.assertEqual([entry['date'] for entry in series], ['2026-03-10', '2026-03-11', '2026-03-12'])
+        self.assertEqual(
+            {key: series[0][key] for key in ('revenue', 'orders', 'aov', 'items', 'customers')},
+            {'revenue': 40.0, 'orders': 2, 'aov': 20.0, 'items': 3, 'customers': 1}
+        )
+        self.assertEqual((series[1]['revenue'], series[1]['orders']), (0.0, 0))
+        # The previous period lines up with the bucket it is compared with
+        self.assertEqual(series[0]['previous']['revenue'], 20.0)
+        self.assertEqual(result['current'], {'revenue': 45.0, 'orders': 3, 'aov': 15.0, 'items': 4})
+        self.assertEqual(result['previous']['orders'], 1)
+
+    def test_hour_buckets(self):
+        self.order(aware(2026, 3, 10, 9, 30), Decimal("10.00"))
+        result = sales_series(Order.objects.all(), self.start, self.start + timedelta(hours=12), bucket='hour', metrics=('orders',))
+
+        self.assertEqual(len(result['series']), 12)
+        self.assertEqual(result['series'][9], {'date': '2026-03-10T09:00', 'orders': 1})
+        self.assertIsNone(result['previous'])
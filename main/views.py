@@ -508,7 +508,7 @@ def product_create(request, branch_id):
         return redirect('product_list', branch_id=branch.id)
         
     if request.method == 'POST':
-        form = ProductForm(request.POST)
+        form = ProductForm(request.POST, branch=branch)
         if form.is_valid():
             product = form.save(commit=False)
             product.tenant = request.user.profile.tenant
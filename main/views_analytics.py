@@ -14,10 +14,21 @@ from main.services.analytics_service import (
     get_customer_metrics,
     get_real_time_metrics
 )
+from main.services.timeseries import BUCKETS, sales_series
+from branches.services.report_cache import cached_report
 
 
 from accounts.utils import merchant_only
 
+
+def _cached(report, tenant, branch, build, start=None, end=None, **params):
+    """Report payload from the report cache; rolling periods leave the range open"""
+    return cached_report(
+        report, tenant.pk, build, branch_id=branch.pk if branch else None,
+        start=start, end=end, params=params
+    )
+
+
 @login_required
 @merchant_only
 def analytics_dashboard(request, branch_id=None):
@@ -42,9 +53,17 @@ def analytics_dashboard(request, branch_id=None):
     period = request.GET.get('period', 'week')
     
     # Fetch analytics data
-    sales_trends = get_sales_trends(branch=branch, tenant=tenant, period=period)
-    revenue_breakdown = get_revenue_breakdown(branch=branch, tenant=tenant)
-    top_products = get_top_products(branch=branch, tenant=tenant, limit=10, period=period)
+    sales_trends = _cached(
+        'sales_trends', tenant, branch,
+        lambda: get_sales_trends(branch=branch, tenant=tenant, period=period),
+        period=period, bucket='day'
+    )
+    revenue_breakdown = _cached('revenue_breakdown', tenant, branch, lambda: get_revenue_breakdown(branch=branch, tenant=tenant))
+    top_products = _cached(
+        'top_products', tenant, branch,
+        lambda: get_top_products(branch=branch, tenant=tenant, limit=10, period=period),
+        period=period, limit=10
+    )
     customer_metrics = get_customer_metrics(tenant=tenant)
     real_time = get_real_time_metrics(branch=branch, tenant=tenant)
     
@@ -84,11 +103,18 @@ def sales_trends_api(request, branch_id=None):
     if branch_id:
         branch = get_object_or_404(Branch, id=branch_id, tenant=tenant)
     
-    # Get period
+    # Get period and chart granularity
     period = request.GET.get('period', 'week')
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return JsonResponse({'error': f'Unknown bucket: {bucket}'}, status=400)
     
     # Get data
-    data = get_sales_trends(branch=branch, tenant=tenant, period=period)
+    data = _cached(
+        'sales_trends', tenant, branch,
+        lambda: get_sales_trends(branch=branch, tenant=tenant, period=period, bucket=bucket),
+        period=period, bucket=bucket
+    )
     
     return JsonResponse(data)
 
@@ -121,11 +147,15 @@ def revenue_breakdown_api(request, branch_id=None):
         end_date = datetime.strptime(end_date, '%Y-%m-%d')
     
     # Get data
-    data = get_revenue_breakdown(
-        branch=branch,
-        tenant=tenant,
-        start_date=start_date,
-        end_date=end_date
+    data = _cached(
+        'revenue_breakdown', tenant, branch,
+        lambda: get_revenue_breakdown(
+            branch=branch,
+            tenant=tenant,
+            start_date=start_date,
+            end_date=end_date
+        ),
+        start=start_date, end=end_date
     )
     
     return JsonResponse(data)
@@ -154,11 +184,15 @@ def top_products_api(request, branch_id=None):
     period = request.GET.get('period', 'month')
     
     # Get data
-    data = get_top_products(
-        branch=branch,
-        tenant=tenant,
-        limit=limit,
-        period=period
+    data = _cached(
+        'top_products', tenant, branch,
+        lambda: get_top_products(
+            branch=branch,
+            tenant=tenant,
+            limit=limit,
+            period=period
+        ),
+        period=period, limit=limit
     )
     
     return JsonResponse(data)
@@ -241,6 +275,16 @@ def custom_report_builder(request):
     return render(request, 'main/analytics/report_builder.html', context)
 
 
+# Report builder metric -> sales_series metric
+REPORT_BUILDER_METRICS = {
+    'revenue': 'revenue',
+    'orders': 'orders',
+    'avg_order': 'aov',
+    'customers': 'customers',
+    'products_sold': 'items',
+}
+
+
 @login_required
 @merchant_only
 def custom_report_data(request):
@@ -257,9 +301,7 @@ def custom_report_data(request):
     period = request.GET.get('period', 'month')
     groupby = request.GET.get('groupby', 'day')
     
-    from datetime import timedelta
     from django.db.models import Sum, Count, Avg
-    from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
     from main.models import Order, OrderItem
     
     # Determine date range
@@ -281,20 +323,22 @@ def custom_report_data(request):
     labels = []
     values = []
     
+    if groupby not in ('category', 'payment'):
+        # Time buckets: one grouped query, empty buckets included
+        series_metric = REPORT_BUILDER_METRICS.get(metric, 'revenue')
+        bucket = groupby if groupby in BUCKETS else 'day'
+        series = sales_series(orders, start_date, now, bucket=bucket, metrics=(series_metric,))['series']
+        return JsonResponse({
+            'labels': [entry['date'] for entry in series],
+            'values': [float(entry[series_metric]) for entry in series]
+        })
+    
     # Group by logic
-    if groupby == 'day':
-        data = orders.annotate(date=TruncDay('created_at')).values('date')
-    elif groupby == 'week':
-        data = orders.annotate(date=TruncWeek('created_at')).values('date')
-    elif groupby == 'month':
-        data = orders.annotate(date=TruncMonth('created_at')).values('date')
-    elif groupby == 'category':
+    if groupby == 'category':
         items = OrderItem.objects.filter(order__in=orders, product__category__isnull=False)
         data = items.values('product__category__name')
-    elif groupby == 'payment':
-        data = orders.values('payment_method')
     else:
-        data = orders.annotate(date=TruncDay('created_at')).values('date')
+        data = orders.values('payment_method')
     
     # Metric calculation
     if metric == 'revenue':
@@ -309,28 +353,17 @@ def custom_report_data(request):
     elif metric == 'customers':
         data = data.annotate(value=Count('customer', distinct=True))
     elif metric == 'products_sold':
-        if groupby in ['day', 'week', 'month']:
-            items = OrderItem.objects.filter(order__in=orders)
-            if groupby == 'day':
-                data = items.annotate(date=TruncDay('order__created_at')).values('date').annotate(value=Sum('quantity'))
-            elif groupby == 'week':
-                data = items.annotate(date=TruncWeek('order__created_at')).values('date').annotate(value=Sum('quantity'))
-            else:
-                data = items.annotate(date=TruncMonth('order__created_at')).values('date').annotate(value=Sum('quantity'))
+        items = OrderItem.objects.filter(order__in=orders)
+        if groupby == 'category':
+            data = items.filter(product__category__isnull=False).values('product__category__name').annotate(value=Sum('quantity'))
         else:
-            items = OrderItem.objects.filter(order__in=orders)
-            if groupby == 'category':
-                data = items.filter(product__category__isnull=False).values('product__category__name').annotate(value=Sum('quantity'))
-            else:
-                data = items.values('order__payment_method').annotate(value=Sum('quantity'))
+            data = items.values('order__payment_method').annotate(value=Sum('quantity'))
     
     # Extract labels and values
     for item in data:
-        if groupby in ['day', 'week', 'month']:
-            labels.append(item['date'].strftime('%Y-%m-%d'))
-        elif groupby == 'category':
+        if groupby == 'category':
             labels.append(item.get('product__category__name', 'Uncategorized'))
-        elif groupby == 'payment':
+        else:
             labels.append(item.get('payment_method', 'Unknown'))
         
         values.append(float(item.get('value', 0)))
@@ -5,17 +5,40 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
 from django.shortcuts import redirect
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
 from accounts.models import Branch
-from main.models import Order, Product, Customer, OrderItem
 from main.services.exports import (
     export_sales_report,
     export_inventory_report,
     export_customer_report,
-    export_order_items_report
+    export_order_items_report,
+    sales_queryset,
+    inventory_queryset,
+    customers_queryset,
+    order_items_queryset,
+    should_export_async,
+    get_saved_report,
 )
 from datetime import datetime, timedelta
 
 
+def queue_export(request, report, format_type, params):
+    """
+    Hand a large report to export_report_task. The user gets a notification
+    with the download link when the file is ready.
+    """
+    from main.tasks import export_report_task
+
+    export_report_task.delay(str(request.user.profile.tenant.id), request.user.id, report, format_type, params)
+    messages.info(
+        request,
+        "This report is large, so it is being prepared in the background. "
+        "You will get a notification with the download link when it is ready."
+    )
+    return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
+
+
 @login_required
 def export_sales(request, branch_id):
     """Export sales report for a specific branch."""
@@ -32,14 +55,11 @@ def export_sales(request, branch_id):
     if not end_date:
         end_date = datetime.now().strftime('%Y-%m-%d')
     
-    # Filter orders
-    orders = Order.objects.filter(
-        branch=branch,
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date
-    ).select_related('customer', 'branch').order_by('-created_at')
+    params = {'branch_id': str(branch.id), 'start_date': start_date, 'end_date': end_date}
+    if should_export_async('sales', params):
+        return queue_export(request, 'sales', format_type, params)
     
-    return export_sales_report(orders, format=format_type)
+    return export_sales_report(sales_queryset(**params), format=format_type)
 
 
 @login_required
@@ -48,13 +68,11 @@ def export_inventory(request, branch_id):
     branch = get_object_or_404(Branch, id=branch_id, tenant=request.user.profile.tenant)
     format_type = request.GET.get('format', 'csv')
     
-    # Filter products
-    products = Product.objects.filter(
-        branch=branch,
-        is_active=True
-    ).select_related('category', 'branch').order_by('name')
+    params = {'branch_id': str(branch.id)}
+    if should_export_async('inventory', params):
+        return queue_export(request, 'inventory', format_type, params)
     
-    return export_inventory_report(products, format=format_type)
+    return export_inventory_report(inventory_queryset(**params), format=format_type)
 
 
 @login_required
@@ -63,12 +81,11 @@ def export_customers(request):
     tenant = request.user.profile.tenant
     format_type = request.GET.get('format', 'csv')
     
-    # Get all customers for the tenant
-    customers = Customer.objects.filter(
-        tenant=tenant
-    ).order_by('-created_at')
+    params = {'tenant_id': str(tenant.id)}
+    if should_export_async('customers', params):
+        return queue_export(request, 'customers', format_type, params)
     
-    return export_customer_report(customers, format=format_type)
+    return export_customer_report(customers_queryset(**params), format=format_type)
 
 
 @login_required
@@ -87,11 +104,18 @@ def export_order_items(request, branch_id):
     if not end_date:
         end_date = datetime.now().strftime('%Y-%m-%d')
     
-    # Filter order items
-    order_items = OrderItem.objects.filter(
-        order__branch=branch,
-        order__created_at__date__gte=start_date,
-        order__created_at__date__lte=end_date
-    ).select_related('order', 'product').order_by('-order__created_at')
+    params = {'branch_id': str(branch.id), 'start_date': start_date, 'end_date': end_date}
+    if should_export_async('order_items', params):
+        return queue_export(request, 'order_items', format_type, params)
     
-    return export_order_items_report(order_items, format=format_type)
+    return export_order_items_report(order_items_queryset(**params), format=format_type)
+
+
+@login_required
+def download_export(request, token):
+    """Download a report prepared by export_report_task."""
+    saved = get_saved_report(token, request.user.id)
+    if not saved or not default_storage.exists(saved[0]):
+        raise Http404("This export has expired.")
+    path, filename = saved
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename=filename)
@@ -23,6 +23,7 @@ from .forms_financial import (
 )
 from accounts.models import Branch
 from .payment_processors import get_payment_processor
+from branches.services.report_cache import cached_report
 
 # =============================================================================
 # EXPENSE MANAGEMENT
@@ -238,6 +239,21 @@ def profit_loss_report(request):
         start_date = None
         end_date = None
     
+    report = cached_report(
+        'profit_loss', tenant.pk, lambda: _profit_loss_figures(tenant, start_date, end_date),
+        start=start_date, end=end_date
+    )
+    
+    context = {
+        'date_range': date_range,
+        'start_date': start_date,
+        'end_date': end_date,
+        **report,
+    }
+    return render(request, 'main/profit_loss_report.html', context)
+
+def _profit_loss_figures(tenant, start_date, end_date):
+    """P&L figures for the period (all time when either date is missing)"""
     # Revenue calculations
     orders_query = Order.objects.filter(tenant=tenant, status='completed')
     if start_date and end_date:
@@ -294,23 +310,19 @@ def profit_loss_report(request):
         orders=Count('id')
     ).order_by('-revenue')
     
-    context = {
-        'date_range': date_range,
-        'start_date': start_date,
-        'end_date': end_date,
+    return {
         'revenue_data': revenue_data,
         'gross_revenue': gross_revenue,
         'cogs': cogs,
         'gross_profit': gross_profit,
         'gross_margin': gross_margin,
         'expense_data': expense_data,
-        'expense_breakdown': expense_breakdown,
+        'expense_breakdown': list(expense_breakdown),
         'net_profit': net_profit,
         'net_margin': net_margin,
-        'revenue_trend': revenue_trend,
-        'branch_performance': branch_performance,
+        'revenue_trend': list(revenue_trend),
+        'branch_performance': list(branch_performance),
     }
-    return render(request, 'main/profit_loss_report.html', context)
 
 # =============================================================================
 # TAX REPORTS
@@ -382,6 +394,22 @@ def tax_report(request):
         start_date = None
         end_date = None
     
+    report = cached_report(
+        'tax', tenant.pk, lambda: _tax_figures(tenant, start_date, end_date),
+        start=start_date, end=end_date
+    )
+    
+    context = {
+        'tax_config': tax_config,
+        'date_range': date_range,
+        'start_date': start_date,
+        'end_date': end_date,
+        **report,
+    }
+    return render(request, 'main/tax_report.html', context)
+
+def _tax_figures(tenant, start_date, end_date):
+    """Tax collected in the period (all time when either date is missing)"""
     # Get completed orders
     orders_query = Order.objects.filter(tenant=tenant, status='completed')
     if start_date and end_date:
@@ -413,16 +441,11 @@ def tax_report(request):
     else:
         daily_tax = []
     
-    context = {
-        'tax_config': tax_config,
-        'date_range': date_range,
-        'start_date': start_date,
-        'end_date': end_date,
+    return {
         'tax_summary': tax_summary,
-        'tax_by_branch': tax_by_branch,
-        'daily_tax': daily_tax,
+        'tax_by_branch': list(tax_by_branch),
+        'daily_tax': list(daily_tax),
     }
-    return render(request, 'main/tax_report.html', context)
 
 @login_required
 def tax_report_export(request):
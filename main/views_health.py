@@ -85,10 +85,17 @@ def metrics_check(request):
         except Exception as e:
             db_info[db_name] = f'error: {str(e)}'
     
+    # Audit writer backpressure (this worker process only)
+    from api.audit import get_audit_writer
+    # Report cache hit ratio (all workers)
+    from branches.services.report_cache import report_cache_stats
+    
     return JsonResponse({
         'status': 'ok',
         'metrics': {
             'databases': db_info,
+            'api_audit': get_audit_writer().stats(),
+            'report_cache': report_cache_stats(),
             'debug_mode': settings.DEBUG,
             'environment': getattr(settings, 'SENTRY_ENVIRONMENT', 'unknown'),
         },
@@ -33,14 +33,15 @@ def inventory_forecast_view(request, branch_id=None):
         branch = get_object_or_404(Branch, id=branch_id, tenant=tenant)
         products = products.filter(branch=branch)
 
-    # Calculate metrics in Python (as per widget logic)
+    # Calculate metrics in Python (as per widget logic), with the sales of
+    # all products read in one query
+    products = products.filter(stock_quantity__gt=0)
+    velocities = Product.get_daily_sales_velocities(products)
+    
     forecasts = []
     for p in products:
-        if p.stock_quantity <= 0:
-            continue
-            
-        days = p.get_days_until_stockout()
-        velocity = p.get_daily_sales_velocity()
+        velocity = velocities.get(p.id, 0.0)
+        days = p.get_days_until_stockout(velocity)
         
         # We can add a "status" for the UI
         status = 'healthy'
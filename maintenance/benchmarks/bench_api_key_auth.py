@@ -0,0 +1,102 @@
+"""
+Load test: APIKeyAuthentication with the principal cache, cold vs. warm.
+
+Creates a throwaway tenant with an API-enabled plan, an admin and an API key,
+then authenticates requests from several threads and reports per phase:
+  - cold: every request misses both cache tiers (the old per-request cost)
+  - warm: principal served from the cache; last_used_at is coalesced
+  - queries/request counted on the main thread
+
+Rate limits are disabled so only authentication is measured. Requires the
+configured Redis cache.
+
+Usage: python maintenance/benchmarks/bench_api_key_auth.py
+"""
+import hashlib
+import os
+import secrets
+import sys
+import threading
+import time
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'possystem.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection, close_old_connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from accounts.models import Tenant, UserProfile, APIKey
+from billing.models import Plan, Subscription
+from api import key_cache
+from api.auth import APIKeyAuthentication
+
+THREADS = 8
+REQUESTS_PER_THREAD = 500
+
+
+def authenticate_many(raw_key, host, count, cold):
+    auth = APIKeyAuthentication()
+    factory = APIRequestFactory()
+    key_hash = hashlib.sha256(raw_key.encode()).hexdigest()
+    for _ in range(count):
+        if cold:
+            key_cache.invalidate_api_keys([key_hash])
+        auth.authenticate(Request(factory.get('/api/v1/products/', HTTP_X_API_KEY=raw_key, HTTP_HOST=host)))
+
+
+def run(raw_key, host, cold):
+    def worker():
+        try:
+            authenticate_many(raw_key, host, REQUESTS_PER_THREAD, cold)
+        finally:
+            close_old_connections()
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with CaptureQueriesContext(connection) as queries:
+        authenticate_many(raw_key, host, 100, cold)
+    return THREADS * REQUESTS_PER_THREAD / elapsed, len(queries.captured_queries) / 100
+
+
+def main():
+    plan = Plan.objects.create(name="Benchmark API", api_access=True, api_daily_limit=0, api_burst_limit=0)
+    tenant = Tenant.objects.create(name="Benchmark Tenant", subdomain="benchapikey")
+    user = User.objects.create_user(username=f"bench-{secrets.token_hex(4)}")
+    try:
+        Subscription.objects.create(tenant=tenant, plan=plan, status='active')
+        UserProfile.objects.create(user=user, tenant=tenant, role='admin')
+        raw_key = "pb_" + secrets.token_urlsafe(32)
+        APIKey.objects.create(
+            tenant=tenant, name="Benchmark", key_prefix=raw_key[:8],
+            key_hash=hashlib.sha256(raw_key.encode()).hexdigest(),
+        )
+        host = f"{tenant.subdomain}.localhost"
+
+        print("=" * 60)
+        print(f"API KEY AUTHENTICATION ({THREADS} threads x {REQUESTS_PER_THREAD} requests)")
+        print("=" * 60)
+        print(f"{'phase':<8} {'req/s':>12} {'queries/req':>14}")
+        with override_settings(API_RATELIMIT_KEY_LIMIT=0):
+            for phase, cold in (('cold', True), ('warm', False)):
+                throughput, queries = run(raw_key, host, cold)
+                print(f"{phase:<8} {throughput:>12.0f} {queries:>14.2f}")
+        key_cache.last_used.flush()
+    finally:
+        tenant.delete(force_drop=True)
+        user.delete()
+        plan.delete()
+
+
+if __name__ == '__main__':
+    main()
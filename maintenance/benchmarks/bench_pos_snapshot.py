@@ -0,0 +1,84 @@
+"""
+Benchmark: POS bootstrap payload (pos_data_api) latency, cold vs. warm.
+
+Creates a throwaway tenant with growing numbers of products and customers and
+measures, per size:
+  - build: POSService.get_pos_data (what every page load used to pay)
+  - cold:  snapshot miss (build + compress + cache write)
+  - warm:  snapshot hit (two cache reads, no database queries)
+
+Requires the configured Redis cache.
+
+Usage: python maintenance/benchmarks/bench_pos_snapshot.py
+"""
+import os
+import sys
+import time
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'possystem.settings')
+django.setup()
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_tenants.utils import schema_context
+from accounts.models import Tenant, Branch
+from main.models import Product, Customer
+from branches.services.pos import POSService
+from branches.services.pos_snapshot import get_pos_snapshot, invalidate_pos_snapshot
+
+SIZES = [1000, 5000, 20000]
+WARM_ROUNDS = 50
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    tenant = Tenant.objects.create(name="Benchmark Tenant", subdomain="benchpossnap")
+    try:
+        with schema_context(tenant.schema_name):
+            branch = Branch.objects.create(tenant=tenant, name="Bench Branch")
+            service = POSService(tenant)
+
+            print("=" * 78)
+            print("POS BOOTSTRAP PAYLOAD (ms)")
+            print("=" * 78)
+            print(f"{'rows':>7} {'build':>9} {'cold':>9} {'warm':>9} {'warm q':>7} {'gzip KB':>9}")
+
+            existing = 0
+            for size in SIZES:
+                Product.objects.bulk_create([
+                    Product(tenant=tenant, branch=branch, name=f"Bench {n}", sku=f"BENCH-{n}", price=1, stock_quantity=100)
+                    for n in range(existing, size)
+                ], batch_size=1000)
+                Customer.objects.bulk_create([
+                    Customer(tenant=tenant, name=f"Customer {n}", phone=f"0244{n:06d}")
+                    for n in range(existing, size)
+                ], batch_size=1000)
+                existing = size
+
+                build_ms, _ = timed(lambda: service.get_pos_data(branch))
+
+                # bulk_create sends no signals; invalidate by hand for the cold run
+                invalidate_pos_snapshot(branch_ids=[branch.pk])
+                cold_ms, (_, body, _) = timed(lambda: get_pos_snapshot(service, branch))
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    for _ in range(WARM_ROUNDS):
+                        get_pos_snapshot(service, branch)
+                    warm_ms = (time.perf_counter() - start) * 1000 / WARM_ROUNDS
+
+                print(f"{size:>7} {build_ms:>9.1f} {cold_ms:>9.1f} {warm_ms:>9.2f} "
+                      f"{len(queries.captured_queries) / WARM_ROUNDS:>7.0f} {len(body) / 1024:>9.1f}")
+    finally:
+        tenant.delete(force_drop=True)
+
+
+if __name__ == '__main__':
+    main()
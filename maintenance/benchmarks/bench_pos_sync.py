@@ -0,0 +1,97 @@
+"""
+Benchmark: queries and time per synced POS basket, per-line vs. set-based.
+
+Creates a throwaway tenant and syncs baskets of increasing size through
+  - per-line: the previous loop (get product, create item, save product and
+              create a movement for every line)
+  - bulk:     POSService.sync_order (one fetch, bulk inserts, one CASE UPDATE)
+
+Usage: python maintenance/benchmarks/bench_pos_sync.py
+"""
+import os
+import sys
+import time
+import uuid
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'possystem.settings')
+django.setup()
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django_tenants.utils import schema_context
+from accounts.models import Tenant, Branch
+from main.models import Product, ProductComponent, Order, OrderItem
+from branches.services.pos import POSService
+from utils.identifier_generator import generate_order_number
+
+BASKET_SIZES = [1, 10, 40, 100]
+ROUNDS = 5
+
+
+def per_line_sync(service, branch, data):
+    """The pre-batching sync loop, kept here for comparison"""
+    with transaction.atomic():
+        order = Order.objects.create(
+            tenant=service.tenant, branch=branch, total_amount=data['total_amount'],
+            status='completed', order_number=generate_order_number(service.tenant)
+        )
+        for item_data in data['items']:
+            product = Product.objects.get(id=item_data['id'], tenant=service.tenant)
+            OrderItem.objects.create(order=order, product=product, quantity=item_data['quantity'], price=item_data['price'])
+            service._deduct_stock(product, item_data['quantity'], order, branch)
+
+
+def bulk_sync(service, branch, data):
+    result = service.sync_order(str(uuid.uuid4()), data)
+    assert result['status'] == 'success', result
+
+
+def measure(fn, service, branch, data):
+    queries = 0
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        with CaptureQueriesContext(connection) as ctx:
+            fn(service, branch, data)
+        queries += len(ctx.captured_queries)
+    return queries / ROUNDS, (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    tenant = Tenant.objects.create(name="Benchmark Tenant", subdomain="benchpossync")
+    try:
+        with schema_context(tenant.schema_name):
+            branch = Branch.objects.create(tenant=tenant, name="Bench Branch")
+            service = POSService(tenant)
+
+            products = Product.objects.bulk_create([
+                Product(tenant=tenant, branch=branch, name=f"Bench {i}", sku=f"BENCH-{i}", price=1, stock_quantity=10 ** 6)
+                for i in range(max(BASKET_SIZES))
+            ])
+            # Every tenth line is a two-component bundle
+            for bundle in products[::10]:
+                bundle.is_composite = True
+                bundle.save()
+                ProductComponent.objects.create(parent_product=bundle, component_product=products[-1], quantity=2)
+
+            print("=" * 70)
+            print(f"POS BASKET SYNC (average of {ROUNDS} baskets)")
+            print("=" * 70)
+            print(f"{'lines':>6} {'per-line q':>11} {'bulk q':>8} {'per-line ms':>12} {'bulk ms':>9}")
+
+            for size in BASKET_SIZES:
+                data = {
+                    'branch_id': str(branch.id),
+                    'total_amount': size,
+                    'items': [{'id': str(p.id), 'quantity': 1, 'price': 1} for p in products[:size]],
+                }
+                old_q, old_ms = measure(per_line_sync, service, branch, data)
+                new_q, new_ms = measure(bulk_sync, service, branch, data)
+                print(f"{size:>6} {old_q:>11.0f} {new_q:>8.0f} {old_ms:>12.1f} {new_ms:>9.1f}")
+    finally:
+        tenant.delete(force_drop=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: product import, row-by-row vs. chunked bulk upsert.
+
+Creates a throwaway tenant and imports, each into a fresh branch:
+  - the bundled sample_products_300.xlsx with the row-by-row path
+    (InventoryService.import_row, what import_products_task used to run)
+  - the same file with InventoryService.import_from_parser
+  - a synthetic 100k-row XLSX with import_from_parser, first as inserts and
+    then again as updates
+
+Reports rows/s, queries and peak Python memory (tracemalloc) per run.
+
+Usage: python maintenance/benchmarks/bench_product_import.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'possystem.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_tenants.utils import schema_context
+from accounts.models import Tenant, Branch
+from branches.services.inventory import InventoryService
+from branches.xlsx_utils import XLSXParser, XLSXGenerator
+
+SYNTHETIC_ROWS = 100000
+
+
+def synthetic_file(rows):
+    generator = XLSXGenerator()
+    generator.writerow(['Name', 'SKU', 'Category', 'Price', 'Wholesale', 'Min Qty', 'Cost', 'Stock', 'Low Stock'])
+    for n in range(rows):
+        generator.writerow([f"Item {n}", f"SYN-{n:06d}", f"Category {n % 50}", "9.99", "8.50", "10", "5.00", str(n % 500), "10"])
+    return generator.generate()
+
+
+def row_by_row(service, parser):
+    rows = parser.parse()
+    next(rows, None)
+    success = 0
+    for row_idx, row in enumerate(rows, start=2):
+        ok, _ = service.import_row(row, row_idx)
+        success += ok
+    return success
+
+
+def bulk(service, parser):
+    return service.import_from_parser(parser)['success']
+
+
+def measure(label, fn, service, content):
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        rows = fn(service, XLSXParser(content))
+        elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {rows:>7} {elapsed:>8.2f} {rows / elapsed:>9.0f} "
+          f"{len(queries.captured_queries):>8} {peak / 1024 / 1024:>8.1f}")
+
+
+def main():
+    with open(os.path.join(settings.BASE_DIR, 'sample_products_300.xlsx'), 'rb') as f:
+        sample = f.read()
+    synthetic = synthetic_file(SYNTHETIC_ROWS)
+
+    tenant = Tenant.objects.create(name="Benchmark Tenant", subdomain="benchimport")
+    try:
+        with schema_context(tenant.schema_name):
+            def service(name):
+                return InventoryService(tenant, Branch.objects.create(tenant=tenant, name=name))
+
+            print("=" * 72)
+            print("PRODUCT IMPORT")
+            print("=" * 72)
+            print(f"{'run':<28} {'rows':>7} {'s':>8} {'rows/s':>9} {'queries':>8} {'peak MB':>8}")
+            measure("sample 300, row by row", row_by_row, service("Row by row"), sample)
+            measure("sample 300, bulk", bulk, service("Bulk"), sample)
+
+            large = service("Synthetic")
+            measure(f"synthetic {SYNTHETIC_ROWS}, insert", bulk, large, synthetic)
+            measure(f"synthetic {SYNTHETIC_ROWS}, update", bulk, large, synthetic)
+    finally:
+        tenant.delete(force_drop=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: concurrent tills selling the same products, read-modify-write vs. ledger.
+
+Creates a throwaway tenant with BRANCHES branches. At each branch TILLS threads
+keep selling random baskets of the branch's few hot products until they sell
+out, through
+  - read-modify-write: the previous pattern (read the product, check the stock,
+                       subtract in Python and save() the whole row)
+  - ledger:            StockLedger.deduct (one conditional UPDATE ... RETURNING
+                       per basket, movements in one INSERT)
+
+For each run it checks that the units sold match the stock that left the
+shelves and the movements written: any difference is overselling. The ledger
+run fails the script if it oversells. Throughput is reported per branch.
+
+Usage: python maintenance/benchmarks/bench_stock_ledger.py
+"""
+import os
+import sys
+import random
+import threading
+import time
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'possystem.settings')
+django.setup()
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django_tenants.utils import schema_context
+from accounts.models import Tenant, Branch
+from main.models import Product
+from branches.models import StockMovement
+from branches.services.stock_ledger import InsufficientStock, StockLedger
+
+BRANCHES = 2
+TILLS = 8
+HOT_PRODUCTS = 5
+STOCK = 300
+MAX_BASKET = 3
+
+
+def read_modify_write(tenant, branch, lines):
+    """The pre-ledger checkout, kept here for comparison"""
+    with transaction.atomic():
+        for product_id, quantity in lines:
+            product = Product.objects.get(pk=product_id)
+            if product.stock_quantity < quantity:
+                raise InsufficientStock([product])
+            product.stock_quantity -= quantity
+            product.save()
+            StockMovement.objects.create(
+                tenant=tenant, branch=branch, product=product, quantity_change=-quantity,
+                balance_after=product.stock_quantity, movement_type='sale'
+            )
+
+
+def ledger(tenant, branch, lines):
+    products = Product.objects.in_bulk([product_id for product_id, _ in lines])
+    StockLedger(tenant).deduct([(products[product_id], quantity) for product_id, quantity in lines], branch)
+
+
+def till(checkout, tenant, branch, product_ids, sold, seed):
+    rng = random.Random(seed)
+    misses = 0
+    with schema_context(tenant.schema_name):
+        try:
+            # Until a run of baskets finds nothing left to sell
+            while misses < 20:
+                lines = [(product_id, rng.randint(1, 2)) for product_id in rng.sample(product_ids, rng.randint(1, MAX_BASKET))]
+                try:
+                    checkout(tenant, branch, lines)
+                except InsufficientStock:
+                    misses += 1
+                    continue
+                misses = 0
+                for product_id, quantity in lines:
+                    sold[product_id] = sold.get(product_id, 0) + quantity
+        finally:
+            connection.close()
+
+
+def run(checkout, tenant, branches):
+    """Returns {branch name: (basket lines/s, units sold, units oversold)}"""
+    results = {}
+    threads = []
+    tallies = {}
+    for branch in branches:
+        products = list(Product.objects.filter(branch=branch))
+        Product.objects.filter(branch=branch).update(stock_quantity=STOCK)
+        StockMovement.objects.filter(branch=branch).delete()
+        product_ids = [product.id for product in products]
+        tallies[branch.id] = []
+        for i in range(TILLS):
+            sold = {}
+            tallies[branch.id].append(sold)
+            threads.append(threading.Thread(target=till, args=(checkout, tenant, branch, product_ids, sold, i)))
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for branch in branches:
+        units_sold = sum(sum(sold.values()) for sold in tallies[branch.id])
+        remaining = Product.objects.filter(branch=branch).aggregate(total=Sum('stock_quantity'))['total']
+        moved = -(StockMovement.objects.filter(branch=branch).aggregate(total=Sum('quantity_change'))['total'] or 0)
+        lines = StockMovement.objects.filter(branch=branch).count()
+        oversold = max(units_sold - (STOCK * HOT_PRODUCTS - remaining), units_sold - moved, 0)
+        results[branch.name] = (lines / elapsed, units_sold, oversold)
+    return results
+
+
+def main():
+    tenant = Tenant.objects.create(name="Benchmark Tenant", subdomain="benchstockledger")
+    try:
+        with schema_context(tenant.schema_name):
+            branches = [Branch.objects.create(tenant=tenant, name=f"Bench Branch {b}") for b in range(BRANCHES)]
+            for branch in branches:
+                Product.objects.bulk_create([
+                    Product(tenant=tenant, branch=branch, name=f"Hot {i}", sku=f"HOT-{i}", price=1, stock_quantity=STOCK)
+                    for i in range(HOT_PRODUCTS)
+                ])
+
+            print("=" * 70)
+            print(f"CONCURRENT TILLS ({TILLS} per branch, {HOT_PRODUCTS} products x {STOCK} units)")
+            print("=" * 70)
+            print(f"{'mode':<18} {'branch':<16} {'lines/s':>9} {'sold':>7} {'oversold':>9}")
+
+            failed = False
+            for name, checkout in (("read-modify-write", read_modify_write), ("ledger", ledger)):
+                for branch_name, (rate, units_sold, oversold) in run(checkout, tenant, branches).items():
+                    print(f"{name:<18} {branch_name:<16} {rate:>9.0f} {units_sold:>7} {oversold:>9}")
+                    if checkout is ledger and oversold:
+                        failed = True
+    finally:
+        tenant.delete(force_drop=True)
+
+    if failed:
+        sys.exit("The ledger oversold.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: webhook delivery, one request per connection vs. the delivery queue.
+
+Creates a throwaway tenant with ENDPOINTS endpoints on a local HTTP stand-in
+that answers after LATENCY seconds, queues EVENTS order.created events and
+delivers them through
+  - per-request:  the previous pattern (a fresh requests.post per delivery,
+                  one at a time, each logged with its own INSERT)
+  - queue:        WebhookService.deliver (rows persisted in one INSERT, sent
+                  from the thread pool over keep-alive connections, outcomes
+                  written in one bulk UPDATE)
+
+A third run points one endpoint at a port nobody listens on, to show the
+circuit breaker cutting the attempts to a dead endpoint short.
+
+Usage: python maintenance/benchmarks/bench_webhook_delivery.py
+"""
+import os
+import sys
+import json
+import threading
+import time
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'possystem.settings')
+django.setup()
+
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from accounts.models import Tenant, WebhookEndpoint, WebhookEvent
+from utils.webhooks import WebhookService, sign
+
+ENDPOINTS = 4
+EVENTS = 250
+LATENCY = 0.01
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def do_POST(self):
+        Handler.connections.add(self.client_address)
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(LATENCY)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+def per_request(tenant, events):
+    """The pre-queue delivery, kept here for comparison"""
+    for tenant_id, event_type, payload in events:
+        for endpoint in WebhookEndpoint.objects.filter(tenant_id=tenant_id, is_active=True):
+            if event_type not in endpoint.events:
+                continue
+            body = json.dumps({'event': event_type, 'data': payload})
+            try:
+                response = requests.post(
+                    endpoint.url, data=body, timeout=10,
+                    headers={'Content-Type': 'application/json', 'X-Puxbay-Signature': sign(body, endpoint.secret)}
+                )
+                status_code, error_message = response.status_code, None
+            except requests.exceptions.RequestException as e:
+                status_code, error_message = None, str(e)
+            WebhookEvent.objects.create(
+                endpoint=endpoint, event_type=event_type, payload=payload, status_code=status_code,
+                error_message=error_message, status=WebhookEvent.STATUS_DELIVERED if status_code == 200 else WebhookEvent.STATUS_DEAD
+            )
+
+
+def queue(tenant, events):
+    WebhookService.deliver(events)
+
+
+def run(deliver, tenant, events):
+    """Returns (deliveries/s, requests, connections)"""
+    WebhookEvent.objects.filter(endpoint__tenant=tenant).delete()
+    WebhookEndpoint.objects.filter(tenant=tenant).update(consecutive_failures=0, disabled_until=None)
+    Handler.connections.clear()
+    start = time.perf_counter()
+    deliver(tenant, events)
+    elapsed = time.perf_counter() - start
+    rows = WebhookEvent.objects.filter(endpoint__tenant=tenant)
+    attempts = sum(rows.values_list('attempts', flat=True)) or rows.exclude(status_code__isnull=True).count()
+    return rows.count() / elapsed, attempts, len(Handler.connections)
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/hook"
+
+    tenant = Tenant.objects.create(name="Benchmark Tenant", subdomain="benchwebhooks")
+    try:
+        endpoints = [
+            WebhookEndpoint.objects.create(tenant=tenant, url=url, secret='bench', events=['order.created'])
+            for _ in range(ENDPOINTS)
+        ]
+        events = [(str(tenant.pk), 'order.created', {'order': n}) for n in range(EVENTS)]
+
+        print("=" * 70)
+        print(f"WEBHOOK DELIVERY ({EVENTS} events x {ENDPOINTS} endpoints, {LATENCY * 1000:.0f} ms per request)")
+        print("=" * 70)
+        print(f"{'mode':<14} {'deliveries/s':>13} {'requests':>9} {'connections':>12}")
+        for name, deliver in (("per-request", per_request), ("queue", queue)):
+            rate, attempts, connections = run(deliver, tenant, events)
+            print(f"{name:<14} {rate:>13.0f} {attempts:>9} {connections:>12}")
+
+        # One endpoint down: how many requests are wasted on it
+        WebhookEndpoint.objects.filter(pk=endpoints[0].pk).update(url="http://127.0.0.1:9/hook")
+        print()
+        print(f"{'dead endpoint':<14} {'deliveries/s':>13} {'attempts':>9}")
+        for name, deliver in (("per-request", per_request), ("queue", queue)):
+            rate, _, _ = run(deliver, tenant, events)
+            dead = WebhookEvent.objects.filter(endpoint=endpoints[0])
+            wasted = sum(dead.values_list('attempts', flat=True)) or dead.count()
+            print(f"{name:<14} {rate:>13.0f} {wasted:>9}")
+    finally:
+        tenant.delete(force_drop=True)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
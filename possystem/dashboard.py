@@ -72,7 +72,7 @@ def dashboard_callback(request, context):
         if webhook_events_7d > 0:
             successful_webhooks = WebhookEvent.objects.filter(
                 timestamp__gte=days_ago_7,
-                status_code__lt=400
+                status=WebhookEvent.STATUS_DELIVERED
             ).count()
             webhook_success_rate = (successful_webhooks / webhook_events_7d * 100)
         
@@ -224,44 +224,63 @@ def dashboard_callback(request, context):
     # TENANT SCHEMA - Tenant-specific Dashboard
     # =========================================================================
     from main.models import Order, Product, Customer, Expense
+    from branches.services.report_cache import cached_report
     
     now = timezone.now()
     days_ago_7 = now - timedelta(days=7)
     
-    # Revenue (Completed Orders)
-    revenue_data = (
-        Order.objects.filter(created_at__gte=days_ago_7, status='completed')
-        .annotate(day=TruncDay('created_at'))
-        .values('day')
-        .annotate(total=Sum('total_amount'))
-        .order_by('day')
-    )
-    
-    # Expenses
-    expense_data = (
-        Expense.objects.filter(date__gte=days_ago_7.date())
-        .values('date')
-        .annotate(total=Sum('amount'))
-        .order_by('date')
-    )
-    
-    # Format data for Chart.js
-    labels = []
-    data_revenue = []
-    data_expense = []
-    
-    rev_dict = {entry['day'].date(): entry['total'] for entry in revenue_data}
-    exp_dict = {entry['date']: entry['total'] for entry in expense_data}
+    def build():
+        # Revenue (Completed Orders)
+        revenue_data = (
+            Order.objects.filter(created_at__gte=days_ago_7, status='completed')
+            .annotate(day=TruncDay('created_at'))
+            .values('day')
+            .annotate(total=Sum('total_amount'))
+            .order_by('day')
+        )
+        
+        # Expenses
+        expense_data = (
+            Expense.objects.filter(date__gte=days_ago_7.date())
+            .values('date')
+            .annotate(total=Sum('amount'))
+            .order_by('date')
+        )
+        
+        # Format data for Chart.js
+        labels = []
+        data_revenue = []
+        data_expense = []
+        
+        rev_dict = {entry['day'].date(): entry['total'] for entry in revenue_data}
+        exp_dict = {entry['date']: entry['total'] for entry in expense_data}
+        
+        for i in range(7):
+            current_date = (days_ago_7 + timedelta(days=i)).date()
+            labels.append(current_date.strftime('%a'))
+            data_revenue.append(float(rev_dict.get(current_date, 0)))
+            data_expense.append(float(exp_dict.get(current_date, 0)))
+
+        return {
+            'labels': labels,
+            'revenue': data_revenue,
+            'expenses': data_expense,
+            'total_rev': Order.objects.filter(status='completed').aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
+            'total_exp': Expense.objects.aggregate(Sum('amount'))['amount__sum'] or 0,
+            'order_count': Order.objects.count(),
+        }
     
-    for i in range(7):
-        current_date = (days_ago_7 + timedelta(days=i)).date()
-        labels.append(current_date.strftime('%a'))
-        data_revenue.append(float(rev_dict.get(current_date, 0)))
-        data_expense.append(float(exp_dict.get(current_date, 0)))
+    # Order and expense figures come from the report cache; counts of
+    # products and customers are not invalidated by it and stay live
+    tenant_id = getattr(getattr(connection, 'tenant', None), 'pk', None)
+    figures = cached_report('admin_dashboard', tenant_id, build) if tenant_id else build()
+    labels = figures['labels']
+    data_revenue = figures['revenue']
+    data_expense = figures['expenses']
 
     # KPIs
-    total_rev = Order.objects.filter(status='completed').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    total_exp = Expense.objects.aggregate(Sum('amount'))['amount__sum'] or 0
+    total_rev = figures['total_rev']
+    total_exp = figures['total_exp']
     net_profit = total_rev - total_exp
     
     context.update({
@@ -286,7 +305,7 @@ def dashboard_callback(request, context):
             },
             {
                 "title": "Total Orders",
-                "metric": Order.objects.count(),
+                "metric": figures['order_count'],
                 "footer": "All time",
                 "icon": "shopping_cart",
             },
@@ -3,6 +3,7 @@ from django.http import Http404
 from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
+from utils.encryption import decryption_cache
 
 class SubdomainMiddleware:
     def __init__(self, get_response):
@@ -71,3 +72,20 @@ class TwoFAMiddleware:
 
         response = self.get_response(request)
         return response
+
+
+class DecryptionCacheMiddleware:
+    """
+    Keep an LRU of decrypted EncryptedTextField values for the duration of a request,
+    so the same token rendered or re-fetched several times is only decrypted once.
+    Size is set by ENCRYPTION_REQUEST_CACHE_SIZE (0 disables).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.maxsize = getattr(settings, 'ENCRYPTION_REQUEST_CACHE_SIZE', 0)
+
+    def __call__(self, request):
+        if not self.maxsize:
+            return self.get_response(request)
+        with decryption_cache(self.maxsize):
+            return self.get_response(request)
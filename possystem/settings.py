@@ -28,6 +28,18 @@ SECRET_KEY = config('SECRET_KEY')
 # Generate with: python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
 FERNET_KEY = config('FERNET_KEY').encode()
 
+# Key rotation: previous keys (comma-separated) are still accepted for decryption.
+# New data is always encrypted with FERNET_KEY; run `manage.py rotate_encryption_keys`
+# to re-encrypt existing rows, then drop the old keys.
+FERNET_OLD_KEYS = config('FERNET_OLD_KEYS', default='', cast=Csv())
+
+# Per-request LRU of decrypted values (0 disables)
+ENCRYPTION_REQUEST_CACHE_SIZE = config('ENCRYPTION_REQUEST_CACHE_SIZE', default=1024, cast=int)
+
+# HMAC key for blind indexes on encrypted lookup columns (defaults to a key derived from FERNET_KEY)
+# Keep it stable: changing it invalidates every stored index. Set it explicitly before rotating FERNET_KEY.
+BLIND_INDEX_KEY = config('BLIND_INDEX_KEY', default='')
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=False, cast=bool)
 
@@ -101,6 +113,7 @@ MIDDLEWARE = [
     'accounts.middleware.TenantProfileMiddleware',  # Attach correct profile for current tenant
     'accounts.middleware.StrictAccessMiddleware',   # Isolate Developer and Merchant dashboards
     'main.middleware.CurrentUserMiddleware',  # Track current user for history
+    'possystem.middleware.DecryptionCacheMiddleware',  # Per-request cache of decrypted field values
     'possystem.middleware_logging.CorrelationIDMiddleware',  # Add correlation IDs for request tracking
     'accounts.middleware.CrossTenantAuditMiddleware',  # Track cross-tenant access
     'api.middleware.APIRateLimitMiddleware',  # API rate limiting
@@ -843,6 +856,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'main.tasks.check_low_stock',
         'schedule': 3600.0,  # Every hour (in seconds)
     },
+    'purge-expired-exports': {
+        'task': 'main.tasks.purge_expired_exports',
+        'schedule': 3600.0,  # Every hour (in seconds)
+    },
+    'rebuild-sales-rollups': {
+        'task': 'main.tasks.rebuild_recent_sales_rollups',
+        'schedule': crontab(hour=2, minute=30), # Daily at 2:30 AM
+    },
+    'retry-webhook-deliveries': {
+        'task': 'main.tasks.retry_webhook_deliveries',
+        'schedule': 60.0,  # Every minute (in seconds)
+    },
 }
 
 # Redis Cache Configuration
@@ -864,12 +889,125 @@ CACHES = {
     }
 }
 
+# =============================================================================
+# IDENTIFIER ALLOCATION
+# =============================================================================
+# Backend for ORD-/ITM-/BR- numbers (see utils/sequences.py)
+# 'db': gap-free per-tenant counter rows, 'redis': lock-free INCR fast path
+IDENTIFIER_SEQUENCE_BACKEND = config('IDENTIFIER_SEQUENCE_BACKEND', default='db')
+
+# =============================================================================
+# OFFLINE SYNC
+# =============================================================================
+# Bounds for POST /api/v1/offline/batch/ (backlog replay after an outage)
+OFFLINE_SYNC_BATCH_MAX_ITEMS = config('OFFLINE_SYNC_BATCH_MAX_ITEMS', default=500, cast=int)
+OFFLINE_SYNC_BATCH_MAX_BYTES = config('OFFLINE_SYNC_BATCH_MAX_BYTES', default=5 * 1024 * 1024, cast=int)
+
+# Catalog delta sync (branches/services/catalog_sync.py): changes per ?since= page,
+# and lifetime of cached full snapshots (keyed by catalog version)
+CATALOG_SYNC_PAGE_SIZE = config('CATALOG_SYNC_PAGE_SIZE', default=1000, cast=int)
+CATALOG_SNAPSHOT_TTL = config('CATALOG_SNAPSHOT_TTL', default=86400, cast=int)
+
+# =============================================================================
+# PRODUCT IMPORT
+# =============================================================================
+# Rows validated and upserted per statement (branches/services/product_import.py)
+PRODUCT_IMPORT_CHUNK_SIZE = config('PRODUCT_IMPORT_CHUNK_SIZE', default=1000, cast=int)
+
+# Image URLs in import files (branches/services/product_images.py)
+IMPORT_IMAGE_WORKERS = config('IMPORT_IMAGE_WORKERS', default=8, cast=int)
+IMPORT_IMAGE_MAX_PENDING = config('IMPORT_IMAGE_MAX_PENDING', default=64, cast=int)
+IMPORT_IMAGE_TIMEOUT = config('IMPORT_IMAGE_TIMEOUT', default=10, cast=float)
+IMPORT_IMAGE_MAX_BYTES = config('IMPORT_IMAGE_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+IMPORT_IMAGE_MAX_DIMENSION = config('IMPORT_IMAGE_MAX_DIMENSION', default=1600, cast=int)
+IMPORT_IMAGE_THUMBNAIL_SIZE = config('IMPORT_IMAGE_THUMBNAIL_SIZE', default=320, cast=int)
+# Attempts per URL inside the import, then delayed rounds via retry_product_images_task
+IMPORT_IMAGE_RETRIES = config('IMPORT_IMAGE_RETRIES', default=2, cast=int)
+IMPORT_IMAGE_RETRY_ROUNDS = config('IMPORT_IMAGE_RETRY_ROUNDS', default=3, cast=int)
+IMPORT_IMAGE_RETRY_DELAY = config('IMPORT_IMAGE_RETRY_DELAY', default=300, cast=int)
+# Loopback/private addresses are refused unless enabled (local development)
+IMPORT_IMAGE_ALLOW_PRIVATE_HOSTS = config('IMPORT_IMAGE_ALLOW_PRIVATE_HOSTS', default=False, cast=bool)
+
+# =============================================================================
+# REPORT EXPORTS
+# =============================================================================
+# Rows fetched per database round trip while streaming an export (main/services/exports.py)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# Reports with more rows are written by a Celery task and delivered as a download link (0 = always stream)
+EXPORT_ASYNC_THRESHOLD = config('EXPORT_ASYNC_THRESHOLD', default=50000, cast=int)
+# How long (seconds) a generated report stays downloadable before it is purged
+EXPORT_FILE_TTL = config('EXPORT_FILE_TTL', default=86400, cast=int)
+
+# =============================================================================
+# SALES ROLLUPS
+# =============================================================================
+# Closed days recomputed nightly from orders to repair the incremental daily rollups
+# (branches/services/sales_rollup.py; 0 = off). Older days: manage.py backfill_sales_rollups
+SALES_ROLLUP_REBUILD_DAYS = config('SALES_ROLLUP_REBUILD_DAYS', default=3, cast=int)
+
+# =============================================================================
+# REPORT CACHE
+# =============================================================================
+# Seconds a cached report payload is kept (branches/services/report_cache.py).
+# Ranges that include today expire quickly; closed periods only change through
+# back-dated writes, which invalidate them anyway. 0 disables caching.
+REPORT_CACHE_TTL_LIVE = config('REPORT_CACHE_TTL_LIVE', default=120, cast=int)
+REPORT_CACHE_TTL_CLOSED = config('REPORT_CACHE_TTL_CLOSED', default=86400, cast=int)
+
+# =============================================================================
+# STOCK LEDGER
+# =============================================================================
+# Seconds units added to an online cart stay reserved for it
+# (branches/services/stock_ledger.py). 0 disables reservations.
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=900, cast=int)
+# Transfer lines shipped/received per transaction; larger transfers are
+# processed in the background in chunks of this size
+TRANSFER_CHUNK_SIZE = config('TRANSFER_CHUNK_SIZE', default=500, cast=int)
+
+# =============================================================================
+# WEBHOOK DELIVERY
+# =============================================================================
+# Seconds to wait for an endpoint to answer (utils/webhooks.py)
+WEBHOOK_TIMEOUT = config('WEBHOOK_TIMEOUT', default=10, cast=int)
+# Attempts before a delivery is given up as dead; retries back off
+# exponentially from WEBHOOK_BACKOFF_BASE seconds up to WEBHOOK_BACKOFF_MAX
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=8, cast=int)
+WEBHOOK_BACKOFF_BASE = config('WEBHOOK_BACKOFF_BASE', default=30, cast=int)
+WEBHOOK_BACKOFF_MAX = config('WEBHOOK_BACKOFF_MAX', default=3600, cast=int)
+# Sending threads per dispatch, and concurrent requests per endpoint
+WEBHOOK_WORKERS = config('WEBHOOK_WORKERS', default=16, cast=int)
+WEBHOOK_ENDPOINT_CONCURRENCY = config('WEBHOOK_ENDPOINT_CONCURRENCY', default=4, cast=int)
+# Failures in a row that pause an endpoint, and for how many seconds
+WEBHOOK_CIRCUIT_THRESHOLD = config('WEBHOOK_CIRCUIT_THRESHOLD', default=5, cast=int)
+WEBHOOK_CIRCUIT_COOLDOWN = config('WEBHOOK_CIRCUIT_COOLDOWN', default=300, cast=int)
+# Deliveries claimed per dispatch
+WEBHOOK_DISPATCH_LIMIT = config('WEBHOOK_DISPATCH_LIMIT', default=1000, cast=int)
+# Subscribed endpoints per tenant and event (utils/webhook_index.py): in Redis,
+# rebuilt when an endpoint changes, and in process for the local TTL
+WEBHOOK_INDEX_TTL = config('WEBHOOK_INDEX_TTL', default=3600, cast=int)
+WEBHOOK_INDEX_LOCAL_TTL = config('WEBHOOK_INDEX_LOCAL_TTL', default=5, cast=int)
+WEBHOOK_INDEX_LOCAL_SIZE = config('WEBHOOK_INDEX_LOCAL_SIZE', default=1000, cast=int)
+
 # =============================================================================
 # API SECURITY CONFIGURATION
 # =============================================================================
 
 # API Audit Logging
 ENABLE_API_AUDIT_LOGGING = config('ENABLE_API_AUDIT_LOGGING', default=True, cast=bool)
+# Rows are buffered in process and written by a background thread (api/audit.py)
+API_AUDIT_ASYNC = config('API_AUDIT_ASYNC', default=True, cast=bool)
+API_AUDIT_BUFFER_SIZE = config('API_AUDIT_BUFFER_SIZE', default=10000, cast=int)
+API_AUDIT_BATCH_SIZE = config('API_AUDIT_BATCH_SIZE', default=200, cast=int)
+API_AUDIT_FLUSH_INTERVAL_MS = config('API_AUDIT_FLUSH_INTERVAL_MS', default=1000, cast=int)
+# Fraction of successful GET/HEAD/OPTIONS requests logged (writes and errors are always logged)
+API_AUDIT_SAMPLE_RATE = config('API_AUDIT_SAMPLE_RATE', default=1.0, cast=float)
+API_AUDIT_MAX_BODY_SIZE = config('API_AUDIT_MAX_BODY_SIZE', default=10000, cast=int)
+# JSON keys whose values are replaced with [REDACTED] (also as a prefix/suffix: new_password, access_token)
+API_AUDIT_REDACT_FIELDS = config(
+    'API_AUDIT_REDACT_FIELDS',
+    default='password,secret,token,api_key,authorization,card_number,cvv,pin',
+    cast=Csv()
+)
 
 # IP Whitelisting for sensitive endpoints
 # Format: comma-separated list of IPs or CIDR ranges
@@ -878,11 +1016,30 @@ WHITELISTED_IPS = config('WHITELISTED_IPS', default='', cast=Csv())
 
 # Webhook Security
 WEBHOOK_SECRET = config('WEBHOOK_SECRET', default='')
+# Seconds between inventory.low webhooks for the same product (main/services/outbox.py)
+INVENTORY_LOW_WEBHOOK_WINDOW = config('INVENTORY_LOW_WEBHOOK_WINDOW', default=3600, cast=int)
 
 # Rate Limiting (uses Redis cache)
 RATELIMIT_ENABLE = config('RATELIMIT_ENABLE', default=True, cast=bool)
 RATELIMIT_USE_CACHE = 'default'  # Use default Redis cache for rate limiting
 
+# API rate limiter (api/ratelimit.py): 'redis' runs one Lua script per request,
+# 'local' keeps per-process counters (also the fallback while Redis is down)
+API_RATELIMIT_BACKEND = config('API_RATELIMIT_BACKEND', default='redis')
+API_RATELIMIT_FAILOVER_SECONDS = config('API_RATELIMIT_FAILOVER_SECONDS', default=30, cast=int)
+API_RATELIMIT_IP_LIMIT = config('API_RATELIMIT_IP_LIMIT', default=100, cast=int)
+API_RATELIMIT_IP_WINDOW = config('API_RATELIMIT_IP_WINDOW', default=60, cast=int)
+API_RATELIMIT_KEY_LIMIT = config('API_RATELIMIT_KEY_LIMIT', default=120, cast=int)
+API_RATELIMIT_KEY_WINDOW = config('API_RATELIMIT_KEY_WINDOW', default=60, cast=int)
+
+# Resolved API keys are cached (api/key_cache.py): in process for the local TTL,
+# in Redis until a key/subscription/plan change invalidates them or the TTL ends
+API_KEY_CACHE_TTL = config('API_KEY_CACHE_TTL', default=300, cast=int)
+API_KEY_CACHE_LOCAL_TTL = config('API_KEY_CACHE_LOCAL_TTL', default=5, cast=int)
+API_KEY_CACHE_LOCAL_SIZE = config('API_KEY_CACHE_LOCAL_SIZE', default=1000, cast=int)
+# APIKey.last_used_at is written in one batched UPDATE per interval
+API_KEY_LAST_USED_FLUSH_SECONDS = config('API_KEY_LAST_USED_FLUSH_SECONDS', default=60, cast=int)
+
 # =============================================================================
 # PRODUCTION SECURITY VALIDATION
 # =============================================================================
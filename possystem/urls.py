@@ -108,6 +108,7 @@ urlpatterns = [
     path('export/inventory/<uuid:branch_id>/', views_exports.export_inventory, name='export_inventory'),
     path('export/customers/', views_exports.export_customers, name='export_customers'),
     path('export/order-items/<uuid:branch_id>/', views_exports.export_order_items, name='export_order_items'),
+    path('export/download/<str:token>/', views_exports.download_export, name='export_download'),
 
     # Barcode URLs
     path('barcode/image/<uuid:product_id>/', views_barcode.barcode_image, name='barcode_image'),
@@ -1,5 +1,8 @@
 // Sync Manager for Offline Transactions
 class SyncManager {
+    // Transactions per /api/v1/offline/batch/ request (server caps at OFFLINE_SYNC_BATCH_MAX_ITEMS)
+    static BATCH_SIZE = 100;
+
     constructor() {
         this.isOnline = navigator.onLine;
         this.syncInProgress = false;
@@ -102,14 +105,27 @@ class SyncManager {
             let successCount = 0;
             let failCount = 0;
 
-            // Process each item
-            for (const item of queue) {
+            // Replay the queue in batches, in queue order
+            for (let i = 0; i < queue.length; i += SyncManager.BATCH_SIZE) {
+                const batch = queue.slice(i, i + SyncManager.BATCH_SIZE);
+                let results;
                 try {
-                    await this.syncItem(item);
-                    await window.posDB.removeFromQueue(item.uuid);
-                    successCount++;
+                    results = await this.syncBatch(batch);
                 } catch (error) {
-                    console.error('[Sync] Failed to sync item:', error);
+                    console.error('[Sync] Failed to sync batch:', error);
+                    results = batch.map(item => ({ uuid: item.uuid, status: 'error', error: error.message }));
+                }
+
+                const resultsByUuid = new Map(results.map(result => [String(result.uuid), result]));
+                for (const item of batch) {
+                    const result = resultsByUuid.get(String(item.uuid));
+                    if (result && result.status !== 'error') {
+                        await window.posDB.removeFromQueue(item.uuid);
+                        successCount++;
+                        continue;
+                    }
+
+                    console.error('[Sync] Failed to sync item:', item.uuid, result?.error);
                     failCount++;
 
                     // Update retry count
@@ -163,6 +179,42 @@ class SyncManager {
         return '';
     }
 
+    // Sync a batch of queued items in one request; returns one result per item
+    async syncBatch(items) {
+        console.log(`[Sync] Sending batch of ${items.length} to /api/v1/offline/batch/`);
+
+        const csrfToken = await this.getCsrfToken();
+
+        // Get API key from IndexedDB
+        const apiKeyData = await window.posDB.get('settings', 'api_key');
+        const apiKey = apiKeyData?.value || '';
+
+        const response = await fetch('/api/v1/offline/batch/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken,
+                'X-API-Key': apiKey
+            },
+            credentials: 'include',
+            body: JSON.stringify(items.map(item => ({
+                uuid: item.uuid,
+                type: item.type,
+                data: item.data
+            })))
+        });
+
+        if (!response.ok) {
+            const error = await response.text();
+            console.error('[Sync] Server error response:', error);
+            throw new Error(`Batch sync failed (${response.status}): ${error}`);
+        }
+
+        const payload = await response.json();
+        console.log('[Sync] Batch synced:', payload.data?.summary);
+        return payload.data?.results || [];
+    }
+
     // Sync individual item
     async syncItem(item) {
         console.log('[Sync] Syncing item:', item.type, item.uuid);
@@ -209,6 +261,51 @@ class SyncManager {
         return result;
     }
 
+    // Apply catalog changes since the stored cursor. Returns null when a full fetch is needed.
+    async fetchCatalogChanges(branchId, headers) {
+        const stored = await window.posDB.get('settings', 'catalog_cursor');
+        if (!stored || stored.value?.branchId !== branchId) {
+            return null;
+        }
+
+        let cursor = stored.value.cursor;
+        let applied = 0;
+        let hasMore = true;
+        while (hasMore) {
+            const response = await fetch(`/api/v1/offline/data/${branchId}/?since=${cursor}`, {
+                headers,
+                credentials: 'include'
+            });
+            if (!response.ok) {
+                return null;
+            }
+
+            const body = await response.json();
+            const changes = body.data || body;
+            if (changes.reset) {
+                return null;
+            }
+
+            for (const store of ['products', 'categories', 'customers']) {
+                if (changes[store]?.length) {
+                    await window.posDB.bulkPut(store, changes[store]);
+                    applied += changes[store].length;
+                }
+                for (const id of changes.deleted?.[store] || []) {
+                    await window.posDB.delete(store, id);
+                    applied++;
+                }
+            }
+
+            cursor = changes.cursor;
+            hasMore = changes.has_more;
+            await window.posDB.put('settings', { key: 'catalog_cursor', value: { branchId, cursor } });
+        }
+
+        console.log(`[Sync] Applied ${applied} catalog changes, cursor ${cursor}`);
+        return { cursor, applied };
+    }
+
     // Fetch and cache data from server
     async fetchAndCache(branchId) {
         if (!this.isOnline) {
@@ -226,18 +323,28 @@ class SyncManager {
             const apiKeyData = await window.posDB.get('settings', 'api_key');
             const apiKey = apiKeyData?.value || '';
 
+            const headers = {
+                'X-API-Key': apiKey,
+                'X-CSRFToken': csrfToken
+            };
+
+            // Only download what changed since the last sync when we have a cursor
+            const changes = await this.fetchCatalogChanges(branchId, headers);
+            if (changes) {
+                this.notifyListeners('cache_complete', changes);
+                return changes;
+            }
+
             const response = await fetch(`/api/v1/offline/data/${branchId}/`, {
-                headers: {
-                    'X-API-Key': apiKey,
-                    'X-CSRFToken': csrfToken
-                },
+                headers,
                 credentials: 'include'
             });
             if (!response.ok) {
                 throw new Error('Failed to fetch sync data');
             }
 
-            const data = await response.json();
+            const body = await response.json();
+            const data = body.data || body;
             console.log('[Sync] Received data:', data);
 
             // Cache transactions (last 500)
@@ -384,6 +491,10 @@ class SyncManager {
                 console.log(`[Sync] Cached ${data.cash_sessions.length} cash sessions`);
             }
 
+            // Remember the catalog version for the next delta sync
+            if (data.cursor !== undefined) {
+                await window.posDB.put('settings', { key: 'catalog_cursor', value: { branchId, cursor: data.cursor } });
+            }
 
             this.notifyListeners('cache_complete', data);
             return data;
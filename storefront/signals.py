@@ -2,6 +2,8 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.cache import caches
 from main.models import Product, Category
+from storefront.models import StorefrontSettings
+from branches.services.pos_snapshot import invalidate_pos_snapshot
 
 @receiver([post_save, post_delete], sender=Product)
 @receiver([post_save, post_delete], sender=Category)
@@ -16,3 +18,9 @@ def clear_storefront_cache(sender, instance, **kwargs):
     except Exception:
         # Gracefully handle missing cache alias in specific environments
         pass
+
+
+@receiver(post_save, sender=StorefrontSettings)
+def invalidate_pos_payment_config(sender, instance, **kwargs):
+    """Payment keys are embedded in every branch's POS snapshot"""
+    invalidate_pos_snapshot(tenant_id=instance.tenant_id)
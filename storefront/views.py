@@ -6,6 +6,7 @@ from accounts.models import Tenant, Branch
 from main.models import Product, Order, OrderItem, Customer, Category, ProductVariant, CRMSettings, LoyaltyTransaction
 # from django.contrib.postgres.search import TrigramSimilarity
 from django.db import transaction
+from django.core.exceptions import ValidationError
 from django.db.models import Q
 from django.conf import settings as django_settings
 import stripe
@@ -17,6 +18,7 @@ from .forms import (
     CustomerProfileForm, CouponApplyForm, TrackOrderForm
 )
 from .decorators import storefront_active_required
+from branches.services.stock_ledger import StockLedger, InsufficientStock
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.models import User
@@ -277,6 +279,18 @@ def store_cart(request, tenant_slug, branch_id):
     }
     return render(request, 'storefront/cart.html', context)
 
+def cart_key(request):
+    """Session key the cart's stock reservations are held under"""
+    if not request.session.session_key:
+        request.session.save()
+    return request.session.session_key
+
+def reserve_cart_item(request, tenant_slug, product_id, qty):
+    """Hold qty units of the product for this cart; False when fewer are free"""
+    tenant = get_object_or_404(Tenant, subdomain=tenant_slug)
+    product = get_object_or_404(Product, id=product_id, tenant=tenant)
+    return StockLedger(tenant).reserve(product, qty, cart_key(request))
+
 @storefront_active_required
 def add_to_cart(request, tenant_slug, branch_id, product_id):
     if request.method == 'POST':
@@ -288,6 +302,9 @@ def add_to_cart(request, tenant_slug, branch_id, product_id):
              qty = 1
         
         current_qty = cart.get(str(product_id), 0)
+        if not reserve_cart_item(request, tenant_slug, product_id, current_qty + qty):
+            messages.error(request, "Not enough stock available for that quantity.")
+            return redirect('store_home', tenant_slug=tenant_slug, branch_id=branch_id)
         cart[str(product_id)] = current_qty + qty
         
         request.session['cart'] = cart
@@ -305,6 +322,9 @@ def update_cart(request, tenant_slug, branch_id, product_id):
         except (ValueError, TypeError):
             qty = 0
         
+        if not reserve_cart_item(request, tenant_slug, product_id, qty):
+            messages.error(request, "Not enough stock available for that quantity.")
+            return redirect('store_cart', tenant_slug=tenant_slug, branch_id=branch_id)
         if qty > 0:
             cart[str(product_id)] = qty
         else:
@@ -320,6 +340,7 @@ def remove_from_cart(request, tenant_slug, branch_id, product_id):
     if str(product_id) in cart:
         del cart[str(product_id)]
         request.session['cart'] = cart
+        reserve_cart_item(request, tenant_slug, product_id, 0)
     return redirect('store_cart', tenant_slug=tenant_slug, branch_id=branch_id)
 
 from notifications.utils import trigger_new_order_notification
@@ -439,17 +460,18 @@ def store_checkout(request, tenant_slug, branch_id):
                             transaction_type='redeem',
                             description=f"Redeemed for Online Order #{order.order_number}"
                         )
+
+                    # Deduct stock for the whole cart, using the units it holds
+                    StockLedger(tenant).deduct(
+                        [(product, cart[str(product.id)]) for product in products if cart.get(str(product.id))],
+                        branch, reference=f"Order {order.order_number}", reservation_key=cart_key(request)
+                    )
                 
                 # Create Order Items
                 final_total = 0
                 for product in products:
                     qty = cart.get(str(product.id))
                     if qty:
-                        # Update Stock
-                        if product.stock_quantity >= qty:
-                            product.stock_quantity -= qty
-                            product.save()
-
                         OrderItem.objects.create(
                             order=order,
                             product=product,
@@ -494,6 +516,9 @@ def store_checkout(request, tenant_slug, branch_id):
                 print(f"[Checkout] Order {order.order_number} created successfully")
                 return redirect('store_order_success', tenant_slug=tenant_slug, branch_id=branch_id, order_id=order.id)
             
+            except InsufficientStock as e:
+                messages.error(request, f"{e}. Please update your cart.")
+                return redirect('store_cart', tenant_slug=tenant_slug, branch_id=branch_id)
             except Exception as e:
                 print(f"[Checkout Error] {e}")
                 import traceback
@@ -981,11 +1006,14 @@ def track_order(request, tenant_slug, branch_id):
     if request.method == 'POST':
         form = TrackOrderForm(request.POST)
         if form.is_valid():
-            order_id = form.cleaned_data['order_id']
+            order_id = form.cleaned_data['order_id'].strip()
             try:
                 order = Order.objects.get(id=order_id, tenant=tenant)
-            except (Order.DoesNotExist, ValueError):
-                error = "Order not found. Please check your ID."
+            except (Order.DoesNotExist, ValueError, ValidationError):
+                # Not a UUID: look up the human-readable order number via its blind index
+                order = Order.objects.filter(order_number__blind=order_id, tenant=tenant).first()
+                if not order:
+                    error = "Order not found. Please check your ID."
         else:
             error = "Please enter a valid Order ID."
             
@@ -1,6 +1,5 @@
 import os
 import django
-import base64
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'possystem.settings')
 django.setup()
@@ -9,6 +8,8 @@ from accounts.models import Tenant, Branch
 from main.models import Product
 from branches.tasks import import_products_task
 from django_tenants.utils import tenant_context
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 
 def test_300_import():
     print("Testing import of 300-product file...")
@@ -36,15 +37,15 @@ def test_300_import():
         before_count = Product.objects.filter(branch=branch).count()
         print(f"✓ Products before: {before_count}")
     
-    # Encode and import
-    file_content_b64 = base64.b64encode(file_content).decode('utf-8')
+    # Store and import
+    file_name = default_storage.save('product_imports/test_300_import.xlsx', ContentFile(file_content))
     
     print("\n🚀 Starting import task...")
     try:
         result = import_products_task(
             str(tenant.id),
             str(branch.id),
-            file_content_b64
+            file_name
         )
         print(f"\n✅ Import completed!")
         print(f"   Success: {result['success']}")
@@ -73,8 +73,11 @@ def test_import():
             
         print(f"✓ Found branch: {branch.name}")
         
-        # Decode the test XLSX
-        file_content_b64 = test_xlsx_b64.strip()
+        # Store the test XLSX; the task streams it from storage
+        import base64
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        file_name = default_storage.save('product_imports/test_import.xlsx', ContentFile(base64.b64decode(test_xlsx_b64.strip())))
         
         print(f"✓ Calling import task...")
         
@@ -82,7 +85,7 @@ def test_import():
         result = import_products_task(
             str(tenant.id),
             str(branch.id),
-            file_content_b64
+            file_name
         )
         
         print(f"✓ Task completed!")
@@ -64,15 +64,16 @@ def test_with_real_file():
     
     # Import using the task
     from branches.tasks import import_products_task
-    import base64
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
     
-    file_content_b64 = base64.b64encode(xlsx_bytes).decode('utf-8')
+    file_name = default_storage.save('product_imports/test_import_real.xlsx', ContentFile(xlsx_bytes))
     
     try:
         result = import_products_task(
             str(tenant.id),
             str(branch.id),
-            file_content_b64
+            file_name
         )
         print(f"✓ Import result: {result}")
     except Exception as e:
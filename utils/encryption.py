@@ -1,7 +1,150 @@
 from django.db import models
-from cryptography.fernet import Fernet
+from django.db.models import Lookup
+from django.db.models.expressions import Col
+from django.core.exceptions import EmptyResultSet, FieldError
+from cryptography.fernet import Fernet, MultiFernet
 from django.conf import settings
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
 import base64
+import hashlib
+import hmac
+import re
+import threading
+
+# -----------------------------------------------------------------------------
+# CIPHER & DECRYPTION ENGINE
+# -----------------------------------------------------------------------------
+# Building a Fernet object means base64-decoding and splitting the key, so the
+# cipher is built once per key set and shared. Decryption goes through
+# decrypt_token()/decrypt_tokens(), which also consult the optional per-request
+# LRU (see DecryptionCacheMiddleware).
+
+_cipher_cache = {}
+_local = threading.local()
+
+
+def get_encryption_keys():
+    """
+    Keys in priority order: FERNET_KEY encrypts, FERNET_OLD_KEYS are only used
+    to decrypt data written before a rotation.
+    """
+    primary = getattr(settings, 'FERNET_KEY', None)
+    if not primary:
+        raise ValueError("FERNET_KEY is not set in settings.")
+    keys = [primary] + [key for key in getattr(settings, 'FERNET_OLD_KEYS', []) if key]
+    return tuple(key.encode('utf-8') if isinstance(key, str) else key for key in keys)
+
+
+def get_cipher():
+    """Cached MultiFernet for the current key set"""
+    keys = get_encryption_keys()
+    cipher = _cipher_cache.get(keys)
+    if cipher is None:
+        cipher = MultiFernet([Fernet(key) for key in keys])
+        # Settings only change in tests; keep a single entry
+        _cipher_cache.clear()
+        _cipher_cache[keys] = cipher
+    return cipher
+
+
+class _LRUCache(OrderedDict):
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def lookup(self, key):
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        self[key] = value
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+@contextmanager
+def decryption_cache(maxsize=1024):
+    """Remember recently decrypted tokens for the duration of the block (e.g. one request)"""
+    previous = getattr(_local, 'cache', None)
+    _local.cache = _LRUCache(maxsize) if maxsize else None
+    try:
+        yield
+    finally:
+        _local.cache = previous
+
+
+@contextmanager
+def raw_encrypted_values():
+    """Make EncryptedTextField return ciphertext untouched while the block runs"""
+    previous = getattr(_local, 'raw', False)
+    _local.raw = True
+    try:
+        yield
+    finally:
+        _local.raw = previous
+
+
+def decrypt_token(token, cipher=None):
+    """Decrypt one token; returns the token itself if it cannot be decrypted"""
+    cache = getattr(_local, 'cache', None)
+    if cache is not None:
+        cached = cache.lookup(token)
+        if cached is not None:
+            return cached
+
+    try:
+        plaintext = (cipher or get_cipher()).decrypt(token.encode('utf-8')).decode('utf-8')
+    except Exception:
+        # If decryption fails (e.g. key changed or bad data), return raw
+        return token
+
+    if cache is not None:
+        cache.store(token, plaintext)
+    return plaintext
+
+
+def decrypt_tokens(tokens):
+    """
+    Decrypt a whole column in one pass: one cipher lookup, and each distinct
+    token decrypted once. None values are preserved.
+    """
+    cipher = get_cipher()
+    plaintexts = {}
+    for token in tokens:
+        if token is not None and token not in plaintexts:
+            plaintexts[token] = decrypt_token(token, cipher)
+    return [None if token is None else plaintexts[token] for token in tokens]
+
+
+def iterate_decrypted(queryset, chunk_size=2000):
+    """
+    Iterate a queryset of model instances, decrypting the encrypted columns of
+    each chunk column by column instead of value by value.
+    """
+    encrypted_fields = [
+        field for field in queryset.model._meta.concrete_fields
+        if isinstance(field, EncryptedTextField)
+    ]
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        # Rows are only fetched (and converted) inside this block, so code run
+        # by the caller between chunks still gets normal decryption
+        with raw_encrypted_values():
+            chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        for field in encrypted_fields:
+            loaded = [obj for obj in chunk if field.attname in obj.__dict__]
+            values = decrypt_tokens([obj.__dict__[field.attname] for obj in loaded])
+            for obj, value in zip(loaded, values):
+                obj.__dict__[field.attname] = value
+        yield from chunk
+
 
 class EncryptedTextField(models.TextField):
     """
@@ -15,10 +158,7 @@ class EncryptedTextField(models.TextField):
         super().__init__(*args, **kwargs)
 
     def get_fernet(self):
-        key = getattr(settings, 'FERNET_KEY', None)
-        if not key:
-            raise ValueError("FERNET_KEY is not set in settings.")
-        return Fernet(key)
+        return get_cipher()
 
     def get_prep_value(self, value):
         """Encrypt the value before saving to the database."""
@@ -27,25 +167,134 @@ class EncryptedTextField(models.TextField):
         if not isinstance(value, str):
             value = str(value)
         
-        fernet = self.get_fernet()
-        encrypted_value = fernet.encrypt(value.encode('utf-8'))
+        # MultiFernet always encrypts with the primary key
+        encrypted_value = get_cipher().encrypt(value.encode('utf-8'))
         return encrypted_value.decode('utf-8')
 
     def from_db_value(self, value, expression, connection):
         """Decrypt the value when retrieving from the database."""
-        if value is None:
-            return None
-        
-        try:
-            fernet = self.get_fernet()
-            decrypted_value = fernet.decrypt(value.encode('utf-8'))
-            return decrypted_value.decode('utf-8')
-        except Exception:
-            # If decryption fails (e.g. key changed or bad data), return raw or empty
+        if value is None or getattr(_local, 'raw', False):
             return value
+        return decrypt_token(value)
 
     def to_python(self, value):
         """Ensure the value is in python format (decrypted handled by from_db_value normally, but for forms/serializers)."""
         # If accessing directly on model instance that was just assigned, it might be plain text.
         # If coming from DB, it's already decrypted by from_db_value.
         return value
+
+
+# -----------------------------------------------------------------------------
+# BLIND INDEX
+# -----------------------------------------------------------------------------
+# Fernet tokens are randomized, so an encrypted column cannot be searched with
+# an equality query. A blind index stores a keyed HMAC of the plaintext in a
+# companion column that can be indexed and compared instead.
+
+def normalize_identifier(value):
+    """ORD-000001, ' ord-000001 ' and 'Ord-000001' hash the same"""
+    return value.strip().upper()
+
+
+def normalize_phone(value):
+    """Keep digits only so formatting differences don't break lookups"""
+    return re.sub(r'\D', '', value)
+
+
+def get_blind_index_key():
+    """
+    HMAC key for blind indexes. Derived from FERNET_KEY unless BLIND_INDEX_KEY is set.
+    Changing it invalidates every stored index (re-save or re-run the backfill).
+    """
+    key = getattr(settings, 'BLIND_INDEX_KEY', None) or getattr(settings, 'FERNET_KEY', None)
+    if not key:
+        raise ValueError("FERNET_KEY is not set in settings.")
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return hmac.new(key, b'puxbay-blind-index', hashlib.sha256).digest()
+
+
+def blind_index(value, normalizer=None):
+    """Compute the blind index of a plaintext value (None for empty values)"""
+    if value is None:
+        return None
+    value = str(value)
+    if normalizer:
+        value = normalizer(value)
+    if not value:
+        return None
+    return hmac.new(get_blind_index_key(), value.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class BlindIndexField(models.CharField):
+    """
+    Keyed HMAC of another (encrypted) field on the same model, filled on save.
+    Usage:
+        phone = EncryptedTextField(blank=True, null=True)
+        phone_index = BlindIndexField(source='phone', normalizer=normalize_phone)
+
+        Customer.objects.filter(phone__blind='+233 24 000 0000')
+
+    Note: queryset.update() and bulk_update() bypass save, so include the index
+    when writing the source field that way.
+    """
+    description = "Blind index of an encrypted field"
+
+    def __init__(self, *args, source=None, normalizer=None, **kwargs):
+        self.source = source
+        self.normalizer = normalizer
+        kwargs.setdefault('max_length', 64)
+        kwargs.setdefault('db_index', True)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('null', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        if self.normalizer is not None:
+            kwargs['normalizer'] = self.normalizer
+        return name, path, args, kwargs
+
+    def compute(self, model_instance):
+        return blind_index(getattr(model_instance, self.source), self.normalizer)
+
+    def pre_save(self, model_instance, add):
+        value = self.compute(model_instance)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+@EncryptedTextField.register_lookup
+class BlindIndexLookup(Lookup):
+    """
+    `<encrypted_field>__blind=value` (or a list of values) rewritten to an
+    equality/IN query on the companion BlindIndexField.
+    """
+    lookup_name = 'blind'
+    prepare_rhs = False
+
+    def get_index_field(self):
+        target = getattr(self.lhs, 'target', None)
+        if target is not None:
+            for field in target.model._meta.concrete_fields:
+                if isinstance(field, BlindIndexField) and field.source == target.name:
+                    return field
+        raise FieldError(f"No blind index is defined for '{getattr(target, 'name', self.lhs)}'.")
+
+    def as_sql(self, compiler, connection):
+        index_field = self.get_index_field()
+        lhs_sql, lhs_params = compiler.compile(Col(self.lhs.alias, index_field))
+
+        if isinstance(self.rhs, (list, tuple, set)):
+            hashes = [h for h in (blind_index(v, index_field.normalizer) for v in self.rhs) if h]
+            if not hashes:
+                raise EmptyResultSet
+            placeholders = ', '.join(['%s'] * len(hashes))
+            return f"{lhs_sql} IN ({placeholders})", (*lhs_params, *hashes)
+
+        value = blind_index(self.rhs, index_field.normalizer)
+        if value is None:
+            raise EmptyResultSet
+        return f"{lhs_sql} = %s", (*lhs_params, value)
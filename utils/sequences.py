@@ -0,0 +1,140 @@
+"""
+Per-tenant sequence allocator for human-readable identifiers.
+
+Numbers come from one counter per (tenant, sequence name) instead of scanning and
+decrypting the whole history on every allocation. The backend is picked with
+settings.IDENTIFIER_SEQUENCE_BACKEND:
+
+- 'db' (default): counter rows in accounts.IdentifierSequence. The increment runs
+  inside the caller's transaction, so a rolled back order gives its number back
+  and the sequence stays gap-free.
+- 'redis': an atomic INCRBY in Redis, floored at the database high-water mark.
+  The checkout transaction never holds the counter row lock; numbers taken by
+  rolled back transactions are skipped instead of reused.
+"""
+import logging
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseSequenceBackend:
+    """Counter rows updated with a single conditional UPDATE per allocation."""
+
+    def allocate(self, tenant, name, count, seed):
+        from accounts.models import IdentifierSequence
+
+        with transaction.atomic():
+            sequence = IdentifierSequence.objects.filter(tenant=tenant, name=name)
+            if not sequence.update(last_value=F('last_value') + count):
+                ensure_sequence(tenant, name, seed)
+                sequence.update(last_value=F('last_value') + count)
+            # The UPDATE holds the row lock, so this read sees our own increment
+            return sequence.values_list('last_value', flat=True).get()
+
+
+class RedisSequenceBackend:
+    """
+    INCRBY in Redis, never handing out a number at or below the committed
+    database high-water mark (protects against a flushed or stale Redis key).
+    """
+
+    # KEYS[1] = counter key, ARGV[1] = count, ARGV[2] = database floor
+    ALLOCATE_SCRIPT = """
+    local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+    local floor = tonumber(ARGV[2])
+    if value - tonumber(ARGV[1]) < floor then
+        value = floor + tonumber(ARGV[1])
+        redis.call('SET', KEYS[1], value)
+    end
+    return value
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._script = None
+
+    def _get_script(self):
+        if self._script is None:
+            from django_redis import get_redis_connection
+            self._script = get_redis_connection(self.alias).register_script(self.ALLOCATE_SCRIPT)
+        return self._script
+
+    def allocate(self, tenant, name, count, seed):
+        from accounts.models import IdentifierSequence
+
+        floor = ensure_sequence(tenant, name, seed)
+        key = f"idseq:{tenant.pk}:{name}"
+        last_value = int(self._get_script()(keys=[key], args=[count, floor]))
+
+        # Advance the database high-water mark once the caller commits, outside
+        # its transaction, so the DB backend can take over without collisions.
+        transaction.on_commit(
+            lambda: IdentifierSequence.objects.filter(tenant=tenant, name=name).update(
+                last_value=Greatest(F('last_value'), last_value)
+            )
+        )
+        return last_value
+
+
+def ensure_sequence(tenant, name, seed):
+    """
+    Return the committed value of a sequence, creating its row on first use.
+    `seed` is a callable returning the highest number already in use; it only
+    runs once per tenant and sequence.
+    """
+    from accounts.models import IdentifierSequence
+
+    current = IdentifierSequence.objects.filter(tenant=tenant, name=name).values_list('last_value', flat=True).first()
+    if current is not None:
+        return current
+
+    initial = seed() if seed else 0
+    try:
+        with transaction.atomic():
+            IdentifierSequence.objects.create(tenant=tenant, name=name, last_value=initial)
+    except IntegrityError:
+        # Another worker created the row first
+        return IdentifierSequence.objects.filter(tenant=tenant, name=name).values_list('last_value', flat=True).get()
+    return initial
+
+
+_BACKENDS = {
+    'db': DatabaseSequenceBackend,
+    'redis': RedisSequenceBackend,
+}
+_backend_cache = {}
+
+
+def get_backend(name=None):
+    name = name or getattr(settings, 'IDENTIFIER_SEQUENCE_BACKEND', 'db')
+    if name not in _backend_cache:
+        try:
+            _backend_cache[name] = _BACKENDS[name]()
+        except KeyError:
+            raise ValueError(f"Unknown identifier sequence backend: {name}")
+    return _backend_cache[name]
+
+
+def allocate(tenant, name, count=1, seed=None):
+    """
+    Reserve `count` consecutive numbers from a tenant's sequence.
+    Returns the numbers as a range, in allocation order.
+    """
+    if count < 1:
+        return range(0)
+
+    backend = get_backend()
+    try:
+        last_value = backend.allocate(tenant, name, count, seed)
+    except Exception as e:
+        if isinstance(backend, DatabaseSequenceBackend):
+            raise
+        # Redis unavailable: the DB counter is kept at or above Redis' high-water mark
+        logger.warning(f"Sequence backend failed for {name}, falling back to database: {str(e)}")
+        last_value = get_backend('db').allocate(tenant, name, count, seed)
+
+    return range(last_value - count + 1, last_value + 1)
@@ -0,0 +1,97 @@
+"""
+Index of webhook subscriptions: which endpoints of a tenant want an event.
+
+Most tenants have no webhooks, so the Order/Customer/Product signals ask the
+index before building a payload or touching the database. Each tenant's
+index ({event_type: [endpoint ids]}, empty for tenants without endpoints) is
+kept in two tiers:
+
+- In process for WEBHOOK_INDEX_LOCAL_TTL seconds (default 5). This is the
+  only tier that can be stale: another worker's endpoint change is seen here
+  once the entry expires.
+- In the default cache for WEBHOOK_INDEX_TTL seconds (default 3600). The
+  signals in accounts/signals.py rebuild a tenant's entry after any of its
+  WebhookEndpoint rows is saved or deleted.
+
+Readers only fill a missing entry (cache.add), so a reader that loaded the
+endpoints before a change cannot overwrite the rebuilt index.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _cache_key(tenant_id):
+    return f"webhook_subscriptions:{tenant_id}"
+
+
+def load_subscriptions(tenant_id):
+    """{event_type: [endpoint id]} of the tenant's active endpoints, from the database."""
+    from accounts.models import WebhookEndpoint
+
+    index = {}
+    for endpoint_id, events in WebhookEndpoint.objects.filter(tenant_id=tenant_id, is_active=True).values_list('id', 'events'):
+        for event_type in events or []:
+            index.setdefault(event_type, []).append(str(endpoint_id))
+    return index
+
+
+def _remember(tenant_id, index):
+    with _local_lock:
+        if len(_local) >= settings.WEBHOOK_INDEX_LOCAL_SIZE:
+            _local.clear()
+        _local[tenant_id] = (time.monotonic() + settings.WEBHOOK_INDEX_LOCAL_TTL, index)
+
+
+def subscriptions(tenant_id):
+    """The tenant's {event_type: [endpoint id]} index."""
+    tenant_id = str(tenant_id)
+    entry = _local.get(tenant_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    index = None
+    try:
+        index = cache.get(_cache_key(tenant_id))
+    except Exception as e:
+        logger.warning(f"Webhook subscription cache unavailable: {str(e)}")
+
+    if index is None:
+        index = load_subscriptions(tenant_id)
+        try:
+            cache.add(_cache_key(tenant_id), index, settings.WEBHOOK_INDEX_TTL)
+        except Exception:
+            pass
+
+    _remember(tenant_id, index)
+    return index
+
+
+def endpoint_ids(tenant_id, event_type):
+    """Ids of the tenant's active endpoints subscribed to `event_type`."""
+    if not tenant_id:
+        return []
+    return subscriptions(tenant_id).get(event_type, [])
+
+
+def is_subscribed(tenant_id, event_type):
+    return bool(endpoint_ids(tenant_id, event_type))
+
+
+def rebuild(tenant_id):
+    """Reload the tenant's index from the database into both tiers."""
+    tenant_id = str(tenant_id)
+    index = load_subscriptions(tenant_id)
+    try:
+        cache.set(_cache_key(tenant_id), index, settings.WEBHOOK_INDEX_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to rebuild webhook subscriptions of tenant {tenant_id}: {str(e)}")
+    _remember(tenant_id, index)
+    return index
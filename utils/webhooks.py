@@ -1,82 +1,277 @@
+"""
+Webhook delivery.
+
+Every event is first persisted as one pending WebhookEvent row per
+subscribed endpoint (WebhookService.enqueue), then sent by WebhookDispatcher
+from a Celery worker:
+
+- deliver_webhook_events / send_webhooks send the rows they were given,
+- retry_webhook_deliveries (every minute) sends whatever else is due:
+  retries, and rows whose worker died or was never queued.
+
+A dispatch claims the due rows (leasing them for CLAIM_LEASE seconds, so
+concurrent workers skip them), groups them per endpoint and sends each group
+from a thread pool, in at most WEBHOOK_ENDPOINT_CONCURRENCY lanes per
+endpoint. Requests go through one keep-alive session per host, and the
+outcomes are written back in one bulk UPDATE.
+
+A failed attempt is retried after an exponential backoff with jitter, up to
+WEBHOOK_MAX_ATTEMPTS attempts before the row is given up as dead. After
+WEBHOOK_CIRCUIT_THRESHOLD failures in a row an endpoint's circuit opens:
+the rest of its batch is put back, unattempted, and nothing is sent to it for
+WEBHOOK_CIRCUIT_COOLDOWN seconds. The next attempt after that probes it.
+"""
 import hmac
 import hashlib
 import json
-import requests
+import logging
+import random
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from accounts.models import WebhookEndpoint, WebhookEvent
+from utils.webhook_index import endpoint_ids
+
+logger = logging.getLogger(__name__)
+
+# Seconds a claimed row is left to its dispatcher before others may send it
+CLAIM_LEASE = 600
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _session(url):
+    """The keep-alive session of the host of `url`, shared by the worker's threads."""
+    parts = urlsplit(url)
+    host = (parts.scheme, parts.netloc)
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.mount(f"{parts.scheme}://", HTTPAdapter(pool_connections=1, pool_maxsize=settings.WEBHOOK_WORKERS))
+            session.headers['User-Agent'] = 'Puxbay-Webhooks/1.0'
+            _sessions[host] = session
+    return session
+
+
+def sign(body, secret):
+    return hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+
+def backoff(attempts):
+    """Seconds to wait after failed attempt number `attempts`: exponential, capped, jittered."""
+    delay = min(settings.WEBHOOK_BACKOFF_MAX, settings.WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def pending_event(endpoint, event_type, payload, now=None):
+    """An unsaved WebhookEvent delivering `payload` to `endpoint`."""
+    now = now or timezone.now()
+    event = WebhookEvent(endpoint=endpoint, event_type=event_type, next_attempt_at=now)
+    event.payload = {
+        'id': str(event.id),
+        'event': event_type,
+        'data': payload,
+        'timestamp': now.isoformat(),
+    }
+    return event
+
 
 class WebhookService:
+    @staticmethod
+    def enqueue(events):
+        """
+        Persist (tenant_id, event_type, payload) events as pending deliveries
+        to the tenants' subscribed endpoints. Returns the WebhookEvent rows.
+        """
+        # The subscription index spares the query when nobody listens
+        subscribed = [
+            (endpoint_ids(tenant_id, event_type), event_type, payload)
+            for tenant_id, event_type, payload in events
+        ]
+        wanted = {endpoint_id for ids, _, _ in subscribed for endpoint_id in ids}
+        if not wanted:
+            return []
+        endpoints = {
+            str(endpoint.id): endpoint
+            for endpoint in WebhookEndpoint.objects.filter(id__in=wanted, is_active=True)
+        }
+
+        now = timezone.now()
+        rows = [
+            pending_event(endpoints[endpoint_id], event_type, payload, now)
+            for ids, event_type, payload in subscribed
+            for endpoint_id in ids
+            if endpoint_id in endpoints
+        ]
+        return WebhookEvent.objects.bulk_create(rows)
+
     @staticmethod
     def trigger(tenant, event_type, payload):
         """
-        Trigger a webhook event for a specific tenant.
-        This spawns a background thread to avoid blocking the request cycle.
+        Queue an event for the tenant's subscribed endpoints; a Celery worker
+        sends it once the current transaction commits.
         """
-        # Find all active endpoints for this tenant subscribed to this event
-        endpoints = WebhookEndpoint.objects.filter(
-            tenant=tenant,
-            is_active=True,
-            events__contains=event_type
-        )
-        
-        for endpoint in endpoints:
-            # Start asynchronous delivery
-            thread = threading.Thread(
-                target=WebhookService._send_request,
-                args=(endpoint, event_type, payload)
-            )
-            thread.daemon = True # Ensure thread exits when process does
-            thread.start()
+        rows = WebhookService.enqueue([(tenant.pk, event_type, payload)])
+        if rows:
+            event_ids = [str(row.id) for row in rows]
+            transaction.on_commit(lambda: _queue_send(event_ids))
 
     @staticmethod
-    def _send_request(endpoint, event_type, payload):
-        """Perform the actual HTTP POST request and log the result"""
-        # 1. Prepare Payload
-        full_payload = {
-            'event': event_type,
-            'data': payload,
-            'timestamp': str(threading.get_ident()) # Just for unique ID in mock? No, use something better
-        }
-        
-        json_payload = json.dumps(full_payload)
-        
-        # 2. Generate Signature
-        signature = hmac.new(
-            endpoint.secret.encode(),
-            json_payload.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
+    def deliver(events):
+        """
+        Enqueue (tenant_id, event_type, payload) events and send them in the
+        calling thread (used by Celery workers). Returns the WebhookEvent rows
+        sent.
+        """
+        rows = WebhookService.enqueue(events)
+        if not rows:
+            return []
+        return WebhookDispatcher().dispatch([row.id for row in rows])
+
+
+def _queue_send(event_ids):
+    from main.tasks import send_webhooks
+    try:
+        send_webhooks.delay(event_ids)
+    except Exception as e:
+        # The rows stay pending for retry_webhook_deliveries
+        logger.error(f"Could not queue {len(event_ids)} webhook deliveries: {str(e)}")
+
+
+class _Circuit:
+    """Failures in a row of one endpoint, shared by the lanes sending to it."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.failures = endpoint.consecutive_failures
+        self.open_until = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.open_until is not None
+
+    def record(self, delivered):
+        with self.lock:
+            if delivered:
+                self.failures = 0
+                self.open_until = None
+            else:
+                self.failures += 1
+                if self.failures >= settings.WEBHOOK_CIRCUIT_THRESHOLD and self.open_until is None:
+                    self.open_until = timezone.now() + timedelta(seconds=settings.WEBHOOK_CIRCUIT_COOLDOWN)
+                    logger.warning(f"Webhook endpoint {self.endpoint.url} failed {self.failures} times in a row, pausing it")
+
+
+class WebhookDispatcher:
+    """Sends pending WebhookEvent rows and records the outcome."""
+
+    def dispatch(self, event_ids=None, limit=None):
+        """
+        Send the due deliveries (of `event_ids` only, if given), at most
+        `limit` (WEBHOOK_DISPATCH_LIMIT). Returns the rows attempted.
+        """
+        events = self._claim(event_ids, limit or settings.WEBHOOK_DISPATCH_LIMIT)
+        if not events:
+            return []
+
+        by_endpoint = {}
+        for event in events:
+            by_endpoint.setdefault(event.endpoint_id, []).append(event)
+        circuits = []
+        jobs = []
+        for endpoint_events in by_endpoint.values():
+            circuit = _Circuit(endpoint_events[0].endpoint)
+            circuits.append(circuit)
+            lanes = min(settings.WEBHOOK_ENDPOINT_CONCURRENCY, len(endpoint_events))
+            for lane in range(lanes):
+                jobs.append((circuit, endpoint_events[lane::lanes]))
+
+        # The threads only talk HTTP; the database is written from here
+        with ThreadPoolExecutor(max_workers=min(settings.WEBHOOK_WORKERS, len(jobs))) as pool:
+            for _ in pool.map(lambda job: self.send_all(*job), jobs):
+                pass
+
+        WebhookEvent.objects.bulk_update(
+            events,
+            ['status', 'attempts', 'next_attempt_at', 'delivered_at', 'signature', 'status_code', 'response_body', 'error_message'],
+            batch_size=500
+        )
+        for circuit in circuits:
+            endpoint = circuit.endpoint
+            if (endpoint.consecutive_failures, endpoint.disabled_until) != (circuit.failures, circuit.open_until):
+                WebhookEndpoint.objects.filter(pk=endpoint.pk).update(
+                    consecutive_failures=circuit.failures, disabled_until=circuit.open_until
+                )
+        return events
+
+    def _claim(self, event_ids, limit):
+        now = timezone.now()
+        with transaction.atomic():
+            due = WebhookEvent.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                status=WebhookEvent.STATUS_PENDING,
+                next_attempt_at__lte=now,
+                endpoint__is_active=True
+            ).exclude(endpoint__disabled_until__gt=now)
+            if event_ids is not None:
+                due = due.filter(id__in=event_ids)
+            events = list(due.select_related('endpoint').order_by('next_attempt_at')[:limit])
+            if events:
+                WebhookEvent.objects.filter(id__in=[event.id for event in events]).update(
+                    next_attempt_at=now + timedelta(seconds=CLAIM_LEASE)
+                )
+        return events
+
+    def send_all(self, circuit, events):
+        """Send `events` to the circuit's endpoint one after the other."""
+        for event in events:
+            if circuit.is_open:
+                # Put back without counting an attempt
+                event.next_attempt_at = circuit.open_until
+                continue
+            circuit.record(self.send(circuit.endpoint, event))
+
+    def send(self, endpoint, event):
+        """Attempt one delivery, updating `event` (unsaved). True when delivered."""
+        body = json.dumps(event.payload)
+        event.signature = sign(body, endpoint.secret)
         headers = {
             'Content-Type': 'application/json',
-            'X-Puxbay-Signature': signature,
-            'X-Puxbay-Event': event_type,
-            'User-Agent': 'Puxbay-Webhooks/1.0'
+            'X-Puxbay-Signature': event.signature,
+            'X-Puxbay-Event': event.event_type,
         }
-        
-        # 3. Send Request
+        event.attempts += 1
         try:
-            response = requests.post(
-                endpoint.url, 
-                data=json_payload, 
-                headers=headers, 
-                timeout=10
+            response = _session(endpoint.url).post(
+                endpoint.url, data=body, headers=headers, timeout=settings.WEBHOOK_TIMEOUT, allow_redirects=False
             )
-            status_code = response.status_code
-            response_body = response.text[:1000] # Limit log size
-            error_message = None
+            event.status_code = response.status_code
+            event.response_body = response.text[:1000] # Limit log size
+            event.error_message = None if 200 <= response.status_code < 300 else f"HTTP {response.status_code}"
         except requests.exceptions.RequestException as e:
-            status_code = None
-            response_body = None
-            error_message = str(e)
-            
-        # 4. Log the result
-        WebhookEvent.objects.create(
-            endpoint=endpoint,
-            event_type=event_type,
-            payload=full_payload,
-            status_code=status_code,
-            response_body=response_body,
-            error_message=error_message
-        )
+            event.status_code = None
+            event.response_body = None
+            event.error_message = str(e)
+
+        now = timezone.now()
+        if event.error_message is None:
+            event.status = WebhookEvent.STATUS_DELIVERED
+            event.delivered_at = now
+            event.next_attempt_at = None
+            return True
+        if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            event.status = WebhookEvent.STATUS_DEAD
+            event.next_attempt_at = None
+            logger.warning(f"Giving up webhook {event.event_type} to {endpoint.url} after {event.attempts} attempts")
+        else:
+            event.next_attempt_at = now + timedelta(seconds=backoff(event.attempts))
+        return False
@@ -20,6 +20,9 @@ def wallet_login(request):
                 return redirect('wallet_dashboard')
             except Customer.DoesNotExist:
                 messages.error(request, "Customer not found with this phone number.")
+            except Customer.MultipleObjectsReturned:
+                # Phone numbers are not unique
+                messages.error(request, "More than one customer uses this phone number. Please ask the store for help.")
     else:
         form = WalletLoginForm()
             